@@ -0,0 +1 @@
+"""Benchmarks for biometal, which can be run with ``python -m benchmarks.run``."""
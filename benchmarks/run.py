@@ -0,0 +1,236 @@
+"""Times biometal's functions on synthetic models of increasing size, checks
+that they still agree with the original implementation, and writes the
+results as JSON.
+
+Run it from the repository root with ``python -m benchmarks.run``, adding
+``--help`` to see the options. Nothing is downloaded, and the same options
+always produce the same models and spheres."""
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+from datetime import datetime
+import numpy as np
+import atomium
+import biometal
+from . import reference
+from .synthetic import synthetic_model, synthetic_site
+
+FILTERS = [
+ {"pc": pc, "het": het, "metal": metal}
+ for pc in (False, True) for het in (True, False) for metal in (True, False)
+]
+
+def main(args=None):
+    """Runs the benchmarks with the given command line arguments and writes
+    the results to the output file, or to stdout.
+
+    :param list args: The arguments, if not those of the command line.
+    :rtype: ``dict``"""
+
+    options = parse_arguments(args)
+    results = run_benchmarks(
+     options.sizes, centres=options.centres, radius=options.radius,
+     repeat=options.repeat, reference_limit=options.reference_limit,
+     seed=options.seed, log=lambda message: print(message, file=sys.stderr)
+    )
+    output = json.dumps(results, indent=1)
+    if options.output:
+        with open(options.output, "w") as f: f.write(output)
+    else:
+        print(output)
+    failures = [check for check in results["parity"] if not check["identical"]]
+    if failures: sys.exit("{} parity checks failed".format(len(failures)))
+    return results
+
+
+def parse_arguments(args=None):
+    """Reads the benchmark options from the command line.
+
+    :param list args: The arguments, if not those of the command line.
+    :rtype: ``argparse.Namespace``"""
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+     "--sizes", type=int, nargs="+", default=[1000, 10000, 100000, 500000],
+     help="the approximate numbers of atoms in the models"
+    )
+    parser.add_argument(
+     "--centres", type=int, default=10, help="the spheres timed per model"
+    )
+    parser.add_argument(
+     "--radius", type=float, default=8, help="the radius of the spheres"
+    )
+    parser.add_argument(
+     "--repeat", type=int, default=1, help="how many times to time each call"
+    )
+    parser.add_argument(
+     "--reference-limit", type=int, default=100000,
+     help="the largest model to check against the original implementation"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="the random seed")
+    parser.add_argument("--output", help="the JSON file to write to")
+    return parser.parse_args(args)
+
+
+def run_benchmarks(sizes, centres=10, radius=8, repeat=1,
+                   reference_limit=100000, seed=0, log=None):
+    """Creates a synthetic model of each size and times the hydrophobicity and
+    template functions on it. For models no larger than the reference limit,
+    the values given by every function are also compared with those of the
+    original implementation.
+
+    :param list sizes: The approximate numbers of atoms in the models.
+    :param int centres: The number of spheres to measure in each model.
+    :param radius: The radius of the spheres.
+    :param int repeat: The number of times to time each call (the fastest is\
+    kept).
+    :param int reference_limit: The largest model to check for parity.
+    :param int seed: The random seed.
+    :param function log: If given, progress messages are passed to this.
+    :rtype: ``dict``"""
+
+    log = log or (lambda message: None)
+    results = {"environment": environment(), "timings": [], "parity": []}
+    for size in sizes:
+        log("Creating model of {} atoms".format(size))
+        start = time.perf_counter()
+        model = synthetic_model(size, seed=seed)
+        atom_count = len(model.atoms())
+        record = lambda name, seconds, calls=1, **kwargs: results[
+         "timings"
+        ].append(dict(
+         function=name, size=size, atoms=atom_count, calls=calls,
+         seconds=seconds, per_call=seconds / calls, **kwargs
+        ))
+        record("synthetic_model", time.perf_counter() - start)
+        points = sphere_centres(model, centres, seed)
+        seconds, site = timed(lambda: synthetic_site(model), repeat)
+        seconds, _ = timed(lambda: biometal.create_site_template(site), repeat)
+        record("create_site_template", seconds)
+        seconds, index = timed(lambda: biometal.SpatialIndex(model), repeat)
+        record("SpatialIndex", seconds)
+        seconds, table = timed(lambda: biometal.AtomTable.from_model(model), repeat)
+        record("AtomTable.from_model", seconds)
+        check = size <= reference_limit
+        for filters in FILTERS:
+            log("Timing {} atoms with {}".format(size, filters))
+            values = {}
+            for name, function in (
+             ("solvation", biometal.solvation),
+             ("hydrophobic_contrast", biometal.hydrophobic_contrast)
+            ):
+                for variant, kwargs in (
+                 ("model", {}), ("index", {"index": index}), ("table", None)
+                ):
+                    structure = table if kwargs is None else model
+                    seconds, values[name, variant] = timed(lambda: [function(
+                     structure, *point, radius, **filters, **(kwargs or {})
+                    ) for point in points], repeat)
+                    record(
+                     name, seconds, len(points), variant=variant, **filters
+                    )
+            for name, function in (
+             ("solvation", biometal.solvation_many),
+             ("hydrophobic_contrast", biometal.hydrophobic_contrast_many)
+            ):
+                seconds, array = timed(lambda: function(
+                 model, points, radius, index=index, **filters
+                ), repeat)
+                values[name, "many"] = array.tolist()
+                record(
+                 name + "_many", seconds, len(points), variant="index",
+                 **filters
+                )
+            if check:
+                results["parity"] += parity(
+                 model, points, radius, filters, values, size
+                )
+    return results
+
+
+def parity(model, points, radius, filters, values, size):
+    """Compares the values the current functions gave with those given by
+    the original implementation.
+
+    :param Model model: The model the values were measured in.
+    :param list points: The sphere centres.
+    :param radius: The radius of the spheres.
+    :param dict filters: The pc, het and metal options used.
+    :param dict values: The current values, keyed by function and variant.
+    :param int size: The size of the model.
+    :rtype: ``list``"""
+
+    checks = []
+    for name in ("solvation", "hydrophobic_contrast"):
+        function = getattr(reference, name)
+        expected = np.array([
+         function(model, *point, radius, **filters) for point in points
+        ])
+        for (value_name, variant), actual in values.items():
+            if value_name != name: continue
+            actual = np.array(actual, dtype=float)
+            difference = float(np.abs(actual - expected).max()) if len(
+             expected
+            ) else 0.0
+            scale = float(np.abs(expected).max()) if len(expected) else 0.0
+            checks.append(dict(
+             function=name, variant=variant, size=size,
+             max_difference=difference,
+             identical=bool(difference <= 1e-9 * max(scale, 1)), **filters
+            ))
+    return checks
+
+
+def sphere_centres(model, count, seed):
+    """Picks sphere centres at the locations of randomly chosen atoms, with
+    the first one at a zinc ion so that metal sites are always included.
+
+    :param Model model: The model to pick centres in.
+    :param int count: The number of centres.
+    :param int seed: The random seed.
+    :rtype: ``list``"""
+
+    atoms = sorted(model.atoms(), key=lambda atom: atom.location)
+    zinc = [atom for atom in atoms if atom.element == "ZN"][:1]
+    chosen = zinc + random.Random(seed).sample(atoms, count - len(zinc))
+    return [list(atom.location) for atom in chosen[:count]]
+
+
+def timed(function, repeat=1):
+    """Calls a function some number of times and returns the shortest time
+    it took, along with what it returned.
+
+    :param function function: The function to time.
+    :param int repeat: The number of times to call it.
+    :rtype: ``tuple``"""
+
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best, result
+
+
+def environment():
+    """Describes the software the benchmarks were run with.
+
+    :rtype: ``dict``"""
+
+    return {
+     "date": datetime.now().isoformat(timespec="seconds"),
+     "python": platform.python_version(),
+     "platform": platform.platform(),
+     "numpy": np.__version__,
+     "atomium": getattr(atomium, "__version__", "unknown"),
+     "biometal": biometal.__version__
+    }
+
+
+if __name__ == "__main__":
+    main()
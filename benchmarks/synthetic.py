@@ -0,0 +1,87 @@
+"""Creates synthetic protein models of any size for benchmarking."""
+
+import random
+from math import pi
+from atomium.structures import Model, Atom, Residue, Molecule, Chain
+from atomium.structures.chains import Site
+from biometal.charges import partial_charges
+
+DENSITY = 0.08
+
+RESIDUE_NAMES = sorted(name for name in partial_charges if name not in (
+ "CYX", "HID", "HIE", "HIP"
+))
+
+def synthetic_model(size, seed=0, metals=10, waters=0.05):
+    """Creates a model of roughly the given number of atoms, made of random
+    amino acid residues packed into a sphere at about the density of a real
+    protein. Every residue has the heavy atoms named in biometal's partial
+    charge table, so all the parameter rules are exercised. Zinc ions and
+    water molecules are scattered through it as heteroatoms.
+
+    The same size and seed always give the same model.
+
+    :param int size: The approximate number of atoms wanted.
+    :param int seed: The seed for the random number generator.
+    :param int metals: The number of zinc ions to add.
+    :param float waters: The fraction of atoms that should be water oxygens.
+    :rtype: ``Model``"""
+
+    generator = random.Random(seed)
+    radius = ((3 * size) / (4 * pi * DENSITY)) ** (1 / 3)
+    point = lambda: _point_in_sphere(generator, radius)
+    residues, count = [], 0
+    residue_target = size * (1 - waters) - metals
+    while count < residue_target:
+        name = generator.choice(RESIDUE_NAMES)
+        centre = point()
+        atoms = [Atom(
+         atom_name[0], *[c + generator.uniform(-2.5, 2.5) for c in centre],
+         name=atom_name
+        ) for atom_name in partial_charges[name] if atom_name[0] != "H"]
+        residue = Residue(*atoms, name=name)
+        residue._id = "A{}".format(len(residues) + 1)
+        residues.append(residue)
+        count += len(atoms)
+    for residue, next_residue in zip(residues[:-1], residues[1:]):
+        residue.next = next_residue
+    model = Model(Chain(*residues, id="A"))
+    for index in range(metals + int(size * waters)):
+        is_metal = index < metals
+        molecule = Molecule(Atom(
+         "ZN" if is_metal else "O", *point(), name="ZN" if is_metal else "O"
+        ), name="ZN" if is_metal else "HOH")
+        molecule._id = "A{}".format(1000000 + index)
+        model.add(molecule)
+    return model
+
+
+def synthetic_site(model, radius=8):
+    """Creates a binding site around the first zinc ion of a model, made of
+    the residues near it which have both CA and CB atoms.
+
+    :param Model model: A model made by :py:func:`.synthetic_model`.
+    :param radius: How far from the zinc to look for residues.
+    :rtype: ``Site``"""
+
+    zinc = sorted(
+     model.molecules(name="ZN"), key=lambda molecule: molecule._id
+    )[0]
+    residues = set()
+    for atom in model.atoms_in_sphere(*zinc.atom().location, radius, het=False):
+        residue = atom.residue
+        if residue.atom(name="CA") and residue.atom(name="CB"):
+            residues.add(residue)
+    return Site(*sorted(residues, key=lambda r: r._id), ligand=zinc)
+
+
+def _point_in_sphere(generator, radius):
+    """Picks a uniformly random point inside a sphere about the origin.
+
+    :param random.Random generator: The random number generator to use.
+    :param radius: The radius of the sphere.
+    :rtype: ``tuple``"""
+
+    while True:
+        point = tuple(generator.uniform(-radius, radius) for _ in range(3))
+        if sum(c ** 2 for c in point) <= radius ** 2: return point
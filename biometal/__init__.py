@@ -1,5 +1,26 @@
-from .templates import create_site_template
-from .hydrophobicity import solvation, hydrophobic_contrast
-
 __author__ = "Sam Ireland"
 __version__ = "0.1.0"
+
+from .hydrophobicity import solvation, hydrophobic_contrast, contrast_map
+from .hydrophobicity import solvation_map
+from .hydrophobicity import sphere_hydrophobicity, contrast_profile
+from .hydrophobicity import solvation_many, hydrophobic_contrast_many
+from .hydrophobicity import solvation_parameters, partial_charges_of
+from .hydrophobicity import parameter_cache_info, clear_parameter_cache
+from .spatial import SpatialIndex, NeighbourList, Box
+from .tables import AtomTable
+from .files import load_table
+from .profiling import profile
+from .templates import create_site_template, SiteTemplate
+from .templates import site_templates, site_templates_many
+from .trajectories import Trajectory, contrast_series, open_frames
+from .optimization import optimize_contrast, contrast_maxima
+from .superposition import superpose, rmsd, superpose_many
+from .superposition import template_rmsd, template_rmsd_matrix
+from .search import TemplateIndex, TemplateMatch, search_templates
+from .library import TemplateLibrary, save_templates
+from .batch import run_batch, metal_contrasts, BatchResult
+from .jobs import create_manifest, run_shard, merge_shards
+from .cache import ResultCache, result_key
+from .service import AnalysisService, StructureCache, serve
+
@@ -0,0 +1,6 @@
+"""Lets biometal's command line tools be run with ``python -m biometal``."""
+
+import sys
+from .cli import main
+
+sys.exit(main())
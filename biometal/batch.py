@@ -0,0 +1,258 @@
+"""Contains tools for running biometal over many structure files at once,
+spread across a pool of processes."""
+
+import os
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+import numpy as np
+from .hydrophobicity import hydrophobic_contrast_many
+from .files import load_table
+from .templates import site_templates
+from .cache import ResultCache
+
+class BatchResult:
+    """The outcome of running a task on one structure file - either the
+    value the task returned, or a description of the error it raised.
+
+    :param str path: The file the task was run on.
+    :param value: What the task returned, if it succeeded.
+    :param str error: The error the task raised, if it failed."""
+
+    __slots__ = ["_path", "_value", "_error"]
+
+    def __init__(self, path, value=None, error=None):
+        self._path, self._value, self._error = path, value, error
+
+
+    def __repr__(self):
+        return "<BatchResult {} ({})>".format(
+         self._path, "failed" if self._error else "succeeded"
+        )
+
+
+    @property
+    def path(self):
+        """The file the task was run on.
+
+        :rtype: ``str``"""
+
+        return self._path
+
+
+    @property
+    def value(self):
+        """What the task returned, or ``None`` if it failed.
+
+        :rtype: ``object``"""
+
+        return self._value
+
+
+    @property
+    def error(self):
+        """The type and message of the error the task raised, or ``None`` if
+        it succeeded.
+
+        :rtype: ``str``"""
+
+        return self._error
+
+
+    @property
+    def succeeded(self):
+        """Whether the task ran without raising an error.
+
+        :rtype: ``bool``"""
+
+        return self._error is None
+
+
+
+def run_batch(paths, task, workers=None, chunk_size=8, **options):
+    """Runs a task on every one of a collection of structure files, spread
+    across a pool of processes, and yields a :py:class:`.BatchResult` for
+    each file as its chunk finishes.
+
+    The files are sent to the workers in chunks, and only a few chunks per
+    worker are waiting at any time, so that paths can come from a generator
+    over an archive far larger than memory. An error in one file is caught
+    and recorded in its result, and the rest of the run carries on.
+
+    If a file kills the worker running it outright - by crashing the
+    interpreter, or by using so much memory that the operating system stops
+    it - the pool breaks and every chunk it was working on is lost. The files
+    in those chunks are then run again one at a time, each in a process of
+    its own, so that only the files which kill a process by themselves are
+    recorded as failed, and the run carries on in a new pool.
+
+    A task is any function that takes a path as its first argument and can be
+    pickled, such as :py:func:`.metal_contrasts` or
+    :py:func:`.site_templates`, or the name of one of those in
+    :py:data:`.TASKS`. Its return value is sent back from the worker, so it
+    should be something compact, like numbers or arrays, rather than an
+    atomium model.
+
+    :param paths: An iterable of paths to .pdb or .cif files.
+    :param task: The function to run on each file, or its name.
+    :param int workers: The number of processes to use - by default, one per\
+    CPU. With one worker, everything is run in this process.
+    :param int chunk_size: How many files to send to a worker at a time.
+    :param \\*\\*options: Any keyword arguments to pass to the task.
+    :raises ValueError: if the task is not a known task name.
+    :raises ValueError: if the number of workers or chunk size is not\
+    positive.
+    :rtype: ``generator`` of :py:class:`.BatchResult`"""
+
+    if isinstance(task, str):
+        if task not in TASKS:
+            raise ValueError("{} is not a batch task".format(task))
+        task = TASKS[task]
+    workers = os.cpu_count() or 1 if workers is None else workers
+    for value in (workers, chunk_size):
+        if not isinstance(value, int) or value < 1:
+            raise ValueError("{} is not a positive integer".format(value))
+    function = partial(task, **options) if options else task
+    chunks = _chunks(paths, chunk_size)
+    if workers == 1:
+        for chunk in chunks: yield from _run_chunk(function, chunk)
+        return
+    executor, pending = ProcessPoolExecutor(max_workers=workers), {}
+    try:
+        for chunk in chunks:
+            try:
+                future = executor.submit(_run_chunk, function, chunk)
+            except BrokenProcessPool:
+                while pending: yield from _collect(function, pending)
+                executor.shutdown()
+                executor = ProcessPoolExecutor(max_workers=workers)
+                future = executor.submit(_run_chunk, function, chunk)
+            pending[future] = chunk
+            if len(pending) >= workers * 2:
+                if (yield from _collect(function, pending)):
+                    executor.shutdown()
+                    executor = ProcessPoolExecutor(max_workers=workers)
+        while pending: yield from _collect(function, pending)
+    finally:
+        executor.shutdown()
+
+
+def metal_contrasts(path, radius=8, pc=False, het=True, metal=True,
+                    cache=None):
+    """Reads a structure file and measures the hydrophobic contrast of a
+    sphere around each of its metal atoms, giving each metal's ID, element
+    and location along with its contrast. Metals are the heteroatoms with a
+    metal element.
+
+    If a cache directory is given, contrasts already worked out for the same
+    atoms and options are read from it rather than measured again - see
+    :py:class:`.ResultCache`.
+
+    :param str path: The .pdb or .cif file to read.
+    :param radius: The radius of the spheres.
+    :param bool pc: If ``True``, atomic partial charges will be used instead of\
+    atomic solvation parameters (squared).
+    :param bool het: If ``False``, only atoms that have a residue will be\
+    considered.
+    :param bool metal: If ``False``, only non-metal atoms will be considered.
+    :param str cache: The directory of a :py:class:`.ResultCache` to use.
+    :rtype: ``list`` of ``tuple``"""
+
+    table = load_table(path)
+    metals = np.nonzero(table.metal & table.het)[0]
+    if len(metals) == 0: return []
+    arguments = (table, table.coordinates[metals], radius)
+    options = {"pc": pc, "het": het, "metal": metal}
+    if cache:
+        contrasts = ResultCache(cache).call(
+         hydrophobic_contrast_many, *arguments, **options
+        )
+    else:
+        contrasts = hydrophobic_contrast_many(*arguments, **options)
+    return [(
+     str(table.residue_ids[index]), str(table.elements[index]),
+     tuple(table.coordinates[index].tolist()), float(contrast)
+    ) for index, contrast in zip(metals, contrasts)]
+
+
+def _chunks(paths, size):
+    """Splits an iterable of paths into lists of a given size, without
+    reading any further into it than it needs to.
+
+    :param paths: The paths to split.
+    :param int size: The most paths in a chunk.
+    :rtype: ``generator``"""
+
+    chunk = []
+    for path in paths:
+        chunk.append(path)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk: yield chunk
+
+
+def _collect(function, pending):
+    """Waits for at least one of the chunks sent to a pool to finish, and
+    yields the results of those that have. If the pool has broken, every
+    chunk is waited for, and the files of those that were lost are run again
+    one at a time, each in a process of its own.
+
+    :param function: The function the chunks were run with.
+    :param dict pending: The paths of each chunk, keyed by its future. Chunks\
+    that have finished are removed.
+    :returns: whether the pool broke.
+    :rtype: ``generator`` of :py:class:`.BatchResult`"""
+
+    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+    broken = any(
+     isinstance(future.exception(), BrokenProcessPool) for future in done
+    )
+    if broken: done, _ = wait(pending)
+    for future in [future for future in pending if future in done]:
+        paths = pending.pop(future)
+        if isinstance(future.exception(), BrokenProcessPool):
+            for path in paths: yield _run_alone(function, path)
+        else:
+            yield from future.result()
+    return broken
+
+
+def _run_alone(function, path):
+    """Runs a function on one path in a process of its own, so that if the
+    process dies, it is clear which file killed it.
+
+    :param function: The function to run.
+    :param str path: The path to run it on.
+    :rtype: :py:class:`.BatchResult`"""
+
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        try:
+            return executor.submit(_run_chunk, function, [path]).result()[0]
+        except BrokenProcessPool as e:
+            return BatchResult(path, error="{}: {}".format(
+             type(e).__name__, e
+            ))
+
+
+def _run_chunk(function, paths):
+    """Runs a function on each of a chunk of paths, catching any error it
+    raises so that one bad file does not stop the others.
+
+    :param function: The function to run.
+    :param list paths: The paths to run it on.
+    :rtype: ``list``"""
+
+    results = []
+    for path in paths:
+        try:
+            results.append(BatchResult(path, value=function(path)))
+        except Exception as e:
+            results.append(BatchResult(path, error="{}: {}".format(
+             type(e).__name__, e
+            )))
+    return results
+
+
+
+TASKS = {"contrast": metal_contrasts, "templates": site_templates}
@@ -0,0 +1,384 @@
+"""Contains a persistent cache of the results of biometal's calculations, so
+that the same query on the same structure is only ever worked out once."""
+
+from contextlib import contextmanager
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import numpy as np
+from atomium.structures import Model
+from . import __version__
+from .spatial import Box
+from .tables import AtomTable
+
+try:
+    import fcntl
+except ImportError: # pragma: no cover
+    fcntl = None
+
+class ResultCache:
+    """A directory of stored results, each in its own file named after a hash
+    of the calculation that produced it - the function, every atom's
+    coordinates and identity, every other argument, and the version of
+    biometal. A result is therefore found again only if nothing that could
+    change it has changed, and there is nothing to invalidate by hand.
+
+    Once the results take up more than the cache's maximum size, those used
+    least recently are deleted. Any number of processes can share a cache -
+    results are written to a temporary file which then replaces the real one,
+    so a result is never read half-written, and adding and deleting results
+    is done while holding a lock on the directory. The total size of the
+    results is kept in a file alongside them, so that the directory only has
+    to be searched when something needs deleting.
+
+    Results are stored with :py:mod:`pickle`, so a cache should only be read
+    from a directory that only trusted users can write to.
+
+    :param str path: The directory to keep results in, which is made if it\
+    does not exist.
+    :param int max_size: The most bytes that results can take up.
+    :raises ValueError: if the maximum size is not a positive integer."""
+
+    def __init__(self, path, max_size=2 ** 30):
+        if not isinstance(max_size, int) or max_size < 1:
+            raise ValueError("{} is not a positive integer".format(max_size))
+        os.makedirs(path, exist_ok=True)
+        self._path, self._max_size = path, max_size
+        self._hits, self._misses = 0, 0
+
+
+    def __repr__(self):
+        return "<ResultCache {}>".format(self._path)
+
+
+    def __len__(self):
+        return sum(1 for _ in self._entries())
+
+
+    def __contains__(self, key):
+        return os.path.exists(self._file(key))
+
+
+    @property
+    def path(self):
+        """The directory results are kept in.
+
+        :rtype: ``str``"""
+
+        return self._path
+
+
+    @property
+    def max_size(self):
+        """The most bytes that results can take up.
+
+        :rtype: ``int``"""
+
+        return self._max_size
+
+
+    @property
+    def size(self):
+        """The number of bytes that results take up at the moment.
+
+        :rtype: ``int``"""
+
+        return sum(entry.stat().st_size for entry in self._entries())
+
+
+    def info(self):
+        """Returns the hit and miss counts of this cache object, along with
+        the number and total size of the results in the directory and its
+        maximum size.
+
+        :rtype: ``dict``"""
+
+        entries = list(self._entries())
+        return {
+         "hits": self._hits, "misses": self._misses, "results": len(entries),
+         "size": sum(entry.stat().st_size for entry in entries),
+         "max_size": self._max_size
+        }
+
+
+    def call(self, function, model, *args, **kwargs):
+        """Calls a function on a model, such as :py:func:`.contrast_map` or
+        :py:func:`.hydrophobic_contrast_many`, unless its result is already
+        stored, in which case the stored result is returned instead. The
+        arguments are those the function takes after the model.
+
+        :param function: The function to call.
+        :param model: The atomium model or :py:class:`.AtomTable` to pass it.
+        :raises TypeError: if the model is not an atomium model or atom table.
+        :raises TypeError: if an argument cannot be part of a key.
+        :rtype: ``object``"""
+
+        key = result_key(function, model, *args, **kwargs)
+        try:
+            return self.get(key)
+        except KeyError:
+            value = function(model, *args, **kwargs)
+        self.put(key, value)
+        return value
+
+
+    def get(self, key):
+        """Returns the result stored under a key, and marks it as recently
+        used. A result that cannot be read is deleted and treated as missing.
+
+        :param str key: The key, as given by :py:func:`.result_key`.
+        :raises KeyError: if there is no such result.
+        :rtype: ``object``"""
+
+        path = self._file(key)
+        try:
+            with open(path, "rb") as f: value = pickle.load(f)
+            os.utime(path)
+        except FileNotFoundError:
+            self._misses += 1
+            raise KeyError(key)
+        except Exception:
+            with self._lock(): self._discard(path)
+            self._misses += 1
+            raise KeyError(key)
+        self._hits += 1
+        return value
+
+
+    def put(self, key, value):
+        """Stores a result under a key, and then deletes the least recently
+        used results until those left fit in the cache. A result bigger than
+        the whole cache is not stored, and if storing fails, no temporary file
+        is left behind.
+
+        :param str key: The key, as given by :py:func:`.result_key`.
+        :param value: The result to store."""
+
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(data) > self._max_size: return
+        path = self._file(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        descriptor, temporary = tempfile.mkstemp(
+         dir=os.path.dirname(path), suffix=".tmp"
+        )
+        try:
+            with os.fdopen(descriptor, "wb") as f: f.write(data)
+            with self._lock():
+                try:
+                    replaced = os.stat(path).st_size
+                except FileNotFoundError:
+                    replaced = 0
+                size = self._stored_size() - replaced + len(data)
+                os.replace(temporary, path)
+                if size > self._max_size: size = self._evict()
+                self._write_size(size)
+        except BaseException:
+            self._remove(temporary)
+            raise
+
+
+    def clear(self):
+        """Deletes every result in the cache."""
+
+        with self._lock():
+            for entry in list(self._entries()): self._remove(entry.path)
+            self._write_size(0)
+
+
+    def _file(self, key):
+        """Gives the location of the file a key's result is stored in, in one
+        of 256 subdirectories so that no directory gets too big.
+
+        :param str key: The key.
+        :rtype: ``str``"""
+
+        return os.path.join(self._path, key[:2], key + EXTENSION)
+
+
+    def _entries(self):
+        """Yields the directory entry of every stored result.
+
+        :rtype: ``generator``"""
+
+        for directory in os.scandir(self._path):
+            if not directory.is_dir(): continue
+            for entry in os.scandir(directory.path):
+                if entry.name.endswith(EXTENSION): yield entry
+
+
+    def _evict(self):
+        """Deletes the least recently used results until the rest take up no
+        more than the maximum size. The lock must already be held.
+
+        :returns: the number of bytes the remaining results take up.
+        :rtype: ``int``"""
+
+        entries = []
+        for entry in self._entries():
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        size = sum(entry[1] for entry in entries)
+        for _, entry_size, path in sorted(entries):
+            if size <= self._max_size: break
+            self._remove(path)
+            size -= entry_size
+        return size
+
+
+    def _stored_size(self):
+        """Gives the total size of the results as recorded in the size file,
+        or, if there is no readable size file, by adding up every result. The
+        lock must already be held.
+
+        :rtype: ``int``"""
+
+        try:
+            with open(os.path.join(self._path, SIZE_FILE)) as f:
+                return int(f.read())
+        except (OSError, ValueError):
+            return sum(entry.stat().st_size for entry in self._entries())
+
+
+    def _write_size(self, size):
+        """Records the total size of the results in the size file. The lock
+        must already be held.
+
+        :param int size: The number of bytes the results take up."""
+
+        with open(os.path.join(self._path, SIZE_FILE), "w") as f:
+            f.write(str(size))
+
+
+    def _discard(self, path):
+        """Deletes a result file and takes its size off the recorded total.
+        The lock must already be held.
+
+        :param str path: The location of the file."""
+
+        try:
+            size = os.stat(path).st_size
+        except FileNotFoundError:
+            return
+        total = self._stored_size()
+        self._remove(path)
+        self._write_size(max(total - size, 0))
+
+
+    @contextmanager
+    def _lock(self):
+        """Holds an exclusive lock on the cache directory, so that only one
+        process at a time deletes results. Where file locking is not
+        available, nothing is locked."""
+
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self._path, "lock"), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+    def _remove(self, path):
+        """Deletes a result file, if another process has not already.
+
+        :param str path: The location of the file."""
+
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+
+def result_key(function, model, *args, **kwargs):
+    """Gives the key that the result of calling a function on a model is
+    stored under - a hash of the function's name, the coordinates, element,
+    residue, name, residue ID, charge and heteroatom and metal flags of every
+    atom, every other argument, and the version of biometal.
+
+    Arguments can be numbers, strings, ``None``, arrays, :py:class:`.Box`
+    objects, or lists, tuples and dicts of these. A number gives the same key
+    whether it is an integer or a float.
+
+    :param function: The function.
+    :param model: The atomium model or :py:class:`.AtomTable` it is called on.
+    :raises TypeError: if the model is not an atomium model or atom table.
+    :raises TypeError: if an argument cannot be part of a key.
+    :rtype: ``str``"""
+
+    digest = hashlib.sha256(json.dumps([
+     __version__, VERSION,
+     "{}.{}".format(function.__module__, function.__qualname__),
+     structure_key(model), _key_value(list(args)), _key_value(kwargs)
+    ], sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def structure_key(model):
+    """Gives a hash of everything about a model's atoms that biometal's
+    calculations use - their coordinates, elements, residue names, names,
+    residue IDs, charges, and whether they are heteroatoms or metals. Atomium
+    models are tabulated first, so a model and its :py:class:`.AtomTable`
+    have the same key.
+
+    :param model: The atomium model or :py:class:`.AtomTable`.
+    :raises TypeError: if the model is not an atomium model or atom table.
+    :rtype: ``str``"""
+
+    if isinstance(model, Model): model = AtomTable.from_model(model)
+    if not isinstance(model, AtomTable):
+        raise TypeError("{} is not a Model".format(model))
+    digest = hashlib.sha256()
+    for column in (
+     model.coordinates.astype("<f8"), model.charges.astype("<f8"),
+     model.het, model.metal
+    ):
+        digest.update(np.ascontiguousarray(column).tobytes())
+    for column in (
+     model.elements, model.residue_names, model.atom_names, model.residue_ids
+    ):
+        digest.update("\0".join(column.tolist()).encode("utf-8") + b"\1")
+    return digest.hexdigest()
+
+
+def _key_value(value):
+    """Turns an argument into something that can be written as JSON in the
+    same way every time, with arrays replaced by a hash of their contents.
+
+    :param value: The argument.
+    :raises TypeError: if the argument cannot be part of a key.
+    :rtype: ``object``"""
+
+    if value is None or isinstance(value, (bool, np.bool_, str)):
+        return value.item() if isinstance(value, np.bool_) else value
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return float(value)
+    if isinstance(value, np.ndarray):
+        array = np.ascontiguousarray(value)
+        if array.dtype.kind in "iuf": array = array.astype("<f8")
+        if array.dtype.kind not in "fbU":
+            raise TypeError("{} cannot be part of a key".format(value))
+        return {"array": [
+         array.dtype.str, array.shape,
+         hashlib.sha256(array.tobytes()).hexdigest()
+        ]}
+    if isinstance(value, Box): return {"box": list(value.dimensions)}
+    if isinstance(value, (list, tuple)):
+        return [_key_value(item) for item in value]
+    if isinstance(value, dict):
+        return {str(k): _key_value(v) for k, v in value.items()}
+    raise TypeError("{} cannot be part of a key".format(value))
+
+
+
+VERSION = 1
+EXTENSION = ".pickle"
+SIZE_FILE = "size"
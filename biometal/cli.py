@@ -0,0 +1,317 @@
+"""Runs biometal over collections of structure files from the command line.
+
+The contrast and templates commands take any number of .pdb and .cif files
+(gzipped or not) and directories, which are searched for such files, and
+spread them across a pool of processes. A file that cannot be read is
+reported and skipped, and the command exits with a non-zero status once
+everything else is done.
+
+Given a --manifest, these commands instead write a job manifest that splits
+the files into shards. Each shard is then run, on any machine, with the
+shard command, which can be stopped and run again without redoing finished
+files, and the merge command combines the shards' results.
+
+The serve command runs a local HTTP service which answers queries about
+structure files while keeping them in memory - see
+:py:mod:`biometal.service`."""
+
+import argparse
+import json
+import os
+import sys
+from .batch import run_batch
+from .library import save_templates
+from .jobs import create_manifest, run_shard, merge_shards, _encode
+from .service import serve
+
+EXTENSIONS = (".pdb", ".ent", ".cif", ".mmcif")
+
+def main(args=None):
+    """Runs the command given by the command line arguments.
+
+    :param list args: The arguments, if not those of the command line.
+    :rtype: ``int``"""
+
+    options = parse_arguments(args)
+    return options.command(options)
+
+
+def parse_arguments(args=None):
+    """Reads the command and its options from the command line.
+
+    :param list args: The arguments, if not those of the command line.
+    :rtype: ``argparse.Namespace``"""
+
+    parser = argparse.ArgumentParser(
+     prog="biometal", description=__doc__.split("\n\n")[0]
+    )
+    commands = parser.add_subparsers(dest="name")
+    commands.required = True
+    contrast = commands.add_parser(
+     "contrast", help="measure the hydrophobic contrast around every metal"
+    )
+    contrast.set_defaults(command=contrast_command)
+    contrast.add_argument(
+     "--radius", type=float, default=8, help="the radius of the spheres"
+    )
+    contrast.add_argument(
+     "--pc", action="store_true",
+     help="use partial charges instead of solvation parameters"
+    )
+    contrast.add_argument(
+     "--no-het", dest="het", action="store_false",
+     help="ignore atoms that have no residue"
+    )
+    contrast.add_argument(
+     "--no-metal", dest="metal", action="store_false",
+     help="ignore metal atoms"
+    )
+    contrast.add_argument(
+     "--cache", help="a directory to keep contrasts in between runs"
+    )
+    contrast.add_argument(
+     "--output", help="the JSON lines file to write to, if not stdout"
+    )
+    templates = commands.add_parser(
+     "templates", help="extract a template of every metal binding site"
+    )
+    templates.set_defaults(command=templates_command)
+    templates.add_argument(
+     "--cutoff", type=float, default=4,
+     help="how close to the metal a residue's atoms must be"
+    )
+    templates.add_argument(
+     "--main-chain", action="store_true",
+     help="consider main chain atoms when finding residues"
+    )
+    templates.add_argument(
+     "--no-carbon", dest="carbon", action="store_false",
+     help="ignore carbon atoms when finding residues"
+    )
+    templates.add_argument(
+     "--output", help="the template library file to write"
+    )
+    for command in (contrast, templates):
+        command.add_argument(
+         "paths", nargs="+", help="structure files, or directories of them"
+        )
+        command.add_argument(
+         "--manifest", help="write a job manifest here instead of running"
+        )
+        command.add_argument(
+         "--shards", type=int, default=1,
+         help="the number of shards to split a manifest's files into"
+        )
+    shard = commands.add_parser("shard", help="run one shard of a job")
+    shard.set_defaults(command=shard_command)
+    shard.add_argument("manifest", help="the job manifest")
+    shard.add_argument("shard", type=int, help="the number of the shard")
+    shard.add_argument(
+     "--checkpoint",
+     help="the checkpoint file, if not the one beside the manifest"
+    )
+    shard.add_argument(
+     "--retry-failed", action="store_true",
+     help="run files that failed before again"
+    )
+    merge = commands.add_parser("merge", help="combine the shards of a job")
+    merge.set_defaults(command=merge_command)
+    merge.add_argument("manifest", help="the job manifest")
+    merge.add_argument("--output", required=True, help="the file to write")
+    merge.add_argument(
+     "--partial", action="store_true",
+     help="leave out files no shard has finished rather than failing"
+    )
+    serve = commands.add_parser(
+     "serve", help="answer queries over HTTP, keeping structures in memory"
+    )
+    serve.set_defaults(command=serve_command)
+    serve.add_argument(
+     "--host", default="127.0.0.1", help="the address to listen on"
+    )
+    serve.add_argument(
+     "--port", type=int, default=8000, help="the port to listen on"
+    )
+    serve.add_argument(
+     "--memory", type=int, default=1024,
+     help="the megabytes of structures to keep in memory"
+    )
+    serve.add_argument(
+     "--workers", type=int, help="the number of threads to answer with"
+    )
+    serve.add_argument(
+     "--root", help="only allow queries about files in this directory"
+    )
+    for command in (contrast, templates, shard):
+        command.add_argument(
+         "--workers", type=int, help="the number of processes to use"
+        )
+        command.add_argument(
+         "--chunk-size", type=int, default=8,
+         help="how many files to send to a process at a time"
+        )
+    options = parser.parse_args(args)
+    if options.name == "templates" and not (
+     options.output or options.manifest
+    ):
+        parser.error("templates needs an --output or a --manifest")
+    return options
+
+
+def task_options(options):
+    """Picks out the options of the contrast or templates command that are
+    passed to its task.
+
+    :param argparse.Namespace options: The command line options.
+    :rtype: ``dict``"""
+
+    if options.name == "contrast":
+        names = ("radius", "pc", "het", "metal", "cache")
+    else:
+        names = ("cutoff", "main_chain", "carbon")
+    return {name: getattr(options, name) for name in names}
+
+
+def contrast_command(options):
+    """Measures the hydrophobic contrast around the metals of every file, and
+    writes a line of JSON for each file.
+
+    :param argparse.Namespace options: The command line options.
+    :rtype: ``int``"""
+
+    if options.manifest: return manifest_command(options)
+    results = run_batch(
+     find_structures(options.paths), "contrast", workers=options.workers,
+     chunk_size=options.chunk_size, **task_options(options)
+    )
+    output = open(options.output, "w") if options.output else sys.stdout
+    failures = 0
+    try:
+        for result in results:
+            record = {"path": result.path}
+            if result.succeeded:
+                record["metals"] = _encode("contrast", result.value)
+            else:
+                record["error"] = result.error
+                failures += report(result)
+            print(json.dumps(record), file=output)
+    finally:
+        if output is not sys.stdout: output.close()
+    return 1 if failures else 0
+
+
+def templates_command(options):
+    """Extracts the metal site templates of every file and writes them all to
+    a single template library.
+
+    :param argparse.Namespace options: The command line options.
+    :rtype: ``int``"""
+
+    if options.manifest: return manifest_command(options)
+    failures = []
+    def templates():
+        for result in run_batch(
+         find_structures(options.paths), "templates",
+         workers=options.workers, chunk_size=options.chunk_size,
+         **task_options(options)
+        ):
+            if result.succeeded:
+                yield from result.value
+            else:
+                failures.append(report(result))
+    count = save_templates(options.output, templates())
+    print("Wrote {} templates to {}".format(count, options.output), file=(
+     sys.stderr
+    ))
+    return 1 if failures else 0
+
+
+def manifest_command(options):
+    """Writes a job manifest for the contrast or templates command, rather
+    than running it.
+
+    :param argparse.Namespace options: The command line options.
+    :rtype: ``int``"""
+
+    manifest = create_manifest(
+     options.manifest, find_structures(options.paths), options.name,
+     shards=options.shards, **task_options(options)
+    )
+    print("Wrote manifest of {} files in {} shards to {}".format(
+     len(manifest["paths"]), manifest["shards"], options.manifest
+    ), file=sys.stderr)
+    return 0
+
+
+def shard_command(options):
+    """Runs one shard of a job, carrying on from its checkpoint.
+
+    :param argparse.Namespace options: The command line options.
+    :rtype: ``int``"""
+
+    summary = run_shard(
+     options.manifest, options.shard, checkpoint=options.checkpoint,
+     retry_failed=options.retry_failed, workers=options.workers,
+     chunk_size=options.chunk_size
+    )
+    print(json.dumps(summary), file=sys.stderr)
+    return 1 if summary["failed"] else 0
+
+
+def merge_command(options):
+    """Combines the checkpoints of every shard of a job into one output.
+
+    :param argparse.Namespace options: The command line options.
+    :rtype: ``int``"""
+
+    try:
+        summary = merge_shards(
+         options.manifest, options.output, partial=options.partial
+        )
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    print(json.dumps(summary), file=sys.stderr)
+    return 0
+
+
+def serve_command(options):
+    """Runs the analysis service until it is stopped.
+
+    :param argparse.Namespace options: The command line options.
+    :rtype: ``int``"""
+
+    serve(
+     host=options.host, port=options.port, max_size=options.memory * 2 ** 20,
+     workers=options.workers, root=options.root
+    )
+    return 0
+
+
+def find_structures(paths):
+    """Yields every structure file among some paths, searching directories
+    for files with structure file extensions, gzipped or not.
+
+    :param list paths: The files and directories.
+    :rtype: ``generator``"""
+
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for directory, names, files in os.walk(path):
+            names.sort()
+            for name in sorted(files):
+                bare = name[:-3] if name.lower().endswith(".gz") else name
+                if bare.lower().endswith(EXTENSIONS):
+                    yield os.path.join(directory, name)
+
+
+def report(result):
+    """Writes the error of a failed result to stderr.
+
+    :param BatchResult result: The failed result.
+    :rtype: ``int``"""
+
+    print("{}: {}".format(result.path, result.error), file=sys.stderr)
+    return 1
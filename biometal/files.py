@@ -0,0 +1,151 @@
+"""Contains functions for reading atoms straight from structure files."""
+
+import gzip
+import re
+from itertools import chain
+from .tables import AtomTable
+
+CIF_TOKEN = re.compile(r"""'(?:[^']|'(?=\S))*'(?=\s|$)|"[^"]*"(?=\s|$)|\S+""")
+
+def load_table(path, first_model=True):
+    """Reads the atoms of a .pdb or .cif file into an :py:class:`.AtomTable`,
+    without creating any atomium objects. The file is read one line at a time
+    and only the atom records are looked at, so this is much faster than
+    opening the file with atomium and uses far less memory. Gzipped files
+    (ending in .gz) are decompressed as they are read.
+
+    Atoms from HETATM records are heteroatoms, and where atoms have alternate
+    locations only the first location given for each residue is kept, as
+    atomium does. Residue IDs are made from the chain, residue number and
+    insertion code in the same way as atomium's, such as 'A23'.
+
+    :param str path: The location of the file.
+    :param bool first_model: If ``False``, atoms from every model in the file\
+    will be read, not just those of the first.
+    :raises ValueError: if the file is not a .pdb or .cif file.
+    :rtype: :py:class:`.AtomTable`"""
+
+    name = path[:-3] if path.lower().endswith(".gz") else path
+    extension = name.lower().rsplit(".", 1)[-1]
+    if extension in ("pdb", "ent"):
+        reader = _pdb_atoms
+    elif extension in ("cif", "mmcif"):
+        reader = _cif_atoms
+    else:
+        raise ValueError("{} is not a .pdb or .cif file".format(path))
+    opener = gzip.open if name != path else open
+    columns = [[] for _ in range(7)]
+    alt_locs = {}
+    with opener(path, "rt") as f:
+        for record in reader(f, first_model):
+            residue, alt_loc = record[6], record[7]
+            if alt_loc:
+                if alt_locs.setdefault(residue, alt_loc) != alt_loc: continue
+            for column, value in zip(columns, record[:6] + (residue[1],)):
+                column.append(value)
+    coordinates, elements, residues, names, charges, het, ids = columns
+    return AtomTable.from_arrays(
+     coordinates, elements, residue_names=residues, atom_names=names,
+     charges=charges, het=het, residue_ids=ids
+    )
+
+
+def _pdb_atoms(lines, first_model=True):
+    """Reads the ATOM and HETATM records of a .pdb file. Each atom is yielded
+    as a tuple of its coordinates, element, residue name, name, charge,
+    whether it is a heteroatom, the residue it belongs to (as a tuple of the
+    model number, residue ID and residue name) and its alternate location.
+
+    :param lines: The lines of the file.
+    :param bool first_model: If ``True``, reading stops at the first ENDMDL.
+    :rtype: ``generator``"""
+
+    model = 0
+    for line in lines:
+        record = line[:6]
+        if record == "ATOM  " or record == "HETATM":
+            charge = line[78:80].strip()
+            if charge:
+                try:
+                    charge = float(charge)
+                except ValueError:
+                    charge = float(charge[::-1])
+            yield (
+             (float(line[30:38]), float(line[38:46]), float(line[46:54])),
+             line[76:78].strip(), line[17:20].strip(), line[12:16].strip(),
+             charge or 0, record == "HETATM",
+             (model, line[21] + line[22:27].strip(), line[17:20]),
+             line[16].strip()
+            )
+        elif record == "ENDMDL":
+            if first_model: return
+            model += 1
+
+
+def _cif_atoms(lines, first_model=True):
+    """Reads the atom_site table of a .cif file. Each atom is yielded in the
+    same form as :py:func:`._pdb_atoms` yields them.
+
+    :param lines: The lines of the file.
+    :param bool first_model: If ``True``, reading stops when a second model\
+    starts.
+    :rtype: ``generator``"""
+
+    fields = []
+    for line in lines:
+        if line.startswith("_atom_site."):
+            fields.append(line.strip()[11:])
+        elif fields:
+            yield from _cif_rows(lines, line, fields, first_model)
+            return
+
+
+def _cif_rows(lines, first, fields, first_model):
+    """Reads the rows of a .cif atom_site table, starting from its first row.
+
+    :param lines: The remaining lines of the file.
+    :param str first: The first row of the table.
+    :param list fields: The names of the table's columns.
+    :param bool first_model: If ``True``, reading stops when a second model\
+    starts.
+    :rtype: ``generator``"""
+
+    column = {field: index for index, field in enumerate(fields)}
+    get = lambda row, *names: next((
+     row[column[name]] for name in names if name in column
+    ), "?")
+    first_number = None
+    for line in chain([first], lines):
+        if line.startswith("#") or line.startswith("loop_") or (
+         line.startswith("_") or line.startswith("data_")
+        ): return
+        row = [token[1:-1] if token[0] in "'\"" else token
+         for token in CIF_TOKEN.findall(line)]
+        if not row: continue
+        number = get(row, "pdbx_PDB_model_num")
+        if first_number is None: first_number = number
+        if first_model and number != first_number: return
+        charge, alt_loc = get(row, "pdbx_formal_charge"), get(row, "label_alt_id")
+        residue = get(row, "auth_comp_id", "label_comp_id")
+        yield (
+         (float(get(row, "Cartn_x")), float(get(row, "Cartn_y")),
+          float(get(row, "Cartn_z"))),
+         _cif_value(get(row, "type_symbol")), _cif_value(residue),
+         _cif_value(get(row, "auth_atom_id", "label_atom_id")),
+         float(charge) if _cif_value(charge) else 0,
+         get(row, "group_PDB") == "HETATM", (
+          number, get(row, "auth_asym_id", "label_asym_id") + get(
+           row, "auth_seq_id", "label_seq_id"
+          ) + _cif_value(get(row, "pdbx_PDB_ins_code")), residue
+         ), _cif_value(alt_loc)
+        )
+
+
+def _cif_value(value):
+    """Converts the .cif markers for an unknown or missing value to an empty
+    string.
+
+    :param str value: The value to convert.
+    :rtype: ``str``"""
+
+    return "" if value in ("?", ".") else value
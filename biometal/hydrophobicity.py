@@ -1,15 +1,29 @@
 """Contains functions for examining hydrophobicity."""
 
+from functools import lru_cache
+from math import ceil, floor
+import numpy as np
 from atomium.structures import Model, Atom
 from .charges import partial_charges
+from .spatial import CellGrid, SpatialIndex, Box
+from .tables import AtomTable
+from . import profiling
 
-def solvation(model, x, y, z, radius, pc=False, het=True, metal=True):
+PARAMETER_CACHE_SIZE = 4096
+
+SPECIAL_SOLVATIONS = {
+ "O": {"GLU": ["OE1", "OE2"], "ASP": ["OD1", "OD2"]},
+ "N": {"HIS": ["ND1", "NE2"], "ARG": ["NH1", "NH2"]}
+}
+
+def solvation(model, x, y, z, radius, pc=False, het=True, metal=True,
+              index=None, box=None):
     """Determines the average solvation within a given sphere of an atomium
     model. By default, all atoms within the radius will be considered, but you
     can opt to exlcude heteroatoms (atoms not part of a chain residue) if you so
     desire.
 
-    :param Model model: The atomium model to examine.
+    :param model: The atomium model or :py:class:`.AtomTable` to examine.
     :param x: The x-coordinate of the centre of the sphere.
     :param y: The y-coordinate of the centre of the sphere.
     :param z: The z-coordinate of the centre of the sphere.
@@ -19,64 +33,103 @@ def solvation(model, x, y, z, radius, pc=False, het=True, metal=True):
     :param bool het: If ``False``, only atoms that have a residue will be\
     considered.
     :param bool metal: If ``False``, only non-metal atoms will be considered.
-    :raises TypeError: if the model is not an atomium model object.
+    :param SpatialIndex index: If given, this index of the model's atoms will\
+    be used to find the atoms in the sphere.
+    :param Box box: If given, the model is a system in this periodic box, and\
+    distances to the nearest image of each atom are used.
+    :raises TypeError: if the model is not an atomium model or atom table.
+    :raises TypeError: if the index is not a :py:class:`.SpatialIndex`.
+    :raises TypeError: if the box is not a :py:class:`.Box`.
+    :raises ValueError: if the index was made with a different box.
     :raises TypeError: if the coordinates are not numeric.
     :raises TypeError: if the radius is not numeric.
     :raises ValueError: if the radius is negative.
+    :raises ValueError: if the radius is too big for the box.
     :rtype: ``float``"""
 
-    if not isinstance(model, Model):
-        raise TypeError("{} is not a Model".format(model))
-    if any(not isinstance(c, (int, float)) for c in (x, y, z)):
-        raise TypeError("({}, {}, {}) not valid coordinate".format(x, y, z))
-    if not isinstance(radius, (int, float)):
-        raise TypeError("{} is not a valid radius".format(radius))
-    if radius < 0:
-        raise ValueError("{} is not a valid radius".format(radius))
-
-    sphere = model.atoms_in_sphere(x, y, z, radius, het=het, metal=metal)
-    solvations = ([atom_partial_charge(atom) ** 2 for atom in sphere]
-     if pc else [atom_solvation(atom) for atom in sphere])
-    return sum(solvations) / len(sphere) if len(solvations) else 0
+    return sphere_hydrophobicity(
+     model, x, y, z, radius, pc=pc, het=het, metal=metal, index=index,
+     box=box
+    ).solvation
 
 
 def atom_solvation(atom):
     """Returns the atomic solvation parameter of an atomium atom. The atomic
     solvation parameters are taken from Yamashita et al (1990).
 
+    The parameter only depends on the atom's element, charge, residue name
+    and name, so it is worked out once for each such combination and then
+    remembered - see :py:func:`.parameter_cache_info`.
+
     :param Atom atom: an atomium atom object.
     :rtype: ``float``"""
 
-    specials = {
-     "O": {"GLU": ["OE1", "OE2"], "ASP": ["OD1", "OD2"]},
-     "N": {"HIS": ["ND1", "NE2"], "ARG": ["NH1", "NH2"]}
-    }
-    if atom.element == "C": return 18
-    if atom.element == "S": return -5
-    if atom.element in specials:
-        if atom.charge != 0:
-            return -37 if atom.element == "O" else -38
-        if atom.residue and atom.residue.name in specials[atom.element]:
-            if atom.name in specials[atom.element][atom.residue.name]:
-                return -23 if atom.element == "O" else -23.5
-        return -9
-    return 0
+    if profiling.active(): return _profiled_lookup(_identity_solvation, atom)
+    return _identity_solvation(*_chemical_identity(atom))
 
 
 def atom_partial_charge(atom):
     """Returns the atomic partial charge of an atomium atom.
 
+    Like :py:func:`.atom_solvation`, this is remembered for each combination
+    of element, charge, residue name and name.
+
     :param Atom atom: an atomium atom object.
     :rtype: ``float``"""
 
-    if atom.charge != 0: return atom.charge
-    if atom.residue is not None and atom.residue.name in partial_charges:
-        if atom.name in partial_charges[atom.residue.name]:
-            return partial_charges[atom.residue.name][atom.name]
-    return 0
+    if profiling.active():
+        return _profiled_lookup(_identity_partial_charge, atom)
+    return _identity_partial_charge(*_chemical_identity(atom))
+
+
+def parameter_cache_info():
+    """Returns the hit and miss counts, maximum size and current size of the
+    caches used by :py:func:`.atom_solvation` and
+    :py:func:`.atom_partial_charge`.
+
+    :rtype: ``dict``"""
+
+    return {
+     "solvation": _identity_solvation.cache_info()._asdict(),
+     "partial_charge": _identity_partial_charge.cache_info()._asdict()
+    }
+
+
+def clear_parameter_cache():
+    """Empties the caches used by :py:func:`.atom_solvation` and
+    :py:func:`.atom_partial_charge`, and resets their statistics. This must be
+    done if the partial charges in :py:mod:`biometal.charges` are changed."""
+
+    _identity_solvation.cache_clear()
+    _identity_partial_charge.cache_clear()
+
+
+def solvation_parameters(atoms):
+    """Returns the atomic solvation parameters of many atomium atoms at once,
+    as an array. The values are the same as :py:func:`.atom_solvation` would
+    give for each atom, but they are read from a table compiled when biometal
+    is imported rather than worked out atom by atom.
+
+    :param atoms: The atomium atoms.
+    :rtype: ``numpy.ndarray``"""
+
+    return _lookup_solvations(*_encode_atoms(atoms))
+
+
+def partial_charges_of(atoms):
+    """Returns the atomic partial charges of many atomium atoms at once, as an
+    array. The values are the same as :py:func:`.atom_partial_charge` would
+    give for each atom, but they are read from a table compiled when biometal
+    is imported rather than worked out atom by atom.
+
+    :param atoms: The atomium atoms.
+    :rtype: ``numpy.ndarray``"""
+
+    return _lookup_charges(*_encode_atoms(atoms))
 
 
-def hydrophobic_contrast(model, x, y, z, radius, pc=False, het=True, metal=True):
+def hydrophobic_contrast(model, x, y, z, radius, pc=False, het=True, metal=True,
+                         index=None, box=None):
     """Determines the hydrophobic contrast within a sphere - a measure of
     how heterogenous the hydrophobicity is within the sphere.
 
@@ -85,7 +138,7 @@ def hydrophobic_contrast(model, x, y, z, radius, pc=False, het=True, metal=True)
     have a high positive value, and the converse will have a high negative
     value.
 
-    :param Model model: The atomium model to examine.
+    :param model: The atomium model or :py:class:`.AtomTable` to examine.
     :param x: The x-coordinate of the centre of the sphere.
     :param y: The y-coordinate of the centre of the sphere.
     :param z: The z-coordinate of the centre of the sphere.
@@ -93,28 +146,992 @@ def hydrophobic_contrast(model, x, y, z, radius, pc=False, het=True, metal=True)
     :param bool het: If ``False``, only atoms that have a residue will be\
     considered.
     :param bool metal: If ``False``, only non-metal atoms will be considered.
-    :raises TypeError: if the model is not an atomium model object.
+    :param SpatialIndex index: If given, this index of the model's atoms will\
+    be used to find the atoms in the sphere.
+    :param Box box: If given, the model is a system in this periodic box, and\
+    distances to the nearest image of each atom are used.
+    :raises TypeError: if the model is not an atomium model or atom table.
+    :raises TypeError: if the index is not a :py:class:`.SpatialIndex`.
+    :raises TypeError: if the box is not a :py:class:`.Box`.
+    :raises ValueError: if the index was made with a different box.
     :raises TypeError: if the coordinates are not numeric.
     :raises TypeError: if the radius is not numeric.
     :raises ValueError: if the radius is negative.
+    :raises ValueError: if the radius is too big for the box.
     :rtype: ``float``"""
 
-    if not isinstance(model, Model):
+    return sphere_hydrophobicity(
+     model, x, y, z, radius, pc=pc, het=het, metal=metal, index=index,
+     box=box
+    ).contrast
+
+
+def sphere_hydrophobicity(model, x, y, z, radius, pc=False, het=True,
+                          metal=True, index=None, box=None):
+    """Measures the hydrophobicity of a sphere within an atomium model, and
+    returns an object from which both the average solvation and the
+    hydrophobic contrast of that sphere can be read.
+
+    The atoms in the sphere are only found once, and each atom's parameter and
+    distance from the centre are only calculated once, so this is the function
+    to use if you want both measures.
+
+    :param model: The atomium model or :py:class:`.AtomTable` to examine.
+    :param x: The x-coordinate of the centre of the sphere.
+    :param y: The y-coordinate of the centre of the sphere.
+    :param z: The z-coordinate of the centre of the sphere.
+    :param radius: The radius of the sphere.
+    :param bool pc: If ``True``, atomic partial charges will be used instead of\
+    atomic solvation parameters (squared).
+    :param bool het: If ``False``, only atoms that have a residue will be\
+    considered.
+    :param bool metal: If ``False``, only non-metal atoms will be considered.
+    :param SpatialIndex index: If given, this index of the model's atoms will\
+    be used to find the atoms in the sphere.
+    :param Box box: If given, the model is a system in this periodic box, and\
+    distances to the nearest image of each atom are used.
+    :raises TypeError: if the model is not an atomium model or atom table.
+    :raises TypeError: if the index is not a :py:class:`.SpatialIndex`.
+    :raises TypeError: if the box is not a :py:class:`.Box`.
+    :raises ValueError: if the index was made with a different box.
+    :raises TypeError: if the coordinates are not numeric.
+    :raises TypeError: if the radius is not numeric.
+    :raises ValueError: if the radius is negative.
+    :raises ValueError: if the radius is too big for the box.
+    :rtype: :py:class:`.SphereHydrophobicity`"""
+
+    if not isinstance(model, (Model, AtomTable)):
+        raise TypeError("{} is not a Model".format(model))
+    if any(not isinstance(c, (int, float)) for c in (x, y, z)):
+        raise TypeError("({}, {}, {}) not valid coordinate".format(x, y, z))
+    if not isinstance(radius, (int, float)):
+        raise TypeError("{} is not a valid radius".format(radius))
+    if radius < 0:
+        raise ValueError("{} is not a valid radius".format(radius))
+    if index is not None and not isinstance(index, SpatialIndex):
+        raise TypeError("{} is not a SpatialIndex".format(index))
+    _check_box(box, radius, index=index)
+    if index is None and isinstance(model, AtomTable):
+        with profiling.phase("sphere_queries"):
+            indices, squares = model.indices_in_sphere(
+             x, y, z, radius, het=het, metal=metal, box=box
+            )
+        _count_sphere(len(indices))
+        with profiling.phase("parameter_lookups"):
+            solvations = model.parameters(pc=pc)[indices]
+        with profiling.phase("distance_arithmetic"):
+            return SphereHydrophobicity(
+             len(indices), solvations.sum(), squares.sum(),
+             (solvations * squares).sum()
+            )
+    with profiling.phase("sphere_queries"):
+        if box is None:
+            sphere = (model if index is None else index).atoms_in_sphere(
+             x, y, z, radius, het=het, metal=metal
+            )
+        else:
+            sphere, squares = _atoms_in_periodic_sphere(
+             model, x, y, z, radius, het=het, metal=metal, index=index,
+             box=box
+            )
+    _count_sphere(len(sphere))
+    with profiling.phase("parameter_lookups"):
+        solvations = [(atom_partial_charge(atom) ** 2) if pc
+         else atom_solvation(atom) for atom in sphere]
+    profiling.count("parameter_lookups", len(sphere))
+    count, solvation_sum, square_sum, product_sum = 0, 0, 0, 0
+    with profiling.phase("distance_arithmetic"):
+        if box is None:
+            squares = [atom.distance_to((x, y, z)) ** 2 for atom in sphere]
+        for solv, square in zip(solvations, squares):
+            count += 1
+            solvation_sum += solv
+            square_sum += square
+            product_sum += solv * square
+    return SphereHydrophobicity(count, solvation_sum, square_sum, product_sum)
+
+
+
+class SphereHydrophobicity:
+    """The hydrophobicity of a sphere, stored as the sums over the atoms in
+    the sphere from which the average solvation and hydrophobic contrast are
+    calculated.
+
+    :param int count: The number of atoms in the sphere.
+    :param solvation_sum: The sum of the atoms' solvation parameters.
+    :param square_sum: The sum of the atoms' squared distances from the centre.
+    :param product_sum: The sum of each atom's solvation parameter multiplied\
+    by its squared distance from the centre."""
+
+    __slots__ = ["_count", "_solvation_sum", "_square_sum", "_product_sum"]
+
+    def __init__(self, count, solvation_sum, square_sum, product_sum):
+        self._count = count
+        self._solvation_sum = solvation_sum
+        self._square_sum = square_sum
+        self._product_sum = product_sum
+
+
+    def __repr__(self):
+        return "<SphereHydrophobicity ({} atom{})>".format(
+         self._count, "" if self._count == 1 else "s"
+        )
+
+
+    @property
+    def count(self):
+        """The number of atoms in the sphere.
+
+        :rtype: ``int``"""
+
+        return self._count
+
+
+    @property
+    def solvation(self):
+        """The average solvation of the atoms in the sphere, or zero if there
+        are none.
+
+        :rtype: ``float``"""
+
+        return self._solvation_sum / self._count if self._count else 0
+
+
+    @property
+    def contrast(self):
+        """The hydrophobic contrast of the sphere, or zero if there are no
+        atoms in it.
+
+        :rtype: ``float``"""
+
+        if not self._count: return 0
+        r2 = self._square_sum / self._count
+        return self._product_sum - (self._count * self.solvation * r2)
+
+
+
+def contrast_map(model, radius, spacing=1, pc=False, het=True, metal=True,
+                 margin=0, method="direct", peaks=0):
+    """Evaluates the hydrophobic contrast function over a regular grid covering
+    an atomium model, rather than at one point at a time.
+
+    The grid points are all multiples of ``spacing`` (so the origin is always
+    one of them, as with atomium's own ``grid`` method) and extend from the
+    lowest to the highest atom coordinates in each dimension, plus any margin.
+    The value at index ``[i, j, k]`` is the contrast of the sphere centred on
+    ``origin + (i, j, k) * spacing``.
+
+    With the default ``"direct"`` method, this is the same value that
+    :py:func:`.hydrophobic_contrast` gives for that point. The ``"fft"``
+    method instead moves every atom to its nearest grid point and calculates
+    the whole map with fast Fourier transform convolutions, which is far
+    faster for large, finely spaced maps but approximate - each atom can be
+    moved by up to ``spacing * √3 / 2``, so atoms that close to the edge of a
+    sphere may be wrongly counted in or out of it, and each squared distance
+    is correspondingly inexact. The ``peaks`` highest points of an FFT map can
+    be recalculated exactly.
+
+    :param model: The atomium model or :py:class:`.AtomTable` to examine.
+    :param radius: The radius of the sphere around each grid point.
+    :param spacing: The distance between adjacent grid points.
+    :param bool pc: If ``True``, atomic partial charges will be used instead of\
+    atomic solvation parameters (squared).
+    :param bool het: If ``False``, only atoms that have a residue will be\
+    considered.
+    :param bool metal: If ``False``, only non-metal atoms will be considered.
+    :param margin: How far to extend the grid beyond the atom coordinates.
+    :param str method: ``"direct"`` or ``"fft"``.
+    :param int peaks: The number of highest points to recalculate exactly.
+    :raises TypeError: if the model is not an atomium model or atom table.
+    :raises TypeError: if the radius, spacing or margin is not numeric.
+    :raises ValueError: if the radius or margin is negative.
+    :raises ValueError: if the spacing is not positive.
+    :raises ValueError: if the method is not recognised.
+    :raises ValueError: if the number of peaks is negative.
+    :rtype: ``tuple`` of (``numpy.ndarray``, origin ``tuple``, spacing)"""
+
+    return _map(
+     _contrast, model, radius, spacing=spacing, pc=pc, het=het, metal=metal,
+     margin=margin, method=method, peaks=peaks
+    )
+
+
+def solvation_map(model, radius, spacing=1, pc=False, het=True, metal=True,
+                  margin=0, method="direct", peaks=0):
+    """Evaluates the average solvation over a regular grid covering an atomium
+    model, rather than at one point at a time. The grid, methods and
+    arguments are the same as for :py:func:`.contrast_map`, and with the
+    ``"direct"`` method the value at each point is the same value that
+    :py:func:`.solvation` gives for that point.
+
+    :param model: The atomium model or :py:class:`.AtomTable` to examine.
+    :param radius: The radius of the sphere around each grid point.
+    :param spacing: The distance between adjacent grid points.
+    :param bool pc: If ``True``, atomic partial charges will be used instead of\
+    atomic solvation parameters (squared).
+    :param bool het: If ``False``, only atoms that have a residue will be\
+    considered.
+    :param bool metal: If ``False``, only non-metal atoms will be considered.
+    :param margin: How far to extend the grid beyond the atom coordinates.
+    :param str method: ``"direct"`` or ``"fft"``.
+    :param int peaks: The number of highest points to recalculate exactly.
+    :raises TypeError: if the model is not an atomium model or atom table.
+    :raises TypeError: if the radius, spacing or margin is not numeric.
+    :raises ValueError: if the radius or margin is negative.
+    :raises ValueError: if the spacing is not positive.
+    :raises ValueError: if the method is not recognised.
+    :raises ValueError: if the number of peaks is negative.
+    :rtype: ``tuple`` of (``numpy.ndarray``, origin ``tuple``, spacing)"""
+
+    return _map(
+     _solvation, model, radius, spacing=spacing, pc=pc, het=het, metal=metal,
+     margin=margin, method=method, peaks=peaks
+    )
+
+
+def _map(measure, model, radius, spacing=1, pc=False, het=True, metal=True,
+         margin=0, method="direct", peaks=0):
+    """Checks the arguments given to the map functions, works out the grid
+    that covers the model, and calculates some measure at every point of it.
+
+    :param function measure: The function which turns the four sphere sums\
+    into the values wanted.
+    :param model: The atomium model or :py:class:`.AtomTable` to examine.
+    :param radius: The radius of the sphere around each grid point.
+    :param spacing: The distance between adjacent grid points.
+    :param bool pc: If ``True``, squared partial charges will be used.
+    :param bool het: If ``False``, only atoms that have a residue will be used.
+    :param bool metal: If ``False``, only non-metal atoms will be used.
+    :param margin: How far to extend the grid beyond the atom coordinates.
+    :param str method: ``"direct"`` or ``"fft"``.
+    :param int peaks: The number of highest points to recalculate exactly.
+    :rtype: ``tuple``"""
+
+    if not isinstance(model, (Model, AtomTable)):
+        raise TypeError("{} is not a Model".format(model))
+    for value in (radius, spacing, margin):
+        if not isinstance(value, (int, float)):
+            raise TypeError("{} is not a valid distance".format(value))
+    if radius < 0:
+        raise ValueError("{} is not a valid radius".format(radius))
+    if spacing <= 0:
+        raise ValueError("{} is not a valid spacing".format(spacing))
+    if margin < 0:
+        raise ValueError("{} is not a valid margin".format(margin))
+    if method not in ("direct", "fft"):
+        raise ValueError("{} is not a valid method".format(method))
+    if not isinstance(peaks, int) or peaks < 0:
+        raise ValueError("{} is not a valid number of peaks".format(peaks))
+    coordinates, parameters = _atom_arrays(model, pc=pc, het=het, metal=metal)
+    all_coordinates = model.coordinates if isinstance(
+     model, AtomTable
+    ) else np.array(
+     [atom.location for atom in model.atoms()], dtype=float
+    ).reshape(-1, 3)
+    if len(all_coordinates) == 0:
+        return np.zeros((0, 0, 0)), (0, 0, 0), spacing
+    lower = [floor((c - margin) / spacing) for c in all_coordinates.min(axis=0)]
+    upper = [ceil((c + margin) / spacing) for c in all_coordinates.max(axis=0)]
+    shape = tuple(u - l + 1 for l, u in zip(lower, upper))
+    sums = (_grid_sums if method == "direct" else _fft_sums)(
+     coordinates, parameters, lower, shape, spacing, radius
+    )
+    values = measure(*sums)
+    if peaks and values.size:
+        top = np.argsort(values, axis=None)[::-1][:peaks] if (
+         peaks >= values.size
+        ) else np.argpartition(-values, peaks - 1, axis=None)[:peaks]
+        indices = np.array(np.unravel_index(top, shape)).T
+        points = (indices + lower) * spacing
+        values.flat[top] = measure(*_sphere_sums(
+         coordinates, parameters, points, radius
+        ))
+    origin = tuple(l * spacing for l in lower)
+    return values, origin, spacing
+
+
+def solvation_many(model, centres, radius, pc=False, het=True, metal=True,
+                   index=None, box=None):
+    """Determines the average solvation within many spheres of the same radius
+    in an atomium model at once. This gives the same values as calling
+    :py:func:`.solvation` once per centre, but the atom parameters are worked
+    out only once and the atoms are binned into cells so that each sphere only
+    looks at the atoms near it.
+
+    :param model: The atomium model or :py:class:`.AtomTable` to examine.
+    :param centres: The (x, y, z) centres of the spheres, as an (N, 3) array\
+    or a list of coordinate triples.
+    :param radius: The radius of the spheres.
+    :param bool pc: If ``True``, atomic partial charges will be used instead of\
+    atomic solvation parameters (squared).
+    :param bool het: If ``False``, only atoms that have a residue will be\
+    considered.
+    :param bool metal: If ``False``, only non-metal atoms will be considered.
+    :param SpatialIndex index: If given, this index of the model's atoms will\
+    be used to find the atoms in the spheres.
+    :param Box box: If given, the model is a system in this periodic box, and\
+    distances to the nearest image of each atom are used.
+    :raises TypeError: if the model is not an atomium model or atom table.
+    :raises TypeError: if the index is not a :py:class:`.SpatialIndex`.
+    :raises TypeError: if the box is not a :py:class:`.Box`.
+    :raises ValueError: if the index was made with a different box.
+    :raises TypeError: if the centres are not numeric.
+    :raises ValueError: if the centres are not (x, y, z) triples.
+    :raises TypeError: if the radius is not numeric.
+    :raises ValueError: if the radius is negative.
+    :raises ValueError: if the radius is too big for the box.
+    :rtype: ``numpy.ndarray``"""
+
+    return _solvation(*_many_sums(
+     model, centres, radius, pc=pc, het=het, metal=metal, index=index,
+     box=box
+    ))
+
+
+def hydrophobic_contrast_many(model, centres, radius, pc=False, het=True,
+                              metal=True, index=None, box=None):
+    """Determines the hydrophobic contrast within many spheres of the same
+    radius in an atomium model at once. This gives the same values as calling
+    :py:func:`.hydrophobic_contrast` once per centre, but the atom parameters
+    are worked out only once and the atoms are binned into cells so that each
+    sphere only looks at the atoms near it.
+
+    :param model: The atomium model or :py:class:`.AtomTable` to examine.
+    :param centres: The (x, y, z) centres of the spheres, as an (N, 3) array\
+    or a list of coordinate triples.
+    :param radius: The radius of the spheres.
+    :param bool pc: If ``True``, atomic partial charges will be used instead of\
+    atomic solvation parameters (squared).
+    :param bool het: If ``False``, only atoms that have a residue will be\
+    considered.
+    :param bool metal: If ``False``, only non-metal atoms will be considered.
+    :param SpatialIndex index: If given, this index of the model's atoms will\
+    be used to find the atoms in the spheres.
+    :param Box box: If given, the model is a system in this periodic box, and\
+    distances to the nearest image of each atom are used.
+    :raises TypeError: if the model is not an atomium model or atom table.
+    :raises TypeError: if the index is not a :py:class:`.SpatialIndex`.
+    :raises TypeError: if the box is not a :py:class:`.Box`.
+    :raises ValueError: if the index was made with a different box.
+    :raises TypeError: if the centres are not numeric.
+    :raises ValueError: if the centres are not (x, y, z) triples.
+    :raises TypeError: if the radius is not numeric.
+    :raises ValueError: if the radius is negative.
+    :raises ValueError: if the radius is too big for the box.
+    :rtype: ``numpy.ndarray``"""
+
+    return _contrast(*_many_sums(
+     model, centres, radius, pc=pc, het=het, metal=metal, index=index,
+     box=box
+    ))
+
+
+def contrast_profile(model, x, y, z, radii, pc=False, het=True, metal=True,
+                     index=None, box=None):
+    """Determines the average solvation and hydrophobic contrast of a series of
+    concentric spheres of different radii. The atoms are sorted by distance
+    from the centre once, and running totals are then read off at each
+    radius, so this is much faster than measuring each sphere separately.
+
+    :param model: The atomium model or :py:class:`.AtomTable` to examine.
+    :param x: The x-coordinate of the centre of the spheres.
+    :param y: The y-coordinate of the centre of the spheres.
+    :param z: The z-coordinate of the centre of the spheres.
+    :param radii: The radii of the spheres, in any order.
+    :param bool pc: If ``True``, atomic partial charges will be used instead of\
+    atomic solvation parameters (squared).
+    :param bool het: If ``False``, only atoms that have a residue will be\
+    considered.
+    :param bool metal: If ``False``, only non-metal atoms will be considered.
+    :param SpatialIndex index: If given, this index of the model's atoms will\
+    be used to find the atoms near the centre.
+    :param Box box: If given, the model is a system in this periodic box, and\
+    distances to the nearest image of each atom are used.
+    :raises TypeError: if the model is not an atomium model or atom table.
+    :raises TypeError: if the index is not a :py:class:`.SpatialIndex`.
+    :raises TypeError: if the box is not a :py:class:`.Box`.
+    :raises ValueError: if the index was made with a different box.
+    :raises TypeError: if the coordinates are not numeric.
+    :raises TypeError: if the radii are not numeric.
+    :raises ValueError: if any radius is negative.
+    :raises ValueError: if any radius is too big for the box.
+    :rtype: ``tuple`` of (solvations ``numpy.ndarray``, contrasts\
+    ``numpy.ndarray``)"""
+
+    if not isinstance(model, (Model, AtomTable)):
         raise TypeError("{} is not a Model".format(model))
     if any(not isinstance(c, (int, float)) for c in (x, y, z)):
         raise TypeError("({}, {}, {}) not valid coordinate".format(x, y, z))
+    try:
+        radii = np.array(radii, dtype=float).reshape(-1)
+    except (TypeError, ValueError):
+        raise TypeError("{} are not valid radii".format(radii))
+    if (radii < 0).any():
+        raise ValueError("{} are not valid radii".format(radii))
+    if index is not None and not isinstance(index, SpatialIndex):
+        raise TypeError("{} is not a SpatialIndex".format(index))
+    largest = radii.max() if len(radii) else 0
+    _check_box(box, largest, index=index)
+    if index is None:
+        coordinates, parameters = _atom_arrays(
+         model, pc=pc, het=het, metal=metal
+        )
+        squares = _squared_distances(coordinates, [x, y, z], box=box)
+    else:
+        _, atoms, squares = index.pairs_filtered(
+         [[x, y, z]], largest, het=het, metal=metal
+        )
+        parameters = _parameters([index.atoms[atom] for atom in atoms], pc=pc)
+    distances = np.sqrt(squares)
+    order = np.argsort(distances, kind="stable")
+    distances, squares = distances[order], squares[order]
+    parameters = parameters[order].astype(float)
+    totals = [np.concatenate([[0], np.cumsum(values)]) for values in (
+     np.ones(len(distances)), parameters, squares, parameters * squares
+    )]
+    counts = np.searchsorted(distances, radii, side="right")
+    sums = [total[counts] for total in totals]
+    return _solvation(*sums), _contrast(*sums)
+
+
+def _many_sums(model, centres, radius, pc=False, het=True, metal=True,
+               index=None, box=None):
+    """Checks the arguments given to the functions which work on many spheres
+    at once, and then gets the four sphere sums for every centre.
+
+    :param model: The atomium model or :py:class:`.AtomTable` to examine.
+    :param centres: The (x, y, z) centres of the spheres.
+    :param radius: The radius of the spheres.
+    :param bool pc: If ``True``, squared partial charges will be used.
+    :param bool het: If ``False``, only atoms that have a residue will be used.
+    :param bool metal: If ``False``, only non-metal atoms will be used.
+    :param SpatialIndex index: An existing index of the model's atoms to use.
+    :param Box box: The periodic box the model is in, if any.
+    :rtype: ``tuple``"""
+
+    if not isinstance(model, (Model, AtomTable)):
+        raise TypeError("{} is not a Model".format(model))
+    centres = _centre_array(centres)
     if not isinstance(radius, (int, float)):
         raise TypeError("{} is not a valid radius".format(radius))
     if radius < 0:
         raise ValueError("{} is not a valid radius".format(radius))
-    sphere = model.atoms_in_sphere(x, y, z, radius, het=het, metal=metal)
-    if len(sphere) == 0: return 0
-    average_solvation = solvation(model, x, y, z, radius, pc=pc, het=het, metal=metal)
-    sum_, r2 = 0, 0
-    for atom in sphere:
-        distance = atom.distance_to((x, y, z))
-        solv = ((atom_partial_charge(atom)) ** 2) if pc else atom_solvation(atom)
-        sum_ += solv * (distance ** 2)
-        r2 += (distance ** 2)
-    r2 /= len(sphere)
-    return sum_ - (len(sphere) * average_solvation * r2)
+    if index is not None and not isinstance(index, SpatialIndex):
+        raise TypeError("{} is not a SpatialIndex".format(index))
+    _check_box(box, radius, index=index)
+    if index is None:
+        coordinates, parameters = _atom_arrays(
+         model, pc=pc, het=het, metal=metal
+        )
+        return _sphere_sums(coordinates, parameters, centres, radius, box=box)
+    parameters = _parameters(index.atoms, pc=pc)
+    return _sphere_sums(
+     index.coordinates, parameters, centres, radius,
+     grid=index, mask=index.mask(het=het, metal=metal)
+    )
+
+
+def _centre_array(centres):
+    """Converts some sphere centres to an (N, 3) array of floats.
+
+    :param centres: The centres to convert.
+    :raises TypeError: if the centres are not numeric.
+    :raises ValueError: if the centres are not (x, y, z) triples.
+    :rtype: ``numpy.ndarray``"""
+
+    try:
+        array = np.array(centres, dtype=float)
+    except (TypeError, ValueError):
+        raise TypeError("{} are not valid coordinates".format(centres))
+    if array.size == 0: return array.reshape(0, 3)
+    if array.ndim != 2 or array.shape[1] != 3:
+        raise ValueError("{} are not (x, y, z) coordinates".format(centres))
+    return array
+
+
+def _atom_arrays(model, pc=False, het=True, metal=True):
+    """Takes an atomium model or atom table and returns an array of the
+    coordinates of the atoms that pass the filters given, along with an array
+    of each such atom's hydrophobicity parameter.
+
+    :param model: The atomium model or :py:class:`.AtomTable` to examine.
+    :param bool pc: If ``True``, squared partial charges will be used.
+    :param bool het: If ``False``, only atoms that have a residue will be used.
+    :param bool metal: If ``False``, only non-metal atoms will be used.
+    :rtype: ``tuple``"""
+
+    if isinstance(model, AtomTable):
+        mask = model.mask(het=het, metal=metal)
+        if mask is None: return model.coordinates, model.parameters(pc=pc)
+        return model.coordinates[mask], model.parameters(pc=pc)[mask]
+    atoms = list(model.atoms(het=het, metal=metal))
+    coordinates = np.array(
+     [atom.location for atom in atoms], dtype=float
+    ).reshape(-1, 3)
+    return coordinates, _parameters(atoms, pc=pc)
+
+
+def _parameters(atoms, pc=False):
+    """Returns an array of the hydrophobicity parameter of each of the atoms
+    given - either its atomic solvation parameter or its partial charge
+    squared.
+
+    :param list atoms: The atomium atoms.
+    :param bool pc: If ``True``, squared partial charges will be used.
+    :rtype: ``numpy.ndarray``"""
+
+    profiling.count("parameter_lookups", len(atoms))
+    with profiling.phase("parameter_lookups"):
+        if pc: return partial_charges_of(atoms) ** 2
+        return solvation_parameters(atoms)
+
+
+def _count_sphere(atoms, spheres=1):
+    """Records, in any active profile, that some spheres have been looked at
+    and how many atoms were found in them.
+
+    :param int atoms: The number of atoms found.
+    :param int spheres: The number of spheres."""
+
+    profiling.count("sphere_queries", spheres)
+    profiling.count("atoms_visited", atoms)
+
+
+def _check_box(box, radius, index=None):
+    """Checks that a periodic box given to one of the hydrophobicity functions
+    is a :py:class:`.Box`, that any index given with it was made with the same
+    box, and that spheres of the given radius fit in it.
+
+    :param Box box: The box to check, which may be ``None``.
+    :param radius: The largest radius that will be used.
+    :param SpatialIndex index: The index being used, if any.
+    :raises TypeError: if the box is not a :py:class:`.Box`.
+    :raises ValueError: if the index was made with a different box.
+    :raises ValueError: if the radius is too big for the box."""
+
+    if box is not None and not isinstance(box, Box):
+        raise TypeError("{} is not a Box".format(box))
+    if index is not None and index.box != box:
+        raise ValueError("{} was not made with {}".format(index, box))
+    if box is not None and radius > box.max_radius:
+        raise ValueError("{} is too big a radius for {}".format(radius, box))
+
+
+def _squared_distances(coordinates, point, box=None):
+    """Returns the squared distance of each of a set of coordinates from a
+    point - in a periodic box, the distance to the nearest image.
+
+    :param numpy.ndarray coordinates: The (N, 3) coordinates.
+    :param point: The (x, y, z) point to measure from.
+    :param Box box: The periodic box, if any.
+    :rtype: ``numpy.ndarray``"""
+
+    differences = coordinates - point
+    if box is not None: differences = box.minimum_image(differences)
+    return (differences ** 2).sum(axis=1)
+
+
+def _atoms_in_periodic_sphere(model, x, y, z, radius, het=True, metal=True,
+                              index=None, box=None):
+    """Finds the atomium atoms whose nearest image in a periodic box is within
+    a sphere, along with their squared distances from its centre.
+
+    :param Model model: The atomium model to look in.
+    :param x: The x-coordinate of the centre of the sphere.
+    :param y: The y-coordinate of the centre of the sphere.
+    :param z: The z-coordinate of the centre of the sphere.
+    :param radius: The radius of the sphere.
+    :param bool het: If ``False``, only atoms that have a residue will be used.
+    :param bool metal: If ``False``, only non-metal atoms will be used.
+    :param SpatialIndex index: An existing index of the model's atoms to use.
+    :param Box box: The periodic box.
+    :rtype: ``tuple``"""
+
+    if index is not None:
+        _, indices, squares = index.pairs_filtered(
+         [[x, y, z]], radius, het=het, metal=metal
+        )
+        return [index.atoms[i] for i in indices], squares
+    atoms = list(model.atoms(het=het, metal=metal))
+    squares = _squared_distances(np.array(
+     [atom.location for atom in atoms], dtype=float
+    ).reshape(-1, 3), [x, y, z], box=box)
+    inside = np.nonzero(np.sqrt(squares) <= radius)[0]
+    return [atoms[i] for i in inside], squares[inside]
+
+
+def _chemical_identity(atom):
+    """Returns the properties of an atomium atom that its hydrophobicity
+    parameters depend on - its element, charge, residue name and name.
+
+    :param Atom atom: an atomium atom object.
+    :rtype: ``tuple``"""
+
+    residue = atom.residue
+    return (
+     atom.element, atom.charge, None if residue is None else residue.name,
+     atom.name
+    )
+
+
+@lru_cache(maxsize=PARAMETER_CACHE_SIZE)
+def _identity_solvation(element, charge, residue, name):
+    """Returns the atomic solvation parameter of an atom with the given
+    chemical identity.
+
+    :param str element: The atom's element.
+    :param charge: The atom's formal charge.
+    :param str residue: The name of the atom's residue, if it has one.
+    :param str name: The atom's name.
+    :rtype: ``float``"""
+
+    if element == "C": return 18
+    if element == "S": return -5
+    if element in SPECIAL_SOLVATIONS:
+        if charge != 0:
+            return -37 if element == "O" else -38
+        specials = SPECIAL_SOLVATIONS[element]
+        if residue is not None and residue in specials:
+            if name in specials[residue]:
+                return -23 if element == "O" else -23.5
+        return -9
+    return 0
+
+
+@lru_cache(maxsize=PARAMETER_CACHE_SIZE)
+def _identity_partial_charge(element, charge, residue, name):
+    """Returns the atomic partial charge of an atom with the given chemical
+    identity.
+
+    :param str element: The atom's element.
+    :param charge: The atom's formal charge.
+    :param str residue: The name of the atom's residue, if it has one.
+    :param str name: The atom's name.
+    :rtype: ``float``"""
+
+    if charge != 0: return charge
+    if residue is not None and residue in partial_charges:
+        if name in partial_charges[residue]:
+            return partial_charges[residue][name]
+    return 0
+
+
+def _profiled_lookup(function, atom):
+    """Looks up one of an atom's parameters with a cached function, and
+    records in any active profile whether the cache already had it. This is
+    only used while profiling, so lookups are otherwise not slowed down.
+
+    The cache is shared by all threads, so if another thread misses at the
+    same moment, the lookup may be recorded as a miss when it was a hit.
+
+    :param function: :py:func:`._identity_solvation` or\
+    :py:func:`._identity_partial_charge`.
+    :param Atom atom: an atomium atom object.
+    :rtype: ``float``"""
+
+    misses = function.cache_info().misses
+    value = function(*_chemical_identity(atom))
+    profiling.count("parameter_cache_misses" if (
+     function.cache_info().misses > misses
+    ) else "parameter_cache_hits")
+    return value
+
+
+def _encode_atoms(atoms):
+    """Takes some atomium atoms and returns, as integer arrays, the codes that
+    the compiled parameter tables use for their elements, residue names and
+    atom names, along with an array of their charges.
+
+    :param atoms: The atomium atoms.
+    :rtype: ``tuple``"""
+
+    elements, charges, residues, names = [], [], [], []
+    for atom in atoms:
+        residue = atom.residue
+        elements.append(ELEMENT_CODES.get(atom.element, 0))
+        charges.append(atom.charge)
+        residues.append(RESIDUE_CODES.get(residue.name, 0) if residue else 0)
+        names.append(ATOM_CODES.get(atom.name, 0))
+    return (
+     np.array(elements, dtype=int), np.array(charges, dtype=float),
+     np.array(residues, dtype=int), np.array(names, dtype=int)
+    )
+
+
+def _lookup_solvations(elements, charges, residues, names):
+    """Reads atomic solvation parameters out of the compiled table.
+
+    :param numpy.ndarray elements: The element codes of the atoms.
+    :param numpy.ndarray charges: The formal charges of the atoms.
+    :param numpy.ndarray residues: The residue name codes of the atoms.
+    :param numpy.ndarray names: The atom name codes of the atoms.
+    :rtype: ``numpy.ndarray``"""
+
+    return SOLVATION_TABLE[elements, (charges != 0).astype(int), residues, names]
+
+
+def _lookup_charges(elements, charges, residues, names):
+    """Reads atomic partial charges out of the compiled table, using the
+    atoms' own charges wherever these are not zero.
+
+    :param numpy.ndarray elements: The element codes of the atoms.
+    :param numpy.ndarray charges: The formal charges of the atoms.
+    :param numpy.ndarray residues: The residue name codes of the atoms.
+    :param numpy.ndarray names: The atom name codes of the atoms.
+    :rtype: ``numpy.ndarray``"""
+
+    return np.where(charges != 0, charges, CHARGE_TABLE[residues, names])
+
+
+def _compile_solvation_table():
+    """Creates the table of atomic solvation parameters used by
+    :py:func:`.solvation_parameters`. It is indexed by element code, then
+    whether the atom is charged, then residue name code, then atom name code,
+    with code 0 in each case meaning anything not otherwise listed.
+
+    :rtype: ``numpy.ndarray``"""
+
+    table = np.zeros((
+     len(ELEMENT_CODES) + 1, 2, len(RESIDUE_CODES) + 1, len(ATOM_CODES) + 1
+    ))
+    table[ELEMENT_CODES["C"]] = 18
+    table[ELEMENT_CODES["S"]] = -5
+    for element, charged, special in (("O", -37, -23), ("N", -38, -23.5)):
+        table[ELEMENT_CODES[element], 0] = -9
+        table[ELEMENT_CODES[element], 1] = charged
+        for residue, names in SPECIAL_SOLVATIONS[element].items():
+            for name in names:
+                table[
+                 ELEMENT_CODES[element], 0, RESIDUE_CODES[residue], ATOM_CODES[name]
+                ] = special
+    return table
+
+
+def _compile_charge_table():
+    """Creates the table of atomic partial charges used by
+    :py:func:`.partial_charges_of`. It is indexed by residue name code and
+    then atom name code, with code 0 meaning anything not otherwise listed.
+
+    :rtype: ``numpy.ndarray``"""
+
+    table = np.zeros((len(RESIDUE_CODES) + 1, len(ATOM_CODES) + 1))
+    for residue, charges in partial_charges.items():
+        for name, charge in charges.items():
+            table[RESIDUE_CODES[residue], ATOM_CODES[name]] = charge
+    return table
+
+
+def _grid_sums(coordinates, parameters, lower, shape, spacing, radius,
+               budget=2 ** 20):
+    """Accumulates, for every point of a grid, the four sums over the atoms in
+    the sphere around it that the hydrophobicity functions are built from -
+    the atom count, the sum of parameters, the sum of squared distances and
+    the sum of parameters multiplied by squared distances.
+
+    Rather than query a sphere per grid point, each atom is scattered onto the
+    grid points near it using a fixed stencil of offsets, a chunk of atoms at a
+    time so that memory use stays bounded.
+
+    :param numpy.ndarray coordinates: The (N, 3) atom coordinates.
+    :param numpy.ndarray parameters: The N atom parameters.
+    :param lower: The integer grid index of the first point in each dimension.
+    :param tuple shape: The number of grid points in each dimension.
+    :param spacing: The distance between adjacent grid points.
+    :param radius: The sphere radius.
+    :param int budget: Roughly how many atom-point pairs to hold at once.
+    :rtype: ``tuple``"""
+
+    sums = [np.zeros(shape) for _ in range(4)]
+    if len(coordinates) == 0 or 0 in shape: return sums
+    lower, shape = np.array(lower), np.array(shape)
+    reach = int(ceil(radius / spacing))
+    steps = np.arange(-reach, reach + 1)
+    stencil = np.stack(
+     np.meshgrid(steps, steps, steps, indexing="ij"), axis=-1
+    ).reshape(-1, 3)
+    nearest = np.maximum(0, np.maximum((stencil - 1) * spacing, -stencil * spacing))
+    stencil = stencil[(nearest ** 2).sum(axis=1) <= radius ** 2]
+    chunk = max(1, budget // len(stencil))
+    flats = [sum_.reshape(-1) for sum_ in sums]
+    for start in range(0, len(coordinates), chunk):
+        atoms = coordinates[start:start + chunk]
+        values = parameters[start:start + chunk]
+        cells = np.floor(atoms / spacing).astype(int) - lower
+        points = cells[:, None, :] + stencil[None, :, :]
+        inside = ((points >= 0) & (points < shape)).all(axis=2)
+        vectors = (points + lower) * spacing - atoms[:, None, :]
+        squares = (vectors ** 2).sum(axis=2)
+        inside &= np.sqrt(squares) <= radius
+        atom_indices, stencil_indices = np.nonzero(inside)
+        indices = np.ravel_multi_index(
+         points[atom_indices, stencil_indices].T, shape
+        )
+        squares = squares[atom_indices, stencil_indices]
+        values = values[atom_indices]
+        for flat, weights in zip(flats, (
+         1, values, squares, values * squares
+        )):
+            np.add.at(flat, indices, weights)
+    return sums
+
+
+def _fft_sums(coordinates, parameters, lower, shape, spacing, radius):
+    """Approximates the four sphere sums for every point of a grid using fast
+    Fourier transform convolutions, padded so that they do not wrap around.
+
+    Each atom is assigned to its nearest grid point, and whether it is in a
+    sphere is decided from there. The squared distance from an atom at
+    ``g + δ`` to a point ``p`` is ``|p - g|² - 2(p - g)·δ + |δ|²``, and each of
+    these terms is a convolution of a grid of (weighted) atom offsets with a
+    spherical kernel, so the squared distances themselves are not affected by
+    the assignment to grid points.
+
+    :param numpy.ndarray coordinates: The (N, 3) atom coordinates.
+    :param numpy.ndarray parameters: The N atom parameters.
+    :param lower: The integer grid index of the first point in each dimension.
+    :param tuple shape: The number of grid points in each dimension.
+    :param spacing: The distance between adjacent grid points.
+    :param radius: The sphere radius.
+    :rtype: ``tuple``"""
+
+    if len(coordinates) == 0 or 0 in shape:
+        return [np.zeros(shape) for _ in range(4)]
+    cells = np.round(coordinates / spacing).astype(int)
+    offsets = coordinates - cells * spacing
+    cells = np.clip(cells - lower, 0, np.array(shape) - 1)
+    flat = np.ravel_multi_index(cells.T, shape)
+    reach = int(floor(radius / spacing))
+    steps = np.arange(-reach, reach + 1) * spacing
+    vectors = np.stack(np.meshgrid(steps, steps, steps, indexing="ij"))
+    squares = (vectors ** 2).sum(axis=0)
+    sphere = (np.sqrt(squares) <= radius).astype(float)
+    full = tuple(n + (2 * reach) for n in shape)
+    crop = tuple(slice(reach, reach + n) for n in shape)
+    kernels = [np.fft.rfftn(kernel, full, axes=(0, 1, 2)) for kernel in (
+     sphere, sphere * squares, *(-2 * sphere * vector for vector in vectors)
+    )]
+    size = int(np.prod(shape))
+    sums = []
+    for weights in (np.ones(len(coordinates)), parameters):
+        fields = [np.fft.rfftn(np.bincount(
+         flat, weights=field, minlength=size
+        ).reshape(shape), full, axes=(0, 1, 2)) for field in (
+         weights, weights * (offsets ** 2).sum(axis=1),
+         *(weights * offset for offset in offsets.T)
+        )]
+        sums.append(np.fft.irfftn(
+         fields[0] * kernels[0], full, axes=(0, 1, 2)
+        )[crop])
+        sums.append(np.fft.irfftn(
+         (fields[0] * kernels[1]) + (fields[1] * kernels[0]) +
+         sum(field * kernel for field, kernel in zip(fields[2:], kernels[2:])),
+         full, axes=(0, 1, 2)
+        )[crop])
+    count, square_sum, solvation_sum, product_sum = sums
+    return [np.round(count), solvation_sum, square_sum, product_sum]
+
+
+def _sphere_sums(coordinates, parameters, centres, radius, grid=None,
+                 mask=None, chunk=4096, box=None):
+    """Accumulates, for each of a number of sphere centres, the four sums over
+    the atoms in the sphere that the hydrophobicity functions are built from -
+    the atom count, the sum of parameters, the sum of squared distances and
+    the sum of parameters multiplied by squared distances.
+
+    The atoms are sorted into a grid of cubic cells (as wide as the radius,
+    unless an existing grid is given) so that only the atoms in the cells
+    around a centre need to be looked at.
+
+    :param numpy.ndarray coordinates: The (N, 3) atom coordinates.
+    :param numpy.ndarray parameters: The N atom parameters.
+    :param numpy.ndarray centres: The (M, 3) sphere centres.
+    :param radius: The sphere radius.
+    :param CellGrid grid: An existing grid of the atom coordinates to use.
+    :param numpy.ndarray mask: If given, which atoms are to be used.
+    :param int chunk: How many centres to process at once.
+    :param Box box: The periodic box the atoms are in, if a new grid is made.
+    :rtype: ``tuple``"""
+
+    sums = [np.zeros(len(centres)) for _ in range(4)]
+    if len(coordinates) == 0 or len(centres) == 0: return sums
+    if grid is None: grid = CellGrid(coordinates, radius or 1, box=box)
+    for first in range(0, len(centres), chunk):
+        points = centres[first:first + chunk]
+        with profiling.phase("sphere_queries"):
+            point_indices, atom_indices, squares = grid.pairs(
+             points, radius, mask=mask
+            )
+        _count_sphere(len(atom_indices), spheres=len(points))
+        for sum_, chunk_sum in zip(sums, _pair_sums(
+         point_indices, atom_indices, squares, parameters, len(points)
+        )):
+            sum_[first:first + chunk] = chunk_sum
+    return sums
+
+
+def _pair_sums(centre_indices, atom_indices, squares, parameters, count):
+    """Turns the (centre, atom) pairs found by a sphere query into the four
+    sphere sums for each centre.
+
+    :param numpy.ndarray centre_indices: The centre of each pair.
+    :param numpy.ndarray atom_indices: The atom of each pair.
+    :param numpy.ndarray squares: The squared distance of each pair.
+    :param numpy.ndarray parameters: The parameters of all the atoms.
+    :param int count: The number of centres.
+    :rtype: ``list``"""
+
+    with profiling.phase("distance_arithmetic"):
+        values = parameters[atom_indices]
+        return [np.bincount(
+         centre_indices, weights=weights, minlength=count
+        ) for weights in (None, values, squares, values * squares)]
+
+
+def _solvation(count, solvation_sum, *args):
+    """Calculates average solvation values from arrays of the sums over
+    spheres, giving zero wherever the sphere was empty.
+
+    :param numpy.ndarray count: The number of atoms in each sphere.
+    :param numpy.ndarray solvation_sum: The sum of atom parameters.
+    :rtype: ``numpy.ndarray``"""
+
+    occupied = count > 0
+    return np.where(occupied, solvation_sum / np.where(occupied, count, 1), 0.0)
+
+
+def _contrast(count, solvation_sum, square_sum, product_sum):
+    """Calculates hydrophobic contrast values from arrays of the sums over
+    spheres, giving zero wherever the sphere was empty.
+
+    :param numpy.ndarray count: The number of atoms in each sphere.
+    :param numpy.ndarray solvation_sum: The sum of atom parameters.
+    :param numpy.ndarray square_sum: The sum of squared distances.
+    :param numpy.ndarray product_sum: The sum of parameters times squared\
+    distances.
+    :rtype: ``numpy.ndarray``"""
+
+    occupied = count > 0
+    n = np.where(occupied, count, 1)
+    contrast = product_sum - n * (solvation_sum / n) * (square_sum / n)
+    return np.where(occupied, contrast, 0.0)
+
+
+
+ELEMENT_CODES = {"C": 1, "S": 2, "O": 3, "N": 4}
+
+RESIDUE_CODES = {name: code for code, name in enumerate(sorted(
+ set(partial_charges) | {
+  residue for residues in SPECIAL_SOLVATIONS.values() for residue in residues
+ }
+), start=1)}
+
+ATOM_CODES = {name: code for code, name in enumerate(sorted(
+ {name for charges in partial_charges.values() for name in charges} | {
+  name for residues in SPECIAL_SOLVATIONS.values()
+  for names in residues.values() for name in names
+ }
+), start=1)}
+
+SOLVATION_TABLE = _compile_solvation_table()
+
+CHARGE_TABLE = _compile_charge_table()
@@ -0,0 +1,295 @@
+"""Contains tools for splitting a batch run into shards that can be run
+separately, stopped and resumed, and then merged.
+
+A job starts as a manifest - a JSON file listing the structure files, the
+task to run on them and its options, and the number of shards. Every file
+belongs to one shard, chosen from a hash of its path, so any machine that
+can read the manifest agrees on what each shard holds. Each shard appends
+a line to its own checkpoint file as each file finishes, and when a shard
+is run again, the files already in its checkpoint are skipped. Once every
+shard has run, their checkpoints are merged into one output."""
+
+import hashlib
+import json
+import os
+from .batch import run_batch, TASKS
+from .templates import SiteTemplate
+from .library import save_templates
+
+def create_manifest(path, paths, task, shards=1, **options):
+    """Writes the manifest of a job to a JSON file. Paths are stored as they
+    are given, so relative paths must be relative to wherever the shards are
+    run.
+
+    :param str path: The location to write the manifest to.
+    :param paths: An iterable of paths to .pdb or .cif files.
+    :param str task: The name of the task to run, from :py:data:`.TASKS`.
+    :param int shards: The number of shards to split the files into.
+    :param \\*\\*options: Any keyword arguments to pass to the task.
+    :raises ValueError: if the task is not a known task name.
+    :raises ValueError: if the number of shards is not positive.
+    :rtype: ``dict``"""
+
+    if task not in TASKS:
+        raise ValueError("{} is not a batch task".format(task))
+    if not isinstance(shards, int) or shards < 1:
+        raise ValueError("{} is not a positive integer".format(shards))
+    manifest = {
+     "version": VERSION, "task": task, "options": options, "shards": shards,
+     "paths": list(paths)
+    }
+    _write_json(path, manifest)
+    return manifest
+
+
+def load_manifest(path):
+    """Reads the manifest of a job from a JSON file.
+
+    :param str path: The location of the manifest.
+    :raises ValueError: if the file is not a job manifest.
+    :rtype: ``dict``"""
+
+    with open(path) as f:
+        try:
+            manifest = json.load(f)
+        except ValueError:
+            raise ValueError("{} is not a job manifest".format(path))
+    if not isinstance(manifest, dict) or not all(
+     key in manifest for key in ("task", "options", "shards", "paths")
+    ):
+        raise ValueError("{} is not a job manifest".format(path))
+    if manifest.get("version", 0) > VERSION:
+        raise ValueError("{} is a version {} job manifest".format(
+         path, manifest["version"]
+        ))
+    return manifest
+
+
+def shard_of(path, shards):
+    """Gives the shard that a file belongs to, from a hash of its path that
+    is the same on every machine and in every Python process.
+
+    :param str path: The path of the file.
+    :param int shards: The number of shards.
+    :rtype: ``int``"""
+
+    digest = hashlib.sha1(path.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % shards
+
+
+def shard_paths(manifest, shard):
+    """Gives the files of a job that belong to one of its shards, in the
+    order the manifest lists them.
+
+    :param dict manifest: The job manifest.
+    :param int shard: The number of the shard.
+    :raises ValueError: if the job has no such shard.
+    :rtype: ``list``"""
+
+    if not 0 <= shard < manifest["shards"]:
+        raise ValueError("Job has no shard {}".format(shard))
+    return [
+     path for path in manifest["paths"]
+     if shard_of(path, manifest["shards"]) == shard
+    ]
+
+
+def checkpoint_path(manifest_path, shard):
+    """Gives the default location of a shard's checkpoint file, beside the
+    manifest.
+
+    :param str manifest_path: The location of the manifest.
+    :param int shard: The number of the shard.
+    :rtype: ``str``"""
+
+    stem = manifest_path[:-5] if manifest_path.endswith(".json") else (
+     manifest_path
+    )
+    return "{}.shard-{}.jsonl".format(stem, shard)
+
+
+def run_shard(manifest_path, shard, checkpoint=None, retry_failed=False,
+              workers=None, chunk_size=8):
+    """Runs one shard of a job, appending a line of JSON to the shard's
+    checkpoint file as each file finishes. Files already in the checkpoint
+    are skipped, so a shard that was stopped part way through carries on
+    from where it was. A line cut short by the process stopping is
+    discarded.
+
+    :param str manifest_path: The location of the manifest.
+    :param int shard: The number of the shard to run.
+    :param str checkpoint: The checkpoint file, if not the default one beside\
+    the manifest.
+    :param bool retry_failed: If ``True``, files that failed before are run\
+    again rather than skipped.
+    :param int workers: The number of processes to use.
+    :param int chunk_size: How many files to send to a worker at a time.
+    :raises ValueError: if the manifest is not a job manifest.
+    :raises ValueError: if the job has no such shard.
+    :rtype: ``dict``"""
+
+    manifest = load_manifest(manifest_path)
+    paths = shard_paths(manifest, shard)
+    checkpoint = checkpoint or checkpoint_path(manifest_path, shard)
+    done = read_checkpoint(checkpoint, repair=True)
+    if retry_failed:
+        done = {path: record for path, record in done.items()
+         if "error" not in record}
+    remaining = [path for path in paths if path not in done]
+    summary = {
+     "shard": shard, "paths": len(paths),
+     "skipped": len(paths) - len(remaining), "completed": 0, "failed": 0
+    }
+    if not remaining: return summary
+    task = manifest["task"]
+    with open(checkpoint, "a") as f:
+        for result in run_batch(
+         remaining, task, workers=workers, chunk_size=chunk_size,
+         **manifest["options"]
+        ):
+            if result.succeeded:
+                record = {"path": result.path, "value": _encode(
+                 task, result.value
+                )}
+                summary["completed"] += 1
+            else:
+                record = {"path": result.path, "error": result.error}
+                summary["failed"] += 1
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+    return summary
+
+
+def read_checkpoint(path, repair=False):
+    """Reads the records of a checkpoint file, keyed by the path of the file
+    each is for. Where a file has more than one record, the last is kept. A
+    missing checkpoint has no records.
+
+    :param str path: The location of the checkpoint.
+    :param bool repair: If ``True``, a last line cut short by the process\
+    writing it stopping is removed from the file.
+    :rtype: ``dict``"""
+
+    records = {}
+    if not os.path.exists(path): return records
+    with open(path, "rb+" if repair else "rb") as f:
+        data = f.read()
+        complete = data.rfind(b"\n") + 1
+        if repair and complete < len(data): f.truncate(complete)
+    for line in data[:complete].decode("utf-8").splitlines():
+        if not line.strip(): continue
+        record = json.loads(line)
+        records[record["path"]] = record
+    return records
+
+
+def merge_shards(manifest_path, output, checkpoints=None, partial=False):
+    """Combines the checkpoints of every shard of a job into one output, in
+    the order the manifest lists the files. For the contrast task, this is a
+    JSON lines file with a line for each structure file, as the ``biometal
+    contrast`` command writes. For the templates task, it is a template
+    library of every template from every file.
+
+    :param str manifest_path: The location of the manifest.
+    :param str output: The location to write the output to.
+    :param list checkpoints: The checkpoint file of each shard, if not the\
+    default ones beside the manifest.
+    :param bool partial: If ``True``, files that no shard has finished are\
+    left out, rather than the merge failing.
+    :raises ValueError: if any file has not been finished and the merge is\
+    not partial.
+    :rtype: ``dict``"""
+
+    manifest = load_manifest(manifest_path)
+    checkpoints = checkpoints or [
+     checkpoint_path(manifest_path, shard)
+     for shard in range(manifest["shards"])
+    ]
+    records = {}
+    for checkpoint in checkpoints: records.update(read_checkpoint(checkpoint))
+    missing = [path for path in manifest["paths"] if path not in records]
+    if missing and not partial:
+        raise ValueError("{} files have not been run, such as {}".format(
+         len(missing), missing[0]
+        ))
+    ordered = [records[path] for path in manifest["paths"] if path in records]
+    if manifest["task"] == "templates":
+        save_templates(output, (
+         template for record in ordered if "value" in record
+         for template in _decode("templates", record["value"])
+        ))
+    else:
+        temporary = "{}.{}.tmp".format(output, os.getpid())
+        try:
+            with open(temporary, "w") as f:
+                for record in ordered:
+                    if "value" in record:
+                        record = {
+                         "path": record["path"], "metals": record["value"]
+                        }
+                    f.write(json.dumps(record) + "\n")
+            os.replace(temporary, output)
+        except BaseException:
+            if os.path.exists(temporary): os.remove(temporary)
+            raise
+    return {
+     "paths": len(manifest["paths"]), "missing": len(missing),
+     "failed": sum("error" in record for record in ordered),
+     "completed": sum("value" in record for record in ordered)
+    }
+
+
+def _encode(task, value):
+    """Turns the value a task returned into something that can be written as
+    JSON.
+
+    :param str task: The name of the task.
+    :param value: The value it returned.
+    :rtype: ``list``"""
+
+    if task == "contrast":
+        return [{
+         "id": id_, "element": element, "location": list(location),
+         "contrast": contrast
+        } for id_, element, location, contrast in value]
+    if task != "templates": return value
+    return [{
+     "coordinates": template.coordinates.tolist(),
+     "residue_ids": template.residue_ids,
+     "residue_names": template.residue_names, "metal": template.metal,
+     "metal_id": template.metal_id,
+     "metal_location": template.metal_location.tolist(),
+     "source": template.source
+    } for template in value]
+
+
+def _decode(task, value):
+    """Turns a value read from a checkpoint back into what the task returned.
+
+    :param str task: The name of the task.
+    :param value: The value as read from JSON.
+    :rtype: ``list``"""
+
+    if task != "templates": return value
+    return [SiteTemplate(
+     template["coordinates"], template["residue_ids"],
+     template["residue_names"], template["metal"],
+     metal_id=template["metal_id"],
+     metal_location=template["metal_location"], source=template["source"]
+    ) for template in value]
+
+
+def _write_json(path, data):
+    """Writes some data as JSON to a temporary file beside a path, which then
+    replaces it.
+
+    :param str path: The location to write to.
+    :param data: The data to write."""
+
+    temporary = "{}.{}.tmp".format(path, os.getpid())
+    with open(temporary, "w") as f: json.dump(data, f, indent=1)
+    os.replace(temporary, path)
+
+
+
+VERSION = 1
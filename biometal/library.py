@@ -0,0 +1,287 @@
+"""Contains tools for storing many site templates in a single binary file."""
+
+import os
+import struct
+import numpy as np
+from .templates import SiteTemplate, _template_arrays
+
+class TemplateLibrary:
+    """A binary file of site templates, memory-mapped so that opening it reads
+    nothing but its header, and any template can be read from it without
+    reading the ones before it. Indexing gives a :py:class:`.SiteTemplate`,
+    and slicing a ``list`` of them. Libraries are written with
+    :py:func:`.save_templates`.
+
+    The file is a header, and then a number of little-endian arrays, each
+    starting on an eight byte boundary - the offset of each template's first
+    residue, the (R, 2, 3) CA and CB coordinates of every residue, the metal
+    location of each template, the string numbers of each template's metal,
+    metal ID and source, the string numbers of each residue's ID and name,
+    and a table of the strings themselves, each stored once.
+
+    :param str path: The location of the file.
+    :raises ValueError: if the file is not a template library.
+    :raises ValueError: if the file was written by a newer version."""
+
+    def __init__(self, path):
+        self._path = path
+        self._data = np.memmap(path, dtype=np.uint8, mode="r")
+        if len(self._data) < HEADER.size or (
+         self._data[:4].tobytes() != MAGIC
+        ):
+            raise ValueError("{} is not a template library".format(path))
+        magic, version, templates, residues, strings, size = HEADER.unpack(
+         self._data[:HEADER.size].tobytes()
+        )
+        if version > VERSION:
+            raise ValueError("{} is a version {} template library".format(
+             path, version
+            ))
+        sections, position = [], HEADER.size
+        shapes = _section_shapes(templates, residues, strings, size)
+        for dtype, shape in shapes:
+            dtype = np.dtype(dtype)
+            length = int(np.prod(shape)) * dtype.itemsize
+            sections.append(self._data[position:position + length].view(
+             dtype
+            ).reshape(shape))
+            position += _padded(length)
+        (self._offsets, self._coordinates, self._metal_locations,
+         self._template_strings, self._residue_strings, self._string_offsets,
+         self._strings) = sections
+
+
+    def __repr__(self):
+        return "<TemplateLibrary ({} templates, {} residues)>".format(
+         len(self), self.residue_count
+        )
+
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [
+             self._template(i) for i in range(*index.indices(len(self)))
+            ]
+        return self._template(self._index(index))
+
+
+    def __iter__(self):
+        for index in range(len(self)): yield self._template(index)
+
+
+    @property
+    def path(self):
+        """The location of the file.
+
+        :rtype: ``str``"""
+
+        return self._path
+
+
+    @property
+    def residue_count(self):
+        """The number of residues in all the templates together.
+
+        :rtype: ``int``"""
+
+        return len(self._coordinates)
+
+
+    @property
+    def sizes(self):
+        """The number of residues in each template.
+
+        :rtype: ``numpy.ndarray``"""
+
+        return np.diff(self._offsets)
+
+
+    def coordinates(self, index):
+        """Returns the (R, 2, 3) CA and CB coordinates of one template, as a
+        view of the file rather than a copy.
+
+        :param int index: The template to look at.
+        :raises IndexError: if there is no such template.
+        :rtype: ``numpy.ndarray``"""
+
+        index = self._index(index)
+        start, end = self._offsets[index], self._offsets[index + 1]
+        return self._coordinates[start:end]
+
+
+    def metals(self):
+        """Returns the element of every template's metal, reading only those
+        and not the templates themselves.
+
+        :rtype: ``list``"""
+
+        return [
+         self._string(number) for number in self._template_strings[:, 0]
+        ]
+
+
+    def _index(self, index):
+        """Checks a template index, and turns a negative index into the
+        positive one it stands for.
+
+        :param int index: The index to check.
+        :raises IndexError: if there is no such template.
+        :rtype: ``int``"""
+
+        if not -len(self) <= index < len(self):
+            raise IndexError("{} has no template {}".format(self, index))
+        return int(index) % len(self)
+
+
+    def _template(self, index):
+        """Reads one template from the file.
+
+        :param int index: The template to read.
+        :rtype: :py:class:`.SiteTemplate`"""
+
+        start, end = self._offsets[index], self._offsets[index + 1]
+        metal, metal_id, source = self._template_strings[index]
+        labels = self._residue_strings[start:end]
+        return SiteTemplate(
+         self._coordinates[start:end],
+         [self._string(number) for number in labels[:, 0]],
+         [self._string(number) for number in labels[:, 1]],
+         self._string(metal), metal_id=self._string(metal_id),
+         metal_location=self._metal_locations[index],
+         source=self._string(source)
+        )
+
+
+    def _string(self, number):
+        """Reads a string from the file's string table, where -1 stands for
+        ``None``.
+
+        :param int number: The number of the string.
+        :rtype: ``str``"""
+
+        if number < 0: return None
+        return self._strings[
+         self._string_offsets[number]:self._string_offsets[number + 1]
+        ].tobytes().decode("utf-8")
+
+
+
+def save_templates(path, templates):
+    """Writes site templates to a single binary file that
+    :py:class:`.TemplateLibrary` can open. The templates are written to a
+    temporary file beside the path which then replaces it, so a library is
+    never left half-written - if writing fails, the temporary file is deleted.
+
+    Templates can be :py:class:`.SiteTemplate` objects or the atomium
+    structures made by :py:func:`.create_site_template` - these have no
+    metal, and their residue IDs are taken from their atoms' residues.
+    Sources other than strings, such as positions in a sequence, are stored
+    as strings.
+
+    :param str path: The location to write to.
+    :param templates: An iterable of templates, such as the generator that\
+    :py:func:`.site_templates_many` gives.
+    :raises TypeError: if a template is not a template.
+    :raises ValueError: if an atomium template's residues cannot be matched\
+    up with its CA and CB atoms.
+    :rtype: ``int``"""
+
+    strings, offsets, coordinates, locations = {}, [0], [], []
+    template_strings, residue_strings = [], []
+    def number(value):
+        if value is None: return -1
+        return strings.setdefault(str(value), len(strings))
+    for template in templates:
+        template = _as_site_template(template)
+        coordinates.append(template.coordinates)
+        offsets.append(offsets[-1] + len(template))
+        locations.append(template.metal_location)
+        template_strings.append([
+         number(template.metal), number(template.metal_id),
+         number(template.source)
+        ])
+        residue_strings.extend(zip(
+         map(number, template.residue_ids), map(number, template.residue_names)
+        ))
+    encoded = [string.encode("utf-8") for string in strings]
+    string_offsets = np.cumsum([0] + [len(string) for string in encoded])
+    arrays = [
+     offsets, np.concatenate(coordinates) if coordinates else [], locations,
+     template_strings, residue_strings, string_offsets,
+     np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    ]
+    counts = (len(offsets) - 1, offsets[-1], len(encoded), string_offsets[-1])
+    temporary = "{}.{}.tmp".format(path, os.getpid())
+    try:
+        with open(temporary, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, *counts))
+            for array, (dtype, shape) in zip(arrays, _section_shapes(*counts)):
+                data = np.array(array, dtype=dtype).reshape(shape).tobytes()
+                f.write(data + bytes(_padded(len(data)) - len(data)))
+        os.replace(temporary, path)
+    except BaseException:
+        if os.path.exists(temporary): os.remove(temporary)
+        raise
+    return len(offsets) - 1
+
+
+def _as_site_template(template):
+    """Makes sure a template is a :py:class:`.SiteTemplate`, converting the
+    atomium structures that :py:func:`.create_site_template` makes.
+
+    :param template: The template.
+    :raises TypeError: if the template is not a template.
+    :raises ValueError: if the template's residue IDs, residue names and\
+    coordinates are not all the same length.
+    :rtype: :py:class:`.SiteTemplate`"""
+
+    if isinstance(template, SiteTemplate): return template
+    coordinates, names = _template_arrays(template)
+    residues = []
+    for atom in sorted(template.atoms(), key=lambda atom: atom.id):
+        if atom.residue not in residues: residues.append(atom.residue)
+    ids = [residue.id for residue in residues if residue is not None and (
+     residue.atom(name="CA") and residue.atom(name="CB")
+    )]
+    if not len(ids) == len(names) == len(coordinates):
+        raise ValueError(
+         "{} has {} residue IDs, {} residue names and {} CA/CB pairs".format(
+          template, len(ids), len(names), len(coordinates)
+         )
+        )
+    return SiteTemplate(coordinates, ids, names, "")
+
+
+def _section_shapes(templates, residues, strings, size):
+    """Gives the data type and shape of each array in a template library.
+
+    :param int templates: The number of templates.
+    :param int residues: The number of residues in all the templates.
+    :param int strings: The number of strings in the string table.
+    :param int size: The number of bytes in the string table.
+    :rtype: ``list``"""
+
+    return [
+     ("<i8", (templates + 1,)), ("<f8", (residues, 2, 3)),
+     ("<f8", (templates, 3)), ("<i4", (templates, 3)),
+     ("<i4", (residues, 2)), ("<i8", (strings + 1,)), ("u1", (size,))
+    ]
+
+
+def _padded(length):
+    """Rounds a number of bytes up to a multiple of eight.
+
+    :param int length: The number of bytes.
+    :rtype: ``int``"""
+
+    return -(-length // 8) * 8
+
+
+
+MAGIC = b"BMTL"
+VERSION = 1
+HEADER = struct.Struct("<4sIQQQQ")
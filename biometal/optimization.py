@@ -0,0 +1,281 @@
+"""Contains functions for finding the points of greatest hydrophobic
+contrast."""
+
+from math import ceil, floor
+import numpy as np
+from atomium.structures import Model
+from .hydrophobicity import _atom_arrays, _parameters, _centre_array
+from .spatial import CellGrid, SpatialIndex, NeighbourList
+
+def optimize_contrast(model, start, radius, pc=False, het=True, metal=True,
+                      width=0, step=0.5, tolerance=0.001, iterations=500,
+                      index=None):
+    """Moves a sphere from a starting point to the nearby point at which its
+    hydrophobic contrast is a local maximum, by following the analytic
+    gradient of the contrast with respect to the sphere's centre.
+
+    Within a fixed set of atoms the contrast changes linearly as the centre
+    moves, and it jumps whenever an atom crosses the sphere's edge. If a
+    ``width`` is given, atoms are instead faded out smoothly over that
+    distance inside the edge, which gives the optimizer a smooth surface to
+    climb before it finishes on the ordinary contrast. Either way, the
+    contrast returned is the ordinary contrast at the final point, as
+    :py:func:`.hydrophobic_contrast` would give.
+
+    :param Model model: The atomium model to examine.
+    :param start: The (x, y, z) point to start from.
+    :param radius: The radius of the sphere.
+    :param bool pc: If ``True``, atomic partial charges will be used instead of\
+    atomic solvation parameters (squared).
+    :param bool het: If ``False``, only atoms that have a residue will be\
+    considered.
+    :param bool metal: If ``False``, only non-metal atoms will be considered.
+    :param width: The width of the switching region at the sphere's edge.
+    :param step: The length of the first step taken.
+    :param tolerance: The step length below which the search stops.
+    :param int iterations: The maximum number of steps to try.
+    :param SpatialIndex index: If given, this index of the model's atoms will\
+    be used to find the atoms in the sphere.
+    :raises TypeError: if the model is not an atomium model object.
+    :raises TypeError: if the start is not an (x, y, z) point.
+    :raises TypeError: if the radius or width is not numeric.
+    :raises ValueError: if the radius is negative.
+    :raises ValueError: if the width is negative or greater than the radius.
+    :rtype: ``tuple`` of ((x, y, z), contrast)"""
+
+    surface = _ContrastSurface(
+     model, radius, pc=pc, het=het, metal=metal, width=width, index=index
+    )
+    starts = _centre_array([start])
+    point, value, _ = surface.climb(starts[0], step, tolerance, iterations)
+    return tuple(point.tolist()), value
+
+
+def contrast_maxima(model, radius, starts="grid", spacing=4, pc=False,
+                    het=True, metal=True, width=0, separation=1, step=0.5,
+                    tolerance=0.001, iterations=500, index=None):
+    """Finds the local maxima of hydrophobic contrast in a model by running
+    :py:func:`.optimize_contrast` from many starting points. Maxima found
+    from more than one start are merged, and points whose sphere contains no
+    atoms are discarded.
+
+    The starting points can be ``"grid"`` (a grid with the given spacing over
+    the model's atoms), ``"atoms"`` (the location of every atom that passes
+    the heteroatom and metal filters), or any list of (x, y, z) points.
+
+    :param Model model: The atomium model to examine.
+    :param radius: The radius of the sphere.
+    :param starts: The points to start from.
+    :param spacing: The distance between grid points, if starting on a grid.
+    :param bool pc: If ``True``, atomic partial charges will be used instead of\
+    atomic solvation parameters (squared).
+    :param bool het: If ``False``, only atoms that have a residue will be\
+    considered.
+    :param bool metal: If ``False``, only non-metal atoms will be considered.
+    :param width: The width of the switching region at the sphere's edge.
+    :param separation: Maxima closer together than this are merged.
+    :param step: The length of the first step taken.
+    :param tolerance: The step length below which each search stops.
+    :param int iterations: The maximum number of steps per search.
+    :param SpatialIndex index: If given, this index of the model's atoms will\
+    be used to find the atoms in the sphere.
+    :raises TypeError: if the model is not an atomium model object.
+    :raises TypeError: if the radius, width or spacing is not numeric.
+    :raises ValueError: if the radius is negative.
+    :raises ValueError: if the width is negative or greater than the radius.
+    :raises ValueError: if the spacing is not positive.
+    :rtype: ``list`` of ((x, y, z), contrast) in descending contrast order."""
+
+    surface = _ContrastSurface(
+     model, radius, pc=pc, het=het, metal=metal, width=width, index=index
+    )
+    if isinstance(starts, str) and starts == "atoms":
+        starts = surface.coordinates
+    elif isinstance(starts, str) and starts == "grid":
+        if not isinstance(spacing, (int, float)):
+            raise TypeError("{} is not a valid spacing".format(spacing))
+        if spacing <= 0:
+            raise ValueError("{} is not a valid spacing".format(spacing))
+        starts = _grid_points(surface.coordinates, spacing)
+    else:
+        starts = _centre_array(starts)
+    maxima = []
+    for start in starts:
+        point, value, count = surface.climb(start, step, tolerance, iterations)
+        if count: maxima.append((point, value))
+    maxima.sort(key=lambda maximum: -maximum[1])
+    kept = []
+    for point, value in maxima:
+        if all(np.sqrt(((point - other) ** 2).sum()) > separation
+         for other, _ in kept):
+            kept.append((point, value))
+    return [(tuple(point.tolist()), value) for point, value in kept]
+
+
+
+class _ContrastSurface:
+    """The hydrophobic contrast of a model as a function of sphere centre,
+    along with its gradient. The atom parameters and the grid used to find
+    atoms near a point are worked out once when this is created, and the atoms
+    near the current point are kept in a :py:class:`.NeighbourList` of that
+    grid as the point moves.
+
+    :param Model model: The atomium model to examine.
+    :param radius: The radius of the sphere.
+    :param bool pc: If ``True``, squared partial charges will be used.
+    :param bool het: If ``False``, only atoms that have a residue will be used.
+    :param bool metal: If ``False``, only non-metal atoms will be used.
+    :param width: The width of the switching region at the sphere's edge.
+    :param SpatialIndex index: An existing index of the model's atoms to use."""
+
+    def __init__(self, model, radius, pc=False, het=True, metal=True, width=0,
+                 index=None):
+        if not isinstance(model, Model):
+            raise TypeError("{} is not a Model".format(model))
+        for value in (radius, width):
+            if not isinstance(value, (int, float)):
+                raise TypeError("{} is not a valid distance".format(value))
+        if radius < 0:
+            raise ValueError("{} is not a valid radius".format(radius))
+        if not 0 <= width <= radius:
+            raise ValueError("{} is not a valid width".format(width))
+        if index is not None and not isinstance(index, SpatialIndex):
+            raise TypeError("{} is not a SpatialIndex".format(index))
+        if index is None:
+            coordinates, self._parameters = _atom_arrays(
+             model, pc=pc, het=het, metal=metal
+            )
+            self._grid, self._mask = CellGrid(coordinates, radius or 1), None
+        else:
+            self._parameters = _parameters(index.atoms, pc=pc)
+            self._grid, self._mask = index, index.mask(het=het, metal=metal)
+        self._radius, self._width = radius, width
+        self._neighbours = NeighbourList(
+         radius, skin=radius / 2, mask=self._mask, grid=self._grid
+        )
+
+
+    @property
+    def coordinates(self):
+        """The coordinates of the atoms that contribute to the contrast.
+
+        :rtype: ``numpy.ndarray``"""
+
+        if self._mask is None: return self._grid.coordinates
+        return self._grid.coordinates[self._mask]
+
+
+    def evaluate(self, point, width=None):
+        """Calculates the contrast at a point, its gradient there, and the
+        (weighted) number of atoms in the sphere.
+
+        :param numpy.ndarray point: The centre of the sphere.
+        :param width: The switching width to use, if not the surface's own.
+        :rtype: ``tuple``"""
+
+        width = self._width if width is None else width
+        _, atoms, squares = self._neighbours.pairs(
+         self._grid.coordinates, [point]
+        )
+        if len(atoms) == 0: return 0.0, np.zeros(3), 0
+        values = self._parameters[atoms]
+        distances = np.sqrt(squares)
+        vectors = point - self._grid.coordinates[atoms]
+        if self._grid.box is not None:
+            vectors = self._grid.box.minimum_image(vectors)
+        if width:
+            t = np.clip(
+             (distances - (self._radius - width)) / width, 0, 1
+            )
+            weights = 1 - (3 * t ** 2) + (2 * t ** 3)
+            slopes = ((6 * t ** 2) - (6 * t)) / width
+        else:
+            weights, slopes = np.ones(len(atoms)), np.zeros(len(atoms))
+        count = weights.sum()
+        if count == 0: return 0.0, np.zeros(3), 0
+        units = np.zeros_like(vectors)
+        nonzero = distances > 0
+        units[nonzero] = vectors[nonzero] / distances[nonzero, None]
+        solvation = (weights * values).sum()
+        square = (weights * squares).sum()
+        product = (weights * values * squares).sum()
+        count_gradient = (slopes[:, None] * units).sum(axis=0)
+        square_terms = (
+         (slopes * squares)[:, None] * units + 2 * weights[:, None] * vectors
+        )
+        solvation_gradient = ((values * slopes)[:, None] * units).sum(axis=0)
+        square_gradient = square_terms.sum(axis=0)
+        product_gradient = (values[:, None] * square_terms).sum(axis=0)
+        contrast = product - count * (solvation / count) * (square / count)
+        gradient = product_gradient - (
+         solvation_gradient * square + solvation * square_gradient
+        ) / count + (solvation * square * count_gradient) / (count ** 2)
+        return contrast, gradient, count
+
+
+    def climb(self, start, step, tolerance, iterations):
+        """Follows the gradient uphill from a starting point until the step
+        length falls below the tolerance or the iterations run out. If the
+        surface has a switching width, the smooth surface is climbed first and
+        the ordinary contrast is then climbed from where that finished.
+
+        The result is the final point, the ordinary contrast there, and the
+        number of atoms in the sphere there.
+
+        :param numpy.ndarray start: The point to start from.
+        :param step: The length of the first step.
+        :param tolerance: The step length below which the search stops.
+        :param int iterations: The maximum number of steps to try.
+        :rtype: ``tuple``"""
+
+        point = np.array(start, dtype=float)
+        for width in ([self._width, 0] if self._width else [0]):
+            point = self._ascend(point, step, tolerance, iterations, width)
+        contrast, _, count = self.evaluate(point, width=0)
+        return point, float(contrast), int(count)
+
+
+    def _ascend(self, point, step, tolerance, iterations, width):
+        """Takes steps up the gradient of the surface with a given switching
+        width. Steps that do not improve the value are retried at half the
+        length, and steps that do are lengthened for the next iteration.
+
+        :param numpy.ndarray point: The point to start from.
+        :param step: The length of the first step.
+        :param tolerance: The step length below which the search stops.
+        :param int iterations: The maximum number of steps to try.
+        :param width: The switching width to use.
+        :rtype: ``numpy.ndarray``"""
+
+        value, gradient, _ = self.evaluate(point, width=width)
+        for iteration in range(iterations):
+            norm = np.sqrt((gradient ** 2).sum())
+            if norm == 0 or step < tolerance: break
+            trial = point + (step / norm) * gradient
+            trial_value, trial_gradient, _ = self.evaluate(trial, width=width)
+            if trial_value > value:
+                point, value, gradient = trial, trial_value, trial_gradient
+                step *= 1.5
+            else:
+                step /= 2
+        return point
+
+
+
+def _grid_points(coordinates, spacing):
+    """Returns the points of a grid covering some coordinates, with every
+    point at a multiple of the spacing.
+
+    :param numpy.ndarray coordinates: The (N, 3) coordinates to cover.
+    :param spacing: The distance between grid points.
+    :rtype: ``numpy.ndarray``"""
+
+    if len(coordinates) == 0: return np.zeros((0, 3))
+    axes = [np.arange(
+     floor(low / spacing), ceil(high / spacing) + 1
+    ) * spacing for low, high in zip(
+     coordinates.min(axis=0), coordinates.max(axis=0)
+    )]
+    return np.stack(
+     np.meshgrid(*axes, indexing="ij"), axis=-1
+    ).reshape(-1, 3)
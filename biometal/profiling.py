@@ -0,0 +1,174 @@
+"""Contains tools for measuring where biometal spends its time."""
+
+from contextlib import contextmanager
+import threading
+from time import perf_counter
+
+class _Recording(threading.local):
+    """The profiles that are active in a thread. Each thread has its own, so
+    work done in one thread is never recorded in another's profile."""
+
+    def __init__(self):
+        self.profiles = []
+
+
+
+_recording = _Recording()
+
+class Profile:
+    """A record of how often biometal's functions did each kind of work while
+    profiling was switched on, and of how long each kind of work took.
+
+    Counters are numbers of things - spheres looked at, atoms visited,
+    parameters looked up, and hits and misses in the parameter cache. Timers
+    are cumulative times in seconds for each phase of a calculation - finding
+    the atoms in spheres, looking up their parameters, and the distance
+    arithmetic."""
+
+    def __init__(self):
+        self._counters, self._timers = {}, {}
+
+
+    def __repr__(self):
+        return "<Profile ({} counters, {} timers)>".format(
+         len(self._counters), len(self._timers)
+        )
+
+
+    @property
+    def counters(self):
+        """The counters recorded so far.
+
+        :rtype: ``dict``"""
+
+        return dict(self._counters)
+
+
+    @property
+    def timers(self):
+        """The cumulative time, in seconds, of each phase recorded so far.
+
+        :rtype: ``dict``"""
+
+        return dict(self._timers)
+
+
+    def add(self, name, amount=1):
+        """Adds to one of the profile's counters.
+
+        :param str name: The counter to add to.
+        :param int amount: How much to add."""
+
+        self._counters[name] = self._counters.get(name, 0) + amount
+
+
+    def add_time(self, name, seconds):
+        """Adds to one of the profile's timers.
+
+        :param str name: The timer to add to.
+        :param float seconds: The time to add."""
+
+        self._timers[name] = self._timers.get(name, 0) + seconds
+
+
+    def reset(self):
+        """Sets all the counters and timers back to nothing."""
+
+        self._counters, self._timers = {}, {}
+
+
+    def as_dict(self):
+        """Returns the counters and timers as a plain ``dict``, ready to be
+        serialised.
+
+        :rtype: ``dict``"""
+
+        return {"counters": self.counters, "timers": self.timers}
+
+
+
+@contextmanager
+def profile():
+    """Switches profiling on for the duration of a ``with`` block, and yields
+    the :py:class:`.Profile` that biometal's functions record their work in.
+    Profiles can be nested, in which case the work is recorded in all of them.
+
+    A profile only records work done in the thread that started it, so
+    threads - such as those of an :py:class:`.AnalysisService` - can each
+    profile their own work at the same time.
+
+    When no profile is active, the only cost to biometal's functions is a check
+    of whether one is.
+
+        >>> with biometal.profile() as p:
+        ...     biometal.hydrophobic_contrast(model, 0, 0, 0, 8)
+        >>> p.as_dict()
+
+    :rtype: :py:class:`.Profile`"""
+
+    recorder = Profile()
+    profiles = _recording.profiles
+    profiles.append(recorder)
+    try:
+        yield recorder
+    finally:
+        profiles.remove(recorder)
+
+
+def active():
+    """Returns ``True`` if any profile is currently recording in this thread.
+
+    :rtype: ``bool``"""
+
+    return bool(_recording.profiles)
+
+
+def count(name, amount=1):
+    """Adds to a counter in every profile active in this thread.
+
+    :param str name: The counter to add to.
+    :param int amount: How much to add."""
+
+    for recorder in _recording.profiles: recorder.add(name, amount)
+
+
+def phase(name):
+    """Returns a context manager which adds the time spent inside it to a
+    timer in every active profile. If there are none, it does nothing.
+
+    :param str name: The timer to add to.
+    :rtype: ``contextmanager``"""
+
+    return _timed(name) if _recording.profiles else _UNTIMED
+
+
+
+@contextmanager
+def _timed(name):
+    """Times the body of a ``with`` block and adds the time to a timer in
+    every active profile.
+
+    :param str name: The timer to add to."""
+
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        seconds = perf_counter() - start
+        for recorder in _recording.profiles: recorder.add_time(name, seconds)
+
+
+
+class _Untimed:
+    """A context manager that does nothing, used when no profile is active."""
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args):
+        return False
+
+
+
+_UNTIMED = _Untimed()
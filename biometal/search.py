@@ -0,0 +1,567 @@
+"""Contains tools for finding the places in many structures that look like a
+metal binding site template."""
+
+from itertools import combinations, permutations, product
+from math import ceil, floor
+import numpy as np
+from atomium.structures import Model
+from .spatial import CellGrid, _expand_ranges
+from .tables import AtomTable
+from .files import load_table
+from .templates import _residue_index, _atom_index, _template_arrays
+from .superposition import superpose, superpose_many
+
+class TemplateIndex:
+    """An index of the residues of many structures, for finding the places in
+    them that match a site template by geometric hashing.
+
+    Every residue with a CA and a CB atom is a point pair, and every triplet
+    of residues whose CB atoms are all within the span of each other is
+    hashed by its three CA-CA and three CB-CB distances, each rounded down
+    to a multiple of the bin size. The distances are sorted before hashing,
+    so the hash does not depend on the order of the residues. A search
+    hashes the triplets of the template in the same way and looks up every
+    bin within the tolerance of each distance, so only triplets of
+    about the right shape are ever superposed on the template.
+
+    Structures can be added at any time, and the index is sorted when it is
+    next searched.
+
+    :param span: The largest CB-CB distance within an indexed triplet.
+    :param bin_size: The width of the distance bins.
+    :raises TypeError: if the span or bin size is not numeric.
+    :raises ValueError: if the span or bin size is not positive.
+    :raises ValueError: if the span is too many bins wide to hash."""
+
+    def __init__(self, span=10, bin_size=1):
+        for value in (span, bin_size):
+            if not isinstance(value, (int, float)):
+                raise TypeError("{} is not a valid distance".format(value))
+            if value <= 0:
+                raise ValueError("{} is not a valid distance".format(value))
+        self._span, self._bin_size = span, bin_size
+        self._base = int(ceil((span + 2 * CA_CB_REACH) / bin_size)) + 1
+        if self._base > 1000:
+            raise ValueError("{} is too many bins of {} to hash".format(
+             span, bin_size
+            ))
+        self._structures, self._chunks = [], []
+        self._keys, self._entries, self._distances = None, None, None
+
+
+    def __repr__(self):
+        return "<TemplateIndex ({} structures, {} triplets)>".format(
+         len(self), self.triplet_count
+        )
+
+
+    def __len__(self):
+        return len(self._structures)
+
+
+    @property
+    def span(self):
+        """The largest CB-CB distance within an indexed triplet.
+
+        :rtype: ``float``"""
+
+        return self._span
+
+
+    @property
+    def bin_size(self):
+        """The width of the distance bins that triplets are hashed by.
+
+        :rtype: ``float``"""
+
+        return self._bin_size
+
+
+    @property
+    def triplet_count(self):
+        """The number of residue triplets in the index.
+
+        :rtype: ``int``"""
+
+        return sum(len(keys) for keys, _, _ in self._chunks)
+
+
+    def add(self, structure, source=None):
+        """Adds a structure's residues to the index.
+
+        :param structure: The atomium model or :py:class:`.AtomTable` to add,\
+        or the path to a .pdb or .cif file to read one from.
+        :param source: A label for the structure, given with any matches in\
+        it. For a path, this is the path unless given.
+        :raises TypeError: if the structure is not a model, table or path.
+        :rtype: ``int``"""
+
+        if isinstance(structure, str):
+            if source is None: source = structure
+            structure = load_table(structure)
+        if isinstance(structure, Model):
+            structure = AtomTable.from_model(structure)
+        if not isinstance(structure, AtomTable):
+            raise TypeError("{} is not a Model or AtomTable".format(structure))
+        coordinates, ids, names = _structure_residues(structure)
+        number = len(self._structures)
+        self._structures.append((source, coordinates, ids, names))
+        triplets = _triplets(coordinates, self._span)
+        entries = np.zeros((len(triplets), 4), dtype=np.int32)
+        entries[:, 0], entries[:, 1:] = number, triplets
+        distances = _triplet_distances(coordinates, triplets)
+        self._chunks.append((
+         self._hash(distances), entries, distances.astype(np.float32)
+        ))
+        self._keys = None
+        return number
+
+
+    def add_many(self, structures):
+        """Adds many structures to the index, one at a time. Structures read
+        from a path are labelled with the path, and others with their position
+        in the index.
+
+        :param structures: An iterable of atomium models,\
+        :py:class:`.AtomTable` objects or paths to .pdb or .cif files.
+        :raises TypeError: if a structure is not a model, table or path."""
+
+        for structure in structures:
+            self.add(structure, source=structure if isinstance(
+             structure, str
+            ) else len(self))
+
+
+    def search(self, template, tolerance=0.5, distance=1.5, max_rmsd=1,
+               min_residues=None, same_residues=False, limit=None):
+        """Finds the places in the indexed structures that match a template.
+
+        Every triplet of the template's residues that fits within the span is
+        looked up, and each triplet found is superposed on it in all six
+        residue orders. The superposition of each close enough triplet is
+        then applied to the whole template, the nearest residue of the
+        structure to each template residue is taken as its match, and
+        everything matched is superposed again to give the RMSD.
+
+        :param template: The :py:class:`.SiteTemplate` to look for, or an\
+        atomium structure of CA and CB atoms as made by\
+        :py:func:`.create_site_template`.
+        :param tolerance: How far each distance in a triplet may be from the\
+        template's.
+        :param distance: How far a residue may be from a template residue once\
+        superposed, as the RMSD of their CA and CB atoms, to match it.
+        :param max_rmsd: The largest RMSD of a match.
+        :param int min_residues: The fewest template residues that must match\
+        (by default, all of them).
+        :param bool same_residues: If ``True``, residues only match template\
+        residues of the same name.
+        :param int limit: The most matches to return.
+        :raises TypeError: if the template is not a template.
+        :raises ValueError: if the template has fewer than three residues.
+        :rtype: ``list`` of :py:class:`.TemplateMatch`"""
+
+        coordinates, names = _template_arrays(template)
+        if len(coordinates) < 3:
+            raise ValueError(
+             "{} has fewer than three residues".format(template)
+            )
+        needed = len(coordinates) if min_residues is None else min_residues
+        self._sort()
+        matches, seen = {}, set()
+        for seed, triplet in self._seeds(coordinates, tolerance):
+            structure, residues = seed[0], tuple(seed[1:])
+            if (structure, residues) in seen: continue
+            match = self._verify(
+             structure, residues, triplet, coordinates, names, tolerance,
+             distance, max_rmsd, needed, same_residues
+            )
+            if match is None: continue
+            matched = tuple(sorted(
+             residue for residue in match.residue_numbers if residue >= 0
+            ))
+            seen.update(
+             (structure, combination) for combination in combinations(
+              matched, 3
+             )
+            )
+            key = (structure, matched)
+            if key not in matches or match.rmsd < matches[key].rmsd:
+                matches[key] = match
+        ranked = sorted(
+         matches.values(), key=lambda match: (-len(match), match.rmsd)
+        )
+        return ranked if limit is None else ranked[:limit]
+
+
+    def _hash(self, distances):
+        """Turns residue triplets into integer hash keys, from their sorted
+        CA-CA and CB-CB distances.
+
+        :param numpy.ndarray distances: The (T, 6) distances of each triplet.
+        :rtype: ``numpy.ndarray``"""
+
+        bins = np.floor(distances / self._bin_size).astype(np.int64)
+        return self._encode(np.minimum(bins, self._base - 1))
+
+
+    def _encode(self, bins):
+        """Combines six distance bins into a single integer key.
+
+        :param numpy.ndarray bins: The (T, 6) distance bins.
+        :rtype: ``numpy.ndarray``"""
+
+        return (bins * self._base ** np.arange(6)).sum(axis=1).astype(np.int64)
+
+
+    def _sort(self):
+        """Combines everything added since the last search into one sorted
+        array of keys."""
+
+        if self._keys is not None: return
+        keys, entries, distances = [np.concatenate(arrays) for arrays in zip(
+         (np.zeros(0, np.int64), np.zeros((0, 4), np.int32),
+         np.zeros((0, 6), np.float32)), *self._chunks
+        )]
+        order = np.argsort(keys, kind="stable")
+        self._keys, self._entries = keys[order], entries[order]
+        self._distances = distances[order]
+        self._chunks = [(self._keys, self._entries, self._distances)]
+
+
+    def _seeds(self, coordinates, tolerance):
+        """Looks up the indexed triplets that could match each of a template's
+        triplets, yielding each one found along with the template triplet.
+        Every distance of a triplet yielded is within the tolerance of the
+        template triplet's, not just in a bin that might be.
+
+        :param numpy.ndarray coordinates: The (R, 2, 3) template coordinates.
+        :param tolerance: How far each distance may be from the template's.
+        :rtype: ``generator``"""
+
+        triplets = np.array(list(combinations(range(len(coordinates)), 3)))
+        distances = _triplet_distances(coordinates, triplets)
+        for triplet, values in zip(triplets, distances):
+            if values[3:].max() > self._span + tolerance: continue
+            ranges = [range(
+             max(floor((value - tolerance) / self._bin_size), 0),
+             min(floor((value + tolerance) / self._bin_size), self._base - 1)
+             + 1
+            ) for value in values]
+            keys = self._encode(np.array(list(product(*ranges))))
+            starts = np.searchsorted(self._keys, keys, side="left")
+            ends = np.searchsorted(self._keys, keys, side="right")
+            found = _expand_ranges(starts, ends - starts)
+            found = found[(np.abs(
+             self._distances[found] - values
+            ) <= tolerance).all(axis=1)]
+            for seed in self._entries[found]: yield seed, triplet
+
+
+    def _verify(self, structure, residues, triplet, coordinates, names,
+                tolerance, distance, max_rmsd, needed, same_residues):
+        """Superposes a template on a structure by way of a seed triplet, and
+        returns the match this gives if it is good enough.
+
+        :param int structure: The number of the structure.
+        :param tuple residues: The structure's seed triplet.
+        :param numpy.ndarray triplet: The template's triplet.
+        :param numpy.ndarray coordinates: The (R, 2, 3) template coordinates.
+        :param tuple names: The template's residue names.
+        :param tolerance: How far the seed may be from the template triplet.
+        :param distance: How far a residue may be from a template residue.
+        :param max_rmsd: The largest RMSD of a match.
+        :param int needed: The fewest template residues that must match.
+        :param bool same_residues: If ``True``, residue names must match.
+        :rtype: :py:class:`.TemplateMatch`"""
+
+        source, target, ids, target_names = self._structures[structure]
+        mobile = coordinates[triplet].reshape(-1, 3)
+        orders = np.array(residues)[ORDERS]
+        if same_residues:
+            orders = orders[(
+             np.array(target_names)[orders] == np.array(names)[triplet]
+            ).all(axis=1)]
+        points = target[orders]
+        points = points[(np.abs(
+         _edge_lengths(points) - _edge_lengths(coordinates[triplet])
+        ) <= tolerance).all(axis=(1, 2))]
+        if len(points) == 0: return None
+        rotations, translations, rmsds = superpose_many(
+         np.repeat(mobile[None], len(points), axis=0),
+         points.reshape(len(points), -1, 3)
+        )
+        best = np.argmin(rmsds)
+        if rmsds[best] > tolerance: return None
+        rotation, translation = rotations[best], translations[best]
+        moved = coordinates @ rotation.T + translation
+        deviations = np.sqrt(((
+         moved[:, None] - target[None]
+        ) ** 2).sum(axis=3).mean(axis=2))
+        if same_residues:
+            deviations[np.array(names)[:, None] != np.array(target_names)] = (
+             np.inf
+            )
+        numbers = _assign(deviations, distance)
+        matched = numbers >= 0
+        if matched.sum() < max(needed, 3): return None
+        rotation, translation, rmsd = superpose(
+         coordinates[matched].reshape(-1, 3),
+         target[numbers[matched]].reshape(-1, 3)
+        )
+        if rmsd > max_rmsd: return None
+        return TemplateMatch(
+         source, structure, numbers,
+         tuple(ids[n] if n >= 0 else None for n in numbers),
+         rmsd, rotation, translation
+        )
+
+
+
+class TemplateMatch:
+    """A place in an indexed structure that matches a template - which
+    residue of the structure matches each residue of the template, and how
+    well they superpose.
+
+    :param source: The label of the structure.
+    :param int structure: The number of the structure in its index.
+    :param numpy.ndarray residue_numbers: The number of the structure's\
+    residue matching each template residue, or -1 where none does.
+    :param tuple residue_ids: The ID of the structure's residue matching each\
+    template residue, or ``None`` where none does.
+    :param float rmsd: The RMSD of the matched CA and CB atoms once superposed.
+    :param numpy.ndarray rotation: The rotation that superposes the template\
+    on the structure.
+    :param numpy.ndarray translation: The translation that follows it."""
+
+    __slots__ = [
+     "_source", "_structure", "_numbers", "_ids", "_rmsd", "_rotation",
+     "_translation"
+    ]
+
+    def __init__(self, source, structure, residue_numbers, residue_ids, rmsd,
+                 rotation, translation):
+        self._source, self._structure = source, structure
+        self._numbers = np.array(residue_numbers, dtype=int)
+        self._ids, self._rmsd = tuple(residue_ids), rmsd
+        self._rotation, self._translation = rotation, translation
+
+
+    def __repr__(self):
+        return "<TemplateMatch in {} ({} residues, RMSD {:.3f})>".format(
+         self._source, len(self), self._rmsd
+        )
+
+
+    def __len__(self):
+        return int((self._numbers >= 0).sum())
+
+
+    @property
+    def source(self):
+        """The label of the structure the match is in.
+
+        :rtype: ``str``"""
+
+        return self._source
+
+
+    @property
+    def structure(self):
+        """The number of the structure in the index that was searched.
+
+        :rtype: ``int``"""
+
+        return self._structure
+
+
+    @property
+    def residue_numbers(self):
+        """The number of the structure's residue matching each template
+        residue, or -1 where none does.
+
+        :rtype: ``numpy.ndarray``"""
+
+        return self._numbers
+
+
+    @property
+    def residue_ids(self):
+        """The ID of the structure's residue matching each template residue,
+        or ``None`` where none does.
+
+        :rtype: ``tuple``"""
+
+        return self._ids
+
+
+    @property
+    def rmsd(self):
+        """The RMSD of the matched CA and CB atoms once superposed.
+
+        :rtype: ``float``"""
+
+        return self._rmsd
+
+
+    @property
+    def rotation(self):
+        """The rotation matrix that superposes the template on the structure.
+
+        :rtype: ``numpy.ndarray``"""
+
+        return self._rotation
+
+
+    @property
+    def translation(self):
+        """The translation that superposes the template on the structure,
+        applied after the rotation.
+
+        :rtype: ``numpy.ndarray``"""
+
+        return self._translation
+
+
+
+def search_templates(template, structures, span=10, bin_size=1, **kwargs):
+    """Indexes some structures and searches them for a template in one go.
+    To search the same structures for more than one template, make a
+    :py:class:`.TemplateIndex` once instead.
+
+    :param template: The :py:class:`.SiteTemplate` to look for, or an\
+    atomium structure of CA and CB atoms.
+    :param structures: An iterable of atomium models, :py:class:`.AtomTable`\
+    objects or paths to .pdb or .cif files.
+    :param span: The largest CB-CB distance within an indexed triplet.
+    :param bin_size: The width of the distance bins.
+    :param \\*\\*kwargs: Any options to pass to\
+    :py:meth:`.TemplateIndex.search`.
+    :rtype: ``list`` of :py:class:`.TemplateMatch`"""
+
+    index = TemplateIndex(span=span, bin_size=bin_size)
+    index.add_many(structures)
+    return index.search(template, **kwargs)
+
+
+def _structure_residues(table):
+    """Finds every residue in a table with both a CA and a CB atom, in the
+    order they first appear, and gives their coordinates, IDs and names.
+
+    :param AtomTable table: The table to look in.
+    :rtype: ``tuple``"""
+
+    residues, first_rows = _residue_index(table)
+    cas, cbs = [_atom_index(table, residues, name) for name in ("CA", "CB")]
+    kept = np.nonzero((cas >= 0) & (cbs >= 0))[0]
+    kept = kept[np.argsort(first_rows[kept], kind="stable")]
+    rows = np.stack([cas[kept], cbs[kept]], axis=1).reshape(-1, 2)
+    return (
+     table.coordinates[rows].reshape(-1, 2, 3),
+     tuple(table.residue_ids[rows[:, 0]].tolist()),
+     tuple(table.residue_names[rows[:, 0]].tolist())
+    )
+
+
+def _triplets(coordinates, span, chunk=2048):
+    """Finds every triplet of residues whose CB atoms are all within a given
+    distance of each other, each as three increasing residue numbers.
+
+    The neighbouring pairs are kept as a sorted list rather than a matrix, so
+    memory grows with the number of pairs and not with the square of the
+    number of residues. For each pair (i, j), the later neighbours k of i are
+    looked up in the list to see if (j, k) is a pair as well.
+
+    :param numpy.ndarray coordinates: The (R, 2, 3) residue coordinates.
+    :param span: The largest CB-CB distance in a triplet.
+    :param int chunk: How many residues to find the neighbours of, and how\
+    many residue pairs to extend, at once.
+    :rtype: ``numpy.ndarray``"""
+
+    if len(coordinates) < 3: return np.zeros((0, 3), dtype=np.int32)
+    cbs = coordinates[:, 1]
+    grid, firsts, seconds = CellGrid(cbs, span), [], []
+    for start in range(0, len(cbs), chunk):
+        first, second, _ = grid.pairs(cbs[start:start + chunk], span)
+        first += start
+        forward = first < second
+        firsts.append(first[forward])
+        seconds.append(second[forward])
+    first, second = np.concatenate(firsts), np.concatenate(seconds)
+    order = np.lexsort((second, first))
+    first, second = first[order], second[order]
+    keys = first.astype(np.int64) * len(cbs) + second
+    later = np.searchsorted(first, first, side="right") - np.arange(
+     len(first)
+    ) - 1
+    triplets = []
+    for start in range(0, len(first), chunk):
+        edges = np.arange(start, min(start + chunk, len(first)))
+        pairs = np.repeat(edges, later[edges])
+        thirds = second[_expand_ranges(edges + 1, later[edges])]
+        wanted = second[pairs].astype(np.int64) * len(cbs) + thirds
+        found = np.searchsorted(keys, wanted)
+        found[found == len(keys)] = 0
+        match = keys[found] == wanted
+        triplets.append(np.stack([
+         first[pairs][match], second[pairs][match], thirds[match]
+        ], axis=1))
+    return np.concatenate(triplets).astype(np.int32) if triplets else (
+     np.zeros((0, 3), dtype=np.int32)
+    )
+
+
+def _triplet_distances(coordinates, triplets):
+    """Measures the three CA-CA and three CB-CB distances of each of a number
+    of residue triplets, with each set of three sorted.
+
+    :param numpy.ndarray coordinates: The (R, 2, 3) residue coordinates.
+    :param numpy.ndarray triplets: The (T, 3) residue triplets.
+    :rtype: ``numpy.ndarray``"""
+
+    triplets = np.asarray(triplets, dtype=int).reshape(-1, 3)
+    points = coordinates[triplets]
+    edges = points[:, [0, 1, 2]] - points[:, [1, 2, 0]]
+    distances = np.sqrt((edges ** 2).sum(axis=3))
+    return np.concatenate([
+     np.sort(distances[:, :, 0], axis=1), np.sort(distances[:, :, 1], axis=1)
+    ], axis=1)
+
+
+def _edge_lengths(points):
+    """Measures the CA-CA and CB-CB distances of residue triplets, in the
+    order of their residues rather than sorted.
+
+    :param numpy.ndarray points: The (..., 3, 2, 3) residue coordinates.
+    :rtype: ``numpy.ndarray``"""
+
+    return np.sqrt(
+     ((points - points[..., [1, 2, 0], :, :]) ** 2).sum(axis=-1)
+    )
+
+
+def _assign(deviations, distance):
+    """Matches each template residue to the structure residue it deviates from
+    least, if that is within a given distance. Where two template residues
+    would match the same residue, only the closer one does.
+
+    :param numpy.ndarray deviations: The (T, R) deviation of each template\
+    residue from each structure residue.
+    :param distance: The largest deviation of a match.
+    :rtype: ``numpy.ndarray``"""
+
+    numbers = np.full(len(deviations), -1)
+    taken = set()
+    order = np.argsort(deviations.min(axis=1), kind="stable")
+    for template_residue in order:
+        for residue in np.argsort(deviations[template_residue], kind="stable"):
+            if deviations[template_residue, residue] > distance: break
+            if residue not in taken:
+                numbers[template_residue] = residue
+                taken.add(residue)
+                break
+    return numbers
+
+
+
+CA_CB_REACH = 1.6
+ORDERS = np.array(list(permutations(range(3))))
@@ -0,0 +1,518 @@
+"""Contains a long-running HTTP service that answers hydrophobicity and
+template queries about structure files, keeping the structures it has read
+in memory between queries.
+
+Every query is a POST of a JSON object naming a structure file, and every
+answer is JSON. The first query about a file reads it, looks up the
+parameters of all its atoms and sorts them into a grid, and later queries
+about the same file use all of this as it is, so that they only do the work
+of the query itself. The structures are kept in a
+:py:class:`.StructureCache`, which forgets the least recently used of them
+once they take up more memory than it is allowed, and which reads a file
+again if it changes.
+
+- ``POST /solvation`` and ``POST /contrast`` take a ``path``, a list of\
+  (x, y, z) ``centres`` and a ``radius``, along with the ``pc``, ``het`` and\
+  ``metal`` options of :py:func:`.solvation_many`, and give the ``values``\
+  at each centre.
+- ``POST /templates`` takes a ``path`` along with the ``cutoff``,\
+  ``main_chain`` and ``carbon`` options of :py:func:`.site_templates`, and\
+  gives the ``templates`` of its metal sites.
+- ``GET /status`` describes the service and its cache.
+
+Options that are switched on or off must be JSON ``true`` or ``false`` - any
+other value, such as the string ``"false"``, is rejected."""
+
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import sys
+import threading
+from urllib.parse import urlsplit
+import numpy as np
+from .files import load_table
+from .hydrophobicity import _sphere_sums, _centre_array, _solvation, _contrast
+from .jobs import _encode
+from .spatial import CellGrid
+from .templates import site_templates
+
+class CachedStructure:
+    """A structure file read into an :py:class:`.AtomTable`, with its atoms'
+    solvation parameters and partial charges already looked up and its atoms
+    sorted into a :py:class:`.CellGrid`.
+
+    :param str path: The location of the file.
+    :param AtomTable table: The atoms read from it.
+    :param cell_size: The width of the grid's cells."""
+
+    def __init__(self, path, table, cell_size=5):
+        self._path, self._table = path, table
+        for pc in (False, True): table.parameters(pc=pc)
+        self._grid = CellGrid(table.coordinates, cell_size)
+        self._size = sum(
+         value.nbytes for part in (table, self._grid)
+         for value in vars(part).values() if isinstance(value, np.ndarray)
+        )
+
+
+    def __repr__(self):
+        return "<CachedStructure {} ({} atoms)>".format(
+         self._path, len(self._table)
+        )
+
+
+    @property
+    def path(self):
+        """The location of the file.
+
+        :rtype: ``str``"""
+
+        return self._path
+
+
+    @property
+    def table(self):
+        """The atoms read from the file.
+
+        :rtype: :py:class:`.AtomTable`"""
+
+        return self._table
+
+
+    @property
+    def grid(self):
+        """The grid the atoms are sorted into.
+
+        :rtype: :py:class:`.CellGrid`"""
+
+        return self._grid
+
+
+    @property
+    def size(self):
+        """Roughly how many bytes of memory the structure takes up - the
+        total size of its arrays.
+
+        :rtype: ``int``"""
+
+        return self._size
+
+
+    def sphere_sums(self, centres, radius, pc=False, het=True, metal=True):
+        """Gets the four sphere sums that the hydrophobicity measures are
+        made from for each of a number of sphere centres.
+
+        :param centres: The (x, y, z) centres of the spheres.
+        :param radius: The radius of the spheres.
+        :param bool pc: If ``True``, squared partial charges will be used.
+        :param bool het: If ``False``, only atoms that have a residue will be\
+        used.
+        :param bool metal: If ``False``, only non-metal atoms will be used.
+        :raises TypeError: if the centres or radius are not numeric.
+        :raises ValueError: if the centres are not (x, y, z) triples.
+        :raises ValueError: if the radius is negative.
+        :rtype: ``tuple``"""
+
+        centres = _centre_array(centres)
+        if not isinstance(radius, (int, float)):
+            raise TypeError("{} is not a valid radius".format(radius))
+        if radius < 0:
+            raise ValueError("{} is not a valid radius".format(radius))
+        return _sphere_sums(
+         self._table.coordinates, self._table.parameters(pc=pc), centres,
+         radius, grid=self._grid, mask=self._table.mask(het=het, metal=metal)
+        )
+
+
+
+class StructureCache:
+    """Keeps the structures read from files in memory, so that each file is
+    only read once. Once the structures take up more than the cache's
+    maximum size, those used least recently are forgotten - though the
+    structure just asked for is always kept, however big it is. A file is
+    read again if its size or modification time has changed since it was
+    last read.
+
+    The cache can be used from many threads at once, and if several threads
+    ask for the same file at the same time it is only read once.
+
+    :param int max_size: The most bytes the structures can take up.
+    :param cell_size: The width of the cells each structure's atoms are\
+    sorted into.
+    :raises ValueError: if the maximum size is not a positive integer."""
+
+    def __init__(self, max_size=2 ** 30, cell_size=5):
+        if not isinstance(max_size, int) or max_size < 1:
+            raise ValueError("{} is not a positive integer".format(max_size))
+        self._max_size, self._cell_size = max_size, cell_size
+        self._structures, self._loading = OrderedDict(), {}
+        self._lock = threading.Lock()
+        self._hits, self._misses = 0, 0
+
+
+    def __repr__(self):
+        return "<StructureCache ({} structures)>".format(len(self))
+
+
+    def __len__(self):
+        return len(self._structures)
+
+
+    @property
+    def max_size(self):
+        """The most bytes the structures can take up.
+
+        :rtype: ``int``"""
+
+        return self._max_size
+
+
+    @property
+    def size(self):
+        """Roughly how many bytes the structures take up at the moment.
+
+        :rtype: ``int``"""
+
+        with self._lock:
+            return sum(entry.size for entry in self._structures.values())
+
+
+    def info(self):
+        """Returns the hit and miss counts of the cache, along with the
+        number of structures in it and their total and maximum size.
+
+        :rtype: ``dict``"""
+
+        with self._lock:
+            return {
+             "hits": self._hits, "misses": self._misses,
+             "structures": len(self._structures),
+             "size": sum(entry.size for entry in self._structures.values()),
+             "max_size": self._max_size
+            }
+
+
+    def get(self, path):
+        """Returns the structure read from a file, reading it if it is not
+        already in the cache.
+
+        :param str path: The location of the file.
+        :raises FileNotFoundError: if there is no such file.
+        :raises ValueError: if the file is not a .pdb or .cif file.
+        :rtype: :py:class:`.CachedStructure`"""
+
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        key = (path, stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            if key in self._structures:
+                self._structures.move_to_end(key)
+                self._hits += 1
+                return self._structures[key]
+            event = self._loading.get(key)
+            if event is None:
+                event = self._loading[key] = threading.Event()
+                self._misses += 1
+                loading = True
+            else:
+                loading = False
+        if not loading:
+            event.wait()
+            return self.get(path)
+        try:
+            entry = CachedStructure(path, load_table(path), self._cell_size)
+            with self._lock:
+                for old in [old for old in self._structures if old[0] == path]:
+                    del self._structures[old]
+                self._structures[key] = entry
+                self._evict()
+        finally:
+            with self._lock: del self._loading[key]
+            event.set()
+        return entry
+
+
+    def clear(self):
+        """Forgets every structure in the cache."""
+
+        with self._lock: self._structures.clear()
+
+
+    def _evict(self):
+        """Forgets the least recently used structures until the rest take up
+        no more than the maximum size, keeping the most recent one whatever
+        its size. The lock must be held."""
+
+        size = sum(entry.size for entry in self._structures.values())
+        while size > self._max_size and len(self._structures) > 1:
+            size -= self._structures.popitem(last=False)[1].size
+
+
+
+class AnalysisService:
+    """An HTTP server that answers JSON queries about structure files - see
+    :py:mod:`biometal.service` for the queries it understands. Queries are
+    worked out in a pool of threads, so that the server can carry on
+    accepting them while others are being answered.
+
+    :param StructureCache cache: The cache to keep structures in, if not a\
+    new one with the default size.
+    :param int workers: The number of threads to answer queries with.
+    :param str root: If given, only files in this directory can be queried,\
+    and relative paths are relative to it."""
+
+    def __init__(self, cache=None, workers=None, root=None):
+        self._cache = StructureCache() if cache is None else cache
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._root = None if root is None else os.path.realpath(root)
+        self._queries = {
+         "/solvation": self.solvation, "/contrast": self.contrast,
+         "/templates": self.templates
+        }
+
+
+    def __repr__(self):
+        return "<AnalysisService ({} structures)>".format(len(self._cache))
+
+
+    @property
+    def cache(self):
+        """The cache structures are kept in.
+
+        :rtype: :py:class:`.StructureCache`"""
+
+        return self._cache
+
+
+    @property
+    def root(self):
+        """The directory files must be in, if any.
+
+        :rtype: ``str``"""
+
+        return self._root
+
+
+    def solvation(self, query):
+        """Answers a solvation query.
+
+        :param dict query: The query.
+        :rtype: ``dict``"""
+
+        return self._spheres(_solvation, query)
+
+
+    def contrast(self, query):
+        """Answers a hydrophobic contrast query.
+
+        :param dict query: The query.
+        :rtype: ``dict``"""
+
+        return self._spheres(_contrast, query)
+
+
+    def templates(self, query):
+        """Answers a site template query.
+
+        :param dict query: The query.
+        :rtype: ``dict``"""
+
+        path = self._path(query)
+        main_chain = self._option(query, "main_chain", False)
+        carbon = self._option(query, "carbon", True)
+        templates = site_templates(
+         self._cache.get(path).table, cutoff=query.get("cutoff", 4),
+         main_chain=main_chain, carbon=carbon, source=query["path"]
+        )
+        return {"path": query["path"], "templates": _encode(
+         "templates", templates
+        )}
+
+
+    def status(self):
+        """Describes the service and its cache.
+
+        :rtype: ``dict``"""
+
+        return {"status": "ok", "cache": self._cache.info()}
+
+
+    async def start(self, host="127.0.0.1", port=8000):
+        """Starts listening for queries, and returns the server, which keeps
+        serving until it is closed.
+
+        :param str host: The address to listen on.
+        :param int port: The port to listen on - 0 picks any free port.
+        :rtype: ``asyncio.Server``"""
+
+        return await asyncio.start_server(self._handle, host, port)
+
+
+    def _spheres(self, measure, query):
+        """Answers a query about the spheres around some centres.
+
+        :param function measure: The function which turns the four sphere\
+        sums into the values wanted.
+        :param dict query: The query.
+        :raises ValueError: if the query has no centres or radius.
+        :raises ValueError: if an option is not true or false.
+        :rtype: ``dict``"""
+
+        path = self._path(query)
+        for name in ("centres", "radius"):
+            if name not in query:
+                raise ValueError("Query has no {}".format(name))
+        options = {name: self._option(query, name, default) for name, default
+         in (("pc", False), ("het", True), ("metal", True))}
+        sums = self._cache.get(path).sphere_sums(
+         query["centres"], query["radius"], **options
+        )
+        return {"path": query["path"], "values": measure(*sums).tolist()}
+
+
+    def _option(self, query, name, default):
+        """Gets one of a query's true-or-false options.
+
+        :param dict query: The query.
+        :param str name: The option.
+        :param bool default: The value to use if the query does not give one.
+        :raises ValueError: if the option is not a JSON ``true`` or ``false``.
+        :rtype: ``bool``"""
+
+        value = query.get(name, default)
+        if not isinstance(value, bool):
+            raise ValueError("{} must be true or false, not {}".format(
+             name, json.dumps(value)
+            ))
+        return value
+
+
+    def _path(self, query):
+        """Finds the file a query is about, making sure that it is in the
+        service's root directory if it has one.
+
+        :param dict query: The query.
+        :raises ValueError: if the query has no path.
+        :raises PermissionError: if the file is outside the root directory.
+        :rtype: ``str``"""
+
+        path = query.get("path")
+        if not isinstance(path, str) or not path:
+            raise ValueError("Query has no path")
+        if self._root is None: return path
+        full = os.path.realpath(os.path.join(self._root, path))
+        if os.path.commonpath([full, self._root]) != self._root:
+            raise PermissionError("{} is outside the root".format(path))
+        return full
+
+
+    async def _handle(self, reader, writer):
+        """Reads one HTTP request from a connection, answers it, and closes
+        the connection.
+
+        :param asyncio.StreamReader reader: The connection's reader.
+        :param asyncio.StreamWriter writer: The connection's writer."""
+
+        try:
+            status, data = await self._respond(reader)
+        except Exception as e:
+            status, data = 500, {"error": "{}: {}".format(
+             type(e).__name__, e
+            )}
+        body = json.dumps(data).encode("utf-8")
+        writer.write((
+         "HTTP/1.1 {} {}\r\nContent-Type: application/json\r\n"
+         "Content-Length: {}\r\nConnection: close\r\n\r\n"
+        ).format(status, REASONS[status], len(body)).encode("latin-1") + body)
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+
+    async def _respond(self, reader):
+        """Reads an HTTP request and works out the status and JSON data to
+        answer it with.
+
+        :param asyncio.StreamReader reader: The connection's reader.
+        :rtype: ``tuple``"""
+
+        try:
+            method, target, _ = (await reader.readline()).decode(
+             "latin-1"
+            ).split()
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode("latin-1").strip()
+                if not line: break
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+            length = int(headers.get("content-length", 0))
+        except ValueError:
+            return 400, {"error": "Request is not valid HTTP"}
+        if length > MAX_BODY:
+            return 413, {"error": "Request body is too large"}
+        body = await reader.readexactly(length) if length > 0 else b""
+        path = urlsplit(target).path
+        if path == "/status":
+            if method != "GET": return 405, {"error": "Use GET"}
+            return 200, self.status()
+        if path not in self._queries:
+            return 404, {"error": "There is no {} query".format(path)}
+        if method != "POST": return 405, {"error": "Use POST"}
+        try:
+            query = json.loads(body.decode("utf-8"))
+        except ValueError:
+            return 400, {"error": "Request body is not JSON"}
+        if not isinstance(query, dict):
+            return 400, {"error": "Request body is not a JSON object"}
+        try:
+            data = await asyncio.get_running_loop().run_in_executor(
+             self._executor, self._queries[path], query
+            )
+        except FileNotFoundError as e:
+            return 404, {"error": "No such file: {}".format(e.filename)}
+        except PermissionError as e:
+            return 403, {"error": str(e)}
+        except (TypeError, ValueError) as e:
+            return 400, {"error": str(e)}
+        return 200, data
+
+
+
+def serve(host="127.0.0.1", port=8000, max_size=2 ** 30, workers=None,
+          root=None):
+    """Runs an :py:class:`.AnalysisService` until the process is stopped.
+
+    :param str host: The address to listen on.
+    :param int port: The port to listen on.
+    :param int max_size: The most bytes the cached structures can take up.
+    :param int workers: The number of threads to answer queries with.
+    :param str root: If given, only files in this directory can be queried.
+    :raises ValueError: if the maximum size is not a positive integer."""
+
+    service = AnalysisService(
+     cache=StructureCache(max_size=max_size), workers=workers, root=root
+    )
+    async def run():
+        server = await service.start(host, port)
+        address = server.sockets[0].getsockname()
+        print("Serving on http://{}:{}".format(*address[:2]), file=(
+         sys.stderr
+        ))
+        async with server: await server.serve_forever()
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+
+MAX_BODY = 16 * 2 ** 20
+REASONS = {
+ 200: "OK", 400: "Bad Request", 403: "Forbidden", 404: "Not Found",
+ 405: "Method Not Allowed", 413: "Payload Too Large",
+ 500: "Internal Server Error"
+}
@@ -0,0 +1,679 @@
+"""Contains tools for quickly finding the atoms near a point."""
+
+from itertools import product
+from math import ceil, cos, sin, radians, sqrt
+import numpy as np
+from atomium.structures import Model
+from atomium.structures.atoms import METALS
+
+class CellGrid:
+    """A uniform grid of cubic cells which a set of coordinates have been
+    sorted into, so that finding the points near some location only means
+    looking at the cells around it, rather than at every point.
+
+    Only occupied cells are stored, so memory use depends on the number of
+    points and not on the volume they span.
+
+    If the points are in a periodic :py:class:`.Box`, they are wrapped into it
+    before being sorted into cells, and distances are measured to the nearest
+    periodic image of each point. The points themselves are never copied into
+    neighbouring boxes - instead, each sphere is looked for again at those of
+    its own images which overlap the box.
+
+    :param numpy.ndarray coordinates: The (N, 3) coordinates to index.
+    :param cell_size: The width of each cell.
+    :param Box box: The periodic box the points are in, if any.
+    :raises TypeError: if the cell size is not numeric.
+    :raises ValueError: if the cell size is not positive.
+    :raises TypeError: if the box is not a :py:class:`.Box`."""
+
+    def __init__(self, coordinates, cell_size, box=None):
+        if not isinstance(cell_size, (int, float)):
+            raise TypeError("{} is not a valid cell size".format(cell_size))
+        if cell_size <= 0:
+            raise ValueError("{} is not a valid cell size".format(cell_size))
+        if box is not None and not isinstance(box, Box):
+            raise TypeError("{} is not a Box".format(box))
+        self._coordinates = np.array(coordinates, dtype=float).reshape(-1, 3)
+        self._cell_size, self._box = cell_size, box
+        self._positions = self._coordinates if box is None else box.wrap(
+         self._coordinates
+        )
+        cells = np.floor(self._positions / cell_size).astype(np.int64)
+        if len(cells):
+            self._lowest = cells.min(axis=0)
+            self._dimensions = cells.max(axis=0) - self._lowest + 1
+        else:
+            self._lowest = np.zeros(3, dtype=np.int64)
+            self._dimensions = np.ones(3, dtype=np.int64)
+        keys = np.ravel_multi_index((cells - self._lowest).T, self._dimensions)
+        self._order = np.argsort(keys, kind="stable")
+        self._keys, self._starts, self._counts = np.unique(
+         keys[self._order], return_index=True, return_counts=True
+        )
+
+
+    def __repr__(self):
+        return "<CellGrid ({} points, {} cells)>".format(
+         len(self._coordinates), len(self._keys)
+        )
+
+
+    def __len__(self):
+        return len(self._coordinates)
+
+
+    @property
+    def coordinates(self):
+        """The (N, 3) array of coordinates that have been indexed.
+
+        :rtype: ``numpy.ndarray``"""
+
+        return self._coordinates
+
+
+    @property
+    def cell_size(self):
+        """The width of each cell.
+
+        :rtype: ``float``"""
+
+        return self._cell_size
+
+
+    @property
+    def box(self):
+        """The periodic box the points are in, or ``None``.
+
+        :rtype: :py:class:`.Box`"""
+
+        return self._box
+
+
+    def pairs(self, centres, radius, mask=None):
+        """Finds every point within a given radius of any of a number of sphere
+        centres. The result is three arrays of equal length - the index of the
+        centre, the index of the point, and the squared distance between them.
+
+        :param numpy.ndarray centres: The (M, 3) sphere centres.
+        :param radius: The radius of the spheres.
+        :param numpy.ndarray mask: If given, a boolean array saying which of\
+        the points can be returned.
+        :raises ValueError: if the radius is too big for the grid's box.
+        :rtype: ``tuple``"""
+
+        centres = np.array(centres, dtype=float).reshape(-1, 3)
+        sources = None
+        if self._box is not None:
+            centres, sources = self._box.images(centres, radius)
+        centre_cells = np.floor(
+         centres / self._cell_size
+        ).astype(np.int64) - self._lowest
+        centre_indices, point_indices = [], []
+        for offset in self._stencil(radius):
+            cells = centre_cells + offset
+            valid = ((cells >= 0) & (cells < self._dimensions)).all(axis=1)
+            keys = np.ravel_multi_index(cells[valid].T, self._dimensions)
+            positions = np.searchsorted(self._keys, keys)
+            positions[positions == len(self._keys)] = 0
+            found = self._keys[positions] == keys
+            counts = self._counts[positions[found]]
+            centre_indices.append(np.repeat(np.nonzero(valid)[0][found], counts))
+            point_indices.append(_expand_ranges(
+             self._starts[positions[found]], counts
+            ))
+        centre_indices = np.concatenate(centre_indices)
+        point_indices = self._order[np.concatenate(point_indices)]
+        if mask is not None:
+            allowed = mask[point_indices]
+            centre_indices = centre_indices[allowed]
+            point_indices = point_indices[allowed]
+        squares = ((
+         self._positions[point_indices] - centres[centre_indices]
+        ) ** 2).sum(axis=1)
+        inside = np.sqrt(squares) <= radius
+        if sources is not None: centre_indices = sources[centre_indices]
+        return centre_indices[inside], point_indices[inside], squares[inside]
+
+
+    def indices_in_sphere(self, x, y, z, radius, mask=None):
+        """Returns the indices of the points within a sphere.
+
+        :param x: The x-coordinate of the centre of the sphere.
+        :param y: The y-coordinate of the centre of the sphere.
+        :param z: The z-coordinate of the centre of the sphere.
+        :param radius: The radius of the sphere.
+        :param numpy.ndarray mask: If given, a boolean array saying which of\
+        the points can be returned.
+        :raises ValueError: if the radius is too big for the grid's box.
+        :rtype: ``numpy.ndarray``"""
+
+        return np.sort(self.pairs([[x, y, z]], radius, mask=mask)[1])
+
+
+    def _stencil(self, radius):
+        """Returns the offsets of the cells which could contain points within
+        the given radius of a point in the central cell.
+
+        :param radius: The radius to cover.
+        :rtype: ``numpy.ndarray``"""
+
+        reach = int(ceil(radius / self._cell_size))
+        steps = np.arange(-reach, reach + 1)
+        stencil = np.stack(
+         np.meshgrid(steps, steps, steps, indexing="ij"), axis=-1
+        ).reshape(-1, 3)
+        gaps = np.maximum(np.abs(stencil) - 1, 0) * self._cell_size
+        return stencil[(gaps ** 2).sum(axis=1) <= radius ** 2]
+
+
+
+class SpatialIndex(CellGrid):
+    """Base class: :py:class:`.CellGrid`
+
+    An index of the atoms of an atomium model, for answering sphere queries
+    without looking at every atom in the model. The cost of a query depends on
+    how many atoms are near the sphere rather than on the size of the model,
+    so building one of these once and passing it to the hydrophobicity
+    functions is much faster when many spheres in a large model are needed.
+
+    The index is a snapshot - if atoms are moved, added or removed after it
+    is created, a new one should be made.
+
+    If the model is a simulation system in a periodic :py:class:`.Box`, giving
+    the box here makes every query use minimum-image distances.
+
+    :param Model model: The atomium model to index.
+    :param cell_size: The width of each cell. Queries are fastest when this is\
+    close to the radius of the spheres being looked at.
+    :param Box box: The periodic box the model is in, if any.
+    :raises TypeError: if the model is not an atomium model object.
+    :raises TypeError: if the cell size is not numeric.
+    :raises ValueError: if the cell size is not positive.
+    :raises TypeError: if the box is not a :py:class:`.Box`."""
+
+    def __init__(self, model, cell_size=5, box=None):
+        if not isinstance(model, Model):
+            raise TypeError("{} is not a Model".format(model))
+        self._atoms = list(model.atoms())
+        CellGrid.__init__(
+         self, [atom.location for atom in self._atoms], cell_size, box=box
+        )
+        self._het = np.array(
+         [atom.residue is None for atom in self._atoms], dtype=bool
+        )
+        self._metal = np.array(
+         [atom.element.upper() in METALS for atom in self._atoms], dtype=bool
+        )
+
+
+    def __repr__(self):
+        return "<SpatialIndex ({} atoms)>".format(len(self._atoms))
+
+
+    @property
+    def atoms(self):
+        """The atoms that have been indexed, in the order that their indices
+        refer to.
+
+        :rtype: ``list``"""
+
+        return self._atoms
+
+
+    def mask(self, het=True, metal=True):
+        """Returns a boolean array of which atoms pass the heteroatom and metal
+        filters given, or ``None`` if no filter is being applied.
+
+        :param bool het: If ``False``, only atoms that have a residue pass.
+        :param bool metal: If ``False``, only non-metal atoms pass.
+        :rtype: ``numpy.ndarray``"""
+
+        if het and metal: return None
+        mask = np.ones(len(self._atoms), dtype=bool)
+        if not het: mask &= ~self._het
+        if not metal: mask &= ~self._metal
+        return mask
+
+
+    def pairs_filtered(self, centres, radius, het=True, metal=True):
+        """Finds every atom within a given radius of any of a number of sphere
+        centres, like :py:meth:`.CellGrid.pairs` but with the heteroatom and
+        metal filters of an atomium model instead of a mask. The result is
+        three arrays of equal length - the index of the centre, the index of
+        the atom, and the squared distance between them.
+
+        :param numpy.ndarray centres: The (M, 3) sphere centres.
+        :param radius: The radius of the spheres.
+        :param bool het: If ``False``, only atoms that have a residue will be\
+        returned.
+        :param bool metal: If ``False``, only non-metal atoms will be returned.
+        :rtype: ``tuple``"""
+
+        return self.pairs(
+         centres, radius, mask=self.mask(het=het, metal=metal)
+        )
+
+
+    def indices_in_sphere(self, x, y, z, radius, mask=None, het=True,
+                          metal=True):
+        """Returns the indices of the atoms within a sphere.
+
+        :param x: The x-coordinate of the centre of the sphere.
+        :param y: The y-coordinate of the centre of the sphere.
+        :param z: The z-coordinate of the centre of the sphere.
+        :param radius: The radius of the sphere.
+        :param numpy.ndarray mask: If given, a boolean array saying which of\
+        the atoms can be returned.
+        :param bool het: If ``False``, only atoms that have a residue will be\
+        returned.
+        :param bool metal: If ``False``, only non-metal atoms will be returned.
+        :rtype: ``numpy.ndarray``"""
+
+        filters = self.mask(het=het, metal=metal)
+        if filters is not None:
+            mask = filters if mask is None else filters & mask
+        return CellGrid.indices_in_sphere(self, x, y, z, radius, mask=mask)
+
+
+    def atoms_in_sphere(self, x, y, z, radius, het=True, metal=True):
+        """Returns all the atoms in a given sphere, in the same way that an
+        atomium model's own ``atoms_in_sphere`` method does.
+
+        :param x: The x-coordinate of the centre of the sphere.
+        :param y: The y-coordinate of the centre of the sphere.
+        :param z: The z-coordinate of the centre of the sphere.
+        :param radius: The radius of the sphere.
+        :param bool het: If ``False``, only atoms that have a residue will be\
+        returned.
+        :param bool metal: If ``False``, only non-metal atoms will be returned.
+        :rtype: ``set``"""
+
+        return set(self._atoms[index] for index in self.indices_in_sphere(
+         x, y, z, radius, het=het, metal=metal
+        ))
+
+
+
+class NeighbourList:
+    """A cache of the atoms that could be within a given radius of some sphere
+    centres, for when the same spheres are looked at again and again while
+    they and the atoms move only a little - in successive frames of a
+    trajectory, or successive steps of an optimizer.
+
+    The atoms within the radius plus a 'skin' distance of each centre are
+    found when the list is built. After that, a query only needs to look at
+    those candidates, until a centre or an atom has moved more than half the
+    skin since the list was built, at which point it is rebuilt. A bigger skin
+    means fewer rebuilds but more candidates to look at each time.
+
+    If the atoms are in a periodic :py:class:`.Box`, it is given with each
+    query, since the box of a simulation can change from frame to frame. The
+    list is rebuilt whenever the box changes, and the skin is cut down if the
+    radius plus the skin would be too big for the box.
+
+    :param radius: The radius of the spheres.
+    :param skin: The extra distance to look for candidates within.
+    :param numpy.ndarray mask: If given, a boolean array saying which of\
+    the atoms can be returned.
+    :param bool static: If ``True``, the atoms are taken not to move, and only\
+    the centres are checked for movement.
+    :param CellGrid grid: If given, an existing grid (or\
+    :py:class:`.SpatialIndex`) of the atoms, which are then taken not to\
+    move. Rebuilds look for candidates in this grid rather than sorting the\
+    atoms into a new one, and the grid's box is used if no other is given.
+    :raises TypeError: if the radius or skin is not numeric.
+    :raises ValueError: if the radius or skin is negative.
+    :raises TypeError: if the grid is not a :py:class:`.CellGrid`."""
+
+    def __init__(self, radius, skin=2, mask=None, static=False, grid=None):
+        for value in (radius, skin):
+            if not isinstance(value, (int, float)):
+                raise TypeError("{} is not a valid distance".format(value))
+            if value < 0:
+                raise ValueError("{} is not a valid distance".format(value))
+        if grid is not None and not isinstance(grid, CellGrid):
+            raise TypeError("{} is not a CellGrid".format(grid))
+        self._radius, self._skin, self._mask = radius, skin, mask
+        self._static, self._grid = static or grid is not None, grid
+        self._coordinates, self._centres, self._box = None, None, None
+        self._reach = radius + skin
+        self._candidates = (np.zeros(0, dtype=int), np.zeros(0, dtype=int))
+        self._queries, self._builds = 0, 0
+
+
+    def __repr__(self):
+        return "<NeighbourList ({} candidates)>".format(len(self._candidates[0]))
+
+
+    @property
+    def radius(self):
+        """The radius of the spheres.
+
+        :rtype: ``float``"""
+
+        return self._radius
+
+
+    @property
+    def skin(self):
+        """The extra distance that candidates are looked for within.
+
+        :rtype: ``float``"""
+
+        return self._skin
+
+
+    @property
+    def statistics(self):
+        """How many queries have been made, how many of them needed the list
+        to be rebuilt, how many reused it, and how many candidates there are
+        now.
+
+        :rtype: ``dict``"""
+
+        return {
+         "queries": self._queries, "builds": self._builds,
+         "reuses": self._queries - self._builds,
+         "candidates": len(self._candidates[0])
+        }
+
+
+    def pairs(self, coordinates, centres, box=None):
+        """Finds every atom within the radius of any of the sphere centres,
+        rebuilding the list first if anything has moved too far. The result is
+        the same as that of :py:meth:`.CellGrid.pairs` - three arrays of the
+        index of the centre, the index of the atom, and the squared distance
+        between them.
+
+        :param numpy.ndarray coordinates: The current (N, 3) atom coordinates.
+        :param numpy.ndarray centres: The current (M, 3) sphere centres.
+        :param Box box: The current periodic box, if any.
+        :raises TypeError: if the box is not a :py:class:`.Box`.
+        :raises ValueError: if the radius is too big for the box.
+        :rtype: ``tuple``"""
+
+        coordinates = np.asarray(coordinates, dtype=float).reshape(-1, 3)
+        centres = np.asarray(centres, dtype=float).reshape(-1, 3)
+        if box is not None and not isinstance(box, Box):
+            raise TypeError("{} is not a Box".format(box))
+        if box is None and self._grid is not None: box = self._grid.box
+        self._queries += 1
+        if self._needs_build(coordinates, centres, box):
+            self._build(coordinates, centres, box)
+        centre_indices, atom_indices = self._candidates
+        differences = coordinates[atom_indices] - centres[centre_indices]
+        if box is not None: differences = box.minimum_image(differences)
+        squares = (differences ** 2).sum(axis=1)
+        inside = np.sqrt(squares) <= self._radius
+        return centre_indices[inside], atom_indices[inside], squares[inside]
+
+
+    def _needs_build(self, coordinates, centres, box=None):
+        """Checks whether the list must be rebuilt before it can be used with
+        the given coordinates and centres - because it has never been built,
+        because the number of atoms or centres or the box has changed, or
+        because an atom or centre has moved more than half the skin.
+
+        :param numpy.ndarray coordinates: The current (N, 3) atom coordinates.
+        :param numpy.ndarray centres: The current (M, 3) sphere centres.
+        :param Box box: The current periodic box, if any.
+        :rtype: ``bool``"""
+
+        if self._coordinates is None: return True
+        if coordinates.shape != self._coordinates.shape: return True
+        if centres.shape != self._centres.shape: return True
+        if box != self._box: return True
+        limit = (self._reach - self._radius) / 2
+        if _moved(centres, self._centres, limit, box=box): return True
+        return not self._static and _moved(
+         coordinates, self._coordinates, limit, box=box
+        )
+
+
+    def _build(self, coordinates, centres, box=None):
+        """Finds the candidates within the radius plus the skin of each centre,
+        in the list's own grid if it has one, and remembers where everything
+        was when it did.
+
+        :param numpy.ndarray coordinates: The current (N, 3) atom coordinates.
+        :param numpy.ndarray centres: The current (M, 3) sphere centres.
+        :param Box box: The current periodic box, if any."""
+
+        reach = self._radius + self._skin
+        if box is not None:
+            reach = max(min(reach, box.max_radius), self._radius)
+        grid = self._grid
+        if grid is None: grid = CellGrid(coordinates, reach or 1, box=box)
+        centre_indices, atom_indices, _ = grid.pairs(
+         centres, reach, mask=self._mask
+        )
+        self._candidates = (centre_indices, atom_indices)
+        self._coordinates = coordinates if self._static else coordinates.copy()
+        self._centres = centres.copy()
+        self._box, self._reach = box, reach
+        self._builds += 1
+
+
+
+class Box:
+    """A periodic simulation box, described in the usual way by the lengths
+    a, b and c of its edges and the angles alpha (between b and c), beta
+    (between a and c) and gamma (between a and b). A box with three right
+    angles is orthorhombic, and any other is triclinic. Edge a lies along the
+    x-axis and edge b in the xy-plane.
+
+    Atoms in a box have an image in every copy of it that tiles space, and
+    the distance between two atoms is the distance to the nearest image. This
+    is only unambiguous for spheres no wider than the box, so the largest
+    radius that can be used is half the smallest distance between opposite
+    faces.
+
+    :param a: The length of the first edge.
+    :param b: The length of the second edge.
+    :param c: The length of the third edge.
+    :param alpha: The angle between b and c, in degrees.
+    :param beta: The angle between a and c, in degrees.
+    :param gamma: The angle between a and b, in degrees.
+    :raises TypeError: if any dimension is not numeric.
+    :raises ValueError: if any length is not positive.
+    :raises ValueError: if the angles do not describe a box."""
+
+    def __init__(self, a, b, c, alpha=90, beta=90, gamma=90):
+        dimensions = (a, b, c, alpha, beta, gamma)
+        for value in dimensions:
+            if not isinstance(value, (int, float)):
+                raise TypeError(
+                 "{} is not a valid box dimension".format(value)
+                )
+        if min(a, b, c) <= 0:
+            raise ValueError("{} are not valid box lengths".format((a, b, c)))
+        angles = (alpha, beta, gamma)
+        if any(not 0 < angle < 180 for angle in angles):
+            raise ValueError("{} are not valid box angles".format(angles))
+        cosines = [0 if angle == 90 else cos(radians(angle)) for angle in angles]
+        sine = 1 if gamma == 90 else sin(radians(gamma))
+        x = c * cosines[1]
+        y = c * (cosines[0] - cosines[1] * cosines[2]) / sine
+        height = c ** 2 - x ** 2 - y ** 2
+        if height <= 0:
+            raise ValueError("{} are not valid box angles".format(angles))
+        self._dimensions = tuple(float(value) for value in dimensions)
+        self._vectors = np.array([
+         [a, 0, 0], [b * cosines[2], b * sine, 0],
+         [x, y, sqrt(height)]
+        ])
+        self._inverse = np.linalg.inv(self._vectors)
+        volume = abs(np.linalg.det(self._vectors))
+        self._widths = np.array([volume / np.linalg.norm(np.cross(
+         self._vectors[(axis + 1) % 3], self._vectors[(axis + 2) % 3]
+        )) for axis in range(3)])
+        self._orthorhombic = alpha == beta == gamma == 90
+        if self._orthorhombic: self._widths = np.array([a, b, c], dtype=float)
+
+
+    def __repr__(self):
+        return "<Box ({:g}, {:g}, {:g}, {:g}, {:g}, {:g})>".format(
+         *self._dimensions
+        )
+
+
+    def __eq__(self, other):
+        if not isinstance(other, Box): return NotImplemented
+        return self._dimensions == other._dimensions
+
+
+    def __hash__(self):
+        return hash(self._dimensions)
+
+
+    @property
+    def dimensions(self):
+        """The lengths a, b and c and the angles alpha, beta and gamma.
+
+        :rtype: ``tuple``"""
+
+        return self._dimensions
+
+
+    @property
+    def vectors(self):
+        """The (3, 3) array whose rows are the box's edge vectors.
+
+        :rtype: ``numpy.ndarray``"""
+
+        return self._vectors.copy()
+
+
+    @property
+    def orthorhombic(self):
+        """Whether all three of the box's angles are right angles.
+
+        :rtype: ``bool``"""
+
+        return self._orthorhombic
+
+
+    @property
+    def max_radius(self):
+        """The largest sphere radius that can be used in the box - half the
+        smallest distance between opposite faces.
+
+        :rtype: ``float``"""
+
+        return float(self._widths.min()) / 2
+
+
+    def wrap(self, coordinates):
+        """Moves coordinates into the box, by replacing each with the image of
+        it that lies inside the box.
+
+        :param numpy.ndarray coordinates: The (N, 3) coordinates to wrap.
+        :rtype: ``numpy.ndarray``"""
+
+        coordinates = np.asarray(coordinates, dtype=float).reshape(-1, 3)
+        return coordinates - np.floor(
+         self._fractions(coordinates)
+        ) @ self._vectors
+
+
+    def minimum_image(self, vectors):
+        """Replaces each of a set of displacements with the shortest
+        displacement between the same two points when every image of them is
+        considered. For a triclinic box this is exact for any displacement
+        that is no longer than :py:attr:`.max_radius` once reduced.
+
+        :param numpy.ndarray vectors: The (N, 3) displacements.
+        :rtype: ``numpy.ndarray``"""
+
+        vectors = np.asarray(vectors, dtype=float).reshape(-1, 3)
+        shortest = vectors - np.round(self._fractions(vectors)) @ self._vectors
+        if self._orthorhombic: return shortest
+        squares = (shortest ** 2).sum(axis=1)
+        reduced = shortest.copy()
+        for shift in IMAGE_SHIFTS @ self._vectors:
+            candidates = shortest + shift
+            candidate_squares = (candidates ** 2).sum(axis=1)
+            closer = candidate_squares < squares
+            reduced[closer] = candidates[closer]
+            squares[closer] = candidate_squares[closer]
+        return reduced
+
+
+    def images(self, centres, radius):
+        """Finds the images of some sphere centres whose spheres could contain
+        points inside the box. Each centre is wrapped into the box first, and
+        then those of the 27 images of it in and around the box whose sphere
+        overlaps the box are given, along with the index of the centre each is
+        an image of.
+
+        Searching for points in the box from each of these images, rather than
+        copying the points into the boxes around it, finds every point whose
+        nearest image is in a sphere exactly once.
+
+        :param numpy.ndarray centres: The (M, 3) sphere centres.
+        :param radius: The radius of the spheres.
+        :raises ValueError: if the radius is bigger than\
+        :py:attr:`.max_radius`.
+        :rtype: ``tuple``"""
+
+        if radius > self.max_radius:
+            raise ValueError("{} is too big a radius for {}".format(
+             radius, self
+            ))
+        centres = self.wrap(centres)
+        fractions = self._fractions(centres)[:, None, :] + IMAGE_SHIFTS
+        outside = np.maximum(
+         np.maximum(fractions - 1, -fractions), 0
+        ) * self._widths
+        near = (outside <= radius).all(axis=2)
+        indices, shifts = np.nonzero(near)
+        return centres[indices] + IMAGE_SHIFTS[shifts] @ self._vectors, indices
+
+
+    def _fractions(self, coordinates):
+        """Converts coordinates to fractions of the box's edge vectors.
+
+        :param numpy.ndarray coordinates: The (N, 3) coordinates to convert.
+        :rtype: ``numpy.ndarray``"""
+
+        coordinates = np.asarray(coordinates, dtype=float).reshape(-1, 3)
+        if self._orthorhombic: return coordinates / self._widths
+        return coordinates @ self._inverse
+
+
+
+def _expand_ranges(starts, counts):
+    """Takes arrays of range starts and lengths and returns all the integers in
+    all those ranges, in order, as a single array.
+
+    :param numpy.ndarray starts: The first integer of each range.
+    :param numpy.ndarray counts: The length of each range.
+    :rtype: ``numpy.ndarray``"""
+
+    total = counts.sum()
+    if total == 0: return np.zeros(0, dtype=np.int64)
+    ends = np.cumsum(counts)
+    return np.repeat(starts - ends + counts, counts) + np.arange(total)
+
+
+def _moved(now, then, limit, box=None):
+    """Checks whether any of a set of points has moved further than some
+    distance. In a periodic box, a point that has left through one face and
+    come back in through the opposite one has only moved as far as the
+    nearest image of where it was.
+
+    :param numpy.ndarray now: The (N, 3) current positions.
+    :param numpy.ndarray then: The (N, 3) earlier positions.
+    :param limit: The distance.
+    :param Box box: The periodic box the points are in, if any.
+    :rtype: ``bool``"""
+
+    if len(now) == 0: return False
+    differences = now - then
+    if box is not None: differences = box.minimum_image(differences)
+    return bool(((differences ** 2).sum(axis=1) > limit ** 2).any())
+
+
+
+IMAGE_SHIFTS = np.array(list(product((-1, 0, 1), repeat=3)), dtype=float)
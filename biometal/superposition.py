@@ -0,0 +1,390 @@
+"""Contains functions for superposing sets of points on one another."""
+
+from itertools import permutations
+from math import factorial
+import numpy as np
+from .templates import _template_arrays
+
+def superpose(mobile, target):
+    """Finds the rotation and translation which best superpose one set of
+    points on another set of the same size, using the Kabsch algorithm, and
+    the root-mean-square deviation of the points once superposed.
+
+    The transformation is applied to points as ``points @ rotation.T +
+    translation``. Reflections are never given, even when a reflection would
+    fit better.
+
+    :param mobile: The (N, 3) points to move.
+    :param target: The (N, 3) points to move them onto.
+    :raises TypeError: if the points are not numeric.
+    :raises ValueError: if the points are not two (N, 3) arrays of one size.
+    :rtype: ``tuple`` of (rotation, translation, rmsd)"""
+
+    mobile, target = _point_array(mobile), _point_array(target)
+    if mobile.shape != target.shape:
+        raise ValueError("{} and {} points cannot be superposed".format(
+         len(mobile), len(target)
+        ))
+    if len(mobile) == 0:
+        raise ValueError("There are no points to superpose")
+    mobile_centre, target_centre = mobile.mean(axis=0), target.mean(axis=0)
+    rotation = _kabsch(mobile - mobile_centre, target - target_centre)
+    translation = target_centre - mobile_centre @ rotation.T
+    return rotation, translation, rmsd(
+     mobile @ rotation.T + translation, target
+    )
+
+
+def rmsd(points1, points2):
+    """Calculates the root-mean-square deviation between two sets of points,
+    as they are.
+
+    :param points1: The first (N, 3) points.
+    :param points2: The second (N, 3) points.
+    :raises TypeError: if the points are not numeric.
+    :raises ValueError: if the points are not two (N, 3) arrays of one size.
+    :rtype: ``float``"""
+
+    points1, points2 = _point_array(points1), _point_array(points2)
+    if points1.shape != points2.shape:
+        raise ValueError("{} and {} points cannot be compared".format(
+         len(points1), len(points2)
+        ))
+    if len(points1) == 0: return 0.0
+    return float(np.sqrt(((points1 - points2) ** 2).sum(axis=1).mean()))
+
+
+def superpose_many(mobile, target):
+    """Superposes each of a stack of point sets on the matching set of
+    another stack in one vectorised call, as :py:func:`.superpose` does for a
+    single pair.
+
+    :param mobile: The (B, N, 3) point sets to move.
+    :param target: The (B, N, 3) point sets to move them onto.
+    :raises TypeError: if the points are not numeric.
+    :raises ValueError: if the points are not two (B, N, 3) stacks of one\
+    size.
+    :rtype: ``tuple`` of (rotations, translations, rmsds)"""
+
+    mobile, target = _stack_array(mobile), _stack_array(target)
+    if mobile.shape != target.shape:
+        raise ValueError("{} and {} point sets cannot be superposed".format(
+         mobile.shape, target.shape
+        ))
+    if mobile.shape[1] == 0:
+        raise ValueError("There are no points to superpose")
+    mobile_centres = mobile.mean(axis=1, keepdims=True)
+    target_centres = target.mean(axis=1, keepdims=True)
+    rotations = _kabsch_many(mobile - mobile_centres, target - target_centres)
+    translations = (
+     target_centres - mobile_centres @ rotations.transpose(0, 2, 1)
+    )[:, 0]
+    moved = mobile @ rotations.transpose(0, 2, 1) + translations[:, None]
+    return rotations, translations, np.sqrt(
+     ((moved - target) ** 2).sum(axis=2).mean(axis=1)
+    )
+
+
+def template_rmsd(template1, template2, permute=True, same_residues=False,
+                  max_permutations=40320):
+    """Finds how well two site templates with the same number of residues
+    superpose, as the RMSD of their CA and CB atoms. If residue order is
+    allowed to change, every order of the second template's residues is
+    tried in one vectorised call and the best is kept.
+
+    The number of orders grows factorially with the number of residues, so
+    there is a limit on how many can be tried - by default that of eight
+    residues. Bigger templates must be compared with ``permute=False``, or
+    with a higher limit if there is the memory for it.
+
+    The templates can be :py:class:`.SiteTemplate` objects or the atomium
+    structures made by :py:func:`.create_site_template`.
+
+    :param template1: The first template.
+    :param template2: The second template.
+    :param bool permute: If ``False``, residues are only compared in the\
+    order they are in.
+    :param bool same_residues: If ``True``, residues are only compared with\
+    residues of the same name.
+    :param int max_permutations: The most residue orders that can be tried.
+    :raises TypeError: if either template is not a template.
+    :raises ValueError: if the templates have different numbers of residues.
+    :raises ValueError: if the templates have too many residue orders.
+    :rtype: ``tuple`` of (rmsd, order)"""
+
+    coordinates1, names1 = _template_arrays(template1)
+    coordinates2, names2 = _template_arrays(template2)
+    if len(coordinates1) != len(coordinates2):
+        raise ValueError("{} and {} residues cannot be compared".format(
+         len(coordinates1), len(coordinates2)
+        ))
+    if len(coordinates1) == 0: return 0.0, ()
+    orders = _residue_orders(len(coordinates1), permute, max_permutations)
+    deviations = _order_rmsds(
+     coordinates1[None], coordinates2[None], orders
+    )[0]
+    if same_residues:
+        deviations[(np.array(names2)[orders] != np.array(names1)).any(
+         axis=1
+        )] = np.inf
+    best = int(np.argmin(deviations))
+    return float(deviations[best]), tuple(orders[best].tolist())
+
+
+def template_rmsd_matrix(templates, others=None, permute=True,
+                         same_residues=False, chunk=100000,
+                         max_permutations=40320):
+    """Finds the RMSD between every pair of site templates, for clustering
+    binding sites. Templates are grouped by number of residues, and each
+    group is compared in chunks of superpositions that are done in one
+    vectorised call each, with only the RMSD, and not the transformation,
+    worked out. Templates with different numbers of residues do not
+    superpose, and their RMSD is ``nan``. When templates are compared with
+    each other, only one of each pair of templates is superposed on the
+    other.
+
+    To compare very many templates, the matrix can be built in blocks by
+    giving a second sequence of templates to compare the first against. As
+    with :py:func:`.template_rmsd`, there is a limit on the number of residue
+    orders tried, and every size of template is checked against it before
+    any are compared.
+
+    :param templates: The :py:class:`.SiteTemplate` objects or atomium\
+    template structures to compare.
+    :param others: If given, the templates to compare them against, rather\
+    than each other.
+    :param bool permute: If ``False``, residues are only compared in the\
+    order they are in.
+    :param bool same_residues: If ``True``, residues are only compared with\
+    residues of the same name.
+    :param int chunk: Roughly how many superpositions to do at once.
+    :param int max_permutations: The most residue orders that can be tried.
+    :raises TypeError: if any template is not a template.
+    :raises ValueError: if any size of template has too many residue orders.
+    :rtype: ``numpy.ndarray``"""
+
+    rows = [_template_arrays(template) for template in templates]
+    columns = rows if others is None else [
+     _template_arrays(template) for template in others
+    ]
+    matrix = np.full((len(rows), len(columns)), np.nan)
+    sizes = set(len(row[0]) for row in rows) & set(
+     len(column[0]) for column in columns
+    )
+    if permute and sizes:
+        _check_orders(max(sizes), max_permutations)
+    for size in sizes:
+        row_indices = [i for i, row in enumerate(rows) if len(row[0]) == size]
+        column_indices = [
+         i for i, column in enumerate(columns) if len(column[0]) == size
+        ]
+        if size == 0:
+            matrix[np.ix_(row_indices, column_indices)] = 0
+            continue
+        orders = _residue_orders(size, permute, max_permutations)
+        row_coordinates = np.array([rows[i][0] for i in row_indices])
+        column_coordinates = np.array([
+         columns[i][0] for i in column_indices
+        ])
+        codes = _name_codes(
+         [rows[i][1] for i in row_indices],
+         [columns[i][1] for i in column_indices]
+        ) if same_residues else None
+        if others is None:
+            pairs_i, pairs_j = np.triu_indices(len(row_indices))
+        else:
+            pairs_i, pairs_j = np.divmod(
+             np.arange(len(row_indices) * len(column_indices)),
+             len(column_indices)
+            )
+        step = max(chunk // len(orders), 1)
+        for start in range(0, len(pairs_i), step):
+            i, j = pairs_i[start:start + step], pairs_j[start:start + step]
+            deviations = _order_rmsds(
+             row_coordinates[i], column_coordinates[j], orders
+            )
+            if codes is not None:
+                deviations[(
+                 codes[1][j][:, orders] != codes[0][i][:, None]
+                ).any(axis=2)] = np.inf
+            matrix[
+             np.array(row_indices)[i], np.array(column_indices)[j]
+            ] = deviations.min(axis=1)
+    if others is None: matrix = np.fmin(matrix, matrix.T)
+    return matrix
+
+
+def _kabsch(mobile, target):
+    """Finds the rotation matrix that best superposes one set of centred
+    points on another.
+
+    :param numpy.ndarray mobile: The (N, 3) centred points to move.
+    :param numpy.ndarray target: The (N, 3) centred points to move them onto.
+    :rtype: ``numpy.ndarray``"""
+
+    u, _, vt = np.linalg.svd(mobile.T @ target)
+    sign = np.sign(np.linalg.det(u @ vt)) or 1
+    return (u @ np.diag([1, 1, sign]) @ vt).T
+
+
+def _point_array(points):
+    """Converts some points to an (N, 3) array of floats.
+
+    :param points: The points to convert.
+    :raises TypeError: if the points are not numeric.
+    :raises ValueError: if the points are not (x, y, z) triples.
+    :rtype: ``numpy.ndarray``"""
+
+    try:
+        array = np.array(points, dtype=float)
+    except (TypeError, ValueError):
+        raise TypeError("{} are not valid points".format(points))
+    if array.size == 0: return array.reshape(0, 3)
+    if array.ndim != 2 or array.shape[1] != 3:
+        raise ValueError("{} are not (x, y, z) points".format(points))
+    return array
+
+
+def _kabsch_many(mobile, target):
+    """Finds the rotation matrices that best superpose each of a stack of
+    centred point sets on another.
+
+    :param numpy.ndarray mobile: The (B, N, 3) centred points to move.
+    :param numpy.ndarray target: The (B, N, 3) centred points to move them\
+    onto.
+    :rtype: ``numpy.ndarray``"""
+
+    u, _, vt = np.linalg.svd(mobile.transpose(0, 2, 1) @ target)
+    signs = np.sign(np.linalg.det(u @ vt))
+    signs[signs == 0] = 1
+    corrections = np.tile(np.eye(3), (len(signs), 1, 1))
+    corrections[:, 2, 2] = signs
+    return (u @ corrections @ vt).transpose(0, 2, 1)
+
+
+def _order_rmsds(coordinates1, coordinates2, orders):
+    """Finds the RMSD of the best superposition of each of a stack of
+    templates on the matching template of another stack, with the second
+    template's residues in each of a number of orders. Only the singular
+    values of each covariance matrix are needed for this, and these are
+    found from the eigenvalues of a symmetric 3 x 3 matrix in closed form,
+    so no rotations are made and no SVD is done.
+
+    :param numpy.ndarray coordinates1: The (B, R, 2, 3) first templates.
+    :param numpy.ndarray coordinates2: The (B, R, 2, 3) second templates.
+    :param numpy.ndarray orders: The (P, R) residue orders to try.
+    :rtype: ``numpy.ndarray``"""
+
+    first = coordinates1.reshape(len(coordinates1), -1, 3)
+    second = coordinates2.reshape(len(coordinates2), -1, 3)
+    first = first - first.mean(axis=1, keepdims=True)
+    second = second - second.mean(axis=1, keepdims=True)
+    points = (orders[:, :, None] * 2 + np.arange(2)).reshape(len(orders), -1)
+    ordered = second[:, points]
+    covariances = first.transpose(0, 2, 1)[:, None] @ ordered
+    largest, middle, smallest = _symmetric_eigenvalues(
+     covariances.transpose(0, 1, 3, 2) @ covariances
+    )
+    signs = np.where(np.linalg.det(covariances) < 0, -1, 1)
+    values = np.sqrt(np.maximum(largest, 0)) + np.sqrt(
+     np.maximum(middle, 0)
+    ) + signs * np.sqrt(np.maximum(smallest, 0))
+    squares = (first ** 2).sum(axis=(1, 2)) + (second ** 2).sum(axis=(1, 2))
+    errors = squares[:, None] - 2 * values
+    return np.sqrt(np.maximum(errors, 0) / first.shape[1])
+
+
+def _symmetric_eigenvalues(matrices):
+    """Finds the eigenvalues of a stack of symmetric 3 x 3 matrices in closed
+    form, largest first, using the trigonometric solution of the
+    characteristic cubic.
+
+    :param numpy.ndarray matrices: The (..., 3, 3) symmetric matrices.
+    :rtype: ``tuple``"""
+
+    a00, a11, a22 = [matrices[..., i, i] for i in range(3)]
+    a01, a02, a12 = [matrices[..., i, j] for i, j in ((0, 1), (0, 2), (1, 2))]
+    mean = (a00 + a11 + a22) / 3
+    spread = np.sqrt((
+     (a00 - mean) ** 2 + (a11 - mean) ** 2 + (a22 - mean) ** 2
+     + 2 * (a01 ** 2 + a02 ** 2 + a12 ** 2)
+    ) / 6)
+    scale = np.where(spread == 0, 1, spread)
+    b00, b11, b22 = [(a - mean) / scale for a in (a00, a11, a22)]
+    b01, b02, b12 = a01 / scale, a02 / scale, a12 / scale
+    half_det = (
+     b00 * (b11 * b22 - b12 * b12) - b01 * (b01 * b22 - b12 * b02)
+     + b02 * (b01 * b12 - b11 * b02)
+    ) / 2
+    angle = np.arccos(np.clip(half_det, -1, 1)) / 3
+    largest = mean + 2 * spread * np.cos(angle)
+    smallest = mean + 2 * spread * np.cos(angle + 2 * np.pi / 3)
+    return largest, 3 * mean - largest - smallest, smallest
+
+
+def _residue_orders(size, permute, max_permutations=None):
+    """Lists the orders that a template's residues can be compared in.
+
+    :param int size: The number of residues.
+    :param bool permute: If ``False``, only the order they are in is given.
+    :param int max_permutations: If given, the most orders there can be.
+    :raises ValueError: if there are more orders than the limit.
+    :rtype: ``numpy.ndarray``"""
+
+    if not permute: return np.arange(size)[None]
+    if max_permutations is not None: _check_orders(size, max_permutations)
+    return np.array(list(permutations(range(size)))).reshape(
+     factorial(size), size
+    )
+
+
+def _check_orders(size, max_permutations):
+    """Checks that the residues of a template of some size do not have more
+    orders than a limit allows.
+
+    :param int size: The number of residues.
+    :param int max_permutations: The most orders there can be.
+    :raises ValueError: if there are more orders than the limit."""
+
+    if factorial(size) > max_permutations:
+        raise ValueError(
+         "{} residues have {} orders, more than the limit of {} - compare "
+         "them with permute=False or raise max_permutations".format(
+          size, factorial(size), max_permutations
+         )
+        )
+
+
+def _name_codes(names1, names2):
+    """Turns two lists of residue name tuples into integer arrays, with the
+    same code for the same name in both.
+
+    :param list names1: The first templates' residue names.
+    :param list names2: The second templates' residue names.
+    :rtype: ``tuple``"""
+
+    lookup = {}
+    for names in names1 + names2:
+        for name in names: lookup.setdefault(name, len(lookup))
+    return tuple(np.array([
+     [lookup[name] for name in names] for names in group
+    ]).reshape(len(group), -1) for group in (names1, names2))
+
+
+def _stack_array(points):
+    """Converts a stack of point sets to a (B, N, 3) array of floats.
+
+    :param points: The points to convert.
+    :raises TypeError: if the points are not numeric.
+    :raises ValueError: if the points are not stacks of (x, y, z) triples.
+    :rtype: ``numpy.ndarray``"""
+
+    try:
+        array = np.array(points, dtype=float)
+    except (TypeError, ValueError):
+        raise TypeError("{} are not valid point sets".format(points))
+    if array.ndim != 3 or array.shape[2] != 3:
+        raise ValueError("{} are not stacks of (x, y, z) points".format(
+         points
+        ))
+    return array
@@ -0,0 +1,333 @@
+"""Contains a compact, columnar representation of a model's atoms."""
+
+import numpy as np
+from atomium.structures import Model
+from atomium.structures.atoms import METALS
+from . import hydrophobicity
+
+class AtomTable:
+    """A table of atoms stored as columns of arrays rather than as atomium
+    objects - the coordinates, the element, residue name, atom name and
+    residue ID of each atom (as integer codes into the table's own list of
+    names), the formal charges, and whether each atom is a heteroatom or a
+    metal.
+
+    Tables use far less memory than atomium models and can be made from the
+    output of any other tool, and they can be passed to the hydrophobicity
+    functions in place of a model. Atomic solvation parameters and partial
+    charges are looked up for the whole table the first time they are needed
+    and then kept.
+
+    Tables are not usually made directly, but with :py:meth:`.from_model` or
+    :py:meth:`.from_arrays`.
+
+    :param numpy.ndarray coordinates: The (N, 3) coordinates of the atoms.
+    :param tuple elements: The element names, and the index of each atom's\
+    element in them.
+    :param tuple residues: The residue names, and the index of each atom's\
+    residue name in them.
+    :param tuple names: The atom names, and the index of each atom's name in\
+    them.
+    :param numpy.ndarray charges: The formal charges of the atoms.
+    :param numpy.ndarray het: Whether each atom is a heteroatom.
+    :param numpy.ndarray metal: Whether each atom is a metal.
+    :param tuple residue_ids: The residue IDs, and the index of each atom's\
+    residue ID in them. If not given, every atom has a blank ID.
+    :raises ValueError: if the columns are not all the same length."""
+
+    def __init__(self, coordinates, elements, residues, names, charges, het,
+                 metal, residue_ids=None):
+        self._coordinates = np.array(coordinates, dtype=float).reshape(-1, 3)
+        self._element_names, self._elements = elements
+        self._residue_names, self._residues = residues
+        self._atom_names, self._names = names
+        self._charges = np.array(charges, dtype=float)
+        self._het = np.array(het, dtype=bool)
+        self._metal = np.array(metal, dtype=bool)
+        if residue_ids is None:
+            residue_ids = _encode([""] * len(self._coordinates))
+        self._id_names, self._ids = residue_ids
+        for column in (
+         self._elements, self._residues, self._names,
+         self._charges, self._het, self._metal, self._ids
+        ):
+            if len(column) != len(self._coordinates):
+                raise ValueError("AtomTable columns must be the same length")
+        self._solvations, self._partial_charges = None, None
+
+
+    def __repr__(self):
+        return "<AtomTable ({} atom{})>".format(
+         len(self), "" if len(self) == 1 else "s"
+        )
+
+
+    def __len__(self):
+        return len(self._coordinates)
+
+
+    @staticmethod
+    def from_model(model):
+        """Creates a table of all the atoms in an atomium model, in order of
+        atom ID (which for a model read from a file is the order of the atoms
+        in the file). Atoms with no residue are heteroatoms, and are given the
+        ID of their molecule instead.
+
+        :param Model model: The atomium model to tabulate.
+        :raises TypeError: if the model is not an atomium model object.
+        :rtype: :py:class:`.AtomTable`"""
+
+        if not isinstance(model, Model):
+            raise TypeError("{} is not a Model".format(model))
+        atoms = sorted(model.atoms(), key=lambda atom: atom.id)
+        return AtomTable.from_arrays(
+         [atom.location for atom in atoms],
+         [atom.element for atom in atoms],
+         residue_names=[
+          atom.residue.name if atom.residue else "" for atom in atoms
+         ],
+         atom_names=[atom.name or "" for atom in atoms],
+         charges=[atom.charge for atom in atoms],
+         het=[atom.residue is None for atom in atoms],
+         residue_ids=[_structure_id(atom) for atom in atoms]
+        )
+
+
+    @staticmethod
+    def from_arrays(coordinates, elements, residue_names=None, atom_names=None,
+                    charges=None, het=None, metal=None, residue_ids=None):
+        """Creates a table from plain sequences of atom properties. Only the
+        coordinates and elements are required - atoms have blank residue
+        names, atom names and residue IDs and no charge if these are not
+        given, are not heteroatoms unless said otherwise, and are metals if
+        their element is a metal.
+
+        Heteroatoms are treated as having no residue when their parameters are
+        looked up, just as atomium treats them.
+
+        :param coordinates: The (x, y, z) coordinates of the atoms.
+        :param elements: The element of each atom.
+        :param residue_names: The residue name of each atom.
+        :param atom_names: The name of each atom.
+        :param charges: The formal charge of each atom.
+        :param het: Whether each atom is a heteroatom.
+        :param metal: Whether each atom is a metal.
+        :param residue_ids: The ID of the residue (or molecule) of each atom.
+        :raises TypeError: if the coordinates are not numeric.
+        :raises ValueError: if the coordinates are not (x, y, z) triples.
+        :raises ValueError: if the columns are not all the same length.
+        :rtype: :py:class:`.AtomTable`"""
+
+        coordinates = hydrophobicity._centre_array(coordinates)
+        size = len(coordinates)
+        blanks = [""] * size
+        elements = _encode(elements)
+        if metal is None:
+            metal = np.array([
+             element.upper() in METALS for element in elements[0]
+            ], dtype=bool)[elements[1]]
+        return AtomTable(
+         coordinates, elements,
+         _encode(blanks if residue_names is None else residue_names),
+         _encode(blanks if atom_names is None else atom_names),
+         np.zeros(size) if charges is None else charges,
+         np.zeros(size, dtype=bool) if het is None else het, metal,
+         _encode(blanks if residue_ids is None else residue_ids)
+        )
+
+
+    @property
+    def coordinates(self):
+        """The (N, 3) array of the atoms' coordinates.
+
+        :rtype: ``numpy.ndarray``"""
+
+        return self._coordinates
+
+
+    @property
+    def elements(self):
+        """The element of each atom.
+
+        :rtype: ``numpy.ndarray``"""
+
+        return self._element_names[self._elements]
+
+
+    @property
+    def residue_names(self):
+        """The residue name of each atom (blank if it has none).
+
+        :rtype: ``numpy.ndarray``"""
+
+        return self._residue_names[self._residues]
+
+
+    @property
+    def atom_names(self):
+        """The name of each atom.
+
+        :rtype: ``numpy.ndarray``"""
+
+        return self._atom_names[self._names]
+
+
+    @property
+    def residue_ids(self):
+        """The ID of the residue each atom belongs to - or of its molecule, for
+        heteroatoms - such as 'A23'.
+
+        :rtype: ``numpy.ndarray``"""
+
+        return self._id_names[self._ids]
+
+
+    @property
+    def charges(self):
+        """The formal charge of each atom.
+
+        :rtype: ``numpy.ndarray``"""
+
+        return self._charges
+
+
+    @property
+    def het(self):
+        """Whether each atom is a heteroatom.
+
+        :rtype: ``numpy.ndarray``"""
+
+        return self._het
+
+
+    @property
+    def metal(self):
+        """Whether each atom is a metal.
+
+        :rtype: ``numpy.ndarray``"""
+
+        return self._metal
+
+
+    @property
+    def solvations(self):
+        """The atomic solvation parameter of each atom.
+
+        :rtype: ``numpy.ndarray``"""
+
+        if self._solvations is None:
+            self._solvations = hydrophobicity._lookup_solvations(
+             *self._parameter_codes()
+            )
+        return self._solvations
+
+
+    @property
+    def partial_charges(self):
+        """The atomic partial charge of each atom.
+
+        :rtype: ``numpy.ndarray``"""
+
+        if self._partial_charges is None:
+            self._partial_charges = hydrophobicity._lookup_charges(
+             *self._parameter_codes()
+            )
+        return self._partial_charges
+
+
+    def parameters(self, pc=False):
+        """Returns the hydrophobicity parameter of each atom - either its
+        atomic solvation parameter or its partial charge squared.
+
+        :param bool pc: If ``True``, squared partial charges will be returned.
+        :rtype: ``numpy.ndarray``"""
+
+        return self.partial_charges ** 2 if pc else self.solvations
+
+
+    def mask(self, het=True, metal=True):
+        """Returns a boolean array of which atoms pass the heteroatom and metal
+        filters given, or ``None`` if no filter is being applied.
+
+        :param bool het: If ``False``, only atoms that have a residue pass.
+        :param bool metal: If ``False``, only non-metal atoms pass.
+        :rtype: ``numpy.ndarray``"""
+
+        if het and metal: return None
+        mask = np.ones(len(self), dtype=bool)
+        if not het: mask &= ~self._het
+        if not metal: mask &= ~self._metal
+        return mask
+
+
+    def indices_in_sphere(self, x, y, z, radius, het=True, metal=True,
+                          box=None):
+        """Returns the indices of the atoms within a sphere, along with their
+        squared distances from its centre. If the atoms are in a periodic box,
+        distances are to the nearest image of each atom.
+
+        :param x: The x-coordinate of the centre of the sphere.
+        :param y: The y-coordinate of the centre of the sphere.
+        :param z: The z-coordinate of the centre of the sphere.
+        :param radius: The radius of the sphere.
+        :param bool het: If ``False``, only atoms that have a residue will be\
+        returned.
+        :param bool metal: If ``False``, only non-metal atoms will be returned.
+        :param Box box: The periodic box the atoms are in, if any.
+        :rtype: ``tuple``"""
+
+        squares = hydrophobicity._squared_distances(
+         self._coordinates, [x, y, z], box=box
+        )
+        inside = np.sqrt(squares) <= radius
+        mask = self.mask(het=het, metal=metal)
+        if mask is not None: inside &= mask
+        indices = np.nonzero(inside)[0]
+        return indices, squares[indices]
+
+
+    def _parameter_codes(self):
+        """Converts the table's own codes into those used by the compiled
+        parameter tables, giving heteroatoms no residue.
+
+        :rtype: ``tuple``"""
+
+        elements = np.array([hydrophobicity.ELEMENT_CODES.get(
+         element, 0
+        ) for element in self._element_names], dtype=int)
+        residues = np.array([hydrophobicity.RESIDUE_CODES.get(
+         residue, 0
+        ) for residue in self._residue_names], dtype=int)
+        names = np.array([hydrophobicity.ATOM_CODES.get(
+         name, 0
+        ) for name in self._atom_names], dtype=int)
+        return (
+         elements[self._elements].reshape(-1), self._charges,
+         np.where(self._het, 0, residues[self._residues]).reshape(-1),
+         names[self._names].reshape(-1)
+        )
+
+
+
+def _structure_id(atom):
+    """Returns the ID of the residue an atomium atom belongs to, or of its
+    molecule if it has no residue, or a blank string if it has neither.
+
+    :param Atom atom: an atomium atom object.
+    :rtype: ``str``"""
+
+    structure = atom.residue if atom.residue is not None else atom.molecule
+    return "" if structure is None or structure.id is None else structure.id
+
+
+def _encode(values):
+    """Takes a sequence of names and returns the distinct names along with
+    the index of each name in them.
+
+    :param values: The names to encode.
+    :rtype: ``tuple``"""
+
+    values = np.array([str(value) for value in values], dtype=str)
+    if len(values) == 0: return np.zeros(0, dtype=str), np.zeros(0, dtype=int)
+    names, codes = np.unique(values, return_inverse=True)
+    return names, codes.reshape(-1)
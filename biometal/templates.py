@@ -1,5 +1,14 @@
+"""Contains tools for describing metal binding sites as templates."""
+
+import numpy as np
+from atomium.structures import Model
 from atomium.structures.chains import Site
 from atomium.structures.molecules import AtomicStructure
+from .spatial import CellGrid
+from .tables import AtomTable
+from .files import load_table
+
+MAIN_CHAIN = ("C", "CA", "O", "N")
 
 def create_site_template(site):
     if not isinstance(site, Site):
@@ -9,3 +18,284 @@ def create_site_template(site):
         atoms.append(residue.atom(name="CA"))
         atoms.append(residue.atom(name="CB"))
     return AtomicStructure(*atoms)
+
+
+
+class SiteTemplate:
+    """The template of a metal binding site - the CA and CB coordinates of
+    each residue that binds the metal, with the residues' IDs and names, and
+    the metal itself. This holds the same atoms as
+    :py:func:`.create_site_template` gives, but as plain arrays, so that many
+    thousands of them can be kept and compared without any atomium objects.
+
+    :param numpy.ndarray coordinates: The (R, 2, 3) coordinates of the CA and\
+    CB atom of each residue.
+    :param residue_ids: The ID of each residue.
+    :param residue_names: The name of each residue.
+    :param str metal: The element of the metal.
+    :param str metal_id: The ID of the metal's molecule.
+    :param metal_location: The (x, y, z) location of the metal.
+    :param source: What the template was taken from, such as a file path.
+    :raises ValueError: if the residue columns do not match the coordinates."""
+
+    def __init__(self, coordinates, residue_ids, residue_names, metal,
+                 metal_id="", metal_location=(0, 0, 0), source=None):
+        self._coordinates = np.array(
+         coordinates, dtype=float
+        ).reshape(-1, 2, 3)
+        self._residue_ids = tuple(str(id_) for id_ in residue_ids)
+        self._residue_names = tuple(str(name) for name in residue_names)
+        if not (
+         len(self._coordinates) == len(self._residue_ids)
+         == len(self._residue_names)
+        ):
+            raise ValueError("SiteTemplate columns must be the same length")
+        self._metal, self._metal_id = metal, metal_id
+        self._metal_location = np.array(metal_location, dtype=float)
+        self._source = source
+
+
+    def __repr__(self):
+        return "<SiteTemplate {}{} ({} residue{})>".format(
+         self._metal, " " + self._metal_id if self._metal_id else "",
+         len(self), "" if len(self) == 1 else "s"
+        )
+
+
+    def __len__(self):
+        return len(self._coordinates)
+
+
+    @property
+    def coordinates(self):
+        """The (R, 2, 3) coordinates of the CA and CB atom of each residue.
+
+        :rtype: ``numpy.ndarray``"""
+
+        return self._coordinates
+
+
+    @property
+    def residue_ids(self):
+        """The ID of each residue, such as 'A23'.
+
+        :rtype: ``tuple``"""
+
+        return self._residue_ids
+
+
+    @property
+    def residue_names(self):
+        """The name of each residue.
+
+        :rtype: ``tuple``"""
+
+        return self._residue_names
+
+
+    @property
+    def metal(self):
+        """The element of the metal.
+
+        :rtype: ``str``"""
+
+        return self._metal
+
+
+    @property
+    def metal_id(self):
+        """The ID of the metal's molecule.
+
+        :rtype: ``str``"""
+
+        return self._metal_id
+
+
+    @property
+    def metal_location(self):
+        """The (x, y, z) location of the metal.
+
+        :rtype: ``numpy.ndarray``"""
+
+        return self._metal_location
+
+
+    @property
+    def source(self):
+        """What the template was taken from, if known.
+
+        :rtype: ``str``"""
+
+        return self._source
+
+
+    def ca_coordinates(self):
+        """Returns the (R, 3) coordinates of the residues' CA atoms.
+
+        :rtype: ``numpy.ndarray``"""
+
+        return self._coordinates[:, 0]
+
+
+    def cb_coordinates(self):
+        """Returns the (R, 3) coordinates of the residues' CB atoms.
+
+        :rtype: ``numpy.ndarray``"""
+
+        return self._coordinates[:, 1]
+
+
+
+def site_templates(structure, cutoff=4, main_chain=False, carbon=True,
+                   source=None):
+    """Creates a template for every metal site in a structure at once.
+
+    The sites are the same as atomium's ``Molecule.site`` finds - every
+    residue with a non-hydrogen atom within the cutoff distance of the metal -
+    except that each metal atom has its own site. All the metals are looked
+    up in one grid of the structure's atoms, and the CA and CB atoms of each
+    residue are found from an index of the atoms by residue and name, so
+    no atomium objects are made. Residues without both a CA and a CB atom,
+    such as glycines, are left out of the templates, and residues are in the
+    order that they first appear in the structure.
+
+    :param structure: The atomium model or :py:class:`.AtomTable` to look in,\
+    or the path to a .pdb or .cif file to read one from.
+    :param cutoff: How close to the metal a residue's atoms must be.
+    :param bool main_chain: If ``True``, main chain atoms will be considered\
+    when finding the residues near a metal.
+    :param bool carbon: If ``False``, carbon atoms will not be considered.
+    :param source: A label to give the templates. For a path, this is the\
+    path unless given.
+    :raises TypeError: if the structure is not a model, table or path.
+    :raises TypeError: if the cutoff is not numeric.
+    :raises ValueError: if the cutoff is negative.
+    :rtype: ``list`` of :py:class:`.SiteTemplate`"""
+
+    if not isinstance(cutoff, (int, float)):
+        raise TypeError("{} is not a valid cutoff".format(cutoff))
+    if cutoff < 0:
+        raise ValueError("{} is not a valid cutoff".format(cutoff))
+    if isinstance(structure, str):
+        if source is None: source = structure
+        structure = load_table(structure)
+    if isinstance(structure, Model):
+        structure = AtomTable.from_model(structure)
+    if not isinstance(structure, AtomTable):
+        raise TypeError("{} is not a Model or AtomTable".format(structure))
+    return _table_templates(structure, cutoff, main_chain, carbon, source)
+
+
+def site_templates_many(structures, cutoff=4, main_chain=False, carbon=True):
+    """Creates templates for every metal site in each of many structures,
+    yielding them a structure at a time so that only one structure need be
+    held in memory. Templates from a path are labelled with the path, and
+    other templates with the position of their structure in the sequence.
+
+    :param structures: An iterable of atomium models, :py:class:`.AtomTable`\
+    objects or paths to .pdb or .cif files.
+    :param cutoff: How close to the metal a residue's atoms must be.
+    :param bool main_chain: If ``True``, main chain atoms will be considered\
+    when finding the residues near a metal.
+    :param bool carbon: If ``False``, carbon atoms will not be considered.
+    :raises TypeError: if a structure is not a model, table or path.
+    :rtype: ``generator`` of :py:class:`.SiteTemplate`"""
+
+    for position, structure in enumerate(structures):
+        yield from site_templates(
+         structure, cutoff=cutoff, main_chain=main_chain, carbon=carbon,
+         source=structure if isinstance(structure, str) else position
+        )
+
+
+def _table_templates(table, cutoff, main_chain, carbon, source):
+    """Finds the metal sites of an atom table and makes a template of each.
+
+    :param AtomTable table: The atoms to look in.
+    :param cutoff: How close to the metal a residue's atoms must be.
+    :param bool main_chain: If ``True``, main chain atoms are considered.
+    :param bool carbon: If ``False``, carbon atoms are not considered.
+    :param source: The label to give the templates.
+    :rtype: ``list``"""
+
+    metals = np.nonzero(table.metal & table.het)[0]
+    if len(metals) == 0: return []
+    elements, names = table.elements, table.atom_names
+    candidates = ~table.het & (np.char.upper(elements) != "H")
+    if not main_chain: candidates &= ~np.isin(names, MAIN_CHAIN)
+    if not carbon: candidates &= np.char.upper(elements) != "C"
+    residues, first_rows = _residue_index(table)
+    cas, cbs = [_atom_index(table, residues, name) for name in ("CA", "CB")]
+    metal_indices, atom_indices, _ = CellGrid(
+     table.coordinates, cutoff or 1
+    ).pairs(table.coordinates[metals], cutoff, mask=candidates)
+    templates = []
+    ids, residue_names = table.residue_ids, table.residue_names
+    for index, metal in enumerate(metals):
+        nearby = np.unique(residues[atom_indices[metal_indices == index]])
+        nearby = nearby[(cas[nearby] >= 0) & (cbs[nearby] >= 0)]
+        nearby = nearby[np.argsort(first_rows[nearby], kind="stable")]
+        rows = np.stack([cas[nearby], cbs[nearby]], axis=1)
+        templates.append(SiteTemplate(
+         table.coordinates[rows], ids[rows[:, 0]], residue_names[rows[:, 0]],
+         elements[metal], metal_id=ids[metal],
+         metal_location=table.coordinates[metal], source=source
+        ))
+    return templates
+
+
+def _residue_index(table):
+    """Assigns every atom of a table a residue number, shared by all the atoms
+    with the same residue ID and name, and gives the first row of each
+    residue.
+
+    :param AtomTable table: The table to index.
+    :rtype: ``tuple``"""
+
+    keys = np.char.add(
+     np.char.add(table.residue_ids, "|"), table.residue_names
+    ) if len(table) else np.zeros(0, dtype=str)
+    _, first_rows, residues = np.unique(
+     keys, return_index=True, return_inverse=True
+    )
+    return residues.reshape(-1), first_rows
+
+
+def _atom_index(table, residues, name):
+    """Finds the row of the first non-heteroatom with a given name in each
+    residue, or -1 for residues with no such atom.
+
+    :param AtomTable table: The table to look in.
+    :param numpy.ndarray residues: The residue number of each atom.
+    :param str name: The atom name to look for.
+    :rtype: ``numpy.ndarray``"""
+
+    index = np.full(residues.max() + 1 if len(residues) else 0, -1)
+    rows = np.nonzero((table.atom_names == name) & ~table.het)[0][::-1]
+    index[residues[rows]] = rows
+    return index
+
+
+def _template_arrays(template):
+    """Gets the (R, 2, 3) CA and CB coordinates and the residue names of a
+    template, which may be a :py:class:`.SiteTemplate` or an atomium
+    structure of CA and CB atoms.
+
+    :param template: The template.
+    :raises TypeError: if the template is not a template.
+    :rtype: ``tuple``"""
+
+    if isinstance(template, SiteTemplate):
+        return template.coordinates, template.residue_names
+    if not isinstance(template, AtomicStructure):
+        raise TypeError("{} is not a site template".format(template))
+    residues = {}
+    for atom in sorted(template.atoms(), key=lambda atom: atom.id):
+        residues.setdefault(atom.residue, {})[atom.name] = atom.location
+    residues = [(residue, atoms) for residue, atoms in residues.items()
+     if "CA" in atoms and "CB" in atoms]
+    return np.array([
+     [atoms["CA"], atoms["CB"]] for _, atoms in residues
+    ], dtype=float).reshape(-1, 2, 3), tuple(
+     residue.name if residue is not None else "" for residue, _ in residues
+    )
@@ -0,0 +1,418 @@
+"""Contains tools for measuring hydrophobicity over many frames of the same
+structure, such as a molecular dynamics trajectory or an NMR ensemble."""
+
+import struct
+from itertools import repeat, zip_longest
+import numpy as np
+from numpy.lib.format import open_memmap
+from numpy.lib.stride_tricks import as_strided
+from atomium.structures import Model, Atom
+from .hydrophobicity import _centre_array, _pair_sums, _solvation, _contrast
+from .spatial import NeighbourList, Box
+from .tables import AtomTable
+from .files import load_table
+
+class Trajectory:
+    """A fixed topology through which many frames of coordinates can be
+    passed. Everything that does not depend on the coordinates - which atoms
+    pass the heteroatom and metal filters, and each atom's hydrophobicity
+    parameter - is worked out once when this is created, so that each frame
+    only needs the sphere sums themselves.
+
+    Frames are (N, 3) arrays with a row for every atom of the topology, in the
+    order of :py:attr:`.coordinates` - for an atomium model this is order of
+    atom ID, which is the order of the atoms in the file it came from.
+
+    :param topology: The atomium model or :py:class:`.AtomTable` that the\
+    frames are frames of, or the path to a .pdb or .cif file to read one from.
+    :param bool pc: If ``True``, atomic partial charges will be used instead of\
+    atomic solvation parameters (squared).
+    :param bool het: If ``False``, only atoms that have a residue will be\
+    considered.
+    :param bool metal: If ``False``, only non-metal atoms will be considered.
+    :raises TypeError: if the topology is not an atomium model or atom table."""
+
+    def __init__(self, topology, pc=False, het=True, metal=True):
+        if isinstance(topology, str): topology = load_table(topology)
+        if isinstance(topology, Model):
+            self._atoms = sorted(topology.atoms(), key=lambda atom: atom.id)
+            self._table = AtomTable.from_model(topology)
+        elif isinstance(topology, AtomTable):
+            self._atoms, self._table = None, topology
+        else:
+            raise TypeError("{} is not a Model or AtomTable".format(topology))
+        self._mask = self._table.mask(het=het, metal=metal)
+        self._parameters = self._table.parameters(pc=pc)
+
+
+    def __repr__(self):
+        return "<Trajectory ({} atoms)>".format(len(self))
+
+
+    def __len__(self):
+        return len(self._table)
+
+
+    @property
+    def coordinates(self):
+        """The coordinates of the topology itself.
+
+        :rtype: ``numpy.ndarray``"""
+
+        return self._table.coordinates
+
+
+    def atom_indices(self, atoms):
+        """Converts some atoms to their row numbers in each frame. The atoms
+        can be given as row numbers already, or, if the topology is an atomium
+        model, as atoms of that model.
+
+        :param atoms: The atoms to find.
+        :raises ValueError: if an atom is not part of the topology.
+        :rtype: ``numpy.ndarray``"""
+
+        rows = {} if self._atoms is None else {
+         id(atom): row for row, atom in enumerate(self._atoms)
+        }
+        indices = []
+        for atom in atoms:
+            if isinstance(atom, Atom):
+                if id(atom) not in rows:
+                    raise ValueError("{} is not in the topology".format(atom))
+                indices.append(rows[id(atom)])
+            elif isinstance(atom, (int, np.integer)) and 0 <= atom < len(self):
+                indices.append(int(atom))
+            else:
+                raise ValueError("{} is not in the topology".format(atom))
+        return np.array(indices, dtype=int)
+
+
+    def series(self, frames, radius, centres=None, atoms=None, skin=2,
+               box=None):
+        """Measures spheres in each of a sequence of frames, yielding the
+        average solvations and hydrophobic contrasts of the spheres in each
+        frame as it goes. Only one frame is held at a time, so any number of
+        frames can be passed through.
+
+        The spheres are centred either on fixed points, or on atoms whose
+        position in each frame is used (to follow a metal ion, for example).
+        The atoms near the spheres are kept in a :py:class:`.NeighbourList`
+        from frame to frame, so only the atoms near the spheres are usually
+        looked at.
+
+        For a simulation in a periodic box, the box can be given either once
+        for every frame or as a sequence with one box per frame (such as the
+        boxes of a :py:class:`.DcdFrames` file), and distances are then
+        measured to the nearest image of each atom. The frames do not need to
+        be unwrapped first. A sequence of boxes must be exactly as long as the
+        frames - as both are read as they go, a mismatch is only found when
+        one of them runs out.
+
+        :param frames: An iterable of (N, 3) coordinate arrays.
+        :param radius: The radius of the spheres.
+        :param centres: The fixed (x, y, z) centres of the spheres.
+        :param atoms: The atoms to centre the spheres on instead.
+        :param skin: The skin distance of the neighbour list.
+        :param box: The periodic :py:class:`.Box` of every frame, or a\
+        sequence of the box of each frame.
+        :raises TypeError: if the radius or skin is not numeric.
+        :raises ValueError: if the radius or skin is negative.
+        :raises ValueError: if not exactly one of centres and atoms is given.
+        :raises ValueError: if a frame has the wrong shape.
+        :raises ValueError: if there are more or fewer boxes than frames.
+        :raises TypeError: if a box is not a :py:class:`.Box`.
+        :raises ValueError: if the radius is too big for a box.
+        :rtype: ``generator`` of (solvations, contrasts)"""
+
+        neighbours = NeighbourList(radius, skin=skin, mask=self._mask)
+        if (centres is None) == (atoms is None):
+            raise ValueError("Give either centres or atoms to track")
+        if atoms is None:
+            centres = _centre_array(centres)
+        else:
+            atoms = self.atom_indices(atoms)
+        if box is None or isinstance(box, Box):
+            pairs = zip(frames, repeat(box))
+        else:
+            pairs = zip_longest(frames, box, fillvalue=_MISSING)
+        for frame, frame_box in pairs:
+            if frame is _MISSING or frame_box is _MISSING:
+                raise ValueError("There must be one box for every frame")
+            frame = np.asarray(frame, dtype=float)
+            if frame.shape != (len(self), 3):
+                raise ValueError("{} is not a frame of {} atoms".format(
+                 frame.shape, len(self)
+                ))
+            points = frame[atoms] if centres is None else centres
+            sums = _pair_sums(*neighbours.pairs(
+             frame, points, box=frame_box
+            ), self._parameters, len(points))
+            yield _solvation(*sums), _contrast(*sums)
+
+
+
+def contrast_series(topology, frames, radius, centres=None, atoms=None,
+                    pc=False, het=True, metal=True, skin=2, box=None):
+    """Determines the average solvation and hydrophobic contrast of one or
+    more spheres across many frames of the same structure. The atoms'
+    parameters are looked up once, and the frames are read one at a time, so
+    memory use does not grow with the length of the trajectory.
+
+    The result is two arrays with a row for each frame and a column for each
+    sphere.
+
+    :param topology: The atomium model or :py:class:`.AtomTable` that the\
+    frames are frames of, or the path to a .pdb or .cif file to read one from.
+    :param frames: An iterable of (N, 3) coordinate arrays, with rows in the\
+    order given by :py:attr:`.Trajectory.coordinates`.
+    :param radius: The radius of the spheres.
+    :param centres: The fixed (x, y, z) centres of the spheres.
+    :param atoms: The atoms (or row numbers) to centre the spheres on instead.
+    :param bool pc: If ``True``, atomic partial charges will be used instead of\
+    atomic solvation parameters (squared).
+    :param bool het: If ``False``, only atoms that have a residue will be\
+    considered.
+    :param bool metal: If ``False``, only non-metal atoms will be considered.
+    :param skin: The skin distance of the neighbour list used between frames.
+    :param box: The periodic :py:class:`.Box` of every frame, or a sequence\
+    of the box of each frame.
+    :raises TypeError: if the topology is not an atomium model or atom table.
+    :raises TypeError: if the radius or skin is not numeric.
+    :raises ValueError: if the radius or skin is negative.
+    :raises ValueError: if not exactly one of centres and atoms is given.
+    :raises ValueError: if a frame has the wrong shape.
+    :raises ValueError: if there are more or fewer boxes than frames.
+    :raises TypeError: if a box is not a :py:class:`.Box`.
+    :raises ValueError: if the radius is too big for a box.
+    :rtype: ``tuple`` of (solvations ``numpy.ndarray``, contrasts\
+    ``numpy.ndarray``)"""
+
+    trajectory = Trajectory(topology, pc=pc, het=het, metal=metal)
+    solvations, contrasts = [], []
+    for solvation, contrast in trajectory.series(
+     frames, radius, centres=centres, atoms=atoms, skin=skin, box=box
+    ):
+        solvations.append(solvation)
+        contrasts.append(contrast)
+    if not solvations:
+        width = len(_centre_array(centres)) if atoms is None else len(atoms)
+        return np.zeros((0, width)), np.zeros((0, width))
+    return np.array(solvations), np.array(contrasts)
+
+
+
+class FrameFile:
+    """A file of coordinate frames, memory-mapped so that frames are only read
+    from disk when they are used. Indexing gives a frame as an (N, 3) array,
+    and slicing gives an (F, N, 3) array of every frame in the slice - both
+    are views of the file rather than copies, so a trajectory far larger than
+    memory can be read a frame at a time by iterating over this.
+
+    This is the base class of the readers for particular formats, and is not
+    created directly - see :py:func:`.open_frames`."""
+
+    def __init__(self, path, frames):
+        self._path, self._frames = path, frames
+
+
+    def __repr__(self):
+        return "<{} ({} frames of {} atoms)>".format(
+         self.__class__.__name__, len(self), self.atom_count
+        )
+
+
+    def __len__(self):
+        return self._frames.shape[0]
+
+
+    def __getitem__(self, index):
+        return self._frames[index]
+
+
+    def __iter__(self):
+        for index in range(len(self)): yield self._frames[index]
+
+
+    @property
+    def path(self):
+        """The location of the file.
+
+        :rtype: ``str``"""
+
+        return self._path
+
+
+    @property
+    def atom_count(self):
+        """The number of atoms in each frame.
+
+        :rtype: ``int``"""
+
+        return self._frames.shape[1]
+
+
+    def frames(self, start=0, stop=None, step=1):
+        """Returns every ``step``-th frame between two frame indices, as a view
+        of the file.
+
+        :param int start: The first frame.
+        :param int stop: The frame to stop before, if not the end.
+        :param int step: The number of frames to move on each time.
+        :rtype: ``numpy.ndarray``"""
+
+        return self._frames[start:stop:step]
+
+
+
+class NpyFrames(FrameFile):
+    """Base class: :py:class:`.FrameFile`
+
+    A .npy file holding a single (F, N, 3) array of coordinates - a simple
+    format that any trajectory can be converted to with
+    :py:func:`.save_frames`.
+
+    :param str path: The location of the file.
+    :raises ValueError: if the file does not hold an (F, N, 3) array."""
+
+    def __init__(self, path):
+        frames = np.load(path, mmap_mode="r")
+        if frames.ndim != 3 or frames.shape[2] != 3:
+            raise ValueError("{} does not hold (F, N, 3) frames".format(path))
+        FrameFile.__init__(self, path, frames)
+
+
+
+class DcdFrames(FrameFile):
+    """Base class: :py:class:`.FrameFile`
+
+    A CHARMM or NAMD .dcd trajectory file. Each frame stores the x, y and z
+    coordinates as separate blocks, so each frame given is a strided view of
+    these blocks. A file with a header but no frames has no frames, rather
+    than being an error.
+
+    :param str path: The location of the file.
+    :raises ValueError: if the file is not a valid .dcd file.
+    :raises ValueError: if the file has fixed atoms, which are not supported."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            header = f.read(8)
+            for order in "<>":
+                if struct.unpack(order + "i", header[:4])[0] == 84: break
+            else:
+                raise ValueError("{} is not a DCD file".format(path))
+            if header[4:8] != b"CORD":
+                raise ValueError("{} is not a DCD file".format(path))
+            control = struct.unpack(order + "20i", f.read(80))
+            f.read(4)
+            title_length = struct.unpack(order + "i", f.read(4))[0]
+            f.read(title_length + 4)
+            f.read(4)
+            atoms = struct.unpack(order + "i", f.read(4))[0]
+            f.read(4)
+            offset = f.tell()
+            f.seek(0, 2)
+            size = f.tell()
+        if control[8]:
+            raise ValueError("{} has fixed atoms".format(path))
+        charmm = control[19] != 0
+        self._has_cell = charmm and control[10] != 0
+        blocks = 4 if charmm and control[11] else 3
+        cell_bytes = 56 if self._has_cell else 0
+        frame_bytes = cell_bytes + blocks * (atoms * 4 + 8)
+        count = (size - offset) // frame_bytes
+        if count:
+            self._data = np.memmap(
+             path, dtype=order + "f4", mode="r", offset=offset,
+             shape=(count, frame_bytes // 4)
+            )
+        else:
+            self._data = np.zeros((0, frame_bytes // 4), dtype=order + "f4")
+        self._order = order
+        start = cell_bytes // 4 + 1
+        frames = as_strided(
+         self._data[:, start:], shape=(count, atoms, 3),
+         strides=(frame_bytes, 4, atoms * 4 + 8), writeable=False
+        )
+        FrameFile.__init__(self, path, frames)
+
+
+    def unit_cell(self, index):
+        """Returns the unit cell of a frame as the lengths a, b and c and the
+        angles alpha, beta and gamma in degrees, or ``None`` if the file does
+        not store unit cells.
+
+        :param int index: The frame to look at.
+        :rtype: ``tuple``"""
+
+        if not self._has_cell: return None
+        cell = self._data[index, 1:13].view(self._order + "f8")
+        a, gamma, b, beta, alpha, c = cell.tolist()
+        angles = [alpha, beta, gamma]
+        if all(abs(angle) <= 1 for angle in angles):
+            angles = [np.degrees(np.arccos(angle)) for angle in angles]
+        return (a, b, c, *angles)
+
+
+    def box(self, index):
+        """Returns the periodic box of a frame, or ``None`` if the file does
+        not store unit cells.
+
+        :param int index: The frame to look at.
+        :rtype: :py:class:`.Box`"""
+
+        cell = self.unit_cell(index)
+        return None if cell is None else Box(*cell)
+
+
+    def boxes(self):
+        """Yields the periodic box of every frame in turn, in the form that
+        :py:meth:`.Trajectory.series` takes them.
+
+        :rtype: ``generator``"""
+
+        for index in range(len(self)): yield self.box(index)
+
+
+
+def open_frames(path):
+    """Opens a trajectory file of frames, memory-mapping it rather than
+    reading it into memory. The format is chosen from the file extension -
+    .dcd or .npy.
+
+    :param str path: The location of the file.
+    :raises ValueError: if the file is not a .dcd or .npy file.
+    :rtype: :py:class:`.FrameFile`"""
+
+    extension = path.lower().rsplit(".", 1)[-1]
+    if extension == "dcd": return DcdFrames(path)
+    if extension == "npy": return NpyFrames(path)
+    raise ValueError("{} is not a .dcd or .npy file".format(path))
+
+
+def save_frames(path, frames):
+    """Writes frames to a .npy file that :py:class:`.NpyFrames` can read. The
+    frames are written one at a time into a memory-mapped file, so a
+    trajectory in another format can be converted without holding it in
+    memory.
+
+    :param str path: The location to write to.
+    :param frames: A sequence of (N, 3) coordinate arrays whose length is\
+    known, such as a :py:class:`.FrameFile`.
+    :raises ValueError: if the frames are not all (N, 3) arrays of one size."""
+
+    atoms = len(frames[0]) if len(frames) else 0
+    output = open_memmap(
+     path, mode="w+", dtype=np.float32, shape=(len(frames), atoms, 3)
+    )
+    for index, frame in enumerate(frames):
+        if np.shape(frame) != (atoms, 3):
+            raise ValueError("{} is not a frame of {} atoms".format(
+             np.shape(frame), atoms
+            ))
+        output[index] = frame
+    output.flush()
+
+
+
+_MISSING = object()
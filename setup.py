@@ -19,5 +19,6 @@ setup(
  ],
  keywords="chemistry bioinformatics proteins biochemistry metals",
  packages=["biometal"],
- install_requires=["atomium"]
+ install_requires=["atomium", "numpy"],
+ entry_points={"console_scripts": ["biometal=biometal.cli:main"]}
 )
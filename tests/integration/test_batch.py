@@ -0,0 +1,162 @@
+from unittest import TestCase
+import io
+import json
+import os
+import random
+import shutil
+import tempfile
+from unittest.mock import patch
+import numpy as np
+import biometal
+from biometal.cli import main
+
+def crash(path):
+    if path == "crash": os._exit(1)
+    return path.upper()
+
+
+
+class BatchTests(TestCase):
+
+    def setUp(self):
+        random.seed(31)
+        self.directory = tempfile.mkdtemp()
+        self.paths = []
+        for number in range(5):
+            lines, atom = [], 1
+            for residue in range(30):
+                centre = [random.uniform(0, 16) for _ in range(3)]
+                for name in ["N", "CA", "C", "O", "CB", "CG"]:
+                    lines.append(self.line(
+                     "ATOM", atom, name, "HIS", residue + 1, name[0],
+                     [c + random.uniform(-1.5, 1.5) for c in centre]
+                    ))
+                    atom += 1
+            for metal in range(2):
+                lines.append(self.line(
+                 "HETATM", atom, "ZN", "ZN", 500 + metal, "ZN",
+                 [random.uniform(4, 12) for _ in range(3)]
+                ))
+                atom += 1
+            self.paths.append(os.path.join(
+             self.directory, "{}.pdb".format(number)
+            ))
+            with open(self.paths[-1], "w") as f:
+                f.write("\n".join(lines + ["END"]))
+        self.bad = os.path.join(self.directory, "bad.pdb")
+        with open(self.bad, "w") as f: f.write("ATOM  " + "x" * 74)
+
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+    def line(self, record, number, name, residue, residue_id, element, location):
+        return "{:6}{:5} {:^4} {:3} A{:4}    {:8.3f}{:8.3f}{:8.3f}{:6.2f}{:6.2f}"\
+         "          {:>2}  ".format(
+          record, number, name, residue, residue_id, *location, 1, 0, element
+         )
+
+
+    def test_process_pool_matches_single_process(self):
+        paths = self.paths[:3] + [self.bad] + self.paths[3:]
+        results = {r.path: r for r in biometal.run_batch(
+         paths, "contrast", workers=2, chunk_size=2, radius=6
+        )}
+        self.assertEqual(set(results), set(paths))
+        self.assertFalse(results[self.bad].succeeded)
+        self.assertIn("ValueError", results[self.bad].error)
+        for path in self.paths:
+            table = biometal.load_table(path)
+            metals = np.nonzero(table.metal)[0]
+            expected = [biometal.hydrophobic_contrast(
+             table, *table.coordinates[index], 6
+            ) for index in metals]
+            self.assertEqual(
+             [metal[0] for metal in results[path].value], ["A500", "A501"]
+            )
+            self.assertTrue(np.allclose(
+             [metal[3] for metal in results[path].value], expected
+            ))
+
+
+    def test_process_pool_survives_crashed_workers(self):
+        paths = list("abcde") + ["crash"] + list("fghij")
+        results = list(biometal.run_batch(
+         paths, crash, workers=2, chunk_size=2
+        ))
+        self.assertEqual(sorted(r.path for r in results), sorted(paths))
+        failed = [r for r in results if not r.succeeded]
+        self.assertEqual([r.path for r in failed], ["crash"])
+        self.assertIn("BrokenProcessPool", failed[0].error)
+        for result in results:
+            if result.succeeded:
+                self.assertEqual(result.value, result.path.upper())
+
+
+    def test_process_pool_returns_templates(self):
+        results = list(biometal.run_batch(
+         self.paths, "templates", workers=2, chunk_size=1
+        ))
+        self.assertTrue(all(r.succeeded for r in results))
+        for result in results:
+            expected = biometal.site_templates(result.path)
+            self.assertEqual(
+             [t.residue_ids for t in result.value],
+             [t.residue_ids for t in expected]
+            )
+
+
+    def test_command_line_tools(self):
+        output = os.path.join(self.directory, "contrasts.jsonl")
+        with patch("sys.stderr", io.StringIO()) as stderr:
+            status = main([
+             "contrast", self.directory, "--workers", "2", "--output", output
+            ])
+        self.assertEqual(status, 1)
+        self.assertIn("bad.pdb", stderr.getvalue())
+        with open(output) as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual(len(lines), 6)
+        self.assertEqual(sum("error" in line for line in lines), 1)
+        library = os.path.join(self.directory, "sites.bmtl")
+        with patch("sys.stderr", io.StringIO()):
+            status = main([
+             "templates", *self.paths, "--output", library, "--workers", "2"
+            ])
+        self.assertEqual(status, 0)
+        self.assertEqual(len(biometal.TemplateLibrary(library)), 10)
+
+
+    def test_sharded_job_can_be_resumed_and_merged(self):
+        manifest = os.path.join(self.directory, "job.json")
+        paths = self.paths + [self.bad]
+        biometal.create_manifest(
+         manifest, paths, "contrast", shards=3, radius=6
+        )
+        biometal.run_shard(manifest, 0, workers=2)
+        first = biometal.run_shard(manifest, 0, workers=2)
+        self.assertEqual(first["skipped"], first["paths"])
+        self.assertEqual(first["completed"], 0)
+        with self.assertRaises(ValueError):
+            biometal.merge_shards(manifest, "unused.jsonl")
+        with open(os.path.join(self.directory, "job.shard-1.jsonl"), "w") as f:
+            f.write('{"path": "')
+        for shard in (1, 2): biometal.run_shard(manifest, shard, workers=2)
+        output = os.path.join(self.directory, "merged.jsonl")
+        summary = biometal.merge_shards(manifest, output)
+        self.assertEqual(summary, {
+         "paths": 6, "missing": 0, "failed": 1, "completed": 5
+        })
+        with open(output) as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual([line["path"] for line in lines], paths)
+        for line in lines[:5]:
+            table = biometal.load_table(line["path"])
+            metals = np.nonzero(table.metal)[0]
+            self.assertTrue(np.allclose(
+             [metal["contrast"] for metal in line["metals"]],
+             biometal.hydrophobic_contrast_many(
+              table, table.coordinates[metals], 6
+             )
+            ))
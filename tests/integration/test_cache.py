@@ -0,0 +1,73 @@
+from unittest import TestCase
+from unittest.mock import patch
+import os
+import shutil
+import tempfile
+from atomium.structures import Model, Atom, Residue, Molecule
+import numpy as np
+import biometal
+
+class CacheTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.model = Model()
+        self.model.add(Molecule(Atom("Zn", 0, 0, 0, name="ZN")))
+        self.model.add(Residue(
+         Atom("C", 1.5, 0, 0, name="CA"), Atom("N", 0, 2, 0, name="N"),
+         Atom("O", 0, 0, 3, name="O"), name="VAL"
+        ))
+        self.model.add(Residue(
+         Atom("S", 3, 3, 0, name="SG"), Atom("C", -2, 1, 1, name="CB"),
+         name="CYS"
+        ))
+
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+    def test_cached_maps_match_uncached_maps(self):
+        cache = biometal.ResultCache(self.directory)
+        expected = biometal.contrast_map(self.model, 3, spacing=1)
+        first = cache.call(biometal.contrast_map, self.model, 3, spacing=1)
+        table = biometal.AtomTable.from_model(self.model)
+        with patch("biometal.hydrophobicity._grid_sums") as mock_sums:
+            second = cache.call(biometal.contrast_map, table, 3, spacing=1.0)
+            self.assertFalse(mock_sums.called)
+        for values in (first, second):
+            self.assertTrue(np.array_equal(values[0], expected[0]))
+            self.assertEqual(values[1:], expected[1:])
+        self.assertEqual(cache.info()["hits"], 1)
+        cache.call(biometal.contrast_map, self.model, 3, spacing=1, pc=True)
+        self.model.atom(name="SG").move_to(3, 3, 1)
+        cache.call(biometal.contrast_map, self.model, 3, spacing=1)
+        self.assertEqual(len(cache), 3)
+
+
+    def test_processes_can_share_cache(self):
+        paths = []
+        for number in range(4):
+            paths.append(os.path.join(self.directory, "{}.pdb".format(number)))
+            with open(paths[-1], "w") as f:
+                f.write(
+                 "ATOM      1  CA  VAL A   1       1.500   0.000   0.000"
+                 "  1.00  0.00           C  \n"
+                 "HETATM    2 ZN    ZN A 100       0.000   0.000{:8.3f}"
+                 "  1.00  0.00          ZN  \nEND".format(number / 10)
+                )
+        directory = os.path.join(self.directory, "cache")
+        for _ in range(2):
+            results = list(biometal.run_batch(
+             paths, "contrast", workers=2, chunk_size=1, radius=4,
+             cache=directory
+            ))
+            self.assertTrue(all(result.succeeded for result in results))
+        self.assertEqual(len(biometal.ResultCache(directory)), 4)
+        for result in results:
+            table = biometal.load_table(result.path)
+            self.assertAlmostEqual(
+             result.value[0][3], biometal.hydrophobic_contrast_many(
+              table, table.coordinates[1:], 4
+             )[0]
+            )
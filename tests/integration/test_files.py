@@ -0,0 +1,83 @@
+from unittest import TestCase
+import gzip
+import os
+import random
+import shutil
+import tempfile
+import atomium
+import biometal
+
+class TableLoadingTests(TestCase):
+
+    def setUp(self):
+        random.seed(13)
+        lines, number = [], 1
+        for residue in range(30):
+            name = random.choice(["GLU", "HIS", "ARG"])
+            for element, atom in [("C", "CA"), ("O", "OE1"), ("N", "ND1"), (
+             "N", "NH1"
+            )]:
+                lines.append(self.line(
+                 "ATOM", number, atom, name, residue + 1, element,
+                 random.choice(["  ", "  ", "1-"])
+                ))
+                number += 1
+        for molecule in range(4):
+            element = random.choice(["ZN", "O"])
+            lines.append(self.line(
+             "HETATM", number, element, "HOH", molecule + 100, element, "  "
+            ))
+            number += 1
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "model.pdb")
+        with open(self.path, "w") as f:
+            f.write("\n".join(lines + ["END"]))
+        self.model = atomium.pdb_from_file(self.path).model
+        self.points = [[random.uniform(0, 15) for _ in range(3)] for _ in range(10)]
+
+
+    def line(self, record, number, name, residue, residue_id, element, charge):
+        return "{:6}{:5} {:^4} {:3} A{:4}    {:8.3f}{:8.3f}{:8.3f}{:6.2f}{:6.2f}"\
+         "          {:>2}{}".format(
+          record, number, name, residue, residue_id,
+          *[random.uniform(0, 15) for _ in range(3)], 1, 0, element, charge
+         )
+
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+    def check_table(self, table):
+        atoms = sorted(self.model.atoms(), key=lambda atom: atom.id)
+        self.assertEqual(len(table), 124)
+        self.assertEqual(
+         table.coordinates.tolist(), [list(atom.location) for atom in atoms]
+        )
+        self.assertEqual(
+         table.charges.tolist(), [atom.charge for atom in atoms]
+        )
+        self.assertEqual(
+         table.het.tolist(), [atom.residue is None for atom in atoms]
+        )
+        self.assertEqual(table.residue_ids.tolist(), [
+         (atom.residue or atom.molecule).id for atom in atoms
+        ])
+        for point in self.points:
+            for kwargs in [{}, {"pc": True}, {"het": False}, {"metal": False}]:
+                self.assertAlmostEqual(biometal.hydrophobic_contrast(
+                 table, *point, 5, **kwargs
+                ), biometal.hydrophobic_contrast(
+                 self.model, *point, 5, **kwargs
+                ), delta=1e-6)
+
+
+    def test_pdb_table_matches_atomium_model(self):
+        self.check_table(biometal.load_table(self.path))
+
+
+    def test_gzipped_pdb_table_matches_atomium_model(self):
+        with open(self.path, "rb") as f:
+            with gzip.open(self.path + ".gz", "wb") as g:
+                g.write(f.read())
+        self.check_table(biometal.load_table(self.path + ".gz"))
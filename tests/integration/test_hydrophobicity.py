@@ -1,5 +1,6 @@
 from unittest import TestCase
 from atomium.structures import Model, Atom, Residue, Molecule
+import numpy as np
 import biometal
 
 class SolvationTests(TestCase):
@@ -92,6 +93,18 @@ class SolvationTests(TestCase):
         ), 7.688794/17, delta=0.005)
 
 
+    def test_parameter_arrays_match_atom_functions(self):
+        atoms = list(self.model.atoms())
+        self.assertEqual(
+         biometal.solvation_parameters(atoms).tolist(),
+         [biometal.hydrophobicity.atom_solvation(atom) for atom in atoms]
+        )
+        self.assertEqual(
+         biometal.partial_charges_of(atoms).tolist(),
+         [biometal.hydrophobicity.atom_partial_charge(atom) for atom in atoms]
+        )
+
+
 
 class ContrastTests(TestCase):
 
@@ -150,3 +163,130 @@ class ContrastTests(TestCase):
           5 * ((0 + ((-0.5) ** 2) + ((-0.52) ** 2) + (0.201 ** 2) + (0.033 ** 2)) / 5) * ((0 + 0.25 + 0.25 + 1 + 1) / 5)
          ), delta=0.0000005
         )
+
+
+    def test_contrast_map_matches_point_function(self):
+        for kwargs in [{}, {"pc": True}, {"het": False}, {"metal": False}]:
+            values, origin, spacing = biometal.hydrophobicity.contrast_map(
+             self.model, 0.8, spacing=0.25, margin=0.5, **kwargs
+            )
+            self.assertEqual(values.shape, (9, 9, 5))
+            self.assertEqual(origin, (-0.5, -0.5, -0.5))
+            for index in np.ndindex(values.shape):
+                point = [o + i * spacing for o, i in zip(origin, index)]
+                self.assertAlmostEqual(values[index],
+                 biometal.hydrophobic_contrast(self.model, *point, 0.8, **kwargs),
+                 delta=0.0000005
+                )
+
+
+    def test_many_spheres_match_point_functions(self):
+        centres = [[0, 0, 0], [0.5, 0.5, 0], [1, 1, 1], [0.2, -0.3, 0.1], [9, 9, 9]]
+        for radius in [0, 0.5, 1, 2]:
+            for kwargs in [{}, {"pc": True}, {"het": False}, {"metal": False}]:
+                solvations = biometal.solvation_many(
+                 self.model, centres, radius, **kwargs
+                )
+                contrasts = biometal.hydrophobic_contrast_many(
+                 self.model, centres, radius, **kwargs
+                )
+                for centre, solv, contrast in zip(centres, solvations, contrasts):
+                    self.assertAlmostEqual(solv, biometal.solvation(
+                     self.model, *centre, radius, **kwargs
+                    ), delta=0.0000005)
+                    self.assertAlmostEqual(contrast, biometal.hydrophobic_contrast(
+                     self.model, *centre, radius, **kwargs
+                    ), delta=0.0000005)
+
+
+    def test_sphere_hydrophobicity_matches_separate_functions(self):
+        for radius in [0.1, 0.5, 1]:
+            for kwargs in [{}, {"pc": True}, {"het": False}]:
+                sphere = biometal.sphere_hydrophobicity(
+                 self.model, 0, 0, 0, radius, **kwargs
+                )
+                self.assertEqual(sphere.solvation, biometal.solvation(
+                 self.model, 0, 0, 0, radius, **kwargs
+                ))
+                self.assertEqual(sphere.contrast, biometal.hydrophobic_contrast(
+                 self.model, 0, 0, 0, radius, **kwargs
+                ))
+        self.assertEqual(
+         biometal.sphere_hydrophobicity(self.model, 0, 0, 0, 1).count, 5
+        )
+
+
+    def test_contrast_profile_matches_point_functions(self):
+        radii = [0, 0.1, 0.25, 0.5, 0.75, 1, 1.5, 0.4]
+        for kwargs in [{}, {"pc": True}, {"het": False}, {"metal": False}]:
+            solvations, contrasts = biometal.contrast_profile(
+             self.model, 0.1, 0.2, 0, radii, **kwargs
+            )
+            for radius, solv, contrast in zip(radii, solvations, contrasts):
+                self.assertAlmostEqual(solv, biometal.solvation(
+                 self.model, 0.1, 0.2, 0, radius, **kwargs
+                ), delta=0.0000005)
+                self.assertAlmostEqual(contrast, biometal.hydrophobic_contrast(
+                 self.model, 0.1, 0.2, 0, radius, **kwargs
+                ), delta=0.0000005)
+
+
+    def test_fft_maps_match_direct_maps_for_atoms_on_grid(self):
+        for function in (biometal.contrast_map, biometal.solvation_map):
+            for kwargs in [{}, {"pc": True}, {"het": False}]:
+                direct, origin1, _ = function(
+                 self.model, 0.8, spacing=0.5, margin=1, **kwargs
+                )
+                fft, origin2, _ = function(
+                 self.model, 0.8, spacing=0.5, margin=1, method="fft", **kwargs
+                )
+                self.assertEqual(origin1, origin2)
+                self.assertLess(np.abs(direct - fft).max(), 0.0000005)
+
+
+    def test_solvation_map_matches_point_function(self):
+        values, origin, spacing = biometal.solvation_map(
+         self.model, 0.8, spacing=0.25
+        )
+        for index in np.ndindex(values.shape):
+            point = [o + i * spacing for o, i in zip(origin, index)]
+            self.assertAlmostEqual(values[index], biometal.solvation(
+             self.model, *point, 0.8
+            ), delta=0.0000005)
+
+
+    def test_fft_map_peaks_are_exact(self):
+        fft, origin, spacing = biometal.contrast_map(
+         self.model, 1.1, spacing=0.3, method="fft"
+        )
+        refined, origin, spacing = biometal.contrast_map(
+         self.model, 1.1, spacing=0.3, method="fft", peaks=3
+        )
+        third = np.sort(fft, axis=None)[-3]
+        for index in np.ndindex(fft.shape):
+            point = [o + i * spacing for o, i in zip(origin, index)]
+            exact = biometal.hydrophobic_contrast(self.model, *point, 1.1)
+            if fft[index] > third:
+                self.assertAlmostEqual(refined[index], exact, delta=0.0000005)
+            elif fft[index] < third:
+                self.assertEqual(refined[index], fft[index])
+
+
+    def test_profiling_records_hot_paths(self):
+        biometal.clear_parameter_cache()
+        with biometal.profile() as recorder:
+            biometal.hydrophobic_contrast(self.model, 0, 0, 0, 5)
+            biometal.hydrophobic_contrast(self.model, 0, 0, 0, 5)
+            biometal.hydrophobic_contrast_many(
+             self.model, [[0, 0, 0], [1, 1, 1]], 5
+            )
+        counters = recorder.as_dict()["counters"]
+        self.assertEqual(counters["sphere_queries"], 4)
+        self.assertEqual(counters["atoms_visited"], 20)
+        self.assertEqual(counters["parameter_cache_misses"], 5)
+        self.assertEqual(counters["parameter_cache_hits"], 5)
+        self.assertEqual(set(recorder.timers), {
+         "sphere_queries", "parameter_lookups", "distance_arithmetic"
+        })
+        biometal.hydrophobic_contrast(self.model, 0, 0, 0, 5)
+        self.assertEqual(recorder.counters["sphere_queries"], 4)
@@ -0,0 +1,53 @@
+from unittest import TestCase
+import random
+from atomium.structures import Model, Atom, Residue, Molecule
+import biometal
+
+class ContrastOptimizationTests(TestCase):
+
+    def setUp(self):
+        random.seed(11)
+        self.model = Model()
+        for index in range(30):
+            self.model.add(Residue(*[Atom(
+             random.choice(["C", "N", "O", "S"]),
+             *[random.uniform(0, 12) for _ in range(3)],
+             name=random.choice(["CA", "OE1", "ND1", "NH1"])
+            ) for _ in range(4)], name=random.choice(["GLU", "HIS", "ARG"])))
+
+
+    def test_optimizer_climbs_contrast(self):
+        start = (6, 6, 6)
+        initial = biometal.hydrophobic_contrast(self.model, *start, 5)
+        for width in [0, 1]:
+            for kwargs in [{}, {"pc": True}]:
+                point, contrast = biometal.optimize_contrast(
+                 self.model, start, 5, width=width, **kwargs
+                )
+                self.assertAlmostEqual(contrast, biometal.hydrophobic_contrast(
+                 self.model, *point, 5, **kwargs
+                ), delta=0.0000005)
+                if not kwargs:
+                    self.assertGreaterEqual(contrast, initial)
+
+
+    def test_optimizer_can_use_index(self):
+        index = biometal.SpatialIndex(self.model, cell_size=5)
+        point1, contrast1 = biometal.optimize_contrast(
+         self.model, (6, 6, 6), 5, index=index
+        )
+        point2, contrast2 = biometal.optimize_contrast(self.model, (6, 6, 6), 5)
+        self.assertAlmostEqual(contrast1, contrast2, delta=0.0000005)
+        for coordinate1, coordinate2 in zip(point1, point2):
+            self.assertAlmostEqual(coordinate1, coordinate2, delta=0.0000005)
+
+
+    def test_can_find_maxima(self):
+        maxima = biometal.contrast_maxima(self.model, 5, spacing=6)
+        self.assertTrue(maxima)
+        values = [contrast for _, contrast in maxima]
+        self.assertEqual(values, sorted(values, reverse=True))
+        for point, contrast in maxima:
+            self.assertAlmostEqual(contrast, biometal.hydrophobic_contrast(
+             self.model, *point, 5
+            ), delta=0.0000005)
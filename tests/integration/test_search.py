@@ -0,0 +1,91 @@
+from unittest import TestCase
+import os
+import random
+import shutil
+import tempfile
+import numpy as np
+import atomium
+import biometal
+
+class TemplateSearchTests(TestCase):
+
+    def setUp(self):
+        random.seed(23)
+        self.template = biometal.SiteTemplate([
+         [[0, 0, 0], [1.2, 0.9, 0.2]], [[6, 0, 0], [5.4, 1.3, 0.3]],
+         [[1, 6.5, 0], [1.6, 5.2, 0.6]], [[3, 3, 5], [3, 2.8, 3.5]]
+        ], ["A1", "A2", "A3", "A4"], ["HIS", "HIS", "CYS", "HIS"], "ZN")
+        angle = np.radians(120)
+        self.rotation = np.array([
+         [np.cos(angle), 0, np.sin(angle)], [0, 1, 0],
+         [-np.sin(angle), 0, np.cos(angle)]
+        ])
+        self.directory = tempfile.mkdtemp()
+        self.paths = []
+        for number in range(12):
+            residues = [(
+             random.choice(["ALA", "LEU", "SER"]),
+             [random.uniform(0, 40) for _ in range(3)]
+            ) for _ in range(150)]
+            residues = [(name, [ca, [c + random.uniform(-1, 1) for c in ca]])
+             for name, ca in residues]
+            if number in (4, 9):
+                moved = self.template.coordinates @ self.rotation.T + 50
+                if number == 9: moved = moved + np.random.RandomState(
+                 3
+                ).uniform(-0.2, 0.2, moved.shape)
+                residues[60:60] = zip(
+                 self.template.residue_names, moved.tolist()
+                )
+            self.paths.append(self.write(number, residues))
+
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+    def write(self, number, residues):
+        lines, atom = [], 1
+        for residue_number, (name, locations) in enumerate(residues, start=1):
+            for atom_name, location in zip(("CA", "CB"), locations):
+                lines.append(
+                 "ATOM  {:5} {:^4} {:3} A{:4}    {:8.3f}{:8.3f}{:8.3f}"
+                 "{:6.2f}{:6.2f}           C  ".format(
+                  atom, atom_name, name, residue_number, *location, 1, 0
+                 )
+                )
+                atom += 1
+        path = os.path.join(self.directory, "{}.pdb".format(number))
+        with open(path, "w") as f:
+            f.write("\n".join(lines + ["END"]))
+        return path
+
+
+    def test_planted_sites_are_found_first(self):
+        index = biometal.TemplateIndex()
+        index.add_many(self.paths)
+        self.assertEqual(len(index), 12)
+        matches = index.search(self.template, same_residues=True)
+        self.assertEqual(
+         [match.source for match in matches[:2]],
+         [self.paths[4], self.paths[9]]
+        )
+        self.assertEqual(matches[0].residue_ids, ("A61", "A62", "A63", "A64"))
+        self.assertAlmostEqual(matches[0].rmsd, 0, delta=0.01)
+        self.assertTrue(np.allclose(
+         matches[0].rotation, self.rotation, atol=0.01
+        ))
+        self.assertGreater(matches[1].rmsd, matches[0].rmsd)
+
+
+    def test_can_search_with_atomium_template(self):
+        model = atomium.pdb_from_file(self.paths[4]).model
+        residues = [model.residue("A{}".format(n)) for n in range(61, 65)]
+        template = biometal.create_site_template(
+         atomium.structures.chains.Site(*residues)
+        )
+        matches = biometal.search_templates(template, self.paths, limit=2)
+        self.assertEqual(
+         [match.source for match in matches], [self.paths[4], self.paths[9]]
+        )
+        self.assertEqual(matches[0].residue_ids, ("A61", "A62", "A63", "A64"))
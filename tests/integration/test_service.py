@@ -0,0 +1,118 @@
+from unittest import TestCase
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import shutil
+import tempfile
+import threading
+from urllib.error import HTTPError
+from urllib.request import urlopen, Request
+import numpy as np
+import biometal
+
+class ServiceTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "site.pdb")
+        atoms = [
+         ("ATOM", "CA", "HIS", 1, "C", (1.5, 0, 0)),
+         ("ATOM", "CB", "HIS", 1, "C", (2, 1, 0)),
+         ("ATOM", "NE2", "HIS", 1, "N", (0, 2, 0)),
+         ("ATOM", "CA", "CYS", 2, "C", (-3, 0, 1)),
+         ("ATOM", "CB", "CYS", 2, "C", (-2, 0.5, 1)),
+         ("ATOM", "SG", "CYS", 2, "S", (-1, 0, 2)),
+         ("HETATM", "ZN", "ZN", 100, "ZN", (0, 0, 0))
+        ]
+        with open(self.path, "w") as f:
+            for number, (record, name, residue, id_, element, location) in (
+             enumerate(atoms, start=1)
+            ):
+                f.write(
+                 "{:6}{:5} {:^4} {:3} A{:4}    {:8.3f}{:8.3f}{:8.3f}"
+                 "  1.00  0.00          {:>2}\n".format(
+                  record, number, name, residue, id_, *location, element
+                 )
+                )
+            f.write("END\n")
+        self.service = biometal.AnalysisService(
+         workers=4, root=self.directory
+        )
+        self.loop = asyncio.new_event_loop()
+        self.server = self.loop.run_until_complete(self.service.start(port=0))
+        self.url = "http://127.0.0.1:{}".format(
+         self.server.sockets[0].getsockname()[1]
+        )
+        self.thread = threading.Thread(target=self.loop.run_forever)
+        self.thread.start()
+
+
+    def tearDown(self):
+        async def close():
+            self.server.close()
+            await self.server.wait_closed()
+        asyncio.run_coroutine_threadsafe(close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        shutil.rmtree(self.directory)
+
+
+    def query(self, name, data=None):
+        request = Request(self.url + name, data=None if data is None else (
+         json.dumps(data).encode()
+        ))
+        try:
+            with urlopen(request, timeout=10) as response:
+                return response.status, json.loads(response.read())
+        except HTTPError as e:
+            return e.code, json.loads(e.read())
+
+
+    def test_service_answers_queries(self):
+        table = biometal.load_table(self.path)
+        centres = [[0, 0, 0], [1, 1, 1], [10, 10, 10]]
+        queries = [("/contrast", {
+         "path": "site.pdb", "centres": centres, "radius": radius
+        }) for radius in (2, 3, 4, 5)] + [("/solvation", {
+         "path": "site.pdb", "centres": centres, "radius": 3, "het": False
+        })] * 4
+        with ThreadPoolExecutor(8) as executor:
+            answers = list(executor.map(lambda q: self.query(*q), queries))
+        for (name, query), (status, answer) in zip(queries, answers):
+            self.assertEqual(status, 200)
+            function = biometal.hydrophobic_contrast_many if (
+             name == "/contrast"
+            ) else biometal.solvation_many
+            self.assertTrue(np.allclose(answer["values"], function(
+             table, centres, query["radius"], het=query.get("het", True)
+            )))
+        status, answer = self.query("/templates", {
+         "path": "site.pdb", "cutoff": 3
+        })
+        self.assertEqual(status, 200)
+        self.assertEqual(len(answer["templates"]), 1)
+        self.assertEqual(answer["templates"][0]["residue_names"], [
+         "HIS", "CYS"
+        ])
+        status, answer = self.query("/status")
+        self.assertEqual(answer["cache"]["structures"], 1)
+        self.assertEqual(answer["cache"]["misses"], 1)
+        self.assertEqual(answer["cache"]["hits"], 8)
+
+
+    def test_service_reports_errors(self):
+        self.assertEqual(self.query("/contrast", {
+         "path": "missing.pdb", "centres": [[0, 0, 0]], "radius": 3
+        })[0], 404)
+        self.assertEqual(self.query("/contrast", {
+         "path": "../site.pdb", "centres": [[0, 0, 0]], "radius": 3
+        })[0], 403)
+        status, answer = self.query("/contrast", {
+         "path": "site.pdb", "centres": [[0, 0, 0]], "radius": -3
+        })
+        self.assertEqual((status, answer), (400, {
+         "error": "-3 is not a valid radius"
+        }))
+        self.assertEqual(self.query("/status")[0], 200)
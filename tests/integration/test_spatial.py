@@ -0,0 +1,171 @@
+from unittest import TestCase
+import random
+import numpy as np
+from atomium.structures import Model, Atom, Residue, Molecule
+import biometal
+
+class SpatialIndexTests(TestCase):
+
+    def setUp(self):
+        random.seed(5)
+        self.model = Model()
+        for index in range(40):
+            self.model.add(Residue(*[Atom(
+             random.choice(["C", "N", "O", "S"]),
+             *[random.uniform(0, 15) for _ in range(3)],
+             name=random.choice(["CA", "OE1", "ND1", "NH1"])
+            ) for _ in range(4)], name=random.choice(["GLU", "HIS", "ARG"])))
+        for index in range(5):
+            self.model.add(Molecule(Atom(
+             random.choice(["Zn", "O"]), *[random.uniform(0, 15) for _ in range(3)]
+            )))
+        self.points = [[random.uniform(-2, 17) for _ in range(3)] for _ in range(20)]
+
+
+    def test_index_finds_same_atoms_as_model(self):
+        for cell_size in [1, 4, 20]:
+            index = biometal.SpatialIndex(self.model, cell_size=cell_size)
+            for point in self.points:
+                for radius in [0, 2, 5]:
+                    for het, metal in [(True, True), (False, True), (True, False)]:
+                        self.assertEqual(index.atoms_in_sphere(
+                         *point, radius, het=het, metal=metal
+                        ), self.model.atoms_in_sphere(
+                         *point, radius, het=het, metal=metal
+                        ))
+
+
+    def test_functions_give_same_values_with_index(self):
+        index = biometal.SpatialIndex(self.model, cell_size=3)
+        for point in self.points:
+            for kwargs in [{}, {"pc": True}, {"het": False}, {"metal": False}]:
+                self.assertEqual(biometal.solvation(
+                 self.model, *point, 5, index=index, **kwargs
+                ), biometal.solvation(self.model, *point, 5, **kwargs))
+                self.assertAlmostEqual(biometal.hydrophobic_contrast(
+                 self.model, *point, 5, index=index, **kwargs
+                ), biometal.hydrophobic_contrast(
+                 self.model, *point, 5, **kwargs
+                ), delta=0.0000005)
+        for kwargs in [{}, {"pc": True}, {"het": False}, {"metal": False}]:
+            solvations = biometal.solvation_many(
+             self.model, self.points, 5, index=index, **kwargs
+            )
+            contrasts = biometal.hydrophobic_contrast_many(
+             self.model, self.points, 5, index=index, **kwargs
+            )
+            for point, solv, contrast in zip(self.points, solvations, contrasts):
+                self.assertAlmostEqual(solv, biometal.solvation(
+                 self.model, *point, 5, **kwargs
+                ), delta=0.0000005)
+                self.assertAlmostEqual(contrast, biometal.hydrophobic_contrast(
+                 self.model, *point, 5, **kwargs
+                ), delta=0.0000005)
+
+
+
+class NeighbourListTests(TestCase):
+
+    def test_neighbour_list_finds_same_atoms_as_model(self):
+        random.seed(9)
+        atoms = [Atom(
+         "C", *[random.uniform(0, 15) for _ in range(3)], id=index + 1
+        ) for index in range(150)]
+        model = Model(*[Molecule(atom) for atom in atoms])
+        neighbours = biometal.NeighbourList(4, skin=1)
+        centres = [[random.uniform(0, 15) for _ in range(3)] for _ in range(5)]
+        for frame in range(20):
+            for atom in atoms:
+                atom.move_to(*[c + random.uniform(-0.1, 0.1) for c in atom.location])
+            coordinates = np.array([atom.location for atom in atoms])
+            centre_indices, atom_indices, _ = neighbours.pairs(coordinates, centres)
+            for index, centre in enumerate(centres):
+                self.assertEqual(
+                 {atoms[i] for i in atom_indices[centre_indices == index]},
+                 model.atoms_in_sphere(*centre, 4)
+                )
+        self.assertLess(neighbours.statistics["builds"], 20)
+        self.assertGreater(neighbours.statistics["reuses"], 0)
+
+
+
+class PeriodicBoxTests(TestCase):
+
+    def setUp(self):
+        random.seed(13)
+        self.boxes = [biometal.Box(14, 15, 16), biometal.Box(14, 15, 16, 75, 85, 100)]
+        self.residues = [(random.choice(["GLU", "HIS", "VAL"]), [(
+         random.choice(["C", "N", "O"]), random.choice(["CA", "OE1", "ND1"]),
+         [random.uniform(-5, 20) for _ in range(3)]
+        ) for _ in range(3)]) for _ in range(60)]
+        self.points = [[random.uniform(-5, 20) for _ in range(3)] for _ in range(8)]
+
+
+    def build(self, shifts, box=None):
+        model = Model()
+        for shift in shifts:
+            for name, atoms in self.residues:
+                locations = np.array([location for _, _, location in atoms])
+                if box is not None: locations = box.wrap(locations)
+                model.add(Residue(*[Atom(
+                 element, *(location + shift), name=atom_name
+                ) for (element, atom_name, _), location in zip(
+                 atoms, locations
+                )], name=name))
+        return model
+
+
+    def test_box_gives_same_values_as_replicated_system(self):
+        for box in self.boxes:
+            model = self.build([np.zeros(3)])
+            replicated = self.build([
+             np.array([i, j, k]) @ box.vectors
+             for i in (-1, 0, 1) for j in (-1, 0, 1) for k in (-1, 0, 1)
+            ], box=box)
+            table = biometal.AtomTable.from_model(model)
+            index = biometal.SpatialIndex(model, cell_size=3, box=box)
+            centres = box.wrap(self.points)
+            for point, centre in zip(self.points, centres):
+                for function in (biometal.solvation, biometal.hydrophobic_contrast):
+                    expected = function(replicated, *centre, 6)
+                    for structure, kwargs in (
+                     (model, {}), (model, {"index": index}), (table, {})
+                    ):
+                        self.assertAlmostEqual(function(
+                         structure, *point, 6, box=box, **kwargs
+                        ), expected, delta=0.000001)
+                solvations, contrasts = biometal.contrast_profile(
+                 model, *point, [2, 4, 6], box=box
+                )
+                self.assertAlmostEqual(solvations[2], biometal.solvation(
+                 replicated, *centre, 6
+                ), delta=0.000001)
+            many = biometal.hydrophobic_contrast_many(
+             model, self.points, 6, box=box
+            )
+            for value, centre in zip(many, centres):
+                self.assertAlmostEqual(value, biometal.hydrophobic_contrast(
+                 replicated, *centre, 6
+                ), delta=0.000001)
+
+
+    def test_trajectories_do_not_need_unwrapping(self):
+        model = self.build([np.zeros(3)])
+        trajectory = biometal.Trajectory(model)
+        generator = np.random.RandomState(3)
+        for box in self.boxes:
+            frames = [trajectory.coordinates + generator.normal(
+             scale=0.3, size=trajectory.coordinates.shape
+            ) for _ in range(5)]
+            jumped = [frame + generator.randint(
+             -2, 3, size=frame.shape
+            ) @ box.vectors for frame in frames]
+            wrapped = biometal.contrast_series(
+             model, [box.wrap(frame) for frame in frames], 6,
+             centres=self.points, box=box
+            )
+            unwrapped = biometal.contrast_series(
+             model, jumped, 6, centres=self.points, box=[box] * 5
+            )
+            for expected, actual in zip(wrapped, unwrapped):
+                self.assertTrue(np.allclose(expected, actual))
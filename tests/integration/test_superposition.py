@@ -0,0 +1,55 @@
+from unittest import TestCase
+import random
+import numpy as np
+from atomium.structures.atoms import Atom
+from atomium.structures.chains import Residue, Site
+import biometal
+
+class TemplateComparisonTests(TestCase):
+
+    def setUp(self):
+        random.seed(11)
+        self.sites = []
+        for number in range(6):
+            residues = []
+            for position in range(4):
+                ca = [random.uniform(-6, 6) for _ in range(3)]
+                residues.append(Residue(
+                 Atom("C", *ca, id=position * 2 + 1, name="CA"),
+                 Atom("C", *[c + random.uniform(-1, 1) for c in ca],
+                  id=position * 2 + 2, name="CB"),
+                 id="A{}".format(position + 1),
+                 name=random.choice(["HIS", "CYS"])
+                ))
+            self.sites.append(Site(*residues))
+
+
+    def test_atomium_templates_can_be_compared(self):
+        templates = [biometal.create_site_template(site) for site in self.sites]
+        moved = biometal.create_site_template(self.sites[2])
+        moved.rotate(1.2, "x")
+        moved.translate(10, -4, 3)
+        deviation, order = biometal.template_rmsd(templates[2], moved)
+        self.assertAlmostEqual(deviation, 0, delta=1e-5)
+        self.assertEqual(order, (0, 1, 2, 3))
+        matrix = biometal.template_rmsd_matrix(templates + [moved])
+        self.assertEqual(matrix.shape, (7, 7))
+        self.assertAlmostEqual(matrix[2, 6], 0, delta=1e-5)
+        self.assertEqual(set(np.argsort(matrix[6])[:2]), {2, 6})
+        for i in range(6):
+            self.assertAlmostEqual(
+             matrix[i, 6], biometal.template_rmsd(templates[i], moved)[0],
+             delta=1e-6
+            )
+
+
+    def test_atomium_and_array_templates_agree(self):
+        template = biometal.create_site_template(self.sites[0])
+        array = biometal.SiteTemplate(
+         [[residue.atom(name="CA").location, residue.atom(name="CB").location]
+          for residue in self.sites[0].residues()][::-1],
+         ["A"] * 4, ["HIS"] * 4, "ZN"
+        )
+        deviation, order = biometal.template_rmsd(template, array)
+        self.assertAlmostEqual(deviation, 0, delta=1e-5)
+        self.assertEqual(len(set(order)), 4)
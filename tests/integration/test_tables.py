@@ -0,0 +1,72 @@
+from unittest import TestCase
+import random
+import numpy as np
+from atomium.structures import Model, Atom, Residue, Molecule
+import biometal
+
+class AtomTableTests(TestCase):
+
+    def setUp(self):
+        random.seed(9)
+        self.model = Model()
+        for index in range(40):
+            self.model.add(Residue(*[Atom(
+             random.choice(["C", "N", "O", "S"]),
+             *[random.uniform(0, 15) for _ in range(3)],
+             name=random.choice(["CA", "OE1", "ND1", "NH1", "N", "O"]),
+             charge=random.choice([0, 0, 0, 1])
+            ) for _ in range(4)], name=random.choice(["GLU", "HIS", "ARG"])))
+        for index in range(5):
+            self.model.add(Molecule(Atom(
+             random.choice(["Zn", "O"]), *[random.uniform(0, 15) for _ in range(3)]
+            ), name="GLU"))
+        self.table = biometal.AtomTable.from_model(self.model)
+        self.points = [[random.uniform(-2, 17) for _ in range(3)] for _ in range(20)]
+
+
+    def test_table_has_model_atoms(self):
+        atoms = sorted(self.model.atoms(), key=lambda atom: atom.id)
+        self.assertEqual(len(self.table), 165)
+        self.assertEqual(
+         self.table.coordinates.tolist(), [list(atom.location) for atom in atoms]
+        )
+        self.assertEqual(self.table.het.sum(), 5)
+        self.assertEqual(self.table.metal.sum(), sum(
+         atom.element == "Zn" for atom in atoms
+        ))
+        self.assertEqual(
+         self.table.solvations.tolist(), biometal.solvation_parameters(atoms).tolist()
+        )
+        self.assertEqual(
+         self.table.partial_charges.tolist(),
+         biometal.partial_charges_of(atoms).tolist()
+        )
+
+
+    def test_functions_give_same_values_with_table(self):
+        for point in self.points:
+            for kwargs in [{}, {"pc": True}, {"het": False}, {"metal": False}]:
+                self.assertAlmostEqual(biometal.solvation(
+                 self.table, *point, 5, **kwargs
+                ), biometal.solvation(self.model, *point, 5, **kwargs), delta=1e-9)
+                self.assertAlmostEqual(biometal.hydrophobic_contrast(
+                 self.table, *point, 5, **kwargs
+                ), biometal.hydrophobic_contrast(
+                 self.model, *point, 5, **kwargs
+                ), delta=1e-6)
+
+
+    def test_array_functions_accept_table(self):
+        self.assertTrue(np.allclose(
+         biometal.hydrophobic_contrast_many(self.table, self.points, 4, het=False),
+         biometal.hydrophobic_contrast_many(self.model, self.points, 4, het=False)
+        ))
+        table_map, model_map = [biometal.contrast_map(
+         structure, 4, spacing=2, metal=False
+        ) for structure in (self.table, self.model)]
+        self.assertTrue(np.allclose(table_map[0], model_map[0]))
+        self.assertEqual(table_map[1:], model_map[1:])
+        for table_values, model_values in zip(biometal.contrast_profile(
+         self.table, 7, 7, 7, [1, 3, 5, 8]
+        ), biometal.contrast_profile(self.model, 7, 7, 7, [1, 3, 5, 8])):
+            self.assertTrue(np.allclose(table_values, model_values))
@@ -1,4 +1,9 @@
 from unittest import TestCase
+import os
+import random
+import shutil
+import tempfile
+import numpy as np
 import atomium
 import biometal
 
@@ -12,3 +17,97 @@ class Tests(TestCase):
         self.assertEqual(len(template.atoms(name="CA")), 3)
         self.assertEqual(len(template.atoms(name="CB")), 3)
         template.save("test.pdb")
+
+
+
+class SiteTemplateTests(TestCase):
+
+    def setUp(self):
+        random.seed(17)
+        self.lines, number = [], 1
+        for residue in range(80):
+            name = random.choice(["HIS", "CYS", "GLY", "ASP"])
+            atom_names = ["N", "CA", "C", "O"] + (
+             [] if name == "GLY" else ["CB", "CG"]
+            )
+            centre = [random.uniform(0, 20) for _ in range(3)]
+            for atom_name in atom_names:
+                self.lines.append(self.line(
+                 "ATOM", number, atom_name, name, residue + 1, atom_name[0],
+                 [c + random.uniform(-2, 2) for c in centre]
+                ))
+                number += 1
+        for metal in range(6):
+            self.lines.append(self.line(
+             "HETATM", number, "ZN", "ZN", 500 + metal, "ZN",
+             [random.uniform(3, 17) for _ in range(3)]
+            ))
+            number += 1
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "sites.pdb")
+        with open(self.path, "w") as f:
+            f.write("\n".join(self.lines + ["END"]))
+        self.model = atomium.pdb_from_file(self.path).model
+
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+    def line(self, record, number, name, residue, residue_id, element, location):
+        return "{:6}{:5} {:^4} {:3} A{:4}    {:8.3f}{:8.3f}{:8.3f}{:6.2f}{:6.2f}"\
+         "          {:>2}  ".format(
+          record, number, name, residue, residue_id, *location, 1, 0, element
+         )
+
+
+    def check_templates(self, templates):
+        metals = {molecule.id: molecule for molecule in self.model.molecules()}
+        self.assertEqual(len(templates), 6)
+        for template in templates:
+            site = metals[template.metal_id].site()
+            residues = sorted([
+             residue for residue in site.residues()
+             if residue.atom(name="CA") and residue.atom(name="CB")
+            ], key=lambda residue: int(residue.id[1:]))
+            self.assertEqual(
+             list(template.residue_ids), [residue.id for residue in residues]
+            )
+            self.assertEqual(
+             list(template.residue_names), [residue.name for residue in residues]
+            )
+            expected = biometal.create_site_template(
+             atomium.structures.chains.Site(*residues)
+            )
+            self.assertEqual(
+             sorted(template.coordinates.reshape(-1, 3).tolist()),
+             sorted(list(atom.location) for atom in expected.atoms())
+            )
+
+
+    def test_templates_match_atomium_sites(self):
+        self.check_templates(biometal.site_templates(self.model))
+        self.check_templates(biometal.site_templates(self.path))
+
+
+    def test_can_get_templates_of_many_files(self):
+        templates = list(biometal.site_templates_many([self.path, self.model]))
+        self.assertEqual([t.source for t in templates], [self.path] * 6 + [1] * 6)
+        self.check_templates(templates[6:])
+
+
+    def test_can_store_templates_in_library(self):
+        path = os.path.join(self.directory, "sites.bmtl")
+        count = biometal.save_templates(
+         path, biometal.site_templates_many([self.path])
+        )
+        self.assertEqual(count, 6)
+        library = biometal.TemplateLibrary(path)
+        self.check_templates(list(library))
+        self.assertEqual([t.source for t in library], [self.path] * 6)
+        for template in library:
+            metal = self.model.molecule(template.metal_id).atom()
+            self.assertEqual(template.metal, "ZN")
+            self.assertTrue(np.allclose(
+             template.metal_location, metal.location, atol=0.001
+            ))
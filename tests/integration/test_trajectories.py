@@ -0,0 +1,84 @@
+from unittest import TestCase
+import os
+import random
+import shutil
+import tempfile
+import numpy as np
+from atomium.structures import Model, Atom, Residue, Molecule
+import biometal
+
+class TrajectoryTests(TestCase):
+
+    def setUp(self):
+        random.seed(21)
+        self.model, number = Model(), 1
+        for index in range(30):
+            atoms = []
+            for _ in range(4):
+                atoms.append(Atom(
+                 random.choice(["C", "N", "O", "S"]),
+                 *[random.uniform(0, 15) for _ in range(3)], id=number,
+                 name=random.choice(["CA", "OE1", "ND1", "NH1"])
+                ))
+                number += 1
+            self.model.add(Residue(*atoms, name=random.choice(["GLU", "HIS"])))
+        self.zinc = Atom("Zn", 7, 7, 7, id=number)
+        self.model.add(Molecule(self.zinc))
+        self.atoms = sorted(self.model.atoms(), key=lambda atom: atom.id)
+        start = np.array([atom.location for atom in self.atoms])
+        self.frames = [start + np.random.RandomState(frame).normal(
+         scale=0.5, size=start.shape
+        ) for frame in range(6)]
+
+
+    def measured_by_moving_atoms(self, function, centre, radius, **kwargs):
+        values = []
+        for frame in self.frames:
+            for atom, location in zip(self.atoms, frame):
+                atom.move_to(*location)
+            point = self.zinc.location if centre is None else centre
+            values.append([function(self.model, *point, radius, **kwargs)])
+        return values
+
+
+    def test_tracked_series_matches_moved_models(self):
+        for kwargs in [{}, {"pc": True}, {"metal": False}]:
+            solvations, contrasts = biometal.contrast_series(
+             self.model, iter(self.frames), 6, atoms=[self.zinc], **kwargs
+            )
+            self.assertTrue(np.allclose(solvations, self.measured_by_moving_atoms(
+             biometal.solvation, None, 6, **kwargs
+            )))
+            self.assertTrue(np.allclose(contrasts, self.measured_by_moving_atoms(
+             biometal.hydrophobic_contrast, None, 6, **kwargs
+            )))
+
+
+    def test_fixed_series_matches_moved_models(self):
+        table = biometal.AtomTable.from_model(self.model)
+        solvations, contrasts = biometal.contrast_series(
+         table, self.frames, 5, centres=[[5, 5, 5], [10, 10, 10]], het=False
+        )
+        self.assertEqual(contrasts.shape, (6, 2))
+        self.assertTrue(np.allclose(contrasts[:, 1:], self.measured_by_moving_atoms(
+         biometal.hydrophobic_contrast, (10, 10, 10), 5, het=False
+        )))
+
+
+    def test_memory_mapped_frames_match_in_memory_frames(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "frames.npy")
+            biometal.trajectories.save_frames(path, self.frames)
+            frames = biometal.open_frames(path)
+            self.assertEqual(len(frames), 6)
+            solvations, contrasts = biometal.contrast_series(
+             self.model, frames.frames(step=2), 6, atoms=[self.zinc]
+            )
+            expected = biometal.contrast_series(
+             self.model, self.frames[::2], 6, atoms=[self.zinc]
+            )
+            self.assertTrue(np.allclose(solvations, expected[0], atol=1e-4))
+            self.assertTrue(np.allclose(contrasts, expected[1], atol=1e-2))
+        finally:
+            shutil.rmtree(directory)
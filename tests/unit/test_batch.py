@@ -0,0 +1,218 @@
+from unittest import TestCase
+from unittest.mock import Mock, patch
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+from biometal.tables import AtomTable
+from biometal.batch import BatchResult, run_batch, metal_contrasts
+from biometal.batch import TASKS, _chunks, _run_chunk, _collect, _run_alone
+
+def double(path, times=2):
+    if path == "bad": raise ValueError("bad file")
+    return path * times
+
+
+
+class BatchResultTests(TestCase):
+
+    def test_can_create_successful_result(self):
+        result = BatchResult("1abc.pdb", value=[1, 2])
+        self.assertEqual(result.path, "1abc.pdb")
+        self.assertEqual(result.value, [1, 2])
+        self.assertIsNone(result.error)
+        self.assertTrue(result.succeeded)
+        self.assertEqual(repr(result), "<BatchResult 1abc.pdb (succeeded)>")
+
+
+    def test_can_create_failed_result(self):
+        result = BatchResult("1abc.pdb", error="ValueError: bad")
+        self.assertIsNone(result.value)
+        self.assertEqual(result.error, "ValueError: bad")
+        self.assertFalse(result.succeeded)
+        self.assertEqual(repr(result), "<BatchResult 1abc.pdb (failed)>")
+
+
+
+class BatchRunningTests(TestCase):
+
+    def test_can_run_in_this_process(self):
+        results = list(run_batch(["a", "bad", "c"], double, workers=1))
+        self.assertEqual([r.path for r in results], ["a", "bad", "c"])
+        self.assertEqual([r.value for r in results], ["aa", None, "cc"])
+        self.assertEqual(results[1].error, "ValueError: bad file")
+
+
+    def test_can_pass_options_to_task(self):
+        results = run_batch(["a", "b"], double, workers=1, times=3)
+        self.assertEqual([r.value for r in results], ["aaa", "bbb"])
+
+
+    @patch("biometal.batch.ProcessPoolExecutor")
+    def test_can_run_in_process_pool(self, mock_executor):
+        executor = mock_executor.return_value
+        futures = []
+        def submit(function, *args):
+            future = Mock()
+            future.result.return_value = function(*args)
+            futures.append(future)
+            return future
+        executor.submit.side_effect = submit
+        with patch("biometal.batch.wait") as mock_wait:
+            mock_wait.side_effect = lambda pending, **kwargs: (
+             sorted(pending, key=futures.index)[:1],
+             set(sorted(pending, key=futures.index)[1:])
+            )
+            results = list(run_batch(
+             "abcdefg", double, workers=2, chunk_size=2
+            ))
+        mock_executor.assert_called_with(max_workers=2)
+        self.assertEqual(executor.submit.call_count, 4)
+        self.assertEqual(executor.submit.call_args_list[0][0][2], ["a", "b"])
+        self.assertEqual(
+         [r.value for r in results], ["aa", "bb", "cc", "dd", "ee", "ff", "gg"]
+        )
+
+
+    def test_chunks_lost_with_broken_pool_are_run_alone(self):
+        futures = [Mock(), Mock(), Mock()]
+        futures[0].exception.return_value = None
+        futures[0].result.return_value = [BatchResult("a", value="aa")]
+        for future in futures[1:]:
+            future.exception.return_value = BrokenProcessPool("died")
+        pending = {
+         futures[0]: ["a"], futures[1]: ["b", "c"], futures[2]: ["d"]
+        }
+        with patch("biometal.batch.wait") as mock_wait, patch(
+         "biometal.batch._run_alone"
+        ) as mock_alone:
+            mock_wait.side_effect = [
+             ({futures[1]}, set(futures) - {futures[1]}), (set(futures), set())
+            ]
+            mock_alone.side_effect = lambda function, path: BatchResult(
+             path, error="BrokenProcessPool: died"
+            )
+            collected = _collect(double, pending)
+            results = []
+            while True:
+                try:
+                    results.append(next(collected))
+                except StopIteration as stop:
+                    broken = stop.value
+                    break
+        self.assertTrue(broken)
+        self.assertEqual(pending, {})
+        self.assertEqual([r.path for r in results], ["a", "b", "c", "d"])
+        self.assertEqual(results[0].value, "aa")
+        self.assertEqual(
+         [call[0][1] for call in mock_alone.call_args_list], ["b", "c", "d"]
+        )
+
+
+    @patch("biometal.batch.ProcessPoolExecutor")
+    def test_broken_pool_is_replaced(self, mock_executor):
+        broken, working = Mock(), Mock()
+        broken.submit.side_effect = BrokenProcessPool("died")
+        working.submit.side_effect = lambda function, *args: Mock(
+         **{"result.return_value": function(*args),
+         "exception.return_value": None}
+        )
+        mock_executor.side_effect = [broken, working]
+        with patch("biometal.batch.wait") as mock_wait:
+            mock_wait.side_effect = lambda pending, **kwargs: (
+             set(pending), set()
+            )
+            results = list(run_batch("abc", double, workers=2, chunk_size=2))
+        self.assertEqual([r.value for r in results], ["aa", "bb", "cc"])
+        self.assertTrue(broken.shutdown.called)
+        self.assertTrue(working.shutdown.called)
+
+
+    def test_can_run_path_alone(self):
+        result = _run_alone(double, "a")
+        self.assertEqual((result.path, result.value), ("a", "aa"))
+
+
+    def test_can_use_task_names(self):
+        with patch.dict("biometal.batch.TASKS", {"double": double}):
+            results = list(run_batch(["a"], "double", workers=1))
+        self.assertEqual(results[0].value, "aa")
+
+
+    def test_task_names_must_be_known(self):
+        with self.assertRaises(ValueError):
+            list(run_batch(["a"], "task", workers=1))
+
+
+    def test_workers_and_chunk_size_must_be_positive(self):
+        with self.assertRaises(ValueError):
+            list(run_batch(["a"], double, workers=0))
+        with self.assertRaises(ValueError):
+            list(run_batch(["a"], double, chunk_size=0))
+
+
+    def test_known_tasks(self):
+        self.assertIs(TASKS["contrast"], metal_contrasts)
+        self.assertEqual(set(TASKS), {"contrast", "templates"})
+
+
+
+class MetalContrastTests(TestCase):
+
+    @patch("biometal.batch.hydrophobic_contrast_many")
+    @patch("biometal.batch.load_table")
+    def test_can_get_metal_contrasts(self, mock_load, mock_contrast):
+        table = AtomTable.from_arrays(
+         [[0, 0, 0], [1, 2, 3], [5, 5, 5]], ["C", "ZN", "ZN"],
+         het=[False, True, False], residue_ids=["A1", "A100", "A2"]
+        )
+        mock_load.return_value = table
+        mock_contrast.return_value = np.array([12.5])
+        contrasts = metal_contrasts("1abc.pdb", radius=6, pc=True)
+        mock_load.assert_called_with("1abc.pdb")
+        self.assertIs(mock_contrast.call_args[0][0], table)
+        self.assertEqual(mock_contrast.call_args[0][1].tolist(), [[1, 2, 3]])
+        self.assertEqual(mock_contrast.call_args[0][2], 6)
+        self.assertEqual(
+         mock_contrast.call_args[1], {"pc": True, "het": True, "metal": True}
+        )
+        self.assertEqual(contrasts, [("A100", "ZN", (1, 2, 3), 12.5)])
+
+
+    @patch("biometal.batch.ResultCache")
+    @patch("biometal.batch.hydrophobic_contrast_many")
+    @patch("biometal.batch.load_table")
+    def test_can_use_cache(self, mock_load, mock_contrast, mock_cache):
+        mock_load.return_value = AtomTable.from_arrays(
+         [[1, 2, 3]], ["ZN"], het=[True], residue_ids=["A100"]
+        )
+        mock_cache.return_value.call.return_value = np.array([12.5])
+        contrasts = metal_contrasts("1abc.pdb", cache="cache")
+        mock_cache.assert_called_with("cache")
+        call = mock_cache.return_value.call.call_args
+        self.assertIs(call[0][0], mock_contrast)
+        self.assertEqual(call[0][3], 8)
+        self.assertFalse(mock_contrast.called)
+        self.assertEqual(contrasts, [("A100", "ZN", (1, 2, 3), 12.5)])
+
+
+    @patch("biometal.batch.hydrophobic_contrast_many")
+    @patch("biometal.batch.load_table")
+    def test_structures_without_metals(self, mock_load, mock_contrast):
+        mock_load.return_value = AtomTable.from_arrays([[0, 0, 0]], ["C"])
+        self.assertEqual(metal_contrasts("1abc.pdb"), [])
+        self.assertFalse(mock_contrast.called)
+
+
+
+class ChunkTests(TestCase):
+
+    def test_can_split_paths_into_chunks(self):
+        self.assertEqual(list(_chunks(iter("abcde"), 2)), [
+         ["a", "b"], ["c", "d"], ["e"]
+        ])
+        self.assertEqual(list(_chunks([], 2)), [])
+
+
+    def test_can_run_chunk(self):
+        results = _run_chunk(double, ["a", "bad"])
+        self.assertEqual(results[0].value, "aa")
+        self.assertEqual(results[1].error, "ValueError: bad file")
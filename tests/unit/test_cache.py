@@ -0,0 +1,289 @@
+from unittest import TestCase
+from unittest.mock import Mock, patch
+import os
+import shutil
+import tempfile
+import numpy as np
+from biometal.spatial import Box
+from biometal.tables import AtomTable
+from biometal.cache import ResultCache, result_key, structure_key
+from biometal.cache import _key_value
+
+def measure(model, radius, pc=False):
+    return np.array([radius, len(model)])
+
+
+
+class CacheTest(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "cache")
+        self.table = AtomTable.from_arrays(
+         [[0, 0, 0], [1, 2, 3]], ["C", "ZN"], residue_names=["ALA", ""],
+         het=[False, True]
+        )
+
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+
+class ResultCacheCreationTests(CacheTest):
+
+    def test_can_create_cache(self):
+        cache = ResultCache(self.path, max_size=1000)
+        self.assertTrue(os.path.isdir(self.path))
+        self.assertEqual(cache.path, self.path)
+        self.assertEqual(cache.max_size, 1000)
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.size, 0)
+        self.assertEqual(repr(cache), "<ResultCache {}>".format(self.path))
+
+
+    def test_max_size_must_be_positive_integer(self):
+        with self.assertRaises(ValueError):
+            ResultCache(self.path, max_size=0)
+        with self.assertRaises(ValueError):
+            ResultCache(self.path, max_size=1.5)
+
+
+
+class ResultCacheStorageTests(CacheTest):
+
+    def test_can_store_and_get_results(self):
+        cache = ResultCache(self.path)
+        key = "ab" * 32
+        self.assertNotIn(key, cache)
+        with self.assertRaises(KeyError):
+            cache.get(key)
+        cache.put(key, (np.arange(3), (0, 0, 0), 1))
+        self.assertIn(key, cache)
+        self.assertTrue(os.path.exists(
+         os.path.join(self.path, "ab", key + ".pickle")
+        ))
+        values, origin, spacing = cache.get(key)
+        self.assertEqual(values.tolist(), [0, 1, 2])
+        self.assertEqual((origin, spacing), ((0, 0, 0), 1))
+        self.assertEqual(len(cache), 1)
+        info = cache.info()
+        self.assertEqual((info["hits"], info["misses"]), (1, 1))
+        self.assertEqual(info["results"], 1)
+        self.assertEqual(info["size"], cache.size)
+        self.assertGreater(cache.size, 0)
+
+
+    def test_caches_share_results(self):
+        ResultCache(self.path).put("cd" * 32, 12.5)
+        self.assertEqual(ResultCache(self.path).get("cd" * 32), 12.5)
+
+
+    def test_damaged_results_are_misses(self):
+        cache = ResultCache(self.path)
+        cache.put("ef" * 32, 1)
+        with open(os.path.join(self.path, "ef", "ef" * 32 + ".pickle"), "wb"):
+            pass
+        with self.assertRaises(KeyError):
+            cache.get("ef" * 32)
+        self.assertNotIn("ef" * 32, cache)
+
+
+    def test_results_that_cannot_be_loaded_are_misses(self):
+        cache = ResultCache(self.path)
+        cache.put("ef" * 32, 1)
+        with patch("biometal.cache.pickle.load") as mock_load:
+            mock_load.side_effect = AttributeError("No such class")
+            with self.assertRaises(KeyError):
+                cache.get("ef" * 32)
+        self.assertNotIn("ef" * 32, cache)
+        self.assertEqual(cache.info()["misses"], 1)
+        with open(os.path.join(self.path, "size")) as f:
+            self.assertEqual(f.read(), "0")
+
+
+    def test_total_size_is_kept_without_searching(self):
+        cache = ResultCache(self.path, max_size=3000)
+        cache.put("ab" * 32, np.zeros(100))
+        with patch.object(cache, "_entries") as mock_entries:
+            cache.put("cd" * 32, np.zeros(100))
+            cache.put("cd" * 32, np.zeros(50))
+            self.assertFalse(mock_entries.called)
+        with open(os.path.join(self.path, "size")) as f:
+            self.assertEqual(int(f.read()), cache.size)
+        cache.clear()
+        with open(os.path.join(self.path, "size")) as f:
+            self.assertEqual(f.read(), "0")
+
+
+    def test_missing_total_size_is_worked_out(self):
+        cache = ResultCache(self.path)
+        cache.put("ab" * 32, np.zeros(100))
+        os.remove(os.path.join(self.path, "size"))
+        cache.put("cd" * 32, np.zeros(100))
+        with open(os.path.join(self.path, "size")) as f:
+            self.assertEqual(int(f.read()), cache.size)
+
+
+    def test_least_recently_used_results_are_evicted(self):
+        cache = ResultCache(self.path, max_size=3000)
+        keys = [str(i) * 64 for i in range(3)]
+        for number, key in enumerate(keys):
+            cache.put(key, np.zeros(100))
+            path = os.path.join(self.path, key[:2], key + ".pickle")
+            os.utime(path, (number, number))
+        cache.get(keys[0])
+        cache.put("3" * 64, np.zeros(100))
+        self.assertEqual(len(cache), 3)
+        self.assertIn(keys[0], cache)
+        self.assertNotIn(keys[1], cache)
+        self.assertIn(keys[2], cache)
+        self.assertIn("3" * 64, cache)
+        self.assertLessEqual(cache.size, 3000)
+
+
+    def test_failed_storing_leaves_nothing_behind(self):
+        cache = ResultCache(self.path)
+        with patch("biometal.cache.os.replace") as mock_replace:
+            mock_replace.side_effect = OSError("No space left on device")
+            with self.assertRaises(OSError):
+                cache.put("ab" * 32, np.zeros(100))
+        self.assertEqual(os.listdir(os.path.join(self.path, "ab")), [])
+        self.assertNotIn("ab" * 32, cache)
+
+
+    def test_results_bigger_than_cache_are_not_stored(self):
+        cache = ResultCache(self.path, max_size=100)
+        cache.put("ab" * 32, np.zeros(100))
+        self.assertEqual(len(cache), 0)
+
+
+    def test_can_clear_cache(self):
+        cache = ResultCache(self.path)
+        cache.put("ab" * 32, 1)
+        cache.put("cd" * 32, 2)
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
+
+
+class ResultCacheCallTests(CacheTest):
+
+    def test_can_call_function_once(self):
+        cache = ResultCache(self.path)
+        function = Mock(wraps=measure)
+        function.__module__, function.__qualname__ = "tests", "measure"
+        first = cache.call(function, self.table, 8, pc=True)
+        second = cache.call(function, self.table, 8.0, pc=True)
+        self.assertEqual(function.call_count, 1)
+        self.assertEqual(first.tolist(), [8, 2])
+        self.assertEqual(second.tolist(), [8, 2])
+        cache.call(function, self.table, 6, pc=True)
+        self.assertEqual(function.call_count, 2)
+
+
+    @patch("biometal.cache.result_key")
+    def test_call_uses_result_key(self, mock_key):
+        mock_key.return_value = "ab" * 32
+        cache = ResultCache(self.path)
+        cache.call(measure, self.table, 8)
+        mock_key.assert_called_with(measure, self.table, 8)
+        self.assertIn("ab" * 32, cache)
+
+
+
+class ResultKeyTests(CacheTest):
+
+    def test_key_depends_on_everything(self):
+        key = result_key(measure, self.table, 8, pc=False)
+        self.assertEqual(len(key), 64)
+        self.assertEqual(key, result_key(measure, self.table, 8.0, pc=False))
+        self.assertNotEqual(key, result_key(len, self.table, 8, pc=False))
+        self.assertNotEqual(key, result_key(measure, self.table, 8, pc=True))
+        self.assertNotEqual(key, result_key(measure, self.table, 8))
+        moved = AtomTable.from_arrays(
+         [[0, 0, 0], [1, 2, 3.001]], ["C", "ZN"],
+         residue_names=["ALA", ""], het=[False, True]
+        )
+        self.assertNotEqual(key, result_key(measure, moved, 8, pc=False))
+
+
+    def test_key_depends_on_version(self):
+        key = result_key(measure, self.table, 8)
+        with patch("biometal.cache.__version__", "99.0"):
+            self.assertNotEqual(key, result_key(measure, self.table, 8))
+
+
+
+class StructureKeyTests(CacheTest):
+
+    def test_same_atoms_give_same_key(self):
+        copy = AtomTable.from_arrays(
+         [[0, 0, 0], [1, 2, 3]], ["C", "ZN"], residue_names=["ALA", ""],
+         het=[False, True]
+        )
+        self.assertEqual(structure_key(self.table), structure_key(copy))
+
+
+    def test_atom_identities_change_key(self):
+        for kwargs in (
+         {"residue_names": ["GLY", ""]}, {"atom_names": ["CA", "ZN"]},
+         {"charges": [0, 2]}, {"het": [False, False]},
+         {"residue_ids": ["A1", "A2"]}, {"metal": [False, False]}
+        ):
+            arguments = {"residue_names": ["ALA", ""], "het": [False, True]}
+            arguments.update(kwargs)
+            other = AtomTable.from_arrays(
+             [[0, 0, 0], [1, 2, 3]], ["C", "ZN"], **arguments
+            )
+            self.assertNotEqual(
+             structure_key(self.table), structure_key(other)
+            )
+
+
+    def test_models_are_tabulated(self):
+        model = Mock()
+        with patch("biometal.cache.Model", Mock), patch(
+         "biometal.cache.AtomTable.from_model"
+        ) as mock_tabulate:
+            mock_tabulate.return_value = self.table
+            self.assertEqual(
+             structure_key(model), structure_key(self.table)
+            )
+            mock_tabulate.assert_called_with(model)
+
+
+    def test_model_must_be_model(self):
+        with self.assertRaises(TypeError):
+            structure_key("model")
+
+
+
+class KeyValueTests(TestCase):
+
+    def test_can_get_key_values(self):
+        self.assertEqual(_key_value(None), None)
+        self.assertEqual(_key_value(True), True)
+        self.assertEqual(_key_value(np.bool_(False)), False)
+        self.assertEqual(_key_value("fft"), "fft")
+        self.assertEqual(_key_value(3), 3.0)
+        self.assertEqual(_key_value(np.int64(3)), 3.0)
+        self.assertEqual(_key_value((1, [2, "a"])), [1.0, [2.0, "a"]])
+        self.assertEqual(_key_value({"a": 1}), {"a": 1.0})
+        self.assertEqual(
+         _key_value(Box(10, 20, 30)), {"box": [10, 20, 30, 90, 90, 90]}
+        )
+
+
+    def test_arrays_are_hashed(self):
+        value = _key_value(np.array([[1, 2, 3]]))
+        self.assertEqual(value["array"][:2], ["<f8", (1, 3)])
+        self.assertEqual(value, _key_value(np.array([[1.0, 2.0, 3.0]])))
+        self.assertNotEqual(value, _key_value(np.array([[1, 2, 4]])))
+
+
+    def test_other_values_cannot_be_keys(self):
+        with self.assertRaises(TypeError):
+            _key_value(object())
+        with self.assertRaises(TypeError):
+            _key_value(np.array([object()]))
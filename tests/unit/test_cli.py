@@ -0,0 +1,236 @@
+from unittest import TestCase
+from unittest.mock import patch
+import io
+import json
+import os
+import shutil
+import tempfile
+from biometal.batch import BatchResult
+from biometal.cli import main, parse_arguments, find_structures
+
+class ArgumentTests(TestCase):
+
+    def test_can_parse_contrast_arguments(self):
+        options = parse_arguments([
+         "contrast", "a.pdb", "b", "--radius", "6", "--pc", "--no-het",
+         "--workers", "3", "--chunk-size", "4"
+        ])
+        self.assertEqual(options.name, "contrast")
+        self.assertEqual(options.paths, ["a.pdb", "b"])
+        self.assertEqual(options.radius, 6)
+        self.assertTrue(options.pc)
+        self.assertFalse(options.het)
+        self.assertTrue(options.metal)
+        self.assertEqual(options.workers, 3)
+        self.assertEqual(options.chunk_size, 4)
+        self.assertIsNone(options.output)
+        self.assertIsNone(options.cache)
+        options = parse_arguments(["contrast", "a.pdb", "--cache", "c"])
+        self.assertEqual(options.cache, "c")
+
+
+    def test_can_parse_templates_arguments(self):
+        options = parse_arguments([
+         "templates", "a.pdb", "--output", "t.bmtl", "--main-chain"
+        ])
+        self.assertEqual(options.name, "templates")
+        self.assertEqual(options.cutoff, 4)
+        self.assertTrue(options.main_chain)
+        self.assertTrue(options.carbon)
+        self.assertIsNone(options.workers)
+        self.assertEqual(options.chunk_size, 8)
+
+
+    def test_command_is_needed(self):
+        with patch("sys.stderr"):
+            with self.assertRaises(SystemExit):
+                parse_arguments([])
+
+
+    def test_templates_need_output(self):
+        with patch("sys.stderr"):
+            with self.assertRaises(SystemExit):
+                parse_arguments(["templates", "a.pdb"])
+
+
+
+class ContrastCommandTests(TestCase):
+
+    @patch("biometal.cli.run_batch")
+    def test_can_write_contrasts(self, mock_run):
+        mock_run.return_value = iter([
+         BatchResult("a.pdb", value=[("A100", "ZN", (1, 2, 3), 12.5)]),
+         BatchResult("b.pdb", error="ValueError: bad")
+        ])
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with patch("sys.stdout", stdout), patch("sys.stderr", stderr):
+            status = main(["contrast", "a.pdb", "b.pdb", "--workers", "2"])
+        self.assertEqual(status, 1)
+        self.assertEqual(list(mock_run.call_args[0][0]), ["a.pdb", "b.pdb"])
+        self.assertEqual(mock_run.call_args[0][1], "contrast")
+        self.assertEqual(mock_run.call_args[1], {
+         "workers": 2, "chunk_size": 8, "radius": 8, "pc": False,
+         "het": True, "metal": True, "cache": None
+        })
+        lines = [json.loads(line) for line in stdout.getvalue().splitlines()]
+        self.assertEqual(lines, [{"path": "a.pdb", "metals": [{
+         "id": "A100", "element": "ZN", "location": [1, 2, 3],
+         "contrast": 12.5
+        }]}, {"path": "b.pdb", "error": "ValueError: bad"}])
+        self.assertEqual(stderr.getvalue(), "b.pdb: ValueError: bad\n")
+
+
+    @patch("biometal.cli.run_batch")
+    def test_successful_run_has_zero_status(self, mock_run):
+        mock_run.return_value = iter([BatchResult("a.pdb", value=[])])
+        with patch("sys.stdout", io.StringIO()):
+            self.assertEqual(main(["contrast", "a.pdb"]), 0)
+
+
+
+class TemplatesCommandTests(TestCase):
+
+    @patch("biometal.cli.save_templates")
+    @patch("biometal.cli.run_batch")
+    def test_can_write_templates(self, mock_run, mock_save):
+        mock_run.return_value = iter([
+         BatchResult("a.pdb", value=["t1", "t2"]),
+         BatchResult("b.pdb", error="ValueError: bad"),
+         BatchResult("c.pdb", value=["t3"])
+        ])
+        saved = []
+        def save(path, templates):
+            saved.extend(templates)
+            return len(saved)
+        mock_save.side_effect = save
+        stderr = io.StringIO()
+        with patch("sys.stderr", stderr):
+            status = main(["templates", "a.pdb", "--output", "t.bmtl"])
+        self.assertEqual(status, 1)
+        self.assertEqual(mock_save.call_args[0][0], "t.bmtl")
+        self.assertEqual(saved, ["t1", "t2", "t3"])
+        self.assertEqual(mock_run.call_args[1], {
+         "workers": None, "chunk_size": 8, "cutoff": 4, "main_chain": False,
+         "carbon": True
+        })
+        self.assertEqual(stderr.getvalue(), (
+         "b.pdb: ValueError: bad\nWrote 3 templates to t.bmtl\n"
+        ))
+
+
+
+class StructureFindingTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.directory, "sub"))
+        for name in (
+         "b.pdb", "a.cif.gz", "notes.txt", "sub/c.ent", "sub/d.PDB.GZ"
+        ):
+            open(os.path.join(self.directory, name), "w").close()
+
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+    def test_can_find_structures(self):
+        self.assertEqual(list(find_structures(["x.pdb", self.directory])), [
+         "x.pdb", os.path.join(self.directory, "a.cif.gz"),
+         os.path.join(self.directory, "b.pdb"),
+         os.path.join(self.directory, "sub", "c.ent"),
+         os.path.join(self.directory, "sub", "d.PDB.GZ")
+        ])
+
+
+
+class JobCommandTests(TestCase):
+
+    def test_can_parse_job_arguments(self):
+        options = parse_arguments([
+         "contrast", "a.pdb", "--manifest", "job.json", "--shards", "4"
+        ])
+        self.assertEqual(options.manifest, "job.json")
+        self.assertEqual(options.shards, 4)
+        options = parse_arguments(["templates", "a.pdb", "--manifest", "j"])
+        self.assertIsNone(options.output)
+        options = parse_arguments(["shard", "job.json", "2", "--retry-failed"])
+        self.assertEqual(options.shard, 2)
+        self.assertTrue(options.retry_failed)
+        self.assertIsNone(options.checkpoint)
+        options = parse_arguments(["merge", "job.json", "--output", "o"])
+        self.assertFalse(options.partial)
+
+
+    @patch("biometal.cli.run_batch")
+    @patch("biometal.cli.create_manifest")
+    def test_can_write_manifest(self, mock_create, mock_run):
+        mock_create.return_value = {"paths": ["a.pdb"], "shards": 3}
+        with patch("sys.stderr", io.StringIO()) as stderr:
+            status = main([
+             "templates", "a.pdb", "--manifest", "job.json", "--shards", "3",
+             "--cutoff", "5"
+            ])
+        self.assertEqual(status, 0)
+        self.assertFalse(mock_run.called)
+        self.assertEqual(mock_create.call_args[0][0], "job.json")
+        self.assertEqual(list(mock_create.call_args[0][1]), ["a.pdb"])
+        self.assertEqual(mock_create.call_args[0][2], "templates")
+        self.assertEqual(mock_create.call_args[1], {
+         "shards": 3, "cutoff": 5, "main_chain": False, "carbon": True
+        })
+        self.assertEqual(
+         stderr.getvalue(),
+         "Wrote manifest of 1 files in 3 shards to job.json\n"
+        )
+
+
+    @patch("biometal.cli.run_shard")
+    def test_can_run_shard(self, mock_run):
+        mock_run.return_value = {"failed": 0}
+        with patch("sys.stderr", io.StringIO()) as stderr:
+            status = main([
+             "shard", "job.json", "1", "--workers", "2", "--checkpoint", "c"
+            ])
+        self.assertEqual(status, 0)
+        mock_run.assert_called_with(
+         "job.json", 1, checkpoint="c", retry_failed=False, workers=2,
+         chunk_size=8
+        )
+        self.assertEqual(stderr.getvalue(), '{"failed": 0}\n')
+        mock_run.return_value = {"failed": 2}
+        with patch("sys.stderr", io.StringIO()):
+            self.assertEqual(main(["shard", "job.json", "1"]), 1)
+
+
+    @patch("biometal.cli.merge_shards")
+    def test_can_merge_shards(self, mock_merge):
+        mock_merge.return_value = {"missing": 0}
+        with patch("sys.stderr", io.StringIO()):
+            status = main(["merge", "job.json", "--output", "o", "--partial"])
+        self.assertEqual(status, 0)
+        mock_merge.assert_called_with("job.json", "o", partial=True)
+        mock_merge.side_effect = ValueError("2 files have not been run")
+        with patch("sys.stderr", io.StringIO()) as stderr:
+            self.assertEqual(main(["merge", "job.json", "--output", "o"]), 1)
+        self.assertEqual(stderr.getvalue(), "2 files have not been run\n")
+
+
+
+class ServeCommandTests(TestCase):
+
+    @patch("biometal.cli.serve")
+    def test_can_serve(self, mock_serve):
+        options = parse_arguments(["serve"])
+        self.assertEqual((options.host, options.port), ("127.0.0.1", 8000))
+        self.assertEqual(options.memory, 1024)
+        self.assertIsNone(options.root)
+        status = main([
+         "serve", "--port", "0", "--memory", "10", "--workers", "4",
+         "--root", "data"
+        ])
+        self.assertEqual(status, 0)
+        mock_serve.assert_called_with(
+         host="127.0.0.1", port=0, max_size=10 * 2 ** 20, workers=4,
+         root="data"
+        )
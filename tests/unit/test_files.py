@@ -0,0 +1,126 @@
+from unittest import TestCase
+from unittest.mock import Mock, patch, mock_open
+import numpy as np
+from biometal.files import *
+from biometal.files import _pdb_atoms, _cif_atoms, _cif_value
+
+PDB_LINES = [
+ "HEADER    METAL BINDING PROTEIN                   11-AUG-95   1TON\n",
+ "MODEL        1\n",
+ "ATOM      1  N   GLU A  16      16.000  23.000 -10.000  1.00 38.00           N\n",
+ "ATOM      2  CA AGLU A  16      17.000  22.000 -11.000  0.50 38.00           C\n",
+ "ATOM      3  CA BGLU A  16      17.500  22.500 -11.500  0.50 38.00           C\n",
+ "ATOM      4  OE1 GLU A  16      18.000  21.000 -12.000  1.00 38.00           O1-\n",
+ "HETATM    5 ZN    ZN A 301      10.000  10.000  10.000  1.00 10.00          ZN2+\n",
+ "ENDMDL\n",
+ "MODEL        2\n",
+ "ATOM      1  N   GLU A  16      16.000  23.000 -10.000  1.00 38.00           N\n",
+ "ENDMDL\n",
+ "END\n"
+]
+
+CIF_LINES = [
+ "data_1TON\n", "#\n", "_entry.id 1TON\n", "#\n", "loop_\n",
+ "_atom_site.group_PDB\n", "_atom_site.id\n", "_atom_site.type_symbol\n",
+ "_atom_site.label_atom_id\n", "_atom_site.label_alt_id\n",
+ "_atom_site.label_comp_id\n", "_atom_site.auth_seq_id\n",
+ "_atom_site.auth_asym_id\n", "_atom_site.Cartn_x\n", "_atom_site.Cartn_y\n",
+ "_atom_site.Cartn_z\n", "_atom_site.pdbx_formal_charge\n",
+ "_atom_site.pdbx_PDB_model_num\n",
+ "ATOM   1 N  N   . GLU 16  A 16.0 23.0 -10.0 ? 1\n",
+ "ATOM   2 C  CA  A GLU 16  A 17.0 22.0 -11.0 ? 1\n",
+ "ATOM   3 C  CA  B GLU 16  A 17.5 22.5 -11.5 ? 1\n",
+ "ATOM   4 O  \"O5'\" . GLU 16  A 18.0 21.0 -12.0 -1 1\n",
+ "HETATM 5 ZN ZN  . ZN  301 A 10.0 10.0 10.0 2 1\n",
+ "ATOM   6 N  N   . GLU 16  A 16.0 23.0 -10.0 ? 2\n",
+ "#\n",
+ "loop_\n", "_atom_site_anisotrop.id\n", "1 0.1\n"
+]
+
+class PdbAtomTests(TestCase):
+
+    def test_can_read_pdb_atoms(self):
+        atoms = list(_pdb_atoms(iter(PDB_LINES)))
+        self.assertEqual(len(atoms), 5)
+        self.assertEqual(atoms[0], (
+         (16, 23, -10), "N", "GLU", "N", 0, False, (0, "A16", "GLU"), ""
+        ))
+        self.assertEqual(atoms[1][7], "A")
+        self.assertEqual(atoms[2][7], "B")
+        self.assertEqual(atoms[3][4], -1)
+        self.assertEqual(atoms[4][1:6], ("ZN", "ZN", "ZN", 2, True))
+
+
+    def test_can_read_all_models(self):
+        atoms = list(_pdb_atoms(iter(PDB_LINES), first_model=False))
+        self.assertEqual(len(atoms), 6)
+        self.assertEqual(atoms[5][6][0], 1)
+
+
+
+class CifAtomTests(TestCase):
+
+    def test_can_read_cif_atoms(self):
+        atoms = list(_cif_atoms(iter(CIF_LINES)))
+        self.assertEqual(len(atoms), 5)
+        self.assertEqual(atoms[0], (
+         (16, 23, -10), "N", "GLU", "N", 0, False,
+         ("1", "A16", "GLU"), ""
+        ))
+        self.assertEqual(atoms[1][7], "A")
+        self.assertEqual(atoms[3][3:5], ("O5'", -1))
+        self.assertEqual(atoms[4][1:6], ("ZN", "ZN", "ZN", 2, True))
+
+
+    def test_can_read_all_models(self):
+        atoms = list(_cif_atoms(iter(CIF_LINES), first_model=False))
+        self.assertEqual(len(atoms), 6)
+        self.assertEqual(atoms[5][6][0], "2")
+
+
+    def test_can_read_file_with_no_atoms(self):
+        self.assertEqual(list(_cif_atoms(iter(CIF_LINES[:4]))), [])
+
+
+    def test_can_convert_missing_values(self):
+        self.assertEqual(_cif_value("?"), "")
+        self.assertEqual(_cif_value("."), "")
+        self.assertEqual(_cif_value("CA"), "CA")
+
+
+
+class TableLoadingTests(TestCase):
+
+    def test_can_load_pdb_table(self):
+        with patch("builtins.open", mock_open(read_data="".join(PDB_LINES))):
+            table = load_table("file.pdb")
+        self.assertEqual(len(table), 4)
+        self.assertEqual(table.coordinates.tolist(), [
+         [16, 23, -10], [17, 22, -11], [18, 21, -12], [10, 10, 10]
+        ])
+        self.assertEqual(table.elements.tolist(), ["N", "C", "O", "ZN"])
+        self.assertEqual(table.atom_names.tolist(), ["N", "CA", "OE1", "ZN"])
+        self.assertEqual(table.residue_ids.tolist(), ["A16"] * 3 + ["A301"])
+        self.assertEqual(table.charges.tolist(), [0, 0, -1, 2])
+        self.assertEqual(table.het.tolist(), [False, False, False, True])
+        self.assertEqual(table.metal.tolist(), [False, False, False, True])
+
+
+    def test_can_load_cif_table(self):
+        with patch("builtins.open", mock_open(read_data="".join(CIF_LINES))):
+            table = load_table("file.cif", first_model=False)
+        self.assertEqual(len(table), 5)
+        self.assertEqual(table.atom_names.tolist()[2], "O5'")
+        self.assertEqual(table.residue_ids.tolist()[2:], ["A16", "A301", "A16"])
+
+
+    def test_can_load_gzipped_table(self):
+        with patch("gzip.open", mock_open(read_data="".join(PDB_LINES))) as m:
+            table = load_table("file.pdb.gz")
+        m.assert_called_with("file.pdb.gz", "rt")
+        self.assertEqual(len(table), 4)
+
+
+    def test_file_must_be_pdb_or_cif(self):
+        with self.assertRaises(ValueError):
+            load_table("file.xyz")
@@ -1,13 +1,22 @@
 from atomium.structures import Model
 from unittest import TestCase
 from unittest.mock import Mock, patch, MagicMock
+import threading
+import numpy as np
+from biometal.profiling import profile
+from biometal.spatial import SpatialIndex, Box
 from biometal.hydrophobicity import *
+from biometal.hydrophobicity import _grid_sums, _contrast, _sphere_sums
+from biometal.hydrophobicity import _fft_sums, _solvation, _atom_arrays
+from biometal.hydrophobicity import _identity_solvation
+from biometal.tables import AtomTable
 
 class SolvationTests(TestCase):
 
     def setUp(self):
         self.model = Mock(Model)
         self.atoms = [Mock(), Mock(), Mock(), Mock(), Mock()]
+        for atom in self.atoms: atom.distance_to.return_value = 1
         self.model.atoms_in_sphere.return_value = self.atoms[:3]
         self.patch1 = patch("biometal.hydrophobicity.atom_solvation")
         self.patch2 = patch("biometal.hydrophobicity.atom_partial_charge")
@@ -86,10 +95,29 @@ class SolvationTests(TestCase):
         )
 
 
+    def test_can_use_spatial_index(self):
+        index = Mock(SpatialIndex)
+        index.box = None
+        index.atoms_in_sphere.return_value = self.atoms[:2]
+        self.mock_atsolv.side_effect = [11, -9]
+        solv = solvation(self.model, 2, 4, 5, 12, het=False, index=index)
+        self.assertFalse(self.model.atoms_in_sphere.called)
+        index.atoms_in_sphere.assert_called_with(
+         2, 4, 5, 12, het=False, metal=True
+        )
+        self.assertEqual(solv, 1)
+
+
+    def test_index_must_be_spatial_index(self):
+        with self.assertRaises(TypeError):
+            solvation(self.model, 2, 4, 5, 12, index="index")
+
+
 
 class AtomSolvationTests(TestCase):
 
     def setUp(self):
+        clear_parameter_cache()
         self.atom, self.residue = Mock(), Mock()
         self.atom.charge = 0
         self.atom.name = None
@@ -193,6 +221,7 @@ class AtomSolvationTests(TestCase):
 class AtomicPartialChargesTests(TestCase):
 
     def setUp(self):
+        clear_parameter_cache()
         self.atom, self.residue = Mock(), Mock()
         self.atom.charge = 0
         self.atom.name = None
@@ -245,6 +274,135 @@ class AtomicPartialChargesTests(TestCase):
 
 
 
+class ParameterCacheTests(TestCase):
+
+    def setUp(self):
+        clear_parameter_cache()
+        self.atom, self.residue = Mock(), Mock()
+        self.atom.element, self.atom.charge, self.atom.name = "O", 0, "OE1"
+        self.atom.residue = self.residue
+        self.residue.name = "GLU"
+
+
+    def test_parameters_are_remembered(self):
+        self.assertEqual(atom_solvation(self.atom), -23)
+        self.assertEqual(atom_solvation(self.atom), -23)
+        self.assertEqual(atom_partial_charge(self.atom), -0.706)
+        info = parameter_cache_info()
+        self.assertEqual(info["solvation"]["hits"], 1)
+        self.assertEqual(info["solvation"]["misses"], 1)
+        self.assertEqual(info["solvation"]["currsize"], 1)
+        self.assertEqual(info["solvation"]["maxsize"], PARAMETER_CACHE_SIZE)
+        self.assertEqual(info["partial_charge"]["misses"], 1)
+
+
+    def test_atoms_with_same_identity_share_entry(self):
+        other = Mock()
+        other.element, other.charge, other.name = "O", 0, "OE1"
+        other.residue = self.residue
+        atom_solvation(self.atom)
+        atom_solvation(other)
+        self.assertEqual(parameter_cache_info()["solvation"]["hits"], 1)
+        other.charge = -1
+        self.assertEqual(atom_solvation(other), -37)
+        self.assertEqual(parameter_cache_info()["solvation"]["misses"], 2)
+
+
+    def test_profiles_count_their_own_thread_lookups(self):
+        other = Mock()
+        other.element, other.charge, other.name = "N", 1, "NZ"
+        other.residue = self.residue
+        barrier, lock, counters = threading.Barrier(2), threading.Lock(), {}
+        def work(atom, times):
+            with profile() as recorder:
+                barrier.wait()
+                with lock:
+                    for _ in range(times): atom_solvation(atom)
+                barrier.wait()
+            counters[times] = recorder.counters
+        threads = [threading.Thread(target=work, args=arguments)
+         for arguments in ((self.atom, 3), (other, 5))]
+        for thread in threads: thread.start()
+        for thread in threads: thread.join()
+        self.assertEqual(counters[3], {
+         "parameter_cache_hits": 2, "parameter_cache_misses": 1
+        })
+        self.assertEqual(counters[5], {
+         "parameter_cache_hits": 4, "parameter_cache_misses": 1
+        })
+
+
+    def test_lookups_are_only_counted_while_profiling(self):
+        with patch("biometal.hydrophobicity._profiled_lookup") as mock_lookup:
+            atom_solvation(self.atom)
+            atom_partial_charge(self.atom)
+            self.assertFalse(mock_lookup.called)
+            mock_lookup.return_value = 5
+            with profile():
+                self.assertEqual(atom_solvation(self.atom), 5)
+            mock_lookup.assert_called_with(_identity_solvation, self.atom)
+
+
+    def test_can_clear_cache(self):
+        atom_solvation(self.atom)
+        atom_partial_charge(self.atom)
+        clear_parameter_cache()
+        info = parameter_cache_info()
+        for cache in ("solvation", "partial_charge"):
+            self.assertEqual(info[cache]["currsize"], 0)
+            self.assertEqual(info[cache]["misses"], 0)
+
+
+
+class ParameterArrayTests(TestCase):
+
+    def make_atom(self, element, name, residue, charge=0):
+        atom = Mock()
+        atom.element, atom.name, atom.charge = element, name, charge
+        atom.residue = None
+        if residue:
+            atom.residue = Mock()
+            atom.residue.name = residue
+        return atom
+
+
+    def setUp(self):
+        self.atoms = [
+         self.make_atom("C", "CA", "ALA"), self.make_atom("S", "SG", "CYS"),
+         self.make_atom("O", "O", "ALA"), self.make_atom("O", "OE1", "GLU"),
+         self.make_atom("O", "OE1", "GLU", charge=-1),
+         self.make_atom("N", "NH2", "ARG"), self.make_atom("N", "NH2", "LYS"),
+         self.make_atom("N", "ND1", None), self.make_atom("FE", "FE", None, 2),
+         self.make_atom("X", "Q", "QQQ")
+        ]
+
+
+    def test_solvation_parameters_match_atom_solvation(self):
+        self.assertEqual(
+         solvation_parameters(self.atoms).tolist(),
+         [18, -5, -9, -23, -37, -23.5, -9, -9, 0, 0]
+        )
+        self.assertEqual(
+         solvation_parameters(self.atoms).tolist(),
+         [atom_solvation(atom) for atom in self.atoms]
+        )
+
+
+    def test_partial_charges_match_atom_partial_charge(self):
+        self.assertEqual(
+         partial_charges_of(self.atoms).tolist(),
+         [atom_partial_charge(atom) for atom in self.atoms]
+        )
+        self.assertEqual(partial_charges_of(self.atoms)[8], 2)
+        self.assertEqual(partial_charges_of(self.atoms)[9], 0)
+
+
+    def test_can_get_parameters_of_no_atoms(self):
+        self.assertEqual(solvation_parameters([]).tolist(), [])
+        self.assertEqual(partial_charges_of([]).tolist(), [])
+
+
+
 class HydrophobicContrastTests(TestCase):
 
     def setUp(self):
@@ -254,19 +412,15 @@ class HydrophobicContrastTests(TestCase):
         self.atoms[1].distance_to.return_value = 5
         self.atoms[2].distance_to.return_value = 10
         self.model.atoms_in_sphere.return_value = self.atoms[:3]
-        self.patch1 = patch("biometal.hydrophobicity.solvation")
-        self.patch2 = patch("biometal.hydrophobicity.atom_solvation")
-        self.patch3 = patch("biometal.hydrophobicity.atom_partial_charge")
-        self.mock_solv = self.patch1.start()
-        self.mock_atsolv = self.patch2.start()
-        self.mock_atcharge = self.patch3.start()
-        self.mock_solv.return_value = 8
+        self.patch1 = patch("biometal.hydrophobicity.atom_solvation")
+        self.patch2 = patch("biometal.hydrophobicity.atom_partial_charge")
+        self.mock_atsolv = self.patch1.start()
+        self.mock_atcharge = self.patch2.start()
 
 
     def tearDown(self):
         self.patch1.stop()
         self.patch2.stop()
-        self.patch3.stop()
 
 
     def test_contrast_needs_model(self):
@@ -296,14 +450,13 @@ class HydrophobicContrastTests(TestCase):
         self.model.atoms_in_sphere.assert_called_with(
          4, 8, 15, 10, het=True, metal=True
         )
-        self.mock_solv.assert_called_with(
-         self.model, 4, 8, 15, 10, het=True, metal=True, pc=False
-        )
+        self.assertEqual(self.model.atoms_in_sphere.call_count, 1)
         for atom in self.atoms[:3]:
-            atom.distance_to.assert_any_call((4, 8, 15))
+            atom.distance_to.assert_called_once_with((4, 8, 15))
             self.mock_atsolv.assert_any_call(atom)
+        self.assertEqual(self.mock_atsolv.call_count, 3)
         self.assertEqual(
-         contrast, ((11 * 49) + (-9 * 25) + (4 * 100)) - (3 * 8 * 58)
+         contrast, ((11 * 49) + (-9 * 25) + (4 * 100)) - (3 * 2 * 58)
         )
 
 
@@ -313,14 +466,15 @@ class HydrophobicContrastTests(TestCase):
         self.model.atoms_in_sphere.assert_called_with(
          4, 8, 15, 10, het=True, metal=True
         )
-        self.mock_solv.assert_called_with(
-         self.model, 4, 8, 15, 10, het=True, metal=True, pc=True
-        )
+        self.assertEqual(self.model.atoms_in_sphere.call_count, 1)
         for atom in self.atoms[:3]:
-            atom.distance_to.assert_any_call((4, 8, 15))
+            atom.distance_to.assert_called_once_with((4, 8, 15))
             self.mock_atcharge.assert_any_call(atom)
-        self.assertEqual(
-         contrast, ((121 * 49) + (81 * 25) + (16 * 100)) - (3 * 8 * 58)
+        self.assertEqual(self.mock_atcharge.call_count, 3)
+        self.assertFalse(self.mock_atsolv.called)
+        self.assertAlmostEqual(
+         contrast, ((121 * 49) + (81 * 25) + (16 * 100)) - (3 * (218 / 3) * 58),
+         delta=0.0000005
         )
 
 
@@ -334,9 +488,6 @@ class HydrophobicContrastTests(TestCase):
         self.model.atoms_in_sphere.assert_called_with(
          2, 4, 5, 12, het=False, metal=True
         )
-        self.mock_solv.assert_called_with(
-         self.model, 2, 4, 5, 12, het=False, metal=True, pc=False
-        )
 
 
     def test_can_filter_out_metal(self):
@@ -344,6 +495,568 @@ class HydrophobicContrastTests(TestCase):
         self.model.atoms_in_sphere.assert_called_with(
          2, 4, 5, 12, het=True, metal=False
         )
-        self.mock_solv.assert_called_with(
-         self.model, 2, 4, 5, 12, het=True, metal=False, pc=False
+
+
+
+class SphereHydrophobicityTests(TestCase):
+
+    def setUp(self):
+        self.model = Mock(Model)
+        self.atoms = [Mock(), Mock(), Mock()]
+        self.atoms[0].distance_to.return_value = 7
+        self.atoms[1].distance_to.return_value = 5
+        self.atoms[2].distance_to.return_value = 10
+        self.model.atoms_in_sphere.return_value = self.atoms
+        self.patch1 = patch("biometal.hydrophobicity.atom_solvation")
+        self.mock_atsolv = self.patch1.start()
+        self.mock_atsolv.side_effect = [11, -9, 4]
+
+
+    def tearDown(self):
+        self.patch1.stop()
+
+
+    def test_sphere_needs_model(self):
+        with self.assertRaises(TypeError):
+            sphere_hydrophobicity("structure", 0, 0, 0, 10)
+
+
+    def test_sphere_needs_valid_arguments(self):
+        with self.assertRaises(TypeError):
+            sphere_hydrophobicity(self.model, 0, "0", 0, 10)
+        with self.assertRaises(TypeError):
+            sphere_hydrophobicity(self.model, 0, 0, 0, "10")
+        with self.assertRaises(ValueError):
+            sphere_hydrophobicity(self.model, 0, 0, 0, -10)
+
+
+    def test_can_measure_sphere_in_one_pass(self):
+        sphere = sphere_hydrophobicity(self.model, 4, 8, 15, 10, het=False)
+        self.model.atoms_in_sphere.assert_called_once_with(
+         4, 8, 15, 10, het=False, metal=True
+        )
+        self.assertEqual(self.mock_atsolv.call_count, 3)
+        for atom in self.atoms:
+            atom.distance_to.assert_called_once_with((4, 8, 15))
+        self.assertIsInstance(sphere, SphereHydrophobicity)
+        self.assertEqual(sphere.count, 3)
+        self.assertEqual(sphere.solvation, 2)
+        self.assertEqual(
+         sphere.contrast, ((11 * 49) + (-9 * 25) + (4 * 100)) - (3 * 2 * 58)
+        )
+
+
+    def test_sphere_needs_valid_box(self):
+        with self.assertRaises(TypeError):
+            sphere_hydrophobicity(self.model, 0, 0, 0, 10, box=30)
+        with self.assertRaises(ValueError):
+            sphere_hydrophobicity(self.model, 0, 0, 0, 10, box=Box(15, 30, 30))
+        index = Mock(SpatialIndex)
+        index.box = Box(30, 30, 30)
+        with self.assertRaises(ValueError):
+            sphere_hydrophobicity(self.model, 0, 0, 0, 10, index=index)
+        with self.assertRaises(ValueError):
+            sphere_hydrophobicity(
+             self.model, 0, 0, 0, 10, index=index, box=Box(40, 40, 40)
+            )
+
+
+    def test_can_measure_sphere_in_box(self):
+        box = Box(20, 20, 20)
+        self.model.atoms.return_value = self.atoms
+        self.atoms[0].location = (1, 0, 0)
+        self.atoms[1].location = (19, 0, 0)
+        self.atoms[2].location = (10, 0, 0)
+        self.mock_atsolv.side_effect = [11, -9]
+        sphere = sphere_hydrophobicity(self.model, 0, 0, 0, 5, box=box)
+        self.model.atoms.assert_called_once_with(het=True, metal=True)
+        self.assertFalse(self.model.atoms_in_sphere.called)
+        self.assertEqual(sphere.count, 2)
+        self.assertEqual(sphere.solvation, 1)
+        self.assertEqual(sphere.contrast, (11 - 9) - (2 * 1 * 1))
+
+
+    def test_can_measure_sphere_in_atom_table(self):
+        table = Mock(AtomTable)
+        table.indices_in_sphere.return_value = (
+         np.array([0, 2]), np.array([49.0, 100])
+        )
+        table.parameters.return_value = np.array([11.0, -9, 4])
+        sphere = sphere_hydrophobicity(table, 4, 8, 15, 10, pc=True, het=False)
+        table.indices_in_sphere.assert_called_once_with(
+         4, 8, 15, 10, het=False, metal=True, box=None
+        )
+        table.parameters.assert_called_with(pc=True)
+        self.assertFalse(self.mock_atsolv.called)
+        self.assertEqual(sphere.count, 2)
+        self.assertEqual(sphere.solvation, 7.5)
+        self.assertEqual(
+         sphere.contrast, ((11 * 49) + (4 * 100)) - (2 * 7.5 * 74.5)
+        )
+
+
+
+class SphereHydrophobicityObjectTests(TestCase):
+
+    def test_can_create_sphere_hydrophobicity(self):
+        sphere = SphereHydrophobicity(3, 6, 174, 714)
+        self.assertEqual(sphere.count, 3)
+        self.assertEqual(sphere.solvation, 2)
+        self.assertEqual(sphere.contrast, 714 - (3 * 2 * 58))
+
+
+    def test_empty_sphere_is_zero(self):
+        sphere = SphereHydrophobicity(0, 0, 0, 0)
+        self.assertEqual(sphere.solvation, 0)
+        self.assertEqual(sphere.contrast, 0)
+
+
+    def test_sphere_hydrophobicity_repr(self):
+        self.assertEqual(
+         repr(SphereHydrophobicity(3, 6, 174, 714)),
+         "<SphereHydrophobicity (3 atoms)>"
+        )
+        self.assertEqual(
+         repr(SphereHydrophobicity(1, 6, 174, 714)),
+         "<SphereHydrophobicity (1 atom)>"
+        )
+
+
+
+class ContrastMapTests(TestCase):
+
+    def setUp(self):
+        self.model = Mock(Model)
+        self.atoms = [Mock(location=(0, 0, 0)), Mock(location=(2.5, 1, -1))]
+        self.model.atoms.return_value = self.atoms
+        self.patch1 = patch("biometal.hydrophobicity._atom_arrays")
+        self.patch2 = patch("biometal.hydrophobicity._grid_sums")
+        self.patch3 = patch("biometal.hydrophobicity._contrast")
+        self.mock_arrays = self.patch1.start()
+        self.mock_sums = self.patch2.start()
+        self.mock_contrast = self.patch3.start()
+        self.mock_arrays.return_value = ("coords", "params")
+        self.mock_sums.return_value = [1, 2, 3, 4]
+        self.mock_contrast.return_value = "values"
+
+
+    def tearDown(self):
+        self.patch1.stop()
+        self.patch2.stop()
+        self.patch3.stop()
+
+
+    def test_map_needs_model(self):
+        with self.assertRaises(TypeError):
+            contrast_map("structure", 10)
+
+
+    def test_distances_must_be_numbers(self):
+        with self.assertRaises(TypeError):
+            contrast_map(self.model, "10")
+        with self.assertRaises(TypeError):
+            contrast_map(self.model, 10, spacing="1")
+        with self.assertRaises(TypeError):
+            contrast_map(self.model, 10, margin="1")
+
+
+    def test_distances_must_be_valid(self):
+        with self.assertRaises(ValueError):
+            contrast_map(self.model, -10)
+        with self.assertRaises(ValueError):
+            contrast_map(self.model, 10, spacing=0)
+        with self.assertRaises(ValueError):
+            contrast_map(self.model, 10, margin=-1)
+
+
+    def test_can_get_contrast_map(self):
+        values, origin, spacing = contrast_map(self.model, 10, het=False)
+        self.mock_arrays.assert_called_with(
+         self.model, pc=False, het=False, metal=True
+        )
+        self.mock_sums.assert_called_with(
+         "coords", "params", [0, 0, -1], (4, 2, 2), 1, 10
+        )
+        self.mock_contrast.assert_called_with(1, 2, 3, 4)
+        self.assertEqual(values, "values")
+        self.assertEqual(origin, (0, 0, -1))
+        self.assertEqual(spacing, 1)
+
+
+    def test_can_get_contrast_map_with_spacing_and_margin(self):
+        values, origin, spacing = contrast_map(
+         self.model, 10, spacing=0.5, margin=1, pc=True, metal=False
+        )
+        self.mock_arrays.assert_called_with(
+         self.model, pc=True, het=True, metal=False
+        )
+        self.mock_sums.assert_called_with(
+         "coords", "params", [-2, -2, -4], (10, 7, 7), 0.5, 10
+        )
+        self.assertEqual(origin, (-1, -1, -2))
+        self.assertEqual(spacing, 0.5)
+
+
+    def test_can_handle_empty_model(self):
+        self.model.atoms.return_value = []
+        values, origin, spacing = contrast_map(self.model, 10)
+        self.assertEqual(values.shape, (0, 0, 0))
+        self.assertEqual(origin, (0, 0, 0))
+
+
+    def test_method_must_be_valid(self):
+        with self.assertRaises(ValueError):
+            contrast_map(self.model, 10, method="fast")
+
+
+    def test_peaks_must_be_valid(self):
+        with self.assertRaises(ValueError):
+            contrast_map(self.model, 10, peaks=-1)
+        with self.assertRaises(ValueError):
+            contrast_map(self.model, 10, peaks=1.5)
+
+
+    def test_can_get_contrast_map_with_fft(self):
+        with patch("biometal.hydrophobicity._fft_sums") as mock_fft:
+            mock_fft.return_value = [5, 6, 7, 8]
+            values, origin, spacing = contrast_map(self.model, 10, method="fft")
+            mock_fft.assert_called_with(
+             "coords", "params", [0, 0, -1], (4, 2, 2), 1, 10
+            )
+        self.assertFalse(self.mock_sums.called)
+        self.mock_contrast.assert_called_with(5, 6, 7, 8)
+
+
+    def test_can_recalculate_peaks(self):
+        self.mock_contrast.side_effect = [
+         np.arange(16.0).reshape(4, 2, 2), np.array([100, 200])
+        ]
+        with patch("biometal.hydrophobicity._sphere_sums") as mock_exact:
+            mock_exact.return_value = [1, 2, 3, 4]
+            values, origin, spacing = contrast_map(self.model, 10, peaks=2)
+            points = mock_exact.call_args[0][2]
+        self.assertEqual(sorted(points.tolist()), [[3, 1, -1], [3, 1, 0]])
+        self.assertEqual(sorted(values.ravel().tolist())[-2:], [100, 200])
+        self.assertEqual(values.sum(), sum(range(14)) + 300)
+
+
+    def test_can_get_solvation_map(self):
+        values, origin, spacing = solvation_map(self.model, 10, pc=True)
+        self.mock_arrays.assert_called_with(
+         self.model, pc=True, het=True, metal=True
+        )
+        self.assertFalse(self.mock_contrast.called)
+        self.assertEqual(values, 2)
+
+
+
+class GridSumTests(TestCase):
+
+    def test_can_get_grid_sums(self):
+        coordinates = np.array([[0.0, 0, 0], [1.5, 0, 0]])
+        parameters = np.array([2.0, -3])
+        count, solv, square, product = _grid_sums(
+         coordinates, parameters, [0, 0, 0], (3, 1, 1), 1, 1
+        )
+        self.assertEqual(count.tolist(), [[[1]], [[2]], [[1]]])
+        self.assertEqual(solv.tolist(), [[[2]], [[-1]], [[-3]]])
+        self.assertEqual(square.tolist(), [[[0]], [[1.25]], [[0.25]]])
+        self.assertEqual(product.tolist(), [[[0]], [[1.25]], [[-0.75]]])
+
+
+    def test_grid_sums_ignore_points_outside_grid(self):
+        coordinates = np.array([[-5.0, 0, 0], [0.2, 0, 0]])
+        count, *_ = _grid_sums(
+         coordinates, np.array([1.0, 1]), [0, 0, 0], (2, 2, 2), 1, 1
+        )
+        self.assertEqual(count.sum(), 2)
+
+
+    def test_can_handle_no_atoms(self):
+        sums = _grid_sums(np.zeros((0, 3)), np.zeros(0), [0, 0, 0], (2, 2, 2), 1, 1)
+        for sum_ in sums:
+            self.assertEqual(sum_.shape, (2, 2, 2))
+            self.assertFalse(sum_.any())
+
+
+
+class FftSumTests(TestCase):
+
+    def test_fft_sums_match_direct_sums_for_atoms_on_grid(self):
+        coordinates = np.array([
+         [0.0, 0, 0], [2, 1, 0], [3, 3, 2], [1, 4, 4], [4, 0, 1]
+        ]) + np.array([0.01, -0.02, 0.03])
+        parameters = np.array([18.0, -9, -23, 4, -5])
+        direct = _grid_sums(coordinates, parameters, [-1, 0, 0], (6, 5, 5), 1, 2.5)
+        fft = _fft_sums(coordinates, parameters, [-1, 0, 0], (6, 5, 5), 1, 2.5)
+        for direct_sum, fft_sum in zip(direct, fft):
+            self.assertEqual(fft_sum.shape, (6, 5, 5))
+            self.assertLess(np.abs(direct_sum - fft_sum).max(), 0.0000005)
+
+
+    def test_fft_sums_can_handle_no_atoms(self):
+        sums = _fft_sums(np.zeros((0, 3)), np.zeros(0), [0, 0, 0], (2, 2, 2), 1, 1)
+        for sum_ in sums:
+            self.assertEqual(sum_.shape, (2, 2, 2))
+            self.assertFalse(sum_.any())
+
+
+
+class SolvationCalculationTests(TestCase):
+
+    def test_can_calculate_solvation(self):
+        solvation = _solvation(
+         np.array([3, 0]), np.array([6, 0]), np.array([58, 0])
+        )
+        self.assertEqual(solvation.tolist(), [2, 0])
+
+
+
+class ContrastCalculationTests(TestCase):
+
+    def test_can_calculate_contrast(self):
+        contrast = _contrast(
+         np.array([3, 0]), np.array([6, 0]),
+         np.array([58, 0]), np.array([600, 0])
+        )
+        self.assertEqual(contrast.tolist(), [600 - (3 * 2 * (58 / 3)), 0])
+
+
+
+class ManySphereTests(TestCase):
+
+    def setUp(self):
+        self.model = Mock(Model)
+        self.patch1 = patch("biometal.hydrophobicity._atom_arrays")
+        self.patch2 = patch("biometal.hydrophobicity._sphere_sums")
+        self.mock_arrays = self.patch1.start()
+        self.mock_sums = self.patch2.start()
+        self.mock_arrays.return_value = ("coords", "params")
+        self.mock_sums.return_value = [
+         np.array([3, 0]), np.array([6, 0]),
+         np.array([58, 0]), np.array([600, 0])
+        ]
+
+
+    def tearDown(self):
+        self.patch1.stop()
+        self.patch2.stop()
+
+
+    def test_functions_need_model(self):
+        with self.assertRaises(TypeError):
+            solvation_many("structure", [[0, 0, 0]], 10)
+        with self.assertRaises(TypeError):
+            hydrophobic_contrast_many("structure", [[0, 0, 0]], 10)
+
+
+    def test_centres_must_be_coordinates(self):
+        with self.assertRaises(TypeError):
+            solvation_many(self.model, [["0", "a", 0]], 10)
+        with self.assertRaises(ValueError):
+            solvation_many(self.model, [[0, 0]], 10)
+        with self.assertRaises(ValueError):
+            hydrophobic_contrast_many(self.model, [0, 0, 0], 10)
+
+
+    def test_radius_must_be_positive_number(self):
+        with self.assertRaises(TypeError):
+            solvation_many(self.model, [[0, 0, 0]], "10")
+        with self.assertRaises(ValueError):
+            hydrophobic_contrast_many(self.model, [[0, 0, 0]], -10)
+
+
+    def test_can_get_many_solvations(self):
+        solvations = solvation_many(
+         self.model, [[1, 2, 3], [4, 5, 6]], 10, pc=True, het=False
+        )
+        self.mock_arrays.assert_called_with(
+         self.model, pc=True, het=False, metal=True
+        )
+        args = self.mock_sums.call_args[0]
+        self.assertEqual(args[:2], ("coords", "params"))
+        self.assertEqual(args[2].tolist(), [[1, 2, 3], [4, 5, 6]])
+        self.assertEqual(args[3], 10)
+        self.assertEqual(solvations.tolist(), [2, 0])
+
+
+    def test_can_get_many_contrasts(self):
+        contrasts = hydrophobic_contrast_many(
+         self.model, np.array([[1, 2, 3], [4, 5, 6]]), 10, metal=False
+        )
+        self.mock_arrays.assert_called_with(
+         self.model, pc=False, het=True, metal=False
+        )
+        self.assertEqual(contrasts.tolist(), [600 - (3 * 2 * (58 / 3)), 0])
+
+
+    def test_can_handle_no_centres(self):
+        solvation_many(self.model, [], 10)
+        self.assertEqual(self.mock_sums.call_args[0][2].shape, (0, 3))
+
+
+    def test_index_must_be_spatial_index(self):
+        with self.assertRaises(TypeError):
+            solvation_many(self.model, [[0, 0, 0]], 10, index="index")
+
+
+    def test_can_use_spatial_index(self):
+        index = Mock(SpatialIndex)
+        index.box = None
+        index.atoms = ["A1", "A2"]
+        index.coordinates = "coords"
+        index.mask.return_value = "mask"
+        with patch("biometal.hydrophobicity.solvation_parameters") as mock_params:
+            mock_params.return_value = np.array([4.0, 5])
+            hydrophobic_contrast_many(
+             self.model, [[1, 2, 3]], 10, het=False, index=index
+            )
+        self.assertFalse(self.mock_arrays.called)
+        index.mask.assert_called_with(het=False, metal=True)
+        args, kwargs = self.mock_sums.call_args
+        self.assertEqual(args[0], "coords")
+        mock_params.assert_called_with(["A1", "A2"])
+        self.assertEqual(args[1].tolist(), [4, 5])
+        self.assertEqual(kwargs, {"grid": index, "mask": "mask"})
+
+
+
+class SphereSumTests(TestCase):
+
+    def test_can_get_sphere_sums(self):
+        coordinates = np.array([[0.0, 0, 0], [1.5, 0, 0], [20, 20, 20]])
+        parameters = np.array([2.0, -3, 7])
+        centres = np.array([[0.0, 0, 0], [1, 0, 0], [2, 0, 0], [-9, 0, 0]])
+        count, solv, square, product = _sphere_sums(
+         coordinates, parameters, centres, 1, chunk=3
+        )
+        self.assertEqual(count.tolist(), [1, 2, 1, 0])
+        self.assertEqual(solv.tolist(), [2, -1, -3, 0])
+        self.assertEqual(square.tolist(), [0, 1.25, 0.25, 0])
+        self.assertEqual(product.tolist(), [0, 1.25, -0.75, 0])
+
+
+    def test_can_use_zero_radius(self):
+        coordinates = np.array([[0.0, 0, 0], [1.5, 0, 0]])
+        count, solv, *_ = _sphere_sums(
+         coordinates, np.array([2.0, -3]), np.array([[1.5, 0, 0]]), 0
+        )
+        self.assertEqual(count.tolist(), [1])
+        self.assertEqual(solv.tolist(), [-3])
+
+
+    def test_can_handle_no_atoms(self):
+        sums = _sphere_sums(np.zeros((0, 3)), np.zeros(0), np.zeros((2, 3)), 1)
+        for sum_ in sums:
+            self.assertEqual(sum_.tolist(), [0, 0])
+
+
+    def test_can_use_existing_grid_and_mask(self):
+        coordinates = np.array([[0.0, 0, 0], [1.5, 0, 0]])
+        grid = Mock()
+        grid.pairs.return_value = (
+         np.array([0, 0]), np.array([1, 0]), np.array([0.25, 1])
+        )
+        count, solv, square, product = _sphere_sums(
+         coordinates, np.array([2.0, -3]), np.array([[1, 0, 0]]), 1,
+         grid=grid, mask="mask"
+        )
+        self.assertEqual(grid.pairs.call_args[0][0].tolist(), [[1, 0, 0]])
+        self.assertEqual(grid.pairs.call_args[1], {"mask": "mask"})
+        self.assertEqual(count.tolist(), [2])
+        self.assertEqual(solv.tolist(), [-1])
+        self.assertEqual(square.tolist(), [1.25])
+        self.assertEqual(product.tolist(), [1.25])
+
+
+
+class ContrastProfileTests(TestCase):
+
+    def setUp(self):
+        self.model = Mock(Model)
+        self.patch1 = patch("biometal.hydrophobicity._atom_arrays")
+        self.mock_arrays = self.patch1.start()
+        self.mock_arrays.return_value = (
+         np.array([[10.0, 0, 0], [1, 0, 0], [0, 2, 0], [0, 0, 0]]),
+         np.array([5.0, 11, -9, 4])
+        )
+
+
+    def tearDown(self):
+        self.patch1.stop()
+
+
+    def test_profile_needs_model(self):
+        with self.assertRaises(TypeError):
+            contrast_profile("structure", 0, 0, 0, [1, 2])
+
+
+    def test_profile_needs_valid_arguments(self):
+        with self.assertRaises(TypeError):
+            contrast_profile(self.model, 0, "0", 0, [1, 2])
+        with self.assertRaises(TypeError):
+            contrast_profile(self.model, 0, 0, 0, ["a", 2])
+        with self.assertRaises(ValueError):
+            contrast_profile(self.model, 0, 0, 0, [1, -2])
+        with self.assertRaises(TypeError):
+            contrast_profile(self.model, 0, 0, 0, [1, 2], index="index")
+
+
+    def test_can_get_profile(self):
+        solvations, contrasts = contrast_profile(
+         self.model, 0, 0, 0, [2, 0.5, 1, 0], pc=True, het=False
+        )
+        self.mock_arrays.assert_called_with(
+         self.model, pc=True, het=False, metal=True
+        )
+        self.assertEqual(solvations.tolist(), [2, 4, 7.5, 4])
+        self.assertEqual(contrasts.tolist(), [
+         (11 - 36) - (3 * 2 * (5 / 3)), 0, 11 - (2 * 7.5 * 0.5), 0
+        ])
+
+
+    def test_can_handle_no_atoms(self):
+        self.mock_arrays.return_value = (np.zeros((0, 3)), np.zeros(0))
+        solvations, contrasts = contrast_profile(self.model, 0, 0, 0, [1, 2])
+        self.assertEqual(solvations.tolist(), [0, 0])
+        self.assertEqual(contrasts.tolist(), [0, 0])
+
+
+    def test_can_use_spatial_index(self):
+        index = Mock(SpatialIndex)
+        index.box = None
+        index.atoms = ["A1", "A2", "A3"]
+        index.pairs_filtered.return_value = (
+         np.array([0, 0]), np.array([2, 0]), np.array([1.0, 0])
+        )
+        with patch("biometal.hydrophobicity.solvation_parameters") as mock_params:
+            mock_params.return_value = np.array([11.0, 4])
+            solvations, contrasts = contrast_profile(
+             self.model, 1, 2, 3, [0, 3, 1], metal=False, index=index
+            )
+        index.pairs_filtered.assert_called_with(
+         [[1, 2, 3]], 3, het=True, metal=False
         )
+        mock_params.assert_called_with(["A3", "A1"])
+        self.assertFalse(self.mock_arrays.called)
+        self.assertEqual(solvations.tolist(), [4, 7.5, 7.5])
+
+
+
+class AtomArrayTests(TestCase):
+
+    def test_can_get_arrays_from_atom_table(self):
+        table = Mock(AtomTable)
+        table.coordinates = np.array([[0.0, 0, 0], [1, 1, 1], [2, 2, 2]])
+        table.parameters.return_value = np.array([1.0, 2, 3])
+        table.mask.return_value = None
+        coordinates, parameters = _atom_arrays(table, pc=True)
+        table.mask.assert_called_with(het=True, metal=True)
+        table.parameters.assert_called_with(pc=True)
+        self.assertEqual(coordinates.tolist(), table.coordinates.tolist())
+        self.assertEqual(parameters.tolist(), [1, 2, 3])
+        table.mask.return_value = np.array([True, False, True])
+        coordinates, parameters = _atom_arrays(table, metal=False)
+        table.mask.assert_called_with(het=True, metal=False)
+        self.assertEqual(coordinates.tolist(), [[0, 0, 0], [2, 2, 2]])
+        self.assertEqual(parameters.tolist(), [1, 3])
@@ -0,0 +1,314 @@
+from unittest import TestCase
+from unittest.mock import patch
+import json
+import os
+import shutil
+import tempfile
+from biometal.batch import BatchResult
+from biometal.templates import SiteTemplate
+from biometal.jobs import create_manifest, load_manifest, shard_of
+from biometal.jobs import shard_paths, checkpoint_path, run_shard
+from biometal.jobs import read_checkpoint, merge_shards, _encode, _decode
+
+class JobTest(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.manifest = os.path.join(self.directory, "job.json")
+        self.paths = ["{}.pdb".format(n) for n in range(20)]
+
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+
+class ManifestTests(JobTest):
+
+    def test_can_create_manifest(self):
+        manifest = create_manifest(
+         self.manifest, iter(self.paths), "contrast", shards=3, radius=6
+        )
+        self.assertEqual(manifest, {
+         "version": 1, "task": "contrast", "options": {"radius": 6},
+         "shards": 3, "paths": self.paths
+        })
+        self.assertEqual(load_manifest(self.manifest), manifest)
+        self.assertEqual(os.listdir(self.directory), ["job.json"])
+
+
+    def test_manifest_needs_known_task(self):
+        with self.assertRaises(ValueError):
+            create_manifest(self.manifest, self.paths, "task")
+
+
+    def test_manifest_needs_positive_shards(self):
+        with self.assertRaises(ValueError):
+            create_manifest(self.manifest, self.paths, "contrast", shards=0)
+
+
+    def test_manifest_must_be_manifest(self):
+        with open(self.manifest, "w") as f: f.write("[1, 2]")
+        with self.assertRaises(ValueError):
+            load_manifest(self.manifest)
+        with open(self.manifest, "w") as f: f.write("{")
+        with self.assertRaises(ValueError):
+            load_manifest(self.manifest)
+
+
+    def test_manifest_must_not_be_newer(self):
+        manifest = create_manifest(self.manifest, self.paths, "contrast")
+        manifest["version"] = 9
+        with open(self.manifest, "w") as f: json.dump(manifest, f)
+        with self.assertRaises(ValueError):
+            load_manifest(self.manifest)
+
+
+
+class ShardingTests(JobTest):
+
+    def test_shards_are_deterministic(self):
+        self.assertEqual(shard_of("1abc.pdb", 7), shard_of("1abc.pdb", 7))
+        self.assertEqual(
+         [shard_of(path, 4) for path in ("a", "b", "c", "d")], [0, 1, 3, 2]
+        )
+        self.assertEqual(shard_of("1abc.pdb", 1), 0)
+
+
+    def test_shards_hold_every_path_once(self):
+        manifest = create_manifest(
+         self.manifest, self.paths, "contrast", shards=3
+        )
+        shards = [shard_paths(manifest, shard) for shard in range(3)]
+        self.assertEqual(sorted(sum(shards, [])), sorted(self.paths))
+        for shard in shards:
+            self.assertTrue(shard)
+            self.assertEqual(shard, sorted(shard, key=self.paths.index))
+
+
+    def test_shard_must_exist(self):
+        manifest = create_manifest(self.manifest, self.paths, "contrast")
+        with self.assertRaises(ValueError):
+            shard_paths(manifest, 1)
+
+
+    def test_can_get_checkpoint_path(self):
+        self.assertEqual(
+         checkpoint_path("/jobs/scan.json", 3), "/jobs/scan.shard-3.jsonl"
+        )
+        self.assertEqual(checkpoint_path("scan", 0), "scan.shard-0.jsonl")
+
+
+
+class CheckpointTests(JobTest):
+
+    def test_missing_checkpoint_has_no_records(self):
+        self.assertEqual(read_checkpoint(self.manifest), {})
+
+
+    def test_can_read_checkpoint(self):
+        with open(self.manifest, "w") as f:
+            f.write('{"path": "a", "value": 1}\n\n')
+            f.write('{"path": "b", "error": "E"}\n')
+            f.write('{"path": "a", "value": 2}\n{"path": "c", "val')
+        self.assertEqual(read_checkpoint(self.manifest), {
+         "a": {"path": "a", "value": 2}, "b": {"path": "b", "error": "E"}
+        })
+        with open(self.manifest) as f:
+            self.assertTrue(f.read().endswith('"val'))
+
+
+    def test_can_repair_checkpoint(self):
+        with open(self.manifest, "w") as f:
+            f.write('{"path": "a", "value": 1}\n{"path": "c", "val')
+        records = read_checkpoint(self.manifest, repair=True)
+        self.assertEqual(list(records), ["a"])
+        with open(self.manifest) as f:
+            self.assertEqual(f.read(), '{"path": "a", "value": 1}\n')
+
+
+
+class ShardRunningTests(JobTest):
+
+    def setUp(self):
+        JobTest.setUp(self)
+        create_manifest(
+         self.manifest, self.paths, "contrast", shards=2, radius=6
+        )
+        self.shard = shard_paths(load_manifest(self.manifest), 1)
+        self.checkpoint = checkpoint_path(self.manifest, 1)
+
+
+    def results(self, paths, *args, **kwargs):
+        for path in paths:
+            if path == self.shard[1]:
+                yield BatchResult(path, error="ValueError: bad")
+            else:
+                yield BatchResult(path, value=[("A1", "ZN", (1, 2, 3), 5.0)])
+
+
+    @patch("biometal.jobs.run_batch")
+    def test_can_run_shard(self, mock_run):
+        mock_run.side_effect = self.results
+        summary = run_shard(self.manifest, 1, workers=3, chunk_size=2)
+        mock_run.assert_called_with(
+         self.shard, "contrast", workers=3, chunk_size=2, radius=6
+        )
+        self.assertEqual(summary, {
+         "shard": 1, "paths": len(self.shard), "skipped": 0,
+         "completed": len(self.shard) - 1, "failed": 1
+        })
+        records = read_checkpoint(self.checkpoint)
+        self.assertEqual(list(records), self.shard)
+        self.assertEqual(records[self.shard[0]]["value"], [{
+         "id": "A1", "element": "ZN", "location": [1, 2, 3], "contrast": 5.0
+        }])
+        self.assertEqual(records[self.shard[1]]["error"], "ValueError: bad")
+
+
+    @patch("biometal.jobs.run_batch")
+    def test_can_resume_shard(self, mock_run):
+        mock_run.side_effect = self.results
+        with open(self.checkpoint, "w") as f:
+            f.write(json.dumps({"path": self.shard[0], "value": []}) + "\n")
+            f.write(json.dumps({"path": self.shard[1], "error": "E"}) + "\n")
+            f.write('{"path": "')
+        summary = run_shard(self.manifest, 1)
+        self.assertEqual(mock_run.call_args[0][0], self.shard[2:])
+        self.assertEqual(summary["skipped"], 2)
+        self.assertEqual(summary["completed"], len(self.shard) - 2)
+        self.assertEqual(list(read_checkpoint(self.checkpoint)), self.shard)
+        run_shard(self.manifest, 1, retry_failed=True)
+        self.assertEqual(mock_run.call_args[0][0], [self.shard[1]])
+
+
+    @patch("biometal.jobs.run_batch")
+    def test_finished_shard_runs_nothing(self, mock_run):
+        with open(self.checkpoint, "w") as f:
+            for path in self.shard:
+                f.write(json.dumps({"path": path, "value": []}) + "\n")
+        summary = run_shard(self.manifest, 1)
+        self.assertFalse(mock_run.called)
+        self.assertEqual(summary["skipped"], len(self.shard))
+
+
+    @patch("biometal.jobs.run_batch")
+    def test_can_use_other_checkpoint(self, mock_run):
+        mock_run.side_effect = self.results
+        other = os.path.join(self.directory, "other.jsonl")
+        run_shard(self.manifest, 1, checkpoint=other)
+        self.assertEqual(list(read_checkpoint(other)), self.shard)
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+
+
+class MergingTests(JobTest):
+
+    def write_checkpoints(self, manifest, records):
+        for shard in range(manifest["shards"]):
+            with open(checkpoint_path(self.manifest, shard), "w") as f:
+                for path in shard_paths(manifest, shard):
+                    if path in records:
+                        f.write(json.dumps(records[path]) + "\n")
+
+
+    def test_can_merge_contrasts(self):
+        manifest = create_manifest(
+         self.manifest, self.paths, "contrast", shards=3
+        )
+        records = {path: {"path": path, "value": [{"id": path}]}
+         for path in self.paths}
+        records["3.pdb"] = {"path": "3.pdb", "error": "E"}
+        self.write_checkpoints(manifest, records)
+        output = os.path.join(self.directory, "out.jsonl")
+        summary = merge_shards(self.manifest, output)
+        self.assertEqual(summary, {
+         "paths": 20, "missing": 0, "failed": 1, "completed": 19
+        })
+        with open(output) as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual([line["path"] for line in lines], self.paths)
+        self.assertEqual(
+         lines[0], {"path": "0.pdb", "metals": [{"id": "0.pdb"}]}
+        )
+        self.assertEqual(lines[3], {"path": "3.pdb", "error": "E"})
+
+
+    def test_merge_needs_every_path(self):
+        manifest = create_manifest(
+         self.manifest, self.paths, "contrast", shards=3
+        )
+        self.write_checkpoints(manifest, {path: {"path": path, "value": []}
+         for path in self.paths[1:]})
+        output = os.path.join(self.directory, "out.jsonl")
+        with self.assertRaises(ValueError):
+            merge_shards(self.manifest, output)
+        self.assertFalse(os.path.exists(output))
+        summary = merge_shards(self.manifest, output, partial=True)
+        self.assertEqual(summary["missing"], 1)
+        with open(output) as f: self.assertEqual(len(f.readlines()), 19)
+
+
+    def test_failed_merge_leaves_nothing_behind(self):
+        manifest = create_manifest(
+         self.manifest, self.paths, "contrast", shards=3
+        )
+        self.write_checkpoints(manifest, {path: {"path": path, "value": []}
+         for path in self.paths})
+        output = os.path.join(self.directory, "out.jsonl")
+        with patch("biometal.jobs.os.replace") as mock_replace:
+            mock_replace.side_effect = OSError("No space left on device")
+            with self.assertRaises(OSError):
+                merge_shards(self.manifest, output)
+        self.assertFalse(any(
+         name.endswith(".tmp") for name in os.listdir(self.directory)
+        ))
+        self.assertFalse(os.path.exists(output))
+
+
+    @patch("biometal.jobs.save_templates")
+    def test_can_merge_templates(self, mock_save):
+        manifest = create_manifest(
+         self.manifest, self.paths[:2], "templates", shards=2
+        )
+        template = SiteTemplate(
+         [[[0, 0, 0], [1, 0, 0]]], ["A1"], ["HIS"], "ZN"
+        )
+        self.write_checkpoints(manifest, {"0.pdb": {
+         "path": "0.pdb", "value": _encode("templates", [template] * 2)
+        }, "1.pdb": {"path": "1.pdb", "error": "E"}})
+        saved = []
+        mock_save.side_effect = lambda path, templates: saved.extend(templates)
+        merge_shards(self.manifest, "out.bmtl")
+        self.assertEqual(mock_save.call_args[0][0], "out.bmtl")
+        self.assertEqual(len(saved), 2)
+        self.assertEqual(saved[0].residue_ids, ("A1",))
+
+
+
+class EncodingTests(TestCase):
+
+    def test_can_encode_contrasts(self):
+        encoded = _encode("contrast", [("A1", "ZN", (1, 2, 3), 5.0)])
+        self.assertEqual(encoded, [{
+         "id": "A1", "element": "ZN", "location": [1, 2, 3], "contrast": 5.0
+        }])
+        self.assertEqual(_decode("contrast", encoded), encoded)
+
+
+    def test_can_encode_templates(self):
+        template = SiteTemplate(
+         [[[0, 0, 0], [1, 0, 0.5]]], ["A1"], ["HIS"], "ZN", metal_id="A9",
+         metal_location=(1, 2, 3), source="1abc.pdb"
+        )
+        encoded = json.loads(json.dumps(_encode("templates", [template])))
+        decoded = _decode("templates", encoded)[0]
+        self.assertEqual(
+         decoded.coordinates.tolist(), [[[0, 0, 0], [1, 0, 0.5]]]
+        )
+        self.assertEqual(decoded.residue_ids, ("A1",))
+        self.assertEqual(decoded.residue_names, ("HIS",))
+        self.assertEqual(decoded.metal, "ZN")
+        self.assertEqual(decoded.metal_id, "A9")
+        self.assertEqual(decoded.metal_location.tolist(), [1, 2, 3])
+        self.assertEqual(decoded.source, "1abc.pdb")
@@ -0,0 +1,221 @@
+from unittest import TestCase
+from unittest.mock import patch
+import os
+import shutil
+import tempfile
+import numpy as np
+from atomium.structures.atoms import Atom
+from atomium.structures.chains import Residue
+from atomium.structures.molecules import AtomicStructure
+from biometal.templates import SiteTemplate
+from biometal.library import TemplateLibrary, save_templates
+from biometal.library import _as_site_template, _section_shapes, _padded
+
+class LibraryTest(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "templates.bmtl")
+        self.templates = [SiteTemplate(
+         [[[0, 0, 0], [1, 0, 0]], [[5, 5, 5], [6, 5, 5.5]]], ["A1", "A9"],
+         ["HIS", "CYS"], "ZN", metal_id="A100", metal_location=(3, 3, 3),
+         source="1abc.pdb"
+        ), SiteTemplate(
+         [[[1, 2, 3], [2, 2, 3]], [[4, 4, 4], [4, 5, 4]],
+         [[9, 8, 7], [9, 8, 6]]], ["B2", "B3", "B10"],
+         ["HIS", "HIS", "GLU"], "FE", metal_id="B200"
+        ), SiteTemplate([], [], [], "CU", source=7)]
+
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+
+class TemplateSavingTests(LibraryTest):
+
+    def test_can_save_templates(self):
+        self.assertEqual(save_templates(self.path, self.templates), 3)
+        self.assertTrue(os.path.exists(self.path))
+        self.assertEqual(os.listdir(self.directory), ["templates.bmtl"])
+        with open(self.path, "rb") as f:
+            self.assertEqual(f.read(4), b"BMTL")
+
+
+    def test_can_save_templates_from_generator(self):
+        save_templates(self.path, (template for template in self.templates))
+        self.assertEqual(len(TemplateLibrary(self.path)), 3)
+
+
+    def test_can_save_no_templates(self):
+        self.assertEqual(save_templates(self.path, []), 0)
+        library = TemplateLibrary(self.path)
+        self.assertEqual(len(library), 0)
+        self.assertEqual(list(library), [])
+
+
+    def test_saving_needs_templates(self):
+        with self.assertRaises(TypeError):
+            save_templates(self.path, ["template"])
+        self.assertEqual(os.listdir(self.directory), [])
+
+
+    def test_failed_saving_leaves_nothing_behind(self):
+        save_templates(self.path, self.templates)
+        with patch("biometal.library._padded") as mock_padded:
+            mock_padded.side_effect = OSError("No space left on device")
+            with self.assertRaises(OSError):
+                save_templates(self.path, self.templates[:1])
+        self.assertEqual(os.listdir(self.directory), ["templates.bmtl"])
+        self.assertEqual(len(TemplateLibrary(self.path)), 3)
+
+
+    def test_saving_replaces_library(self):
+        save_templates(self.path, self.templates)
+        save_templates(self.path, self.templates[:1])
+        self.assertEqual(len(TemplateLibrary(self.path)), 1)
+
+
+
+class TemplateLibraryTests(LibraryTest):
+
+    def setUp(self):
+        LibraryTest.setUp(self)
+        save_templates(self.path, self.templates)
+        self.library = TemplateLibrary(self.path)
+
+
+    def check_template(self, template, expected):
+        self.assertIsInstance(template, SiteTemplate)
+        self.assertTrue(np.allclose(template.coordinates, expected.coordinates))
+        self.assertEqual(template.coordinates.shape, expected.coordinates.shape)
+        self.assertEqual(template.residue_ids, expected.residue_ids)
+        self.assertEqual(template.residue_names, expected.residue_names)
+        self.assertEqual(template.metal, expected.metal)
+        self.assertEqual(template.metal_id, expected.metal_id)
+        self.assertEqual(
+         template.metal_location.tolist(), expected.metal_location.tolist()
+        )
+
+
+    def test_can_open_library(self):
+        self.assertEqual(self.library.path, self.path)
+        self.assertEqual(len(self.library), 3)
+        self.assertEqual(self.library.residue_count, 5)
+        self.assertEqual(self.library.sizes.tolist(), [2, 3, 0])
+        self.assertEqual(
+         repr(self.library), "<TemplateLibrary (3 templates, 5 residues)>"
+        )
+
+
+    def test_can_get_templates(self):
+        for template, expected in zip(self.library, self.templates):
+            self.check_template(template, expected)
+        self.check_template(self.library[1], self.templates[1])
+        self.check_template(self.library[-3], self.templates[0])
+
+
+    def test_sources_are_strings(self):
+        self.assertEqual(
+         [template.source for template in self.library],
+         ["1abc.pdb", None, "7"]
+        )
+
+
+    def test_can_slice_library(self):
+        templates = self.library[1:]
+        self.assertEqual(len(templates), 2)
+        self.check_template(templates[0], self.templates[1])
+
+
+    def test_library_index_must_exist(self):
+        with self.assertRaises(IndexError):
+            self.library[3]
+        with self.assertRaises(IndexError):
+            self.library.coordinates(-4)
+
+
+    def test_can_get_coordinates_without_copying(self):
+        coordinates = self.library.coordinates(1)
+        self.assertEqual(coordinates.shape, (3, 2, 3))
+        self.assertEqual(coordinates[2, 1].tolist(), [9, 8, 6])
+        self.assertIsInstance(coordinates.base, np.ndarray)
+        self.assertFalse(coordinates.flags.writeable)
+
+
+    def test_can_get_metals(self):
+        self.assertEqual(self.library.metals(), ["ZN", "FE", "CU"])
+
+
+    def test_library_must_be_library(self):
+        other = os.path.join(self.directory, "other.pdb")
+        with open(other, "w") as f: f.write("HEADER" + " " * 80)
+        with self.assertRaises(ValueError):
+            TemplateLibrary(other)
+
+
+    def test_library_must_not_be_newer(self):
+        with open(self.path, "r+b") as f:
+            f.seek(4)
+            f.write(b"\x09")
+        with self.assertRaises(ValueError):
+            TemplateLibrary(self.path)
+
+
+
+class TemplateConversionTests(TestCase):
+
+    def test_site_templates_are_kept(self):
+        template = SiteTemplate([], [], [], "ZN")
+        self.assertIs(_as_site_template(template), template)
+
+
+    def test_can_convert_atomium_template(self):
+        atoms = [
+         Atom("C", 0, 0, 0, id=1, name="CA"),
+         Atom("C", 1, 0, 0, id=2, name="CB"),
+         Atom("C", 5, 5, 5, id=3, name="CA"),
+         Atom("C", 6, 5, 5, id=4, name="CB")
+        ]
+        Residue(*atoms[:2], id="A1", name="HIS")
+        Residue(*atoms[2:], id="A9", name="CYS")
+        template = _as_site_template(AtomicStructure(*atoms))
+        self.assertEqual(template.coordinates.tolist(), [
+         [[0, 0, 0], [1, 0, 0]], [[5, 5, 5], [6, 5, 5]]
+        ])
+        self.assertEqual(template.residue_ids, ("A1", "A9"))
+        self.assertEqual(template.residue_names, ("HIS", "CYS"))
+        self.assertEqual(template.metal, "")
+
+
+    def test_conversion_needs_matching_residues(self):
+        atoms = [
+         Atom("C", 0, 0, 0, id=1, name="CA"),
+         Atom("C", 1, 0, 0, id=2, name="CB"),
+         Atom("C", 5, 5, 5, id=3, name="CA"),
+         Atom("C", 6, 5, 5, id=4, name="CB")
+        ]
+        Residue(*atoms[:2], id="A1", name="HIS")
+        with self.assertRaises(ValueError):
+            _as_site_template(AtomicStructure(*atoms))
+
+
+    def test_conversion_needs_template(self):
+        with self.assertRaises(TypeError):
+            _as_site_template("template")
+
+
+
+class LayoutTests(TestCase):
+
+    def test_can_get_section_shapes(self):
+        self.assertEqual(_section_shapes(2, 5, 3, 20), [
+         ("<i8", (3,)), ("<f8", (5, 2, 3)), ("<f8", (2, 3)), ("<i4", (2, 3)),
+         ("<i4", (5, 2)), ("<i8", (4,)), ("u1", (20,))
+        ])
+
+
+    def test_can_pad_lengths(self):
+        self.assertEqual(_padded(0), 0)
+        self.assertEqual(_padded(1), 8)
+        self.assertEqual(_padded(16), 16)
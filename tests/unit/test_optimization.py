@@ -0,0 +1,305 @@
+from atomium.structures import Model, Molecule, Atom
+from unittest import TestCase
+from unittest.mock import Mock, patch
+import numpy as np
+from biometal.spatial import SpatialIndex, Box
+from biometal.optimization import *
+from biometal.optimization import _ContrastSurface, _grid_points
+
+class ContrastSurfaceCreationTests(TestCase):
+
+    def setUp(self):
+        self.model = Mock(Model)
+        self.patch1 = patch("biometal.optimization._atom_arrays")
+        self.mock_arrays = self.patch1.start()
+        self.mock_arrays.return_value = (
+         np.array([[0.0, 0, 0], [2, 0, 0]]), np.array([18.0, -9])
+        )
+
+
+    def tearDown(self):
+        self.patch1.stop()
+
+
+    def test_surface_needs_model(self):
+        with self.assertRaises(TypeError):
+            _ContrastSurface("model", 5)
+
+
+    def test_surface_needs_valid_distances(self):
+        with self.assertRaises(TypeError):
+            _ContrastSurface(self.model, "5")
+        with self.assertRaises(TypeError):
+            _ContrastSurface(self.model, 5, width="1")
+        with self.assertRaises(ValueError):
+            _ContrastSurface(self.model, -5)
+        with self.assertRaises(ValueError):
+            _ContrastSurface(self.model, 5, width=-1)
+        with self.assertRaises(ValueError):
+            _ContrastSurface(self.model, 5, width=6)
+
+
+    def test_surface_index_must_be_spatial_index(self):
+        with self.assertRaises(TypeError):
+            _ContrastSurface(self.model, 5, index="index")
+
+
+    def test_can_create_surface(self):
+        surface = _ContrastSurface(self.model, 5, pc=True, het=False)
+        self.mock_arrays.assert_called_with(
+         self.model, pc=True, het=False, metal=True
+        )
+        self.assertEqual(surface.coordinates.tolist(), [[0, 0, 0], [2, 0, 0]])
+        self.assertEqual(surface._grid.cell_size, 5)
+        self.assertIs(surface._neighbours._grid, surface._grid)
+        self.assertEqual(surface._parameters.tolist(), [18, -9])
+
+
+    def test_can_create_surface_from_index(self):
+        index = Mock(SpatialIndex)
+        index.atoms = ["A1", "A2"]
+        index.coordinates = np.array([[0.0, 0, 0], [2, 0, 0]])
+        index.mask.return_value = np.array([False, True])
+        with patch("biometal.optimization._parameters") as mock_params:
+            mock_params.return_value = np.array([1.0, 2])
+            surface = _ContrastSurface(self.model, 5, metal=False, index=index)
+            mock_params.assert_called_with(["A1", "A2"], pc=False)
+        index.mask.assert_called_with(het=True, metal=False)
+        self.assertIs(surface._grid, index)
+        self.assertIs(surface._neighbours._grid, index)
+        self.assertEqual(surface.coordinates.tolist(), [[2, 0, 0]])
+
+
+
+class ContrastSurfaceEvaluationTests(TestCase):
+
+    def setUp(self):
+        self.model = Mock(Model)
+        self.patch1 = patch("biometal.optimization._atom_arrays")
+        self.mock_arrays = self.patch1.start()
+        self.mock_arrays.return_value = (
+         np.array([[0.0, 0, 0], [2, 0, 0], [0, 3, 0], [1, 1, 1]]),
+         np.array([18.0, -9, -23, 4])
+        )
+
+
+    def tearDown(self):
+        self.patch1.stop()
+
+
+    def test_can_evaluate_contrast(self):
+        surface = _ContrastSurface(self.model, 2.5)
+        contrast, gradient, count = surface.evaluate(np.array([0.5, 0, 0]))
+        self.assertEqual(count, 3)
+        squares = np.array([0.25, 2.25, 2.25])
+        values = np.array([18, -9, 4])
+        self.assertAlmostEqual(contrast, (values * squares).sum() - (
+         3 * (values.sum() / 3) * (squares.sum() / 3)
+        ), delta=0.0000005)
+        vectors = np.array([[0.5, 0, 0], [-1.5, 0, 0], [-0.5, -1, -1]])
+        expected = 2 * ((values - values.mean())[:, None] * vectors).sum(axis=0)
+        for actual, value in zip(gradient, expected):
+            self.assertAlmostEqual(actual, value, delta=0.0000005)
+
+
+    def test_can_evaluate_empty_sphere(self):
+        surface = _ContrastSurface(self.model, 1)
+        contrast, gradient, count = surface.evaluate(np.array([50.0, 0, 0]))
+        self.assertEqual((contrast, count), (0, 0))
+        self.assertEqual(gradient.tolist(), [0, 0, 0])
+
+
+    def test_smooth_gradient_matches_numerical_gradient(self):
+        surface = _ContrastSurface(self.model, 2.5, width=1)
+        point = np.array([0.4, 0.7, 0.2])
+        contrast, gradient, count = surface.evaluate(point)
+        self.assertLess(count, 4)
+        for axis in range(3):
+            shift = np.zeros(3)
+            shift[axis] = 0.000001
+            numerical = (
+             surface.evaluate(point + shift)[0] - surface.evaluate(point - shift)[0]
+            ) / 0.000002
+            self.assertAlmostEqual(gradient[axis], numerical, delta=0.0001)
+
+
+    def test_zero_width_overrides_smoothing(self):
+        hard = _ContrastSurface(self.model, 2.5)
+        smooth = _ContrastSurface(self.model, 2.5, width=1)
+        point = np.array([0.4, 0.7, 0.2])
+        self.assertEqual(
+         smooth.evaluate(point, width=0)[0], hard.evaluate(point)[0]
+        )
+
+
+
+class PeriodicContrastSurfaceTests(TestCase):
+
+    def setUp(self):
+        state = np.random.RandomState(7)
+        self.model = Model(Molecule(*[Atom(
+         "CONS"[index % 4], x, y, z, id=index + 1, name="X"
+        ) for index, (x, y, z) in enumerate(state.uniform(0, 20, (60, 3)))]))
+        self.index = SpatialIndex(self.model, box=Box(20, 20, 20))
+
+
+    def test_periodic_gradient_matches_numerical_gradient(self):
+        surface = _ContrastSurface(self.model, 6, width=2, index=self.index)
+        for point in ([1.0, 1, 1], [19.5, 0.5, 10], [10.0, 10, 10]):
+            point = np.array(point)
+            gradient = surface.evaluate(point)[1]
+            for axis in range(3):
+                shift = np.zeros(3)
+                shift[axis] = 0.000001
+                numerical = (
+                 surface.evaluate(point + shift)[0] -
+                 surface.evaluate(point - shift)[0]
+                ) / 0.000002
+                self.assertAlmostEqual(
+                 gradient[axis], numerical,
+                 delta=0.001 * max(abs(numerical), 1)
+                )
+
+
+
+class ContrastSurfaceClimbingTests(TestCase):
+
+    def setUp(self):
+        self.model = Mock(Model)
+        self.patch1 = patch("biometal.optimization._atom_arrays")
+        self.mock_arrays = self.patch1.start()
+        self.mock_arrays.return_value = (np.zeros((1, 3)), np.array([1.0]))
+        self.surface = _ContrastSurface(self.model, 5)
+        self.surface.evaluate = Mock()
+
+
+    def tearDown(self):
+        self.patch1.stop()
+
+
+    def test_climbing_stops_at_zero_gradient(self):
+        self.surface.evaluate.return_value = (10, np.zeros(3), 2)
+        point, value, count = self.surface.climb([1, 2, 3], 0.5, 0.001, 100)
+        self.assertEqual(point.tolist(), [1, 2, 3])
+        self.assertEqual((value, count), (10, 2))
+        self.assertEqual(self.surface.evaluate.call_count, 2)
+
+
+    def test_climbing_accepts_improvements_and_halves_otherwise(self):
+        self.surface.evaluate.side_effect = [
+         (10, np.array([2.0, 0, 0]), 2),
+         (12, np.array([0, 1.0, 0]), 2),
+         (11, np.array([0, 1.0, 0]), 2),
+         (13, np.zeros(3), 2),
+         (13, np.zeros(3), 3),
+        ]
+        point, value, count = self.surface.climb([1, 2, 3], 0.5, 0.001, 100)
+        self.assertEqual(point.tolist(), [1.5, 2.375, 3])
+        self.assertEqual((value, count), (13, 3))
+        self.surface.evaluate.assert_called_with(point, width=0)
+
+
+    def test_climbing_stops_below_tolerance(self):
+        self.surface.evaluate.side_effect = [(10, np.array([1.0, 0, 0]), 1)] + [
+         (9, np.array([1.0, 0, 0]), 1)
+        ] * 3 + [(10, np.array([1.0, 0, 0]), 1)]
+        point, value, count = self.surface.climb([1, 2, 3], 0.5, 0.1, 100)
+        self.assertEqual(point.tolist(), [1, 2, 3])
+        self.assertEqual(self.surface.evaluate.call_count, 5)
+
+
+    def test_climbing_stops_after_iterations(self):
+        self.surface.evaluate.return_value = (10, np.array([1.0, 0, 0]), 1)
+        self.surface.climb([1, 2, 3], 0.5, 0.001, 3)
+        self.assertEqual(self.surface.evaluate.call_count, 5)
+
+
+    def test_smooth_surface_is_climbed_before_ordinary_surface(self):
+        self.surface._width = 1
+        self.surface.evaluate.return_value = (10, np.zeros(3), 1)
+        self.surface.climb([1, 2, 3], 0.5, 0.001, 3)
+        widths = [c[1]["width"] for c in self.surface.evaluate.call_args_list]
+        self.assertEqual(widths, [1, 0, 0])
+
+
+
+class ContrastOptimizationTests(TestCase):
+
+    def setUp(self):
+        self.model = Mock(Model)
+        self.patch1 = patch("biometal.optimization._ContrastSurface")
+        self.mock_surface = self.patch1.start()
+        self.surface = self.mock_surface.return_value
+        self.surface.climb.return_value = (np.array([1.0, 2, 3]), 50.0, 4)
+
+
+    def tearDown(self):
+        self.patch1.stop()
+
+
+    def test_can_optimize_contrast(self):
+        point, contrast = optimize_contrast(
+         self.model, (4, 5, 6), 8, pc=True, width=1, step=0.2
+        )
+        self.mock_surface.assert_called_with(
+         self.model, 8, pc=True, het=True, metal=True, width=1, index=None
+        )
+        args = self.surface.climb.call_args[0]
+        self.assertEqual(args[0].tolist(), [4, 5, 6])
+        self.assertEqual(args[1:], (0.2, 0.001, 500))
+        self.assertEqual(point, (1, 2, 3))
+        self.assertEqual(contrast, 50)
+
+
+    def test_start_must_be_point(self):
+        with self.assertRaises(TypeError):
+            optimize_contrast(self.model, ("a", 5, 6), 8)
+        with self.assertRaises(ValueError):
+            optimize_contrast(self.model, (5, 6), 8)
+
+
+    def test_can_find_maxima_from_points(self):
+        self.surface.climb.side_effect = [
+         (np.array([0.0, 0, 0]), 5.0, 3), (np.array([0.5, 0, 0]), 8.0, 3),
+         (np.array([9.0, 0, 0]), 2.0, 3), (np.array([50.0, 0, 0]), 0.0, 0),
+        ]
+        maxima = contrast_maxima(
+         self.model, 8, starts=[[1, 1, 1], [2, 2, 2], [3, 3, 3], [4, 4, 4]]
+        )
+        self.assertEqual(self.surface.climb.call_count, 4)
+        self.assertEqual(maxima, [((0.5, 0, 0), 8), ((9, 0, 0), 2)])
+
+
+    def test_can_find_maxima_from_atoms(self):
+        self.surface.coordinates = np.array([[1.0, 1, 1], [2, 2, 2]])
+        contrast_maxima(self.model, 8, starts="atoms", separation=0)
+        starts = [c[0][0].tolist() for c in self.surface.climb.call_args_list]
+        self.assertEqual(starts, [[1, 1, 1], [2, 2, 2]])
+
+
+    def test_can_find_maxima_from_grid(self):
+        self.surface.coordinates = np.array([[1.0, 1, 1], [2, 5, 2]])
+        contrast_maxima(self.model, 8, spacing=3)
+        self.assertEqual(self.surface.climb.call_count, 2 * 3 * 2)
+
+
+    def test_grid_spacing_must_be_valid(self):
+        self.surface.coordinates = np.array([[1.0, 1, 1]])
+        with self.assertRaises(TypeError):
+            contrast_maxima(self.model, 8, spacing="3")
+        with self.assertRaises(ValueError):
+            contrast_maxima(self.model, 8, spacing=0)
+
+
+
+class GridPointTests(TestCase):
+
+    def test_can_get_grid_points(self):
+        points = _grid_points(np.array([[0.5, 0, 0], [2, 0, 1]]), 1)
+        self.assertEqual(points.tolist(), [
+         [0, 0, 0], [0, 0, 1], [1, 0, 0], [1, 0, 1], [2, 0, 0], [2, 0, 1]
+        ])
+
+
+    def test_can_get_no_grid_points(self):
+        self.assertEqual(_grid_points(np.zeros((0, 3)), 1).shape, (0, 3))
@@ -0,0 +1,94 @@
+from unittest import TestCase
+from unittest.mock import Mock, patch
+import threading
+from biometal.profiling import *
+from biometal.profiling import _recording, _UNTIMED
+
+class ProfileTests(TestCase):
+
+    def test_can_create_profile(self):
+        recorder = Profile()
+        self.assertEqual(recorder.counters, {})
+        self.assertEqual(recorder.timers, {})
+        self.assertEqual(repr(recorder), "<Profile (0 counters, 0 timers)>")
+
+
+    def test_can_add_to_counters_and_timers(self):
+        recorder = Profile()
+        recorder.add("atoms")
+        recorder.add("atoms", 5)
+        recorder.add_time("queries", 0.5)
+        recorder.add_time("queries", 0.25)
+        self.assertEqual(recorder.counters, {"atoms": 6})
+        self.assertEqual(recorder.timers, {"queries": 0.75})
+        self.assertEqual(
+         recorder.as_dict(),
+         {"counters": {"atoms": 6}, "timers": {"queries": 0.75}}
+        )
+
+
+    def test_can_reset_profile(self):
+        recorder = Profile()
+        recorder.add("atoms")
+        recorder.add_time("queries", 0.5)
+        recorder.reset()
+        self.assertEqual(recorder.as_dict(), {"counters": {}, "timers": {}})
+
+
+
+class ProfilingSwitchTests(TestCase):
+
+    def test_nothing_recorded_when_inactive(self):
+        self.assertFalse(active())
+        count("atoms", 5)
+        self.assertIs(phase("queries"), _UNTIMED)
+        with phase("queries"): pass
+
+
+    def test_profile_records_while_active(self):
+        with profile() as recorder:
+            self.assertTrue(active())
+            count("atoms", 5)
+            count("atoms")
+            with patch("biometal.profiling.perf_counter") as mock_time:
+                mock_time.side_effect = [10, 10.5]
+                with phase("queries"): pass
+        self.assertFalse(active())
+        count("atoms")
+        self.assertEqual(recorder.counters, {"atoms": 6})
+        self.assertEqual(recorder.timers, {"queries": 0.5})
+
+
+    def test_profiles_can_be_nested(self):
+        with profile() as outer:
+            count("atoms")
+            with profile() as inner:
+                count("atoms", 2)
+        self.assertEqual(outer.counters["atoms"], 3)
+        self.assertEqual(inner.counters["atoms"], 2)
+        self.assertEqual(_recording.profiles, [])
+
+
+    def test_profile_stops_after_error(self):
+        with self.assertRaises(ZeroDivisionError):
+            with profile():
+                1 / 0
+        self.assertFalse(active())
+
+
+    def test_threads_have_own_profiles(self):
+        barrier, recorders = threading.Barrier(2), {}
+        def work(amount):
+            with profile() as recorder:
+                barrier.wait()
+                for _ in range(100): count("atoms", amount)
+                with phase("queries"): barrier.wait()
+            recorders[amount] = recorder
+        threads = [threading.Thread(target=work, args=[n]) for n in (1, 2)]
+        for thread in threads: thread.start()
+        for thread in threads: thread.join()
+        self.assertEqual(recorders[1].counters, {"atoms": 100})
+        self.assertEqual(recorders[2].counters, {"atoms": 200})
+        for recorder in recorders.values():
+            self.assertEqual(set(recorder.timers), {"queries"})
+        self.assertFalse(active())
@@ -0,0 +1,344 @@
+from unittest import TestCase
+from unittest.mock import patch
+import tracemalloc
+import numpy as np
+from atomium.structures import Model
+from atomium.structures.atoms import Atom
+from atomium.structures.chains import Residue
+from atomium.structures.molecules import AtomicStructure
+from biometal.tables import AtomTable
+from biometal.templates import SiteTemplate
+from biometal.search import TemplateIndex, TemplateMatch, search_templates
+from biometal.search import _structure_residues, _triplets
+from biometal.search import _triplet_distances, _assign
+
+TEMPLATE = np.array([
+ [[0, 0, 0], [1, 1, 0]], [[5, 0, 0], [5, 1.5, 0]], [[0, 6, 0], [1, 6, 1]],
+ [[3, 3, 4], [3, 3, 5.5]]
+])
+
+def make_table(residues, names=None):
+    residues = np.array(residues, dtype=float).reshape(-1, 2, 3)
+    count = len(residues)
+    names = names or ["HIS"] * count
+    return AtomTable.from_arrays(
+     residues.reshape(-1, 3), ["C"] * count * 2,
+     residue_names=np.repeat(names, 2), atom_names=["CA", "CB"] * count,
+     residue_ids=np.repeat(["A{}".format(n + 1) for n in range(count)], 2)
+    )
+
+
+
+class TemplateIndexCreationTests(TestCase):
+
+    def test_can_create_index(self):
+        index = TemplateIndex()
+        self.assertEqual(index.span, 10)
+        self.assertEqual(index.bin_size, 1)
+        self.assertEqual(len(index), 0)
+        self.assertEqual(index.triplet_count, 0)
+
+
+    def test_index_repr(self):
+        self.assertEqual(
+         repr(TemplateIndex()), "<TemplateIndex (0 structures, 0 triplets)>"
+        )
+
+
+    def test_index_needs_numeric_distances(self):
+        with self.assertRaises(TypeError):
+            TemplateIndex(span="10")
+        with self.assertRaises(TypeError):
+            TemplateIndex(bin_size="1")
+
+
+    def test_index_needs_positive_distances(self):
+        with self.assertRaises(ValueError):
+            TemplateIndex(span=0)
+        with self.assertRaises(ValueError):
+            TemplateIndex(bin_size=-1)
+
+
+    def test_index_needs_few_enough_bins(self):
+        with self.assertRaises(ValueError):
+            TemplateIndex(span=1000, bin_size=0.1)
+
+
+
+class TemplateIndexAddingTests(TestCase):
+
+    def test_can_add_table(self):
+        index = TemplateIndex()
+        self.assertEqual(index.add(make_table(TEMPLATE), source="x"), 0)
+        self.assertEqual(index.add(make_table(TEMPLATE)), 1)
+        self.assertEqual(len(index), 2)
+        self.assertEqual(index.triplet_count, 8)
+
+
+    def test_adding_needs_structure(self):
+        with self.assertRaises(TypeError):
+            TemplateIndex().add(100)
+
+
+    @patch("biometal.search.AtomTable.from_model")
+    def test_can_add_model(self, mock_from):
+        mock_from.return_value = make_table(TEMPLATE)
+        model = Model()
+        index = TemplateIndex()
+        index.add(model)
+        mock_from.assert_called_with(model)
+        self.assertEqual(index.triplet_count, 4)
+
+
+    @patch("biometal.search.load_table")
+    def test_can_add_path(self, mock_load):
+        mock_load.return_value = make_table(TEMPLATE)
+        index = TemplateIndex()
+        index.add("1abc.pdb")
+        mock_load.assert_called_with("1abc.pdb")
+        self.assertEqual(index.search(TEMPLATE_OBJECT)[0].source, "1abc.pdb")
+
+
+    @patch("biometal.search.load_table")
+    def test_can_add_many(self, mock_load):
+        mock_load.return_value = make_table(TEMPLATE)
+        index = TemplateIndex()
+        index.add_many([make_table(TEMPLATE), "1abc.pdb"])
+        self.assertEqual(len(index), 2)
+        self.assertEqual(
+         [match.source for match in index.search(TEMPLATE_OBJECT)],
+         [0, "1abc.pdb"]
+        )
+
+
+
+class TemplateIndexSearchingTests(TestCase):
+
+    def setUp(self):
+        angle = np.radians(50)
+        rotation = np.array([
+         [1, 0, 0], [0, np.cos(angle), -np.sin(angle)],
+         [0, np.sin(angle), np.cos(angle)]
+        ])
+        self.moved = TEMPLATE @ rotation.T + [30, 30, 30]
+        decoys = np.array([[[x, 0, 0], [x, 1, 0]] for x in range(0, 60, 4)])
+        self.index = TemplateIndex()
+        self.index.add(make_table(np.concatenate([decoys, self.moved[::-1]])))
+
+
+    def test_can_find_template(self):
+        matches = self.index.search(TEMPLATE_OBJECT)
+        self.assertEqual(len(matches), 1)
+        self.assertEqual(matches[0].residue_ids, ("A19", "A18", "A17", "A16"))
+        self.assertEqual(matches[0].residue_numbers.tolist(), [18, 17, 16, 15])
+        self.assertAlmostEqual(matches[0].rmsd, 0)
+        self.assertTrue(np.allclose(
+         TEMPLATE @ matches[0].rotation.T + matches[0].translation,
+         self.moved
+        ))
+
+
+    def test_can_search_with_atomium_structure(self):
+        atoms = []
+        for position, residue in enumerate(TEMPLATE_OBJECT.coordinates):
+            for name, location in zip(("CA", "CB"), residue):
+                atoms.append(Atom(
+                 "C", *location, id=position * 2 + 1, name=name
+                ))
+        for position in range(4):
+            Residue(*atoms[position * 2:position * 2 + 2], name="HIS")
+        matches = self.index.search(AtomicStructure(*atoms))
+        self.assertEqual(matches[0].residue_ids, ("A19", "A18", "A17", "A16"))
+
+
+    def test_search_needs_template(self):
+        with self.assertRaises(TypeError):
+            self.index.search("template")
+
+
+    def test_search_needs_three_residues(self):
+        with self.assertRaises(ValueError):
+            self.index.search(SiteTemplate(
+             TEMPLATE[:2], ["A1", "A2"], ["HIS", "HIS"], "ZN"
+            ))
+
+
+    def test_search_can_require_same_residues(self):
+        template = SiteTemplate(
+         TEMPLATE, ["A1", "A2", "A3", "A4"], ["HIS", "CYS", "HIS", "HIS"], "ZN"
+        )
+        self.assertEqual(len(self.index.search(template)), 1)
+        self.assertEqual(self.index.search(template, same_residues=True), [])
+
+
+    def test_search_can_allow_partial_matches(self):
+        template = SiteTemplate(
+         np.concatenate([TEMPLATE, [[[-9, -9, -9], [-9, -9, -8]]]]),
+         ["A1", "A2", "A3", "A4", "A5"], ["HIS"] * 5, "ZN"
+        )
+        self.assertEqual(self.index.search(template), [])
+        matches = self.index.search(template, min_residues=4)
+        self.assertEqual(len(matches[0]), 4)
+        self.assertEqual(matches[0].residue_ids[-1], None)
+        self.assertEqual(matches[0].residue_numbers[-1], -1)
+
+
+    def test_search_can_be_limited(self):
+        self.index.add(make_table(self.moved))
+        self.assertEqual(len(self.index.search(TEMPLATE_OBJECT)), 2)
+        self.assertEqual(len(self.index.search(TEMPLATE_OBJECT, limit=1)), 1)
+
+
+    def test_search_ranks_by_rmsd(self):
+        self.index.add(make_table(TEMPLATE + np.random.RandomState(1).uniform(
+         -0.1, 0.1, TEMPLATE.shape
+        )))
+        matches = self.index.search(TEMPLATE_OBJECT)
+        self.assertEqual([match.structure for match in matches], [0, 1])
+        self.assertLess(matches[0].rmsd, matches[1].rmsd)
+
+
+    def test_search_ignores_mirror_images(self):
+        index = TemplateIndex()
+        index.add(make_table(TEMPLATE * [1, 1, -1]))
+        self.assertEqual(index.search(TEMPLATE_OBJECT), [])
+
+
+    def test_search_of_empty_index(self):
+        self.assertEqual(TemplateIndex().search(TEMPLATE_OBJECT), [])
+
+
+    @patch("biometal.search.TemplateIndex.search")
+    @patch("biometal.search.TemplateIndex.add_many")
+    def test_can_search_structures_in_one_go(self, mock_add, mock_search):
+        mock_search.return_value = ["match"]
+        matches = search_templates(
+         TEMPLATE_OBJECT, ["1abc.pdb"], span=8, tolerance=0.2
+        )
+        mock_add.assert_called_with(["1abc.pdb"])
+        mock_search.assert_called_with(TEMPLATE_OBJECT, tolerance=0.2)
+        self.assertEqual(matches, ["match"])
+
+
+
+class TemplateMatchTests(TestCase):
+
+    def test_can_create_match(self):
+        match = TemplateMatch(
+         "1abc.pdb", 3, [5, -1, 2], ["A6", None, "A3"], 0.25, np.eye(3),
+         np.zeros(3)
+        )
+        self.assertEqual(match.source, "1abc.pdb")
+        self.assertEqual(match.structure, 3)
+        self.assertEqual(match.residue_numbers.tolist(), [5, -1, 2])
+        self.assertEqual(match.residue_ids, ("A6", None, "A3"))
+        self.assertEqual(match.rmsd, 0.25)
+        self.assertEqual(match.rotation.tolist(), np.eye(3).tolist())
+        self.assertEqual(match.translation.tolist(), [0, 0, 0])
+        self.assertEqual(len(match), 2)
+        self.assertEqual(
+         repr(match), "<TemplateMatch in 1abc.pdb (2 residues, RMSD 0.250)>"
+        )
+
+
+
+class StructureResidueTests(TestCase):
+
+    def test_can_get_residues_with_ca_and_cb(self):
+        table = AtomTable.from_arrays(
+         [[0, 0, 0], [1, 0, 0], [2, 0, 0], [3, 0, 0], [4, 0, 0]],
+         ["C"] * 5, residue_names=["HIS", "HIS", "GLY", "CYS", "CYS"],
+         atom_names=["CA", "CB", "CA", "CB", "CA"],
+         residue_ids=["A1", "A1", "A2", "A3", "A3"]
+        )
+        coordinates, ids, names = _structure_residues(table)
+        self.assertEqual(coordinates.tolist(), [
+         [[0, 0, 0], [1, 0, 0]], [[4, 0, 0], [3, 0, 0]]
+        ])
+        self.assertEqual(ids, ("A1", "A3"))
+        self.assertEqual(names, ("HIS", "CYS"))
+
+
+    def test_can_get_residues_of_empty_table(self):
+        coordinates, ids, names = _structure_residues(make_table([]))
+        self.assertEqual(coordinates.shape, (0, 2, 3))
+        self.assertEqual(ids, ())
+
+
+
+class TripletTests(TestCase):
+
+    def test_can_get_triplets_within_span(self):
+        residues = np.array([
+         [[0, 0, 0], [0, 0, 0]], [[0, 0, 0], [4, 0, 0]],
+         [[0, 0, 0], [0, 4, 0]], [[0, 0, 0], [20, 0, 0]],
+         [[0, 0, 0], [4, 4, 0]]
+        ])
+        self.assertEqual(
+         sorted(map(tuple, _triplets(residues, 6).tolist())),
+         [(0, 1, 2), (0, 1, 4), (0, 2, 4), (1, 2, 4)]
+        )
+        self.assertEqual(_triplets(residues, 5).shape, (0, 3))
+
+
+    def test_large_sparse_residue_sets_use_little_memory(self):
+        residues = np.zeros((30000, 2, 3))
+        residues[:, 1, 0] = np.arange(30000) * 4
+        tracemalloc.start()
+        try:
+            triplets = _triplets(residues, 10, chunk=1000)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        self.assertLess(peak, 50 * 2 ** 20)
+        self.assertEqual(len(triplets), 29998)
+        self.assertEqual(
+         np.sort(triplets, axis=0).tolist()[:2], [[0, 1, 2], [1, 2, 3]]
+        )
+
+
+    def test_chunk_size_does_not_change_triplets(self):
+        residues = np.random.RandomState(9).uniform(0, 30, (300, 2, 3))
+        self.assertEqual(
+         sorted(map(tuple, _triplets(residues, 8, chunk=7).tolist())),
+         sorted(map(tuple, _triplets(residues, 8).tolist()))
+        )
+
+
+    def test_too_few_residues_have_no_triplets(self):
+        self.assertEqual(_triplets(TEMPLATE[:2], 10).shape, (0, 3))
+
+
+    def test_can_get_sorted_triplet_distances(self):
+        distances = _triplet_distances(TEMPLATE, [[0, 1, 2]])
+        self.assertEqual(distances.shape, (1, 6))
+        self.assertTrue(np.allclose(distances[0, :3], [5, 6, np.sqrt(61)]))
+        self.assertTrue(np.allclose(
+         distances[0, 3:], sorted([
+          np.sqrt(16.25), np.sqrt(37.25), np.sqrt(26)
+         ])
+        ))
+
+
+
+class AssignmentTests(TestCase):
+
+    def test_residues_match_nearest(self):
+        deviations = np.array([[0.5, 3, 1], [2, 0.2, 3]])
+        self.assertEqual(_assign(deviations, 1.5).tolist(), [0, 1])
+
+
+    def test_residues_too_far_do_not_match(self):
+        deviations = np.array([[0.5, 3], [2, 1.8]])
+        self.assertEqual(_assign(deviations, 1.5).tolist(), [0, -1])
+
+
+    def test_closer_residue_wins_shared_match(self):
+        deviations = np.array([[0.5, 0.9], [0.1, 3]])
+        self.assertEqual(_assign(deviations, 1.5).tolist(), [1, 0])
+
+
+
+TEMPLATE_OBJECT = SiteTemplate(
+ TEMPLATE, ["A1", "A2", "A3", "A4"], ["HIS"] * 4, "ZN"
+)
@@ -0,0 +1,366 @@
+from unittest import TestCase
+from unittest.mock import Mock, patch
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import threading
+import numpy as np
+from biometal.tables import AtomTable
+from biometal.spatial import CellGrid
+from biometal.hydrophobicity import solvation_many, hydrophobic_contrast_many
+from biometal.service import CachedStructure, StructureCache, AnalysisService
+from biometal.service import serve
+
+class ServiceTest(TestCase):
+
+    def setUp(self):
+        self.table = AtomTable.from_arrays(
+         [[0, 0, 0], [1, 0, 0], [0, 2, 0], [5, 5, 5]], ["ZN", "C", "O", "N"],
+         residue_names=["", "ALA", "ALA", "GLY"],
+         atom_names=["ZN", "CB", "O", "N"], het=[True, False, False, False]
+        )
+        self.directory = tempfile.mkdtemp()
+        self.paths = []
+        for name in ("a.pdb", "b.pdb", "c.pdb"):
+            self.paths.append(os.path.join(self.directory, name))
+            with open(self.paths[-1], "w") as f: f.write(name)
+
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+
+class CachedStructureTests(ServiceTest):
+
+    def test_can_create_cached_structure(self):
+        structure = CachedStructure("a.pdb", self.table, cell_size=3)
+        self.assertEqual(structure.path, "a.pdb")
+        self.assertIs(structure.table, self.table)
+        self.assertIsInstance(structure.grid, CellGrid)
+        self.assertEqual(structure.grid.cell_size, 3)
+        self.assertEqual(repr(structure), "<CachedStructure a.pdb (4 atoms)>")
+        self.assertIsNotNone(self.table._solvations)
+        self.assertIsNotNone(self.table._partial_charges)
+        self.assertGreater(structure.size, self.table.coordinates.nbytes * 2)
+
+
+    def test_can_get_sphere_sums(self):
+        structure = CachedStructure("a.pdb", self.table)
+        centres = [[0, 0, 0], [4, 4, 4], [1, 1, 1]]
+        for pc, het, metal in ((False, True, True), (True, False, True)):
+            sums = structure.sphere_sums(centres, 3, pc=pc, het=het)
+            count, solvation_sum = sums[:2]
+            self.assertEqual(count.tolist(), [3, 1, 3] if het else [2, 1, 2])
+            self.assertTrue(np.allclose(
+             solvation_sum / np.maximum(count, 1),
+             solvation_many(self.table, centres, 3, pc=pc, het=het)
+            ))
+
+
+    def test_sphere_sums_need_valid_radius(self):
+        structure = CachedStructure("a.pdb", self.table)
+        with self.assertRaises(TypeError):
+            structure.sphere_sums([[0, 0, 0]], "3")
+        with self.assertRaises(ValueError):
+            structure.sphere_sums([[0, 0, 0]], -3)
+        with self.assertRaises(ValueError):
+            structure.sphere_sums([[0, 0]], 3)
+
+
+
+class StructureCacheTests(ServiceTest):
+
+    def test_can_create_cache(self):
+        cache = StructureCache(max_size=1000)
+        self.assertEqual(cache.max_size, 1000)
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.size, 0)
+        self.assertEqual(repr(cache), "<StructureCache (0 structures)>")
+
+
+    def test_max_size_must_be_positive_integer(self):
+        with self.assertRaises(ValueError):
+            StructureCache(max_size=0)
+
+
+    @patch("biometal.service.load_table")
+    def test_files_are_read_once(self, mock_load):
+        mock_load.return_value = self.table
+        cache = StructureCache()
+        first = cache.get(self.paths[0])
+        second = cache.get(self.paths[0])
+        self.assertIs(first, second)
+        mock_load.assert_called_once_with(self.paths[0])
+        info = cache.info()
+        self.assertEqual((info["hits"], info["misses"]), (1, 1))
+        self.assertEqual(info["structures"], 1)
+        self.assertEqual(info["size"], first.size)
+
+
+    @patch("biometal.service.load_table")
+    def test_changed_files_are_read_again(self, mock_load):
+        mock_load.return_value = self.table
+        cache = StructureCache()
+        first = cache.get(self.paths[0])
+        with open(self.paths[0], "a") as f: f.write("more")
+        second = cache.get(self.paths[0])
+        self.assertIsNot(first, second)
+        self.assertEqual(mock_load.call_count, 2)
+        self.assertEqual(len(cache), 1)
+
+
+    @patch("biometal.service.load_table")
+    def test_least_recently_used_structures_are_forgotten(self, mock_load):
+        mock_load.side_effect = lambda path: AtomTable.from_arrays(
+         self.table.coordinates, self.table.elements
+        )
+        size = CachedStructure("", mock_load("")).size
+        cache = StructureCache(max_size=size * 2)
+        for path in self.paths[:2]: cache.get(path)
+        cache.get(self.paths[0])
+        cache.get(self.paths[2])
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.info()["misses"], 3)
+        cache.get(self.paths[0])
+        self.assertEqual(cache.info()["misses"], 3)
+        cache.get(self.paths[1])
+        self.assertEqual(cache.info()["misses"], 4)
+
+
+    @patch("biometal.service.load_table")
+    def test_big_structure_is_kept(self, mock_load):
+        mock_load.return_value = self.table
+        cache = StructureCache(max_size=1)
+        cache.get(self.paths[0])
+        self.assertEqual(len(cache), 1)
+        cache.get(self.paths[1])
+        self.assertEqual(len(cache), 1)
+
+
+    @patch("biometal.service.load_table")
+    def test_files_read_at_same_time_are_read_once(self, mock_load):
+        started, release = threading.Event(), threading.Event()
+        def load(path):
+            started.set()
+            release.wait()
+            return self.table
+        mock_load.side_effect = load
+        cache, results = StructureCache(), []
+        threads = [threading.Thread(
+         target=lambda: results.append(cache.get(self.paths[0]))
+        ) for _ in range(3)]
+        for thread in threads: thread.start()
+        started.wait()
+        release.set()
+        for thread in threads: thread.join()
+        self.assertEqual(mock_load.call_count, 1)
+        self.assertEqual(len(set(map(id, results))), 1)
+
+
+    def test_missing_files_raise_error(self):
+        with self.assertRaises(FileNotFoundError):
+            StructureCache().get(os.path.join(self.directory, "x.pdb"))
+
+
+    @patch("biometal.service.load_table")
+    def test_can_clear_cache(self, mock_load):
+        mock_load.return_value = self.table
+        cache = StructureCache()
+        cache.get(self.paths[0])
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
+
+
+class AnalysisServiceTests(ServiceTest):
+
+    def setUp(self):
+        ServiceTest.setUp(self)
+        self.patch = patch("biometal.service.load_table")
+        self.mock_load = self.patch.start()
+        self.mock_load.return_value = self.table
+        self.service = AnalysisService(workers=2)
+
+
+    def tearDown(self):
+        self.patch.stop()
+        ServiceTest.tearDown(self)
+
+
+    def test_can_create_service(self):
+        self.assertIsInstance(self.service.cache, StructureCache)
+        self.assertIsNone(self.service.root)
+        cache = StructureCache()
+        service = AnalysisService(cache=cache, root=self.directory)
+        self.assertIs(service.cache, cache)
+        self.assertEqual(service.root, os.path.realpath(self.directory))
+
+
+    def test_can_answer_sphere_queries(self):
+        query = {
+         "path": self.paths[0], "centres": [[0, 0, 0], [4, 4, 4]],
+         "radius": 3, "pc": True
+        }
+        solvation = self.service.solvation(query)
+        contrast = self.service.contrast(query)
+        self.assertEqual(solvation["path"], self.paths[0])
+        self.assertTrue(np.allclose(solvation["values"], solvation_many(
+         self.table, query["centres"], 3, pc=True
+        )))
+        self.assertTrue(np.allclose(
+         contrast["values"], hydrophobic_contrast_many(
+          self.table, query["centres"], 3, pc=True
+         )
+        ))
+        self.assertEqual(self.mock_load.call_count, 1)
+
+
+    def test_sphere_queries_need_centres_and_radius(self):
+        with self.assertRaises(ValueError):
+            self.service.contrast({"path": self.paths[0], "radius": 3})
+        with self.assertRaises(ValueError):
+            self.service.contrast({"path": self.paths[0], "centres": []})
+        with self.assertRaises(ValueError):
+            self.service.contrast({"centres": [], "radius": 3})
+
+
+    def test_options_must_be_booleans(self):
+        query = {"path": self.paths[0], "centres": [[0, 0, 0]], "radius": 3}
+        for value in ("false", 0, 1, None, []):
+            with self.assertRaises(ValueError):
+                self.service.contrast(dict(query, pc=value))
+        with self.assertRaises(ValueError):
+            self.service.templates({"path": self.paths[0], "carbon": "no"})
+        self.assertIs(self.service._option({"het": False}, "het", True), False)
+        self.assertIs(self.service._option({}, "het", True), True)
+
+
+    @patch("biometal.service.site_templates")
+    def test_can_answer_template_queries(self, mock_templates):
+        mock_templates.return_value = []
+        answer = self.service.templates({"path": self.paths[0], "cutoff": 3})
+        self.assertEqual(answer, {"path": self.paths[0], "templates": []})
+        mock_templates.assert_called_with(
+         self.table, cutoff=3, main_chain=False, carbon=True,
+         source=self.paths[0]
+        )
+
+
+    def test_root_limits_paths(self):
+        service = AnalysisService(root=self.directory)
+        self.assertEqual(
+         service._path({"path": "a.pdb"}),
+         os.path.join(os.path.realpath(self.directory), "a.pdb")
+        )
+        with self.assertRaises(PermissionError):
+            service._path({"path": "../a.pdb"})
+        with self.assertRaises(PermissionError):
+            service._path({"path": "/etc/passwd"})
+
+
+    def test_can_get_status(self):
+        self.assertEqual(self.service.status(), {
+         "status": "ok", "cache": self.service.cache.info()
+        })
+
+
+
+class RequestTests(ServiceTest):
+
+    def setUp(self):
+        ServiceTest.setUp(self)
+        self.service = AnalysisService(workers=1)
+        self.service.contrast = Mock(return_value={"values": [1.5]})
+        self.service._queries["/contrast"] = self.service.contrast
+
+
+    def respond(self, request):
+        async def run():
+            reader = asyncio.StreamReader()
+            reader.feed_data(request)
+            reader.feed_eof()
+            return await self.service._respond(reader)
+        return asyncio.run(run())
+
+
+    def post(self, target, data):
+        body = data if isinstance(data, bytes) else json.dumps(data).encode()
+        return self.respond((
+         "POST {} HTTP/1.1\r\nHost: x\r\nContent-Length: {}\r\n\r\n".format(
+          target, len(body)
+         )
+        ).encode() + body)
+
+
+    def test_can_answer_query(self):
+        self.assertEqual(
+         self.post("/contrast", {"path": "a"}), (200, {"values": [1.5]})
+        )
+        self.service.contrast.assert_called_with({"path": "a"})
+
+
+    def test_can_answer_status(self):
+        status, data = self.respond(b"GET /status?x=1 HTTP/1.1\r\n\r\n")
+        self.assertEqual(status, 200)
+        self.assertEqual(data["status"], "ok")
+
+
+    def test_bad_requests(self):
+        self.assertEqual(self.respond(b"nonsense\r\n\r\n")[0], 400)
+        self.assertEqual(self.post("/contrast", b"{")[0], 400)
+        self.assertEqual(self.post("/contrast", [1, 2])[0], 400)
+        self.assertEqual(self.post("/nothing", {})[0], 404)
+        self.assertEqual(self.post("/status", {})[0], 405)
+        self.assertEqual(
+         self.respond(b"GET /contrast HTTP/1.1\r\n\r\n")[0], 405
+        )
+        self.assertEqual(self.respond(
+         b"POST /contrast HTTP/1.1\r\nContent-Length: 99999999999\r\n\r\n"
+        )[0], 413)
+
+
+    def test_options_that_are_not_booleans_are_bad_requests(self):
+        self.service = AnalysisService(workers=1)
+        self.assertEqual(self.post("/contrast", {
+         "path": "a.pdb", "centres": [[0, 0, 0]], "radius": 3, "pc": "false"
+        }), (400, {"error": 'pc must be true or false, not "false"'}))
+
+
+    def test_query_errors(self):
+        for error, status in (
+         (FileNotFoundError(2, "No such file", "a.pdb"), 404),
+         (PermissionError("a.pdb is outside the root"), 403),
+         (ValueError("Query has no path"), 400),
+         (TypeError("x is not a valid radius"), 400)
+        ):
+            self.service.contrast.side_effect = error
+            self.assertEqual(self.post("/contrast", {})[0], status)
+        self.assertEqual(
+         self.post("/contrast", {})[1], {"error": "x is not a valid radius"}
+        )
+
+
+
+class ServeTests(TestCase):
+
+    @patch("biometal.service.asyncio.run")
+    @patch("biometal.service.AnalysisService")
+    def test_can_serve(self, mock_service, mock_run):
+        mock_run.side_effect = lambda coroutine: coroutine.close()
+        serve(port=9000, max_size=100, workers=2, root="data")
+        self.assertEqual(mock_service.call_args[1]["workers"], 2)
+        self.assertEqual(mock_service.call_args[1]["root"], "data")
+        self.assertEqual(mock_service.call_args[1]["cache"].max_size, 100)
+        self.assertTrue(mock_run.called)
+
+
+    @patch("biometal.service.asyncio.run")
+    def test_serving_stops_on_interrupt(self, mock_run):
+        def interrupt(coroutine):
+            coroutine.close()
+            raise KeyboardInterrupt
+        mock_run.side_effect = interrupt
+        serve()
@@ -0,0 +1,451 @@
+from atomium.structures import Model
+from unittest import TestCase
+from unittest.mock import Mock, patch
+import numpy as np
+from biometal.spatial import *
+from biometal.spatial import _expand_ranges, _moved
+
+class CellGridCreationTests(TestCase):
+
+    def test_can_create_cell_grid(self):
+        grid = CellGrid([[0, 0, 0], [1.5, 0.2, 0], [0.5, 0.5, 0.5]], 1)
+        self.assertEqual(grid.coordinates.tolist(), [
+         [0, 0, 0], [1.5, 0.2, 0], [0.5, 0.5, 0.5]
+        ])
+        self.assertEqual(grid.cell_size, 1)
+        self.assertEqual(len(grid), 3)
+        self.assertEqual(grid._keys.tolist(), [0, 1])
+        self.assertEqual(grid._counts.tolist(), [2, 1])
+        self.assertEqual(grid._order.tolist(), [0, 2, 1])
+
+
+    def test_cell_size_must_be_positive_number(self):
+        with self.assertRaises(TypeError):
+            CellGrid([[0, 0, 0]], "1")
+        with self.assertRaises(ValueError):
+            CellGrid([[0, 0, 0]], 0)
+
+
+    def test_can_create_empty_grid(self):
+        grid = CellGrid([], 1)
+        self.assertEqual(grid.coordinates.shape, (0, 3))
+        self.assertEqual(len(grid._keys), 0)
+
+
+    def test_cell_grid_repr(self):
+        grid = CellGrid([[0, 0, 0], [1.5, 0.2, 0], [0.5, 0.5, 0.5]], 1)
+        self.assertEqual(repr(grid), "<CellGrid (3 points, 2 cells)>")
+
+
+
+class CellGridQueryTests(TestCase):
+
+    def setUp(self):
+        self.grid = CellGrid([
+         [0, 0, 0], [1.5, 0, 0], [0, 3, 0], [10, 10, 10], [-2, 0, 0]
+        ], 1)
+
+
+    def test_can_get_pairs(self):
+        centres, points, squares = self.grid.pairs(
+         [[0, 0, 0], [1, 0, 0], [50, 50, 50]], 2
+        )
+        pairs = sorted(zip(centres.tolist(), points.tolist(), squares.tolist()))
+        self.assertEqual(pairs, [
+         (0, 0, 0), (0, 1, 2.25), (0, 4, 4), (1, 0, 1), (1, 1, 0.25)
+        ])
+
+
+    def test_can_mask_pairs(self):
+        centres, points, squares = self.grid.pairs(
+         [[0, 0, 0]], 2, mask=np.array([False, True, True, True, True])
+        )
+        self.assertEqual(sorted(points.tolist()), [1, 4])
+
+
+    def test_can_get_indices_in_sphere(self):
+        self.assertEqual(
+         self.grid.indices_in_sphere(0, 0, 0, 3).tolist(), [0, 1, 2, 4]
+        )
+        self.assertEqual(self.grid.indices_in_sphere(0, 0, 0, 0).tolist(), [0])
+        self.assertEqual(self.grid.indices_in_sphere(5, 5, 5, 1).tolist(), [])
+
+
+    def test_stencil_covers_radius(self):
+        self.assertEqual(len(self.grid._stencil(0)), 1)
+        self.assertEqual(len(self.grid._stencil(1)), 27)
+        self.assertEqual(len(self.grid._stencil(1.5)), 5 ** 3 - 8)
+
+
+
+class SpatialIndexTests(TestCase):
+
+    def setUp(self):
+        self.model = Mock(Model)
+        self.atoms = [Mock(location=(0, 0, 0), element="Zn", residue=None),
+         Mock(location=(1, 0, 0), element="C", residue="R1"),
+         Mock(location=(0, 2, 0), element="O", residue=None),
+         Mock(location=(9, 9, 9), element="N", residue="R2")]
+        self.model.atoms.return_value = self.atoms
+
+
+    def test_can_create_spatial_index(self):
+        index = SpatialIndex(self.model, cell_size=2)
+        self.assertEqual(index.atoms, self.atoms)
+        self.assertEqual(index.coordinates[1].tolist(), [1, 0, 0])
+        self.assertEqual(index.cell_size, 2)
+        self.assertEqual(index._het.tolist(), [True, False, True, False])
+        self.assertEqual(index._metal.tolist(), [True, False, False, False])
+
+
+    def test_spatial_index_needs_model(self):
+        with self.assertRaises(TypeError):
+            SpatialIndex("model")
+
+
+    def test_spatial_index_repr(self):
+        self.assertEqual(
+         repr(SpatialIndex(self.model)), "<SpatialIndex (4 atoms)>"
+        )
+
+
+    def test_can_get_masks(self):
+        index = SpatialIndex(self.model)
+        self.assertIsNone(index.mask())
+        self.assertEqual(
+         index.mask(het=False).tolist(), [False, True, False, True]
+        )
+        self.assertEqual(
+         index.mask(metal=False).tolist(), [False, True, True, True]
+        )
+        self.assertEqual(
+         index.mask(het=False, metal=False).tolist(), [False, True, False, True]
+        )
+
+
+    def test_can_get_atoms_in_sphere(self):
+        index = SpatialIndex(self.model)
+        self.assertEqual(
+         index.atoms_in_sphere(0, 0, 0, 2), set(self.atoms[:3])
+        )
+        self.assertEqual(
+         index.atoms_in_sphere(0, 0, 0, 2, het=False), {self.atoms[1]}
+        )
+        self.assertEqual(
+         index.atoms_in_sphere(0, 0, 0, 2, metal=False), set(self.atoms[1:3])
+        )
+        self.assertEqual(index.atoms_in_sphere(20, 0, 0, 2), set())
+
+
+    def test_can_get_filtered_pairs(self):
+        index = SpatialIndex(self.model)
+        centres, atoms, squares = index.pairs_filtered(
+         [[0, 0, 0]], 2, metal=False
+        )
+        self.assertEqual(sorted(atoms.tolist()), [1, 2])
+
+
+    def test_index_can_be_used_as_grid(self):
+        index = SpatialIndex(self.model)
+        grid = CellGrid(index.coordinates, 5)
+        mask = np.array([True, False, True, True])
+        for arguments in ([[[0, 0, 0]], 2], [[[0, 0, 0]], 2, mask]):
+            self.assertEqual(
+             [a.tolist() for a in index.pairs(*arguments)],
+             [a.tolist() for a in grid.pairs(*arguments)]
+            )
+        self.assertEqual(
+         index.indices_in_sphere(0, 0, 0, 2, mask).tolist(),
+         grid.indices_in_sphere(0, 0, 0, 2, mask).tolist()
+        )
+        self.assertEqual(index.indices_in_sphere(
+         0, 0, 0, 2, mask=mask, metal=False
+        ).tolist(), [2])
+
+
+
+class RangeExpansionTests(TestCase):
+
+    def test_can_expand_ranges(self):
+        self.assertEqual(_expand_ranges(
+         np.array([4, 0, 9]), np.array([2, 0, 3])
+        ).tolist(), [4, 5, 9, 10, 11])
+        self.assertEqual(_expand_ranges(
+         np.array([], dtype=int), np.array([], dtype=int)
+        ).tolist(), [])
+
+
+
+class NeighbourListTests(TestCase):
+
+    def setUp(self):
+        self.coordinates = np.array([
+         [0.0, 0, 0], [1.5, 0, 0], [0, 3, 0], [10, 10, 10], [-2, 0, 0]
+        ])
+
+
+    def pairs(self, result):
+        return sorted(zip(*[array.tolist() for array in result]))
+
+
+    def test_can_create_neighbour_list(self):
+        neighbours = NeighbourList(2, skin=1)
+        self.assertEqual(neighbours.radius, 2)
+        self.assertEqual(neighbours.skin, 1)
+        self.assertEqual(neighbours.statistics, {
+         "queries": 0, "builds": 0, "reuses": 0, "candidates": 0
+        })
+        self.assertEqual(repr(neighbours), "<NeighbourList (0 candidates)>")
+
+
+    def test_neighbour_list_needs_valid_distances(self):
+        with self.assertRaises(TypeError):
+            NeighbourList("2")
+        with self.assertRaises(TypeError):
+            NeighbourList(2, skin="1")
+        with self.assertRaises(ValueError):
+            NeighbourList(-2)
+        with self.assertRaises(ValueError):
+            NeighbourList(2, skin=-1)
+
+
+    def test_can_get_pairs(self):
+        neighbours = NeighbourList(2, skin=1)
+        result = neighbours.pairs(self.coordinates, [[0, 0, 0], [1, 0, 0]])
+        self.assertEqual(self.pairs(result), [
+         (0, 0, 0), (0, 1, 2.25), (0, 4, 4), (1, 0, 1), (1, 1, 0.25)
+        ])
+        self.assertEqual(neighbours.statistics, {
+         "queries": 1, "builds": 1, "reuses": 0, "candidates": 7
+        })
+
+
+    def test_small_moves_reuse_list(self):
+        neighbours = NeighbourList(2, skin=1)
+        neighbours.pairs(self.coordinates, [[0, 0, 0]])
+        self.coordinates[4] = [-2.4, 0, 0]
+        result = neighbours.pairs(self.coordinates, [[0.3, 0, 0]])
+        self.assertEqual(self.pairs(result), [(0, 0, 0.09), (0, 1, 1.44)])
+        self.assertEqual(neighbours.statistics["builds"], 1)
+        self.assertEqual(neighbours.statistics["reuses"], 1)
+
+
+    def test_large_moves_rebuild_list(self):
+        neighbours = NeighbourList(2, skin=1)
+        neighbours.pairs(self.coordinates, [[0, 0, 0]])
+        neighbours.pairs(self.coordinates, [[0, 0.6, 0]])
+        self.assertEqual(neighbours.statistics["builds"], 2)
+        self.coordinates[2] = [0, 1.5, 0]
+        result = neighbours.pairs(self.coordinates, [[0, 0.6, 0]])
+        self.assertIn((0, 2, 0.81), [
+         (c, a, round(s, 10)) for c, a, s in self.pairs(result)
+        ])
+        self.assertEqual(neighbours.statistics["builds"], 3)
+        neighbours.pairs(self.coordinates, [[0, 0.6, 0], [1, 1, 1]])
+        self.assertEqual(neighbours.statistics["builds"], 4)
+
+
+    def test_static_list_ignores_atom_moves(self):
+        neighbours = NeighbourList(2, skin=1, static=True)
+        neighbours.pairs(self.coordinates, [[0, 0, 0]])
+        self.coordinates[2] = [0, 1.5, 0]
+        neighbours.pairs(self.coordinates, [[0, 0, 0]])
+        self.assertEqual(neighbours.statistics["builds"], 1)
+
+
+    def test_neighbour_list_reuses_existing_grid(self):
+        grid = CellGrid(self.coordinates, 5)
+        neighbours = NeighbourList(2, skin=1, grid=grid)
+        with patch("biometal.spatial.CellGrid.__init__") as mock_grid:
+            result = neighbours.pairs(grid.coordinates, [[0, 0, 0]])
+            neighbours.pairs(grid.coordinates, [[5, 5, 5]])
+            self.assertFalse(mock_grid.called)
+        self.assertEqual(self.pairs(result), [
+         (0, 0, 0), (0, 1, 2.25), (0, 4, 4)
+        ])
+        self.assertEqual(neighbours.statistics["builds"], 2)
+        self.coordinates[2] = [0, 1.5, 0]
+        neighbours.pairs(grid.coordinates, [[5, 5, 5]])
+        self.assertEqual(neighbours.statistics["builds"], 2)
+
+
+    def test_neighbour_list_uses_grid_box(self):
+        box = Box(10, 10, 10)
+        grid = CellGrid([[0.5, 0, 0], [9.5, 0, 0], [5, 5, 5]], 2, box=box)
+        neighbours = NeighbourList(2, skin=1, grid=grid)
+        result = neighbours.pairs(grid.coordinates, [[0, 0, 0]])
+        self.assertEqual([atom for _, atom, _ in self.pairs(result)], [0, 1])
+
+
+    def test_neighbour_list_grid_must_be_grid(self):
+        with self.assertRaises(TypeError):
+            NeighbourList(2, grid=self.coordinates)
+
+
+    def test_can_mask_neighbour_list(self):
+        neighbours = NeighbourList(2, skin=1, mask=np.array(
+         [True, False, True, True, True]
+        ))
+        result = neighbours.pairs(self.coordinates, [[0, 0, 0]])
+        self.assertEqual(self.pairs(result), [(0, 0, 0), (0, 4, 4)])
+
+
+
+class MovementTests(TestCase):
+
+    def test_can_detect_movement(self):
+        then = np.array([[0.0, 0, 0], [1, 1, 1]])
+        self.assertFalse(_moved(then + 0.5, then, 1))
+        self.assertTrue(_moved(then + [0, 0, 1.5], then, 1))
+        self.assertFalse(_moved(np.zeros((0, 3)), np.zeros((0, 3)), 1))
+        box, now = Box(10, 10, 10), np.array([[9.5, 0, 0]])
+        self.assertFalse(_moved(now, np.array([[0.5, 0, 0]]), 1.5, box=box))
+        self.assertTrue(_moved(now, np.array([[0.5, 0, 0]]), 0.5, box=box))
+
+
+
+class BoxTests(TestCase):
+
+    def test_can_create_orthorhombic_box(self):
+        box = Box(10, 20, 30)
+        self.assertEqual(box.dimensions, (10, 20, 30, 90, 90, 90))
+        self.assertEqual(box.vectors.tolist(), [[10, 0, 0], [0, 20, 0], [0, 0, 30]])
+        self.assertTrue(box.orthorhombic)
+        self.assertEqual(box.max_radius, 5)
+        self.assertEqual(repr(box), "<Box (10, 20, 30, 90, 90, 90)>")
+
+
+    def test_can_create_triclinic_box(self):
+        box = Box(10, 10, 10, 60, 60, 90)
+        self.assertFalse(box.orthorhombic)
+        vectors = box.vectors
+        self.assertAlmostEqual(vectors[0] @ vectors[1], 0)
+        self.assertAlmostEqual(vectors[0] @ vectors[2], 50)
+        self.assertAlmostEqual(vectors[1] @ vectors[2], 50)
+        self.assertAlmostEqual(np.linalg.norm(vectors[2]), 10)
+        self.assertAlmostEqual(box.max_radius, 10 / np.sqrt(2) / 2)
+
+
+    def test_box_needs_valid_dimensions(self):
+        with self.assertRaises(TypeError):
+            Box("10", 10, 10)
+        with self.assertRaises(ValueError):
+            Box(0, 10, 10)
+        with self.assertRaises(ValueError):
+            Box(10, 10, 10, 0, 90, 90)
+        with self.assertRaises(ValueError):
+            Box(10, 10, 10, 150, 150, 150)
+
+
+    def test_boxes_are_equal_by_dimensions(self):
+        self.assertEqual(Box(10, 10, 10), Box(10.0, 10, 10, 90, 90, 90))
+        self.assertNotEqual(Box(10, 10, 10), Box(10, 10, 11))
+        self.assertNotEqual(Box(10, 10, 10), None)
+        self.assertEqual(len({Box(10, 10, 10), Box(10, 10, 10)}), 1)
+
+
+    def test_can_wrap_coordinates(self):
+        box = Box(10, 20, 30)
+        self.assertEqual(box.wrap([[12, -1, 65], [1, 2, 3]]).tolist(), [
+         [2, 19, 5], [1, 2, 3]
+        ])
+
+
+    def test_can_get_orthorhombic_minimum_image(self):
+        box = Box(10, 20, 30)
+        self.assertEqual(box.minimum_image([[9, -12, 14], [1, 2, 3]]).tolist(), [
+         [-1, 8, 14], [1, 2, 3]
+        ])
+
+
+    def test_can_get_triclinic_minimum_image(self):
+        box = Box(10, 11, 12, 70, 80, 100)
+        random = np.random.RandomState(1)
+        vectors = random.uniform(-30, 30, (200, 3))
+        shifts = np.array([[i, j, k] for i in range(-5, 6)
+         for j in range(-5, 6) for k in range(-5, 6)]) @ box.vectors
+        reduced = box.minimum_image(vectors)
+        for vector, image in zip(vectors, reduced):
+            lengths = np.linalg.norm(vector + shifts, axis=1)
+            self.assertAlmostEqual(np.linalg.norm(image), lengths.min())
+            self.assertIn(round(np.linalg.norm(image), 6), np.round(lengths, 6))
+
+
+    def test_can_get_centre_images(self):
+        box = Box(10, 10, 10)
+        images, indices = box.images([[5, 5, 5], [11, 5, 5]], 2)
+        self.assertEqual(images.tolist(), [[5, 5, 5], [1, 5, 5], [11, 5, 5]])
+        self.assertEqual(indices.tolist(), [0, 1, 1])
+
+
+    def test_images_need_radius_that_fits(self):
+        with self.assertRaises(ValueError):
+            Box(10, 10, 10).images([[5, 5, 5]], 6)
+
+
+
+class PeriodicQueryTests(TestCase):
+
+    def setUp(self):
+        self.box = Box(10, 10, 10)
+        self.coordinates = np.array([
+         [0.5, 5, 5], [9.5, 5, 5], [5, 5, 5], [20.2, 5, 5]
+        ])
+
+
+    def test_cell_grid_uses_minimum_image(self):
+        grid = CellGrid(self.coordinates, 2, box=self.box)
+        self.assertIs(grid.box, self.box)
+        self.assertEqual(grid.coordinates.tolist(), self.coordinates.tolist())
+        centres, indices, squares = grid.pairs([[9.8, 5, 5], [-0.3, 5, 5]], 1)
+        self.assertEqual(sorted(zip(
+         centres.tolist(), indices.tolist(), np.round(squares, 6).tolist()
+        )), [
+         (0, 0, 0.49), (0, 1, 0.09), (0, 3, 0.16),
+         (1, 0, 0.64), (1, 1, 0.04), (1, 3, 0.25)
+        ])
+        self.assertEqual(grid.indices_in_sphere(0, 5, 5, 1).tolist(), [0, 1, 3])
+
+
+    def test_cell_grid_box_must_be_box(self):
+        with self.assertRaises(TypeError):
+            CellGrid(self.coordinates, 2, box=10)
+
+
+    def test_neighbour_list_uses_minimum_image(self):
+        neighbours = NeighbourList(1, skin=1)
+        centres, indices, squares = neighbours.pairs(
+         self.coordinates, [[9.8, 5, 5]], box=self.box
+        )
+        self.assertEqual(sorted(indices.tolist()), [0, 1, 3])
+        self.assertEqual(
+         sorted(np.round(squares, 6).tolist()), [0.09, 0.16, 0.49]
+        )
+
+
+    def test_neighbour_list_rebuilds_when_box_changes(self):
+        neighbours = NeighbourList(1, skin=1)
+        neighbours.pairs(self.coordinates, [[9.8, 5, 5]], box=self.box)
+        neighbours.pairs(self.coordinates, [[9.8, 5, 5]], box=Box(10, 10, 10))
+        self.assertEqual(neighbours.statistics["builds"], 1)
+        neighbours.pairs(self.coordinates, [[9.8, 5, 5]], box=Box(11, 10, 10))
+        self.assertEqual(neighbours.statistics["builds"], 2)
+
+
+    def test_neighbour_list_allows_wrapping_atoms(self):
+        neighbours = NeighbourList(1, skin=1)
+        neighbours.pairs(self.coordinates, [[0, 5, 5]], box=self.box)
+        self.coordinates[0] = [10.1, 5, 5]
+        centres, indices, squares = neighbours.pairs(
+         self.coordinates, [[0, 5, 5]], box=self.box
+        )
+        self.assertEqual(neighbours.statistics["builds"], 1)
+        self.assertEqual(sorted(indices.tolist()), [0, 1, 3])
+
+
+    def test_neighbour_list_skin_is_cut_to_fit_box(self):
+        neighbours = NeighbourList(4, skin=3)
+        neighbours.pairs(self.coordinates, [[0, 5, 5]], box=self.box)
+        self.assertEqual(neighbours._reach, 5)
+        with self.assertRaises(TypeError):
+            neighbours.pairs(self.coordinates, [[0, 5, 5]], box=10)
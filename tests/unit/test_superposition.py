@@ -0,0 +1,375 @@
+from unittest import TestCase
+from unittest.mock import patch
+import numpy as np
+from biometal.templates import SiteTemplate
+from biometal.superposition import superpose, rmsd, superpose_many
+from biometal.superposition import template_rmsd, template_rmsd_matrix
+from biometal.superposition import _kabsch, _kabsch_many, _order_rmsds
+from biometal.superposition import _symmetric_eigenvalues, _residue_orders
+from biometal.superposition import _name_codes, _point_array, _stack_array
+
+def rotation_about_z(degrees):
+    angle = np.radians(degrees)
+    return np.array([
+     [np.cos(angle), -np.sin(angle), 0], [np.sin(angle), np.cos(angle), 0],
+     [0, 0, 1]
+    ])
+
+
+
+class SuperpositionTests(TestCase):
+
+    def setUp(self):
+        self.rotation = rotation_about_z(30)
+        self.points = np.array([
+         [0, 0, 0], [3, 0, 0], [0, 4, 0], [1, 1, 5], [2, -1, 1]
+        ], dtype=float)
+        self.moved = self.points @ self.rotation.T + [1, 2, 3]
+
+
+    def test_can_recover_transformation(self):
+        rotation, translation, deviation = superpose(self.points, self.moved)
+        self.assertTrue(np.allclose(rotation, self.rotation))
+        self.assertTrue(np.allclose(translation, [1, 2, 3]))
+        self.assertAlmostEqual(deviation, 0)
+
+
+    def test_transformation_moves_points_onto_target(self):
+        rotation, translation, _ = superpose(self.points, self.moved)
+        self.assertTrue(np.allclose(
+         self.points @ rotation.T + translation, self.moved
+        ))
+
+
+    def test_superposition_gives_rmsd_of_imperfect_fit(self):
+        target = self.moved.copy()
+        target[0] += [0, 0, 1]
+        _, _, deviation = superpose(self.points, target)
+        self.assertGreater(deviation, 0)
+        self.assertLess(deviation, 1 / np.sqrt(5))
+
+
+    def test_superposition_never_reflects(self):
+        mirrored = self.points * [1, 1, -1]
+        rotation, _, deviation = superpose(self.points, mirrored)
+        self.assertAlmostEqual(np.linalg.det(rotation), 1)
+        self.assertGreater(deviation, 0.1)
+
+
+    def test_superposition_needs_same_number_of_points(self):
+        with self.assertRaises(ValueError):
+            superpose(self.points, self.moved[:4])
+
+
+    def test_superposition_needs_points(self):
+        with self.assertRaises(ValueError):
+            superpose([], [])
+
+
+
+class RmsdTests(TestCase):
+
+    def test_can_get_rmsd(self):
+        self.assertAlmostEqual(
+         rmsd([[0, 0, 0], [1, 1, 1]], [[0, 0, 2], [1, 1, 1]]), np.sqrt(2)
+        )
+
+
+    def test_rmsd_of_nothing_is_zero(self):
+        self.assertEqual(rmsd([], []), 0)
+
+
+    def test_rmsd_needs_same_number_of_points(self):
+        with self.assertRaises(ValueError):
+            rmsd([[0, 0, 0]], [[0, 0, 0], [1, 1, 1]])
+
+
+
+class BatchSuperpositionTests(TestCase):
+
+    def setUp(self):
+        self.points = np.random.RandomState(2).uniform(-5, 5, (4, 6, 3))
+        self.rotations = np.array([
+         rotation_about_z(angle) for angle in (0, 40, 90, 200)
+        ])
+        self.moved = np.array([
+         points @ rotation.T + [i, 2, -i]
+         for i, (points, rotation)
+         in enumerate(zip(self.points, self.rotations))
+        ])
+
+
+    def test_can_recover_transformations(self):
+        rotations, translations, rmsds = superpose_many(self.points, self.moved)
+        self.assertTrue(np.allclose(rotations, self.rotations))
+        self.assertTrue(np.allclose(
+         translations, [[0, 2, 0], [1, 2, -1], [2, 2, -2], [3, 2, -3]]
+        ))
+        self.assertTrue(np.allclose(rmsds, 0))
+
+
+    def test_batch_matches_single_superpositions(self):
+        target = self.moved + np.random.RandomState(3).normal(
+         0, 0.5, self.moved.shape
+        )
+        rotations, translations, rmsds = superpose_many(self.points, target)
+        for index in range(4):
+            rotation, translation, deviation = superpose(
+             self.points[index], target[index]
+            )
+            self.assertTrue(np.allclose(rotations[index], rotation))
+            self.assertTrue(np.allclose(translations[index], translation))
+            self.assertAlmostEqual(rmsds[index], deviation)
+
+
+    def test_batch_needs_same_shapes(self):
+        with self.assertRaises(ValueError):
+            superpose_many(self.points, self.moved[:3])
+        with self.assertRaises(ValueError):
+            superpose_many(self.points[:, :0], self.moved[:, :0])
+
+
+
+class TemplateRmsdTests(TestCase):
+
+    def setUp(self):
+        self.coordinates = np.random.RandomState(4).uniform(-4, 4, (4, 2, 3))
+        self.template = SiteTemplate(
+         self.coordinates, ["A1", "A2", "A3", "A4"],
+         ["HIS", "CYS", "HIS", "ASP"], "ZN"
+        )
+        order = [2, 0, 3, 1]
+        self.other = SiteTemplate(
+         self.coordinates[order] @ rotation_about_z(70).T + 3,
+         ["B1", "B2", "B3", "B4"], ["HIS", "HIS", "ASP", "CYS"], "ZN"
+        )
+
+
+    def test_can_get_rmsd_over_residue_orders(self):
+        deviation, order = template_rmsd(self.template, self.other)
+        self.assertAlmostEqual(deviation, 0, delta=1e-5)
+        self.assertEqual(order, (1, 3, 0, 2))
+
+
+    def test_can_keep_residue_order(self):
+        deviation, order = template_rmsd(
+         self.template, self.other, permute=False
+        )
+        self.assertGreater(deviation, 1)
+        self.assertEqual(order, (0, 1, 2, 3))
+
+
+    def test_can_require_same_residues(self):
+        swapped = SiteTemplate(
+         self.other.coordinates, self.other.residue_ids,
+         ["HIS", "HIS", "CYS", "ASP"], "ZN"
+        )
+        self.assertGreater(template_rmsd(
+         self.template, swapped, same_residues=True
+        )[0], 0.1)
+        self.assertAlmostEqual(template_rmsd(
+         self.template, self.other, same_residues=True
+        )[0], 0, delta=1e-5)
+
+
+    def test_residue_orders_are_limited(self):
+        with self.assertRaises(ValueError):
+            template_rmsd(self.template, self.other, max_permutations=23)
+        self.assertAlmostEqual(template_rmsd(
+         self.template, self.other, max_permutations=24
+        )[0], 0, delta=1e-5)
+        self.assertGreater(template_rmsd(
+         self.template, self.other, permute=False, max_permutations=1
+        )[0], 1)
+
+
+    def test_big_templates_need_higher_limit(self):
+        coordinates = np.random.RandomState(6).uniform(-4, 4, (9, 2, 3))
+        big = SiteTemplate(coordinates, ["A"] * 9, ["HIS"] * 9, "ZN")
+        with self.assertRaises(ValueError):
+            template_rmsd(big, big)
+        self.assertAlmostEqual(
+         template_rmsd(big, big, permute=False)[0], 0, delta=1e-5
+        )
+
+
+    def test_templates_must_be_same_size(self):
+        smaller = SiteTemplate(
+         self.coordinates[:3], ["A1", "A2", "A3"], ["HIS"] * 3, "ZN"
+        )
+        with self.assertRaises(ValueError):
+            template_rmsd(self.template, smaller)
+
+
+    def test_templates_must_be_templates(self):
+        with self.assertRaises(TypeError):
+            template_rmsd(self.template, "template")
+
+
+
+class TemplateRmsdMatrixTests(TestCase):
+
+    def setUp(self):
+        state = np.random.RandomState(5)
+        self.templates = [SiteTemplate(
+         state.uniform(-4, 4, (size, 2, 3)), ["A"] * size, ["HIS"] * size,
+         "ZN"
+        ) for size in (3, 4, 3, 4, 4)]
+
+
+    def test_can_get_matrix(self):
+        matrix = template_rmsd_matrix(self.templates)
+        self.assertEqual(matrix.shape, (5, 5))
+        self.assertTrue(np.allclose(np.diag(matrix), 0, atol=1e-5))
+        self.assertTrue(np.allclose(matrix, matrix.T, equal_nan=True))
+        self.assertTrue(np.isnan(matrix[0, 1]))
+        for i, j in ((0, 2), (1, 3), (3, 4)):
+            self.assertAlmostEqual(matrix[i, j], template_rmsd(
+             self.templates[i], self.templates[j]
+            )[0])
+
+
+    def test_can_get_matrix_block(self):
+        block = template_rmsd_matrix(self.templates[:2], self.templates)
+        self.assertEqual(block.shape, (2, 5))
+        self.assertTrue(np.allclose(
+         block, template_rmsd_matrix(self.templates)[:2], equal_nan=True
+        ))
+
+
+    def test_chunk_size_does_not_change_matrix(self):
+        self.assertTrue(np.allclose(
+         template_rmsd_matrix(self.templates, chunk=1),
+         template_rmsd_matrix(self.templates), equal_nan=True
+        ))
+
+
+    def test_can_get_matrix_without_permutations(self):
+        matrix = template_rmsd_matrix(self.templates, permute=False)
+        permuted = template_rmsd_matrix(self.templates)
+        compared = ~np.isnan(matrix)
+        self.assertTrue(np.all(matrix[compared] >= permuted[compared] - 1e-9))
+        self.assertTrue(np.any(matrix[compared] > permuted[compared] + 0.1))
+
+
+    def test_can_get_matrix_of_same_residues(self):
+        self.templates[3] = SiteTemplate(
+         self.templates[3].coordinates, ["A"] * 4, ["CYS"] * 4, "ZN"
+        )
+        matrix = template_rmsd_matrix(self.templates, same_residues=True)
+        self.assertEqual(matrix[1, 3], np.inf)
+        self.assertLess(matrix[1, 4], np.inf)
+
+
+    def test_residue_orders_are_limited_before_comparing(self):
+        with patch("biometal.superposition._order_rmsds") as mock_rmsds:
+            with self.assertRaises(ValueError):
+                template_rmsd_matrix(self.templates, max_permutations=6)
+            self.assertFalse(mock_rmsds.called)
+        self.assertEqual(template_rmsd_matrix(
+         self.templates[:1] + self.templates[2:3], max_permutations=6
+        ).shape, (2, 2))
+        self.assertEqual(template_rmsd_matrix(
+         self.templates, permute=False, max_permutations=1
+        ).shape, (5, 5))
+
+
+
+class KabschTests(TestCase):
+
+    def test_kabsch_gives_identity_for_same_points(self):
+        points = np.array([[1, 0, 0], [-1, 0, 0], [0, 2, 0], [0, 0, -3]])
+        self.assertTrue(np.allclose(_kabsch(points, points), np.eye(3)))
+
+
+
+class BatchKabschTests(TestCase):
+
+    def test_batch_kabsch_never_reflects(self):
+        points = np.random.RandomState(6).normal(size=(3, 5, 3))
+        points -= points.mean(axis=1, keepdims=True)
+        rotations = _kabsch_many(points, points * [1, 1, -1])
+        self.assertTrue(np.allclose(np.linalg.det(rotations), 1))
+
+
+
+class OrderRmsdTests(TestCase):
+
+    def test_can_get_rmsd_of_each_order(self):
+        coordinates = np.random.RandomState(7).normal(size=(1, 3, 2, 3))
+        orders = _residue_orders(3, True)
+        deviations = _order_rmsds(
+         coordinates, coordinates[:, [1, 2, 0]], orders
+        )
+        self.assertEqual(deviations.shape, (1, 6))
+        for order, deviation in zip(orders, deviations[0]):
+            self.assertAlmostEqual(deviation, superpose(
+             coordinates[0].reshape(-1, 3),
+             coordinates[0, [1, 2, 0]][order].reshape(-1, 3)
+            )[2], delta=1e-6)
+        self.assertAlmostEqual(deviations[0, 4], 0, delta=1e-6)
+
+
+    def test_can_get_eigenvalues(self):
+        matrices = np.random.RandomState(8).normal(size=(10, 3, 3))
+        matrices = matrices @ matrices.transpose(0, 2, 1)
+        matrices[0] = np.eye(3) * 2
+        values = np.stack(_symmetric_eigenvalues(matrices), axis=1)
+        self.assertTrue(np.allclose(
+         values, np.linalg.eigvalsh(matrices)[:, ::-1]
+        ))
+
+
+    def test_can_get_residue_orders(self):
+        self.assertEqual(_residue_orders(3, False).tolist(), [[0, 1, 2]])
+        self.assertEqual(_residue_orders(3, True).shape, (6, 3))
+        self.assertEqual(_residue_orders(0, True).shape, (1, 0))
+        self.assertEqual(_residue_orders(3, True, 6).shape, (6, 3))
+        self.assertEqual(_residue_orders(3, False, 1).shape, (1, 3))
+        with self.assertRaises(ValueError):
+            _residue_orders(3, True, 5)
+
+
+    def test_can_get_name_codes(self):
+        codes = _name_codes([("HIS", "CYS")], [("CYS", "ASP"), ("HIS", "HIS")])
+        self.assertEqual(codes[0].tolist(), [[0, 1]])
+        self.assertEqual(codes[1].tolist(), [[1, 2], [0, 0]])
+
+
+
+class PointArrayTests(TestCase):
+
+    def test_can_make_point_array(self):
+        array = _point_array([[1, 2, 3], [4, 5, 6]])
+        self.assertEqual(array.dtype, float)
+        self.assertEqual(array.shape, (2, 3))
+
+
+    def test_empty_points_are_reshaped(self):
+        self.assertEqual(_point_array([]).shape, (0, 3))
+
+
+    def test_points_must_be_numeric(self):
+        with self.assertRaises(TypeError):
+            _point_array([["a", "b", "c"]])
+
+
+    def test_points_must_be_triples(self):
+        with self.assertRaises(ValueError):
+            _point_array([[1, 2], [3, 4]])
+
+
+    def test_can_make_stack_array(self):
+        self.assertEqual(
+         _stack_array([[[1, 2, 3]], [[4, 5, 6]]]).shape, (2, 1, 3)
+        )
+
+
+    def test_stacks_must_be_numeric(self):
+        with self.assertRaises(TypeError):
+            _stack_array([[["a", "b", "c"]]])
+
+
+    def test_stacks_must_be_stacks_of_triples(self):
+        with self.assertRaises(ValueError):
+            _stack_array([[1, 2, 3]])
@@ -0,0 +1,183 @@
+from atomium.structures import Model
+from unittest import TestCase
+from unittest.mock import Mock, patch
+import numpy as np
+from biometal.tables import *
+from biometal.tables import _encode
+
+class AtomTableCreationTests(TestCase):
+
+    def test_can_create_table_from_arrays(self):
+        table = AtomTable.from_arrays(
+         [[0, 0, 0], [1, 2, 3], [4, 5, 6]], ["C", "ZN", "C"],
+         residue_names=["GLU", "", "ALA"], atom_names=["CA", "ZN", "CB"],
+         charges=[0, 2, 0], het=[False, True, False],
+         residue_ids=["A1", "A2", "A3"]
+        )
+        self.assertEqual(len(table), 3)
+        self.assertEqual(table.coordinates.tolist(), [
+         [0, 0, 0], [1, 2, 3], [4, 5, 6]
+        ])
+        self.assertEqual(table.elements.tolist(), ["C", "ZN", "C"])
+        self.assertEqual(table.residue_names.tolist(), ["GLU", "", "ALA"])
+        self.assertEqual(table.atom_names.tolist(), ["CA", "ZN", "CB"])
+        self.assertEqual(table.residue_ids.tolist(), ["A1", "A2", "A3"])
+        self.assertEqual(table.charges.tolist(), [0, 2, 0])
+        self.assertEqual(table.het.tolist(), [False, True, False])
+        self.assertEqual(table.metal.tolist(), [False, True, False])
+        self.assertEqual(table._element_names.tolist(), ["C", "ZN"])
+        self.assertEqual(table._elements.tolist(), [0, 1, 0])
+
+
+    def test_table_defaults(self):
+        table = AtomTable.from_arrays([[0, 0, 0], [1, 2, 3]], ["C", "Fe"])
+        self.assertEqual(table.residue_names.tolist(), ["", ""])
+        self.assertEqual(table.atom_names.tolist(), ["", ""])
+        self.assertEqual(table.residue_ids.tolist(), ["", ""])
+        self.assertEqual(table.charges.tolist(), [0, 0])
+        self.assertEqual(table.het.tolist(), [False, False])
+        self.assertEqual(table.metal.tolist(), [False, True])
+
+
+    def test_can_create_empty_table(self):
+        table = AtomTable.from_arrays([], [])
+        self.assertEqual(len(table), 0)
+        self.assertEqual(table.coordinates.shape, (0, 3))
+        self.assertEqual(table.solvations.tolist(), [])
+
+
+    def test_columns_must_match(self):
+        with self.assertRaises(ValueError):
+            AtomTable.from_arrays([[0, 0, 0], [1, 2, 3]], ["C"])
+        with self.assertRaises(ValueError):
+            AtomTable.from_arrays([[0, 0, 0]], ["C"], charges=[1, 2])
+
+
+    def test_coordinates_must_be_valid(self):
+        with self.assertRaises(TypeError):
+            AtomTable.from_arrays([["a", 0, 0]], ["C"])
+        with self.assertRaises(ValueError):
+            AtomTable.from_arrays([[0, 0]], ["C"])
+
+
+    def test_can_create_table_from_model(self):
+        model = Mock(Model)
+        atoms = [Mock(), Mock()]
+        atoms[0].location, atoms[1].location = (1, 2, 3), (4, 5, 6)
+        atoms[0].element, atoms[1].element = "N", "Mg"
+        atoms[0].residue.name, atoms[1].residue = "HIS", None
+        atoms[0].name, atoms[1].name = "ND1", None
+        atoms[0].charge, atoms[1].charge = 0, 2
+        atoms[0].id, atoms[1].id = 1, 2
+        atoms[0].residue.id, atoms[1].molecule.id = "A1", "A2"
+        model.atoms.return_value = set(atoms)
+        table = AtomTable.from_model(model)
+        self.assertEqual(table.coordinates.tolist(), [[1, 2, 3], [4, 5, 6]])
+        self.assertEqual(table.elements.tolist(), ["N", "Mg"])
+        self.assertEqual(table.residue_names.tolist(), ["HIS", ""])
+        self.assertEqual(table.atom_names.tolist(), ["ND1", ""])
+        self.assertEqual(table.residue_ids.tolist(), ["A1", "A2"])
+        self.assertEqual(table.charges.tolist(), [0, 2])
+        self.assertEqual(table.het.tolist(), [False, True])
+        self.assertEqual(table.metal.tolist(), [False, True])
+
+
+    def test_model_must_be_model(self):
+        with self.assertRaises(TypeError):
+            AtomTable.from_model("model")
+
+
+    def test_table_repr(self):
+        table = AtomTable.from_arrays([[0, 0, 0], [1, 2, 3]], ["C", "Fe"])
+        self.assertEqual(repr(table), "<AtomTable (2 atoms)>")
+        table = AtomTable.from_arrays([[0, 0, 0]], ["C"])
+        self.assertEqual(repr(table), "<AtomTable (1 atom)>")
+
+
+
+class AtomTableParameterTests(TestCase):
+
+    def setUp(self):
+        self.table = AtomTable.from_arrays(
+         [[0, 0, 0]] * 5, ["C", "O", "O", "N", "N"],
+         residue_names=["ALA", "GLU", "GLU", "HIS", "ARG"],
+         atom_names=["CA", "OE1", "OE1", "ND1", "NE"],
+         charges=[0, 0, -1, 0, 0], het=[False, False, False, True, False]
+        )
+
+
+    def test_can_get_solvations(self):
+        self.assertEqual(
+         self.table.solvations.tolist(), [18, -23, -37, -9, -9]
+        )
+
+
+    def test_can_get_partial_charges(self):
+        charges = self.table.partial_charges
+        self.assertEqual(charges[2], -1)
+        self.assertEqual(charges[3], 0)
+        self.assertNotEqual(charges[4], 0)
+
+
+    def test_parameters_are_cached(self):
+        with patch("biometal.hydrophobicity._lookup_solvations") as mock_look:
+            mock_look.return_value = np.array([1.0, 2, 3, 4, 5])
+            self.table.solvations
+            self.assertEqual(self.table.solvations.tolist(), [1, 2, 3, 4, 5])
+        self.assertEqual(mock_look.call_count, 1)
+
+
+    def test_can_get_parameters(self):
+        self.assertEqual(
+         self.table.parameters().tolist(), self.table.solvations.tolist()
+        )
+        self.assertEqual(
+         self.table.parameters(pc=True).tolist(),
+         (self.table.partial_charges ** 2).tolist()
+        )
+
+
+
+class AtomTableSphereTests(TestCase):
+
+    def setUp(self):
+        self.table = AtomTable.from_arrays(
+         [[0, 0, 0], [1, 0, 0], [0, 2, 0], [5, 5, 5]], ["C", "O", "ZN", "C"],
+         het=[False, False, True, False]
+        )
+
+
+    def test_can_get_mask(self):
+        self.assertIsNone(self.table.mask())
+        self.assertEqual(
+         self.table.mask(het=False).tolist(), [True, True, False, True]
+        )
+        self.assertEqual(
+         self.table.mask(metal=False).tolist(), [True, True, False, True]
+        )
+
+
+    def test_can_get_indices_in_sphere(self):
+        indices, squares = self.table.indices_in_sphere(0, 0, 0, 2)
+        self.assertEqual(indices.tolist(), [0, 1, 2])
+        self.assertEqual(squares.tolist(), [0, 1, 4])
+        indices, squares = self.table.indices_in_sphere(0, 0, 0, 2, het=False)
+        self.assertEqual(indices.tolist(), [0, 1])
+        indices, squares = self.table.indices_in_sphere(1, 0, 0, 0.5)
+        self.assertEqual(indices.tolist(), [1])
+        self.assertEqual(squares.tolist(), [0])
+
+
+
+class EncodingTests(TestCase):
+
+    def test_can_encode_names(self):
+        names, codes = _encode(["B", "A", "B", "C"])
+        self.assertEqual(names.tolist(), ["A", "B", "C"])
+        self.assertEqual(codes.tolist(), [1, 0, 1, 2])
+
+
+    def test_can_encode_no_names(self):
+        names, codes = _encode([])
+        self.assertEqual(len(names), 0)
+        self.assertEqual(len(codes), 0)
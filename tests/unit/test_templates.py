@@ -1,8 +1,13 @@
+from atomium.structures import Model
 from atomium.structures.chains import Site
 from atomium.structures.molecules import AtomicStructure
 from unittest import TestCase
 from unittest.mock import Mock, MagicMock, patch
-from biometal.templates import create_site_template
+import numpy as np
+from biometal.tables import AtomTable
+from biometal.templates import create_site_template, SiteTemplate
+from biometal.templates import site_templates, site_templates_many
+from biometal.templates import _residue_index, _atom_index
 
 class TemplateCreationTests(TestCase):
 
@@ -33,3 +38,165 @@ class TemplateCreationTests(TestCase):
         for res in self.residues:
             res.atom.assert_any_call(name="CA")
             res.atom.assert_any_call(name="CB")
+
+
+
+class SiteTemplateTests(TestCase):
+
+    def test_can_create_site_template(self):
+        template = SiteTemplate(
+         [[[0, 0, 0], [1, 0, 0]], [[5, 5, 5], [6, 5, 5]]], ["A1", "A9"],
+         ["HIS", "CYS"], "ZN", metal_id="A100", metal_location=(3, 3, 3),
+         source="1abc.pdb"
+        )
+        self.assertEqual(len(template), 2)
+        self.assertEqual(template.coordinates.shape, (2, 2, 3))
+        self.assertEqual(template.residue_ids, ("A1", "A9"))
+        self.assertEqual(template.residue_names, ("HIS", "CYS"))
+        self.assertEqual(template.metal, "ZN")
+        self.assertEqual(template.metal_id, "A100")
+        self.assertEqual(template.metal_location.tolist(), [3, 3, 3])
+        self.assertEqual(template.source, "1abc.pdb")
+        self.assertEqual(template.ca_coordinates().tolist(), [[0, 0, 0], [5, 5, 5]])
+        self.assertEqual(template.cb_coordinates().tolist(), [[1, 0, 0], [6, 5, 5]])
+        self.assertEqual(repr(template), "<SiteTemplate ZN A100 (2 residues)>")
+
+
+    def test_can_create_empty_site_template(self):
+        template = SiteTemplate([], [], [], "FE")
+        self.assertEqual(len(template), 0)
+        self.assertEqual(template.coordinates.shape, (0, 2, 3))
+        self.assertIsNone(template.source)
+        self.assertEqual(repr(template), "<SiteTemplate FE (0 residues)>")
+
+
+    def test_site_template_columns_must_match(self):
+        with self.assertRaises(ValueError):
+            SiteTemplate([[[0, 0, 0], [1, 0, 0]]], ["A1", "A2"], ["HIS"], "ZN")
+
+
+
+class SiteTemplatesTests(TestCase):
+
+    def setUp(self):
+        self.table = AtomTable.from_arrays([
+         [10, 0, 0], [11, 0, 0], [12, 0, 0],
+         [0, 5, 0], [0, 6, 0], [0, 3, 0],
+         [0, 0, 3.5], [0, 0, 5], [0, 0, 6],
+         [3, 3, 3], [20, 20, 20],
+         [0, 0, 0], [30, 30, 30]
+        ], [
+         "N", "C", "C", "C", "C", "C", "N", "C", "C", "C", "C", "ZN", "CU"
+        ], residue_names=[
+         "HIS", "HIS", "HIS", "GLY", "GLY", "GLY", "CYS", "CYS", "CYS",
+         "VAL", "VAL", "ZN", "CU"
+        ], atom_names=[
+         "ND1", "CA", "CB", "N", "CA", "C", "N", "CA", "CB", "CG1", "CA",
+         "ZN", "CU"
+        ], residue_ids=[
+         "A1", "A1", "A1", "A2", "A2", "A2", "A3", "A3", "A3", "A4", "A4",
+         "A100", "A101"
+        ], het=[False] * 11 + [True] * 2)
+        self.table._coordinates[0] = [2, 0, 0]
+        self.table._coordinates[9] = [0, 0, -3.9]
+        self.table._coordinates[10] = [0, 0, -4.5]
+
+
+    def test_can_get_templates_from_table(self):
+        templates = site_templates(self.table, source="x")
+        self.assertEqual(len(templates), 2)
+        self.assertEqual(templates[0].metal, "ZN")
+        self.assertEqual(templates[0].metal_id, "A100")
+        self.assertEqual(templates[0].residue_ids, ("A1",))
+        self.assertEqual(templates[0].coordinates.tolist(), [
+         [[11, 0, 0], [12, 0, 0]]
+        ])
+        self.assertEqual(templates[0].source, "x")
+        self.assertEqual(len(templates[1]), 0)
+
+
+    def test_can_consider_main_chain(self):
+        templates = site_templates(self.table, main_chain=True)
+        self.assertEqual(templates[0].residue_ids, ("A1", "A3"))
+        self.assertEqual(templates[0].residue_names, ("HIS", "CYS"))
+
+
+    def test_can_ignore_carbon(self):
+        templates = site_templates(self.table, main_chain=True, carbon=False)
+        self.assertEqual(templates[0].residue_ids, ("A1", "A3"))
+        templates = site_templates(self.table, carbon=False)
+        self.assertEqual(templates[0].residue_ids, ("A1",))
+
+
+    def test_can_change_cutoff(self):
+        templates = site_templates(self.table, cutoff=2.5)
+        self.assertEqual(templates[0].residue_ids, ("A1",))
+        templates = site_templates(self.table, cutoff=1.5)
+        self.assertEqual(templates[0].residue_ids, ())
+
+
+    def test_can_get_templates_from_model(self):
+        model = Mock(Model)
+        with patch("biometal.templates.AtomTable.from_model") as mock_table:
+            mock_table.return_value = self.table
+            templates = site_templates(model)
+        mock_table.assert_called_with(model)
+        self.assertEqual(len(templates), 2)
+
+
+    def test_can_get_templates_from_path(self):
+        with patch("biometal.templates.load_table") as mock_load:
+            mock_load.return_value = self.table
+            templates = site_templates("1abc.pdb")
+        mock_load.assert_called_with("1abc.pdb")
+        self.assertEqual(templates[0].source, "1abc.pdb")
+
+
+    def test_structure_must_be_valid(self):
+        with self.assertRaises(TypeError):
+            site_templates(100)
+
+
+    def test_cutoff_must_be_valid(self):
+        with self.assertRaises(TypeError):
+            site_templates(self.table, cutoff="4")
+        with self.assertRaises(ValueError):
+            site_templates(self.table, cutoff=-4)
+
+
+    def test_table_with_no_metals_has_no_templates(self):
+        table = AtomTable.from_arrays([[0, 0, 0]], ["C"])
+        self.assertEqual(site_templates(table), [])
+        self.assertEqual(site_templates(AtomTable.from_arrays([], [])), [])
+
+
+    def test_can_get_templates_from_many_structures(self):
+        with patch("biometal.templates.load_table") as mock_load:
+            mock_load.return_value = self.table
+            templates = list(site_templates_many(
+             [self.table, "1abc.pdb"], cutoff=3
+            ))
+        self.assertEqual([t.source for t in templates], [0, 0, "1abc.pdb", "1abc.pdb"])
+        self.assertEqual(templates[0].residue_ids, ("A1",))
+
+
+
+class IndexTests(TestCase):
+
+    def test_can_index_residues(self):
+        table = AtomTable.from_arrays(
+         [[0, 0, 0]] * 5, ["C"] * 5, residue_names=["A", "A", "B", "A", "A"],
+         residue_ids=["1", "1", "1", "2", "1"]
+        )
+        residues, first_rows = _residue_index(table)
+        self.assertEqual(residues.tolist(), [0, 0, 1, 2, 0])
+        self.assertEqual(first_rows.tolist(), [0, 2, 3])
+
+
+    def test_can_index_atom_names(self):
+        table = AtomTable.from_arrays(
+         [[0, 0, 0]] * 5, ["C"] * 5, atom_names=["CA", "CB", "CA", "CA", "CA"],
+         het=[False, False, False, True, False]
+        )
+        index = _atom_index(table, np.array([0, 0, 0, 1, 2]), "CA")
+        self.assertEqual(index.tolist(), [0, -1, 4])
@@ -0,0 +1,353 @@
+from atomium.structures import Model, Atom
+from unittest import TestCase
+from unittest.mock import Mock, patch
+import os
+import shutil
+import struct
+import tempfile
+import numpy as np
+from biometal.spatial import Box
+from biometal.tables import AtomTable
+from biometal.trajectories import *
+
+class TrajectoryCreationTests(TestCase):
+
+    def setUp(self):
+        self.table = AtomTable.from_arrays(
+         [[0, 0, 0], [1, 0, 0], [0, 2, 0]], ["C", "O", "ZN"],
+         het=[False, False, True]
+        )
+
+
+    def test_can_create_trajectory_from_table(self):
+        trajectory = Trajectory(self.table, metal=False)
+        self.assertEqual(len(trajectory), 3)
+        self.assertEqual(trajectory._mask.tolist(), [True, True, False])
+        self.assertEqual(trajectory._parameters.tolist(), [18, -9, 0])
+        self.assertIs(trajectory.coordinates, self.table.coordinates)
+        self.assertEqual(repr(trajectory), "<Trajectory (3 atoms)>")
+
+
+    def test_can_create_trajectory_from_model(self):
+        model = Mock(Model)
+        model.atoms.return_value = set()
+        with patch("biometal.tables.AtomTable.from_model") as mock_table:
+            mock_table.return_value = self.table
+            trajectory = Trajectory(model, pc=True)
+        mock_table.assert_called_with(model)
+        self.assertIsNone(trajectory._mask)
+        self.assertEqual(
+         trajectory._parameters.tolist(), (self.table.partial_charges ** 2).tolist()
+        )
+
+
+    def test_can_create_trajectory_from_file(self):
+        with patch("biometal.trajectories.load_table") as mock_load:
+            mock_load.return_value = self.table
+            trajectory = Trajectory("file.pdb")
+        mock_load.assert_called_with("file.pdb")
+        self.assertIs(trajectory._table, self.table)
+
+
+    def test_topology_must_be_model_or_table(self):
+        with self.assertRaises(TypeError):
+            Trajectory(100)
+
+
+    def test_can_get_atom_indices(self):
+        trajectory = Trajectory(self.table)
+        self.assertEqual(trajectory.atom_indices([2, 0]).tolist(), [2, 0])
+        with self.assertRaises(ValueError):
+            trajectory.atom_indices([3])
+        with self.assertRaises(ValueError):
+            trajectory.atom_indices([Atom("C", 0, 0, 0)])
+
+
+    def test_can_get_atom_indices_of_model_atoms(self):
+        atoms = [Atom("C", 0, 0, 0, id=2), Atom("O", 1, 0, 0, id=1)]
+        model = Mock(Model)
+        model.atoms.return_value = set(atoms)
+        with patch("biometal.tables.AtomTable.from_model") as mock_table:
+            mock_table.return_value = self.table
+            trajectory = Trajectory(model)
+        self.assertEqual(trajectory.atom_indices(atoms).tolist(), [1, 0])
+
+
+
+class TrajectorySeriesTests(TestCase):
+
+    def setUp(self):
+        self.table = AtomTable.from_arrays(
+         [[0, 0, 0], [1, 0, 0], [0, 2, 0]], ["C", "O", "ZN"]
+        )
+        self.trajectory = Trajectory(self.table)
+        self.frames = [
+         np.array([[0.0, 0, 0], [1, 0, 0], [0, 2, 0]]),
+         np.array([[0.0, 0, 0], [3, 0, 0], [0, 1, 0]])
+        ]
+
+
+    def test_can_get_series_at_fixed_centres(self):
+        series = list(self.trajectory.series(
+         iter(self.frames), 1.5, centres=[[0, 0, 0], [9, 9, 9]]
+        ))
+        self.assertEqual(len(series), 2)
+        self.assertEqual(series[0][0].tolist(), [4.5, 0])
+        self.assertEqual(series[0][1].tolist(), [-13.5, 0])
+        self.assertEqual(series[1][0].tolist(), [9, 0])
+        self.assertEqual(series[1][1].tolist(), [-9, 0])
+
+
+    def test_can_get_series_at_tracked_atoms(self):
+        series = list(self.trajectory.series(self.frames, 1.5, atoms=[2]))
+        self.assertEqual(series[0][0].tolist(), [0])
+        self.assertEqual(series[1][0].tolist(), [9])
+
+
+    def test_series_needs_valid_arguments(self):
+        with self.assertRaises(TypeError):
+            next(self.trajectory.series(self.frames, "1", centres=[[0, 0, 0]]))
+        with self.assertRaises(ValueError):
+            next(self.trajectory.series(self.frames, -1, centres=[[0, 0, 0]]))
+        with self.assertRaises(ValueError):
+            next(self.trajectory.series(self.frames, 1))
+        with self.assertRaises(ValueError):
+            next(self.trajectory.series(
+             self.frames, 1, centres=[[0, 0, 0]], atoms=[0]
+            ))
+
+
+    def test_series_uses_neighbour_list(self):
+        frames = [self.frames[0]] * 3 + [self.frames[0] + 5]
+        with patch("biometal.trajectories.NeighbourList") as mock_list:
+            mock_list.return_value.pairs.return_value = (
+             np.array([0]), np.array([1]), np.array([1.0])
+            )
+            series = list(self.trajectory.series(
+             frames, 1.5, centres=[[0, 0, 0]], skin=3
+            ))
+        mock_list.assert_called_with(1.5, skin=3, mask=None)
+        self.assertEqual(mock_list.return_value.pairs.call_count, 4)
+        self.assertEqual(series[0][0].tolist(), [-9])
+
+
+    def test_neighbour_list_is_reused_between_frames(self):
+        frames = [self.frames[0] + 0.1 * step for step in range(5)]
+        trajectory = Trajectory(self.table)
+        with patch("biometal.spatial.CellGrid.pairs") as mock_pairs:
+            mock_pairs.return_value = (
+             np.array([0, 0]), np.array([0, 1]), np.array([0.0, 1])
+            )
+            series = list(trajectory.series(frames, 1.5, atoms=[0], skin=2))
+        self.assertEqual(len(series), 5)
+        self.assertEqual(mock_pairs.call_count, 1)
+
+
+    def test_can_get_series_in_periodic_box(self):
+        series = list(self.trajectory.series(
+         self.frames, 1.5, centres=[[9.5, 0, 0]], box=Box(10, 10, 10)
+        ))
+        self.assertEqual(series[0][0].tolist(), [4.5])
+        self.assertEqual(series[1][0].tolist(), [9])
+
+
+    def test_can_get_series_with_box_per_frame(self):
+        with patch("biometal.trajectories.NeighbourList") as mock_list:
+            mock_list.return_value.pairs.return_value = (
+             np.array([0]), np.array([1]), np.array([1.0])
+            )
+            boxes = [Box(10, 10, 10), Box(11, 11, 11)]
+            list(self.trajectory.series(
+             self.frames, 1.5, centres=[[0, 0, 0]], box=boxes
+            ))
+        for call, box in zip(mock_list.return_value.pairs.call_args_list, boxes):
+            self.assertIs(call[1]["box"], box)
+
+
+    def test_boxes_must_match_frames(self):
+        for boxes in (
+         [Box(10, 10, 10)], [Box(10, 10, 10)] * 3,
+         (Box(10, 10, 10) for _ in range(1))
+        ):
+            series = self.trajectory.series(
+             self.frames, 1.5, centres=[[0, 0, 0]], box=boxes
+            )
+            with self.assertRaises(ValueError):
+                list(series)
+        self.assertEqual(len(list(self.trajectory.series(
+         self.frames, 1.5, centres=[[0, 0, 0]], box=[Box(10, 10, 10)] * 2
+        ))), 2)
+
+
+    def test_frames_must_match_topology(self):
+        with self.assertRaises(ValueError):
+            next(self.trajectory.series(
+             [np.zeros((2, 3))], 1, centres=[[0, 0, 0]]
+            ))
+
+
+
+class ContrastSeriesTests(TestCase):
+
+    def setUp(self):
+        self.table = AtomTable.from_arrays(
+         [[0, 0, 0], [1, 0, 0], [0, 2, 0]], ["C", "O", "ZN"]
+        )
+
+
+    def test_can_get_contrast_series(self):
+        frames = (np.array([[0.0, 0, 0], [x, 0, 0], [0, 2, 0]]) for x in (1, 3))
+        solvations, contrasts = contrast_series(
+         self.table, frames, 1.5, centres=[[0, 0, 0]]
+        )
+        self.assertEqual(solvations.tolist(), [[4.5], [18]])
+        self.assertEqual(contrasts.tolist(), [[-13.5], [0]])
+
+
+    def test_can_get_empty_series(self):
+        solvations, contrasts = contrast_series(
+         self.table, [], 1.5, atoms=[0, 2]
+        )
+        self.assertEqual(solvations.shape, (0, 2))
+        self.assertEqual(contrasts.shape, (0, 2))
+
+
+
+def write_dcd(path, frames, cells=None, order="<", charmm=True):
+    frames = np.asarray(frames, dtype=np.float32)
+    record = lambda data: struct.pack(
+     order + "i", len(data)
+    ) + data + struct.pack(order + "i", len(data))
+    control = [len(frames), 0, 1] + [0] * 16 + [24 if charmm else 0]
+    control[10] = int(cells is not None)
+    data = record(b"CORD" + struct.pack(order + "20i", *control))
+    data += record(struct.pack(order + "i", 1) + b"title".ljust(80))
+    data += record(struct.pack(order + "i", frames.shape[1]))
+    for index, frame in enumerate(frames):
+        if cells is not None:
+            data += record(struct.pack(order + "6d", *cells[index]))
+        for axis in range(3):
+            data += record(frame[:, axis].astype(order + "f4").tobytes())
+    with open(path, "wb") as f: f.write(data)
+
+
+
+class FrameFileTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.frames = np.arange(5 * 4 * 3, dtype=np.float32).reshape(5, 4, 3)
+
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+
+    def test_can_read_npy_frames(self):
+        np.save(self.path("frames.npy"), self.frames)
+        frames = NpyFrames(self.path("frames.npy"))
+        self.assertEqual(len(frames), 5)
+        self.assertEqual(frames.atom_count, 4)
+        self.assertEqual(frames.path, self.path("frames.npy"))
+        self.assertEqual(repr(frames), "<NpyFrames (5 frames of 4 atoms)>")
+        self.assertIsInstance(frames._frames, np.memmap)
+        self.assertEqual(frames[2].tolist(), self.frames[2].tolist())
+        self.assertEqual(
+         frames.frames(1, step=2).tolist(), self.frames[1::2].tolist()
+        )
+        self.assertEqual(
+         [frame.tolist() for frame in frames], self.frames.tolist()
+        )
+
+
+    def test_npy_frames_must_have_right_shape(self):
+        np.save(self.path("frames.npy"), np.zeros((5, 4)))
+        with self.assertRaises(ValueError):
+            NpyFrames(self.path("frames.npy"))
+
+
+    def test_can_read_dcd_frames(self):
+        cells = [(10 + i, 90, 11, 90, 90, 12) for i in range(5)]
+        write_dcd(self.path("frames.dcd"), self.frames, cells=cells)
+        frames = DcdFrames(self.path("frames.dcd"))
+        self.assertEqual(len(frames), 5)
+        self.assertEqual(frames.atom_count, 4)
+        self.assertEqual(frames[3].tolist(), self.frames[3].tolist())
+        self.assertFalse(frames[3].flags.owndata)
+        self.assertEqual(
+         frames.frames(0, 4, 3).tolist(), self.frames[0:4:3].tolist()
+        )
+        self.assertEqual(frames.unit_cell(2), (12, 11, 12, 90, 90, 90))
+
+
+    def test_can_read_big_endian_dcd_frames(self):
+        write_dcd(self.path("frames.dcd"), self.frames, order=">", charmm=False)
+        frames = DcdFrames(self.path("frames.dcd"))
+        self.assertEqual(
+         [frame.tolist() for frame in frames], self.frames.tolist()
+        )
+        self.assertIsNone(frames.unit_cell(0))
+
+
+    def test_dcd_cell_angles_can_be_cosines(self):
+        write_dcd(self.path("frames.dcd"), self.frames, cells=[
+         (10, 0.5, 10, 0, 0, 10)
+        ] * 5)
+        cell = DcdFrames(self.path("frames.dcd")).unit_cell(0)
+        self.assertAlmostEqual(cell[3], 90)
+        self.assertAlmostEqual(cell[5], 60)
+
+
+    def test_can_get_dcd_boxes(self):
+        write_dcd(self.path("frames.dcd"), self.frames, cells=[
+         (10 + i, 90, 11, 90, 90, 12) for i in range(5)
+        ])
+        frames = DcdFrames(self.path("frames.dcd"))
+        self.assertEqual(frames.box(2), Box(12, 11, 12))
+        self.assertEqual(list(frames.boxes()), [
+         Box(10 + i, 11, 12) for i in range(5)
+        ])
+        write_dcd(self.path("frames.dcd"), self.frames)
+        self.assertIsNone(DcdFrames(self.path("frames.dcd")).box(0))
+
+
+    def test_can_read_dcd_without_frames(self):
+        write_dcd(self.path("frames.dcd"), np.zeros((0, 4, 3)), cells=[])
+        with patch("biometal.trajectories.np.memmap") as mock_memmap:
+            mock_memmap.side_effect = ValueError("mmap offset past end")
+            frames = DcdFrames(self.path("frames.dcd"))
+        self.assertEqual(len(frames), 0)
+        self.assertEqual(frames.atom_count, 4)
+        self.assertEqual(list(frames), [])
+        self.assertEqual(list(frames.boxes()), [])
+        self.assertEqual(frames.frames().shape, (0, 4, 3))
+        self.assertEqual(repr(frames), "<DcdFrames (0 frames of 4 atoms)>")
+
+
+    def test_dcd_must_be_valid(self):
+        with open(self.path("frames.dcd"), "wb") as f: f.write(b"x" * 100)
+        with self.assertRaises(ValueError):
+            DcdFrames(self.path("frames.dcd"))
+
+
+    def test_can_open_frames_by_extension(self):
+        np.save(self.path("frames.npy"), self.frames)
+        write_dcd(self.path("frames.dcd"), self.frames)
+        self.assertIsInstance(open_frames(self.path("frames.npy")), NpyFrames)
+        self.assertIsInstance(open_frames(self.path("frames.dcd")), DcdFrames)
+        with self.assertRaises(ValueError):
+            open_frames(self.path("frames.xtc"))
+
+
+    def test_can_save_frames(self):
+        write_dcd(self.path("frames.dcd"), self.frames)
+        save_frames(self.path("frames.npy"), DcdFrames(self.path("frames.dcd")))
+        self.assertEqual(
+         np.load(self.path("frames.npy")).tolist(), self.frames.tolist()
+        )
+        with self.assertRaises(ValueError):
+            save_frames(self.path("bad.npy"), [np.zeros((2, 3)), np.zeros((3, 3))])